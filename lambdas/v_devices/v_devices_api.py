@@ -1,24 +1,35 @@
 import json
+import base64
+import csv
+import hashlib
 import os
 import boto3
 import logging
+import math
 import re
+import time
 import uuid
-from datetime import datetime
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal
 import decimal
 from pydantic import BaseModel, ValidationError, Field
 from botocore.exceptions import ClientError
-from boto3.dynamodb.types import TypeDeserializer
-from boto3.dynamodb.conditions import Key
-from shared.response_utils import SuccessResponse, ErrorResponse
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from boto3.dynamodb.conditions import Key, Attr
+from shared.response_utils import SuccessResponse, ErrorResponse, build_response
 from shared.encryption_utils import FieldEncryption, get_fields_to_encrypt, get_fields_to_decrypt, prepare_item_for_storage, prepare_item_for_response
 
 TABLE_NAME = os.environ.get("TABLE_NAME", "v_devices_dev")
 SIMCARDS_TABLE_NAME = os.environ.get("SIMCARDS_TABLE_NAME", "v_simcards_dev")
+# Same table the regions API writes (its TABLE_NAME)
+REGIONS_TABLE_NAME = os.environ.get("REGIONS_TABLE", "regions")
 dynamodb = boto3.resource("dynamodb")
 dynamodb_client = boto3.client("dynamodb")
+s3_client = boto3.client("s3")
+lambda_client = boto3.client("lambda")
 table = dynamodb.Table(TABLE_NAME)
 simcards_table = dynamodb.Table(SIMCARDS_TABLE_NAME)
 deserializer = TypeDeserializer()
@@ -375,7 +386,7 @@ ENTITY_MODEL_MAP = {
 }
 
 def fetch_region_names(state_id=None, district_id=None, mandal_id=None, village_id=None, habitation_id=None):
-    """Fetch region names from v_regions_dev table
+    """Fetch region names from the regions table (REGIONS_TABLE_NAME)
     
     The table uses a hierarchical structure:
     - STATE#<code> contains districts as SK entries
@@ -395,7 +406,7 @@ def fetch_region_names(state_id=None, district_id=None, mandal_id=None, village_
     region_names = {}
     
     try:
-        regions_table = dynamodb.Table(os.environ.get("REGIONS_TABLE", "v_regions_dev"))
+        regions_table = dynamodb.Table(REGIONS_TABLE_NAME)
         logger.info(f"fetch_region_names called with: state_id={state_id}, district_id={district_id}, mandal_id={mandal_id}, village_id={village_id}, habitation_id={habitation_id}")
         
         # For STATE
@@ -469,9 +480,231 @@ def fetch_region_names(state_id=None, district_id=None, mandal_id=None, village_
     
     except Exception as e:
         logger.warning(f"Failed to fetch region names: {str(e)}")
-    
+
+    return region_names
+
+# Region name attributes denormalized onto INSTALL#<id>/META
+REGION_NAME_FIELDS = ("stateName", "districtName", "mandalName", "villageName", "habitationName")
+
+def resolve_install_region_names(install_data):
+    """Return region names for an installation record.
+
+    Installations created or updated since region names were denormalized carry
+    stateName..habitationName on the META item, so no regions table lookup is needed.
+    Legacy records without the stored names fall back to fetch_region_names.
+    """
+    stored_names = {field: install_data.get(field) for field in REGION_NAME_FIELDS if install_data.get(field)}
+    if len(stored_names) == len(REGION_NAME_FIELDS):
+        return stored_names
+
+    # Support both PascalCase and camelCase
+    region_names = fetch_region_names(
+        state_id=install_data.get("stateId") or install_data.get("StateId"),
+        district_id=install_data.get("districtId") or install_data.get("DistrictId"),
+        mandal_id=install_data.get("mandalId") or install_data.get("MandalId"),
+        village_id=install_data.get("villageId") or install_data.get("VillageId"),
+        habitation_id=install_data.get("habitationId") or install_data.get("HabitationId")
+    )
+    region_names.update(stored_names)
     return region_names
 
+
+# Installation listing indexes (see scripts/create_install_indexes.py)
+INSTALL_ENTITY_DATE_INDEX = "InstallEntityDateIndex"  # entityType (HASH) + createdDate (RANGE)
+INSTALL_REGION_INDEX = "InstallRegionIndex"            # stateId (HASH) + regionCombo (RANGE)
+INSTALL_CUSTOMER_INDEX = "InstallCustomerIndex"        # customerId (HASH) + createdDate (RANGE)
+INSTALL_REGION_LEVELS = ("stateId", "districtId", "mandalId", "villageId", "habitationId")
+
+
+def encode_install_cursor(index_name, last_evaluated_key):
+    """Encode a query LastEvaluatedKey (and the index it belongs to) as an opaque nextToken."""
+    payload = {"index": index_name, "key": simplify(last_evaluated_key)}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("utf-8")
+
+
+def decode_install_cursor(token, index_name):
+    """Decode a nextToken produced by encode_install_cursor. Returns (key, error)."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("utf-8")).decode("utf-8"))
+    except Exception as e:
+        logger.error(f"Invalid nextToken: {e}")
+        return None, "Invalid nextToken"
+    if payload.get("index") != index_name or not isinstance(payload.get("key"), dict):
+        return None, "nextToken does not match the requested filters"
+    return payload["key"], None
+
+
+def build_install_list_query(filters):
+    """
+    Choose the index and key condition for GET /installs from the request filters.
+
+    - customerId          -> InstallCustomerIndex
+    - stateId (+ levels)  -> InstallRegionIndex, begins_with(regionCombo, "<state>#<district>#...")
+    - otherwise           -> InstallEntityDateIndex, newest first
+    Filters not covered by the key condition become a FilterExpression.
+    Returns (query_params, index_name).
+    """
+    remaining = {k: v for k, v in filters.items() if v}
+
+    if remaining.get("customerId"):
+        index_name = INSTALL_CUSTOMER_INDEX
+        key_condition = Key("customerId").eq(remaining.pop("customerId"))
+    elif remaining.get("stateId"):
+        index_name = INSTALL_REGION_INDEX
+        # Longest contiguous run of hierarchy levels becomes the regionCombo prefix
+        prefix_parts = []
+        for level in INSTALL_REGION_LEVELS:
+            if not remaining.get(level):
+                break
+            prefix_parts.append(remaining.pop(level))
+        key_condition = Key("stateId").eq(prefix_parts[0])
+        if len(prefix_parts) == len(INSTALL_REGION_LEVELS):
+            key_condition = key_condition & Key("regionCombo").eq("#".join(prefix_parts))
+        elif len(prefix_parts) > 1:
+            key_condition = key_condition & Key("regionCombo").begins_with("#".join(prefix_parts) + "#")
+    else:
+        index_name = INSTALL_ENTITY_DATE_INDEX
+        key_condition = Key("entityType").eq("INSTALL")
+
+    filter_expression = Attr("entityType").eq("INSTALL") if index_name != INSTALL_ENTITY_DATE_INDEX else None
+    for attribute, value in remaining.items():
+        condition = Attr(attribute).eq(value)
+        filter_expression = condition if filter_expression is None else filter_expression & condition
+
+    query_params = {
+        "IndexName": index_name,
+        "KeyConditionExpression": key_condition,
+        "ScanIndexForward": index_name == INSTALL_REGION_INDEX
+    }
+    if filter_expression is not None:
+        query_params["FilterExpression"] = filter_expression
+    return query_params, index_name
+
+
+def install_region_scope_error(filters):
+    """District and lower region codes are only unique within their state; they need a stateId or customerId."""
+    if not filters.get("stateId") and not filters.get("customerId"):
+        lower_levels = [level for level in INSTALL_REGION_LEVELS[1:] if filters.get(level)]
+        if lower_levels:
+            return f"stateId is required when filtering by {', '.join(lower_levels)}"
+    return None
+
+
+def query_installs_page(filters, limit, next_token=None):
+    """
+    Fetch one page of installation META records via the listing indexes.
+
+    Each query call is capped at the number of items still needed, so a page never
+    overshoots and LastEvaluatedKey is always a stable cursor (nothing is skipped).
+    Region codes below the state are only unique within their parent, so district and
+    lower filters need a stateId (or a customerId scoping the query).
+    Returns (items, next_token, error).
+    """
+    scope_error = install_region_scope_error(filters)
+    if scope_error:
+        return None, None, scope_error
+
+    query_params, index_name = build_install_list_query(filters)
+    if next_token:
+        start_key, error = decode_install_cursor(next_token, index_name)
+        if error:
+            return None, None, error
+        query_params["ExclusiveStartKey"] = start_key
+
+    items = []
+    last_evaluated_key = None
+    while len(items) < limit:
+        query_params["Limit"] = limit - len(items)
+        response = table.query(**query_params)
+        items.extend(response.get("Items", []))
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        query_params["ExclusiveStartKey"] = last_evaluated_key
+
+    logger.info(f"Queried {len(items)} installs from {index_name} with filters {filters}")
+    token = encode_install_cursor(index_name, last_evaluated_key) if last_evaluated_key else None
+    return items, token, None
+
+
+INSTALL_WARRANTY_INDEX = "InstallWarrantyIndex"  # entityType (HASH) + warrantyDate (RANGE)
+WARRANTY_MAX_WINDOW_DAYS = 365
+
+
+def parse_warranty_window(value):
+    """Parse a ?within= value such as "30d" or "30" into a day count. Returns (days, error)."""
+    match = re.match(r"^(\d{1,3})d?$", (value or "30d").strip().lower())
+    if not match:
+        return None, "within must be a number of days, e.g. 30d"
+    days = int(match.group(1))
+    if days < 1 or days > WARRANTY_MAX_WINDOW_DAYS:
+        return None, f"within must be between 1 and {WARRANTY_MAX_WINDOW_DAYS} days"
+    return days, None
+
+
+def count_install_devices(install_id):
+    """Count DEVICE_ASSOC records for an installation without reading the items."""
+    count = 0
+    query_params = {
+        "KeyConditionExpression": Key("PK").eq(f"INSTALL#{install_id}") & Key("SK").begins_with("DEVICE_ASSOC#"),
+        "Select": "COUNT"
+    }
+    while True:
+        response = table.query(**query_params)
+        count += response.get("Count", 0)
+        if "LastEvaluatedKey" not in response:
+            return count
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def query_warranty_expiring_page(days, filters, limit, next_token=None):
+    """
+    Fetch installs whose warrantyDate falls between today and today + days, soonest first,
+    with one range query on InstallWarrantyIndex per page. Region/customer/status filters
+    are applied as a FilterExpression. Returns (items, next_token, error).
+    """
+    scope_error = install_region_scope_error(filters)
+    if scope_error:
+        return None, None, scope_error
+
+    today = datetime.utcnow().date()
+    window_end = today + relativedelta(days=days)
+    # warrantyDate is stored as YYYY-MM-DD (or a full ISO timestamp on legacy records)
+    query_params = {
+        "IndexName": INSTALL_WARRANTY_INDEX,
+        "KeyConditionExpression": Key("entityType").eq("INSTALL") & Key("warrantyDate").between(
+            today.isoformat(), f"{window_end.isoformat()}T23:59:59.999999Z"
+        ),
+        "ScanIndexForward": True
+    }
+    filter_expression = None
+    for attribute, value in filters.items():
+        if value:
+            condition = Attr(attribute).eq(value)
+            filter_expression = condition if filter_expression is None else filter_expression & condition
+    if filter_expression is not None:
+        query_params["FilterExpression"] = filter_expression
+
+    if next_token:
+        start_key, error = decode_install_cursor(next_token, INSTALL_WARRANTY_INDEX)
+        if error:
+            return None, None, error
+        query_params["ExclusiveStartKey"] = start_key
+
+    items = []
+    last_evaluated_key = None
+    while len(items) < limit:
+        query_params["Limit"] = limit - len(items)
+        response = table.query(**query_params)
+        items.extend(response.get("Items", []))
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        query_params["ExclusiveStartKey"] = last_evaluated_key
+
+    token = encode_install_cursor(INSTALL_WARRANTY_INDEX, last_evaluated_key) if last_evaluated_key else None
+    return items, token, None
+
 def lambda_handler(event, context):
     # Log the full event for debugging
     logger.info(f"Received event: {json.dumps(event, default=str)}")
@@ -483,6 +716,18 @@ def lambda_handler(event, context):
         event.get("requestContext", {}).get("httpMethod")
     )
     
+    # Scheduled RUNTIME archive job (EventBridge rule with a constant {"job": "archive-runtime"} input)
+    if event.get("job") == "archive-runtime":
+        return {"statusCode": 200, "body": json.dumps(run_runtime_archive_job(event.get("deviceIds")))}
+    
+    # Queued bulk config push (async self-invocation from POST /configs/apply)
+    if event.get("job") == "config-apply":
+        return {"statusCode": 200, "body": json.dumps(run_config_apply_job(event.get("jobId")), default=str)}
+    
+    # Scheduled EventBridge invocation: retry pending ThingsBoard outbox markers
+    if event.get("source") == "aws.events":
+        return {"statusCode": 200, "body": json.dumps(drain_thingsboard_outbox())}
+    
     # Log for debugging
     logger.info(f"Event keys: {list(event.keys())}")
     logger.info(f"Extracted method: {method}")
@@ -612,8 +857,8 @@ def lambda_handler(event, context):
             
             logger.info(f"Checking for existing installation: RegionCombo={region_combo_key}")
             
-            # NOTE: We'll use a conditional expression during put_item to prevent duplicates atomically
-            # This is better than a scan + check pattern which has race conditions
+            # The region lock, META, initial device links and ThingsBoard outbox marker are
+            # written in a single transaction so a failure cannot leave an orphaned lock
             
             # Create installation record
             try:
@@ -630,7 +875,7 @@ def lambda_handler(event, context):
                     "mandalId": body.get("mandalId"),
                     "villageId": body.get("villageId"),
                     "habitationId": body.get("habitationId"),
-                    "regionCombo": region_combo_key,  # Add for future GSI
+                    "regionCombo": region_combo_key,  # InstallRegionIndex sort key
                     "primaryDevice": body.get("primaryDevice"),
                     "status": body.get("status"),
                     "installationDate": body.get("installationDate"),
@@ -641,6 +886,16 @@ def lambda_handler(event, context):
                     "updatedBy": created_by
                 }
                 
+                # Denormalize region names onto the install record so reads need no region lookups
+                region_names = fetch_region_names(
+                    state_id=state_id,
+                    district_id=district_id,
+                    mandal_id=mandal_id,
+                    village_id=village_id,
+                    habitation_id=habitation_id
+                )
+                installation_item.update(region_names)
+
                 # Add optional fields
                 customer_id = body.get("customerId")
                 if customer_id:
@@ -681,7 +936,6 @@ def lambda_handler(event, context):
                     logger.info(f"Using directly provided warrantyDate: {warranty_date}")
                 
                 # Create a unique record for region combo to prevent duplicates
-                # This will be used with conditional expression
                 region_lock_item = {
                     "PK": f"REGION_LOCK#{region_combo_key}",
                     "SK": "LOCK",
@@ -690,167 +944,60 @@ def lambda_handler(event, context):
                     "createdDate": timestamp
                 }
                 
-                # First, try to create the region lock atomically
-                try:
-                    table.put_item(
-                        Item=convert_floats_to_decimal(region_lock_item),
-                        ConditionExpression="attribute_not_exists(PK)"  # Only succeeds if lock doesn't exist
+                # Validate the initial devices up front (batch read + parallel link lookups)
+                performed_by = body.get("CreatedBy") or created_by
+                ip_address = get_client_ip(event)
+                reason = "Linked during installation creation"
+                eligible_device_ids, device_link_errors = prevalidate_install_device_links(installation_id, device_ids)
+                
+                success, linked_device_ids, overflow_device_ids, transaction_errors, error_code = execute_install_create_transaction(
+                    installation_item, region_lock_item, eligible_device_ids, performed_by, ip_address, reason
+                )
+                if error_code == "DUPLICATE":
+                    logger.warning(f"Duplicate installation attempt for region combination: {region_combo_key}")
+                    # Try to find existing installation ID
+                    try:
+                        existing = table.get_item(Key={"PK": f"REGION_LOCK#{region_combo_key}", "SK": "LOCK"})
+                        existing_id = existing.get("Item", {}).get("installationId", "unknown")
+                    except Exception:
+                        existing_id = "unknown"
+                    return ErrorResponse.build(
+                        f"Installation already exists for this region combination (InstallationId: {existing_id}). "
+                        f"Region: {state_id}/{district_id}/{mandal_id}/{village_id}/{habitation_id}",
+                        409  # Conflict status code
                     )
-                    logger.info(f"Created region lock for {region_combo_key}")
-                except ClientError as e:
-                    if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
-                        # Region lock already exists - duplicate installation
-                        logger.warning(f"Duplicate installation attempt for region combination: {region_combo_key}")
-                        # Try to find existing installation ID
-                        try:
-                            existing = table.get_item(Key={"PK": f"REGION_LOCK#{region_combo_key}", "SK": "LOCK"})
-                            existing_id = existing.get("Item", {}).get("installationId", "unknown")
-                        except:
-                            existing_id = "unknown"
-                        return ErrorResponse.build(
-                            f"Installation already exists for this region combination (InstallationId: {existing_id}). "
-                            f"Region: {state_id}/{district_id}/{mandal_id}/{village_id}/{habitation_id}",
-                            409  # Conflict status code
-                        )
-                    else:
-                        raise  # Re-raise if it's a different error
+                device_link_errors.extend(transaction_errors)
                 
-                # Region lock created successfully, now create the installation
-                installation_item = convert_floats_to_decimal(installation_item)
-                table.put_item(Item=installation_item)
+                # Devices beyond one transaction's capacity are linked in follow-up batches
+                if overflow_device_ids:
+                    overflow_linked, overflow_errors = execute_install_device_link_batch(
+                        installation_id, overflow_device_ids, performed_by, ip_address, reason
+                    )
+                    linked_device_ids.extend(overflow_linked)
+                    device_link_errors.extend(overflow_errors)
                 
                 logger.info(f"Created installation {installation_id}")
                 
-                # Fetch and add region names to response
+                # Build the response from the in-memory item - no re-read needed
                 response_data = simplify(installation_item)
-                region_names = fetch_region_names(
-                    state_id=response_data.get("stateId"),
-                    district_id=response_data.get("districtId"),
-                    mandal_id=response_data.get("mandalId"),
-                    village_id=response_data.get("villageId"),
-                    habitation_id=response_data.get("habitationId")
-                )
-                response_data.update(region_names)
                 
-                # Sync region assets to Thingsboard (non-blocking)
-                try:
-                    from shared.thingsboard_utils import sync_installation_regions_to_thingsboard
-                    
-                    logger.info(f"Syncing installation regions to Thingsboard for installation {installation_id}")
-                    logger.info(f"Installation data keys: {list(response_data.keys())}")
-                    logger.info(f"Installation data: {response_data}")
-                    
-                    # Sync all regions (state, district, mandal, village, habitation)
-                    sync_results = sync_installation_regions_to_thingsboard(response_data)
-                    
-                    logger.info(f"Thingsboard sync results: {sync_results}")
-                    
-                    response_data["thingsboardStatus"] = "synced"
+                # Sync region assets and habitation links to Thingsboard (non-blocking).
+                # On failure the outbox marker stays behind for the scheduled drain to retry.
+                sync_results, thingsboard_status, thingsboard_error = complete_thingsboard_outbox(response_data, linked_device_ids)
+                response_data["thingsboardStatus"] = thingsboard_status
+                if thingsboard_error:
+                    response_data["thingsboardError"] = thingsboard_error
+                else:
                     response_data["thingsboardAssets"] = sync_results
-                    
                     if sync_results.get("errors"):
                         logger.warning(f"Thingsboard sync had errors: {sync_results['errors']}")
-                        response_data["thingsboardStatus"] = "partial"
                         response_data["thingsboardErrors"] = sync_results["errors"]
-                    else:
-                        logger.info(f"Successfully synced all regions to Thingsboard for installation {installation_id}")
-                    
-                    # Save thingsboardAssets back to DynamoDB so device linking can access it
-                    try:
-                        table.update_item(
-                            Key={"PK": f"INSTALL#{installation_id}", "SK": "META"},
-                            UpdateExpression="SET thingsboardAssets = :assets, thingsboardStatus = :status",
-                            ExpressionAttributeValues={
-                                ":assets": sync_results,
-                                ":status": response_data["thingsboardStatus"]
-                            }
-                        )
-                        logger.info(f"Saved thingsboardAssets to installation record")
-                    except Exception as update_error:
-                        logger.error(f"Failed to save thingsboardAssets to DynamoDB: {str(update_error)}")
-                        
-                except Exception as e:
-                    logger.error(f"Thingsboard sync failed (non-blocking): {str(e)}", exc_info=True)
-                    response_data["thingsboardStatus"] = "error"
-                    response_data["thingsboardError"] = str(e)
-                
-                # Link devices if provided in request (called from UI)
-                # Support both deviceIds and DeviceIds (case variations)
-                device_ids = body.get("deviceIds") or body.get("DeviceIds", [])
-                if device_ids:
-                    logger.info(f"Linking {len(device_ids)} devices to installation {installation_id}")
-                
-                    device_link_results = []
-                    device_link_errors = []
-                
-                    for device_id in device_ids:
-                        try:
-                            # Validate device exists
-                            device_response = table.get_item(
-                                Key={"PK": f"DEVICE#{device_id}", "SK": "META"}
-                            )
-                            if "Item" not in device_response:
-                                device_link_errors.append({"deviceId": device_id, "error": "Device not found"})
-                                continue
-                            
-                            # Check if device is already linked to another installation
-                            is_linked, existing_install_id = get_device_installation_link(device_id)
-                            if is_linked:
-                                device_link_errors.append({
-                                    "deviceId": device_id, 
-                                    "error": f"Device already linked to installation {existing_install_id}"
-                                })
-                                continue
-                        
-                            # Execute the device link transaction
-                            performed_by = body.get("CreatedBy", "system")
-                            ip_address = get_client_ip(event)
-                            reason = "Linked during installation creation"
-                        
-                            success, transaction_error = execute_install_device_link_transaction(
-                                installation_id, device_id, performed_by, ip_address, reason
-                            )
-                        
-                            if success:
-                                # Link device to habitation asset in Thingsboard (non-blocking)
-                                try:
-                                    from shared.thingsboard_utils import link_device_to_habitation
-                                
-                                    # Get habitation asset ID from installation
-                                    install_response = table.get_item(Key={"PK": f"INSTALL#{installation_id}", "SK": "META"})
-                                    if "Item" in install_response:
-                                        installation = install_response["Item"]
-                                        thingsboard_assets = installation.get("thingsboardAssets")
-                                        habitation_id = None
-                                    
-                                        if isinstance(thingsboard_assets, dict):
-                                            habitation_id = thingsboard_assets.get("habitation", {}).get("id")
-                                    
-                                        if habitation_id:
-                                            logger.info(f"Linking device {device_id} to habitation {habitation_id} in Thingsboard")
-                                            link_success = link_device_to_habitation(device_id, habitation_id)
-                                            if link_success:
-                                                logger.info(f"Successfully linked device {device_id} to habitation in Thingsboard")
-                                            else:
-                                                logger.warning(f"Failed to link device {device_id} to habitation in Thingsboard (non-blocking)")
-                                except Exception as e:
-                                    logger.warning(f"Thingsboard device linking failed (non-blocking): {str(e)}", exc_info=True)
-                            
-                                device_link_results.append({"deviceId": device_id, "status": "linked"})
-                            else:
-                                device_link_errors.append({"deviceId": device_id, "error": transaction_error})
-                    
-                        except Exception as e:
-                            logger.error(f"Error linking device {device_id}: {str(e)}", exc_info=True)
-                            device_link_errors.append({"deviceId": device_id, "error": str(e)})
                 
-                    # Add device linking results to response
-                    response_data["deviceLinking"] = {
-                        "linked": device_link_results,
-                        "errors": device_link_errors if device_link_errors else []
-                    }
-                
-                    logger.info(f"Device linking complete: {len(device_link_results)} linked, {len(device_link_errors)} failed")
+                response_data["deviceLinking"] = {
+                    "linked": [{"deviceId": device_id, "status": "linked"} for device_id in linked_device_ids],
+                    "errors": device_link_errors
+                }
+                logger.info(f"Device linking complete: {len(linked_device_ids)} linked, {len(device_link_errors)} failed")
                 
                 return SuccessResponse.build({
                     "message": "Installation created successfully",
@@ -1067,6 +1214,7 @@ def lambda_handler(event, context):
                 "Cost": body.get("cost", 0),
                 "Technician": body.get("technician", ""),
                 "Status": body.get("status", "pending"),
+                "RepairDate": timestamp,
                 "CreatedDate": timestamp,
                 "UpdatedDate": timestamp,
                 "CreatedBy": body.get("createdBy", "system"),
@@ -1174,98 +1322,40 @@ def lambda_handler(event, context):
             if not is_valid:
                 return ErrorResponse.build(error_msg, 404)
             
-            # Batch validate device existence - much faster than sequential lookups
-            logger.info(f"Batch validating {len(device_ids)} devices")
-            try:
-                batch_keys = [{"PK": f"DEVICE#{device_id}", "SK": "META"} for device_id in device_ids]
-                batch_response = dynamodb_client.batch_get_item(
-                    RequestItems={
-                        TABLE_NAME: {
-                            "Keys": batch_keys
-                        }
-                    }
-                )
-                
-                found_devices = {item["DeviceId"]["S"]: item for item in batch_response.get("Responses", {}).get(TABLE_NAME, [])}
-                logger.info(f"Found {len(found_devices)} devices out of {len(device_ids)}")
-            except Exception as e:
-                logger.error(f"Batch device lookup failed: {str(e)}")
-                # Fallback to sequential validation
-                found_devices = {}
-            
-            # Link each device
-            results = []
-            errors = []
+            # Validate all devices up front, then link them in as few transactions as possible
+            eligible, errors = prevalidate_install_device_links(install_id, device_ids)
+            linked_ids, link_errors = execute_install_device_link_batch(
+                install_id, eligible, performed_by, ip_address, reason
+            )
+            errors.extend(link_errors)
+            results = [{"deviceId": device_id, "status": "linked"} for device_id in linked_ids]
             
-            for device_id in device_ids:
-                # Validate device format
-                if not re.match(r"^[A-Za-z0-9_-]{1,64}$", device_id):
-                    errors.append({"deviceId": device_id, "error": "Invalid deviceId format"})
-                    continue
-                
-                # Check if device exists (using batch lookup result)
-                if found_devices:
-                    if device_id not in found_devices:
-                        errors.append({"deviceId": device_id, "error": f"Device {device_id} not found"})
-                        continue
-                else:
-                    # Fallback: sequential validation
-                    is_valid, error_msg = validate_device_exists(device_id)
-                    if not is_valid:
-                        errors.append({"deviceId": device_id, "error": error_msg})
-                        continue
-                
-                # Check if already linked to THIS installation
-                if check_device_install_link(device_id, install_id):
-                    errors.append({"deviceId": device_id, "error": f"Device already linked to install {install_id}"})
-                    continue
-                
-                # Check if device is already linked to ANY OTHER installation
-                is_linked, existing_install_id = get_device_installation_link(device_id)
-                if is_linked and existing_install_id != install_id:
-                    errors.append({
-                        "deviceId": device_id, 
-                        "error": f"Device already linked to installation {existing_install_id}"
-                    })
-                    continue
-                
-                # Execute link transaction
-                success, transaction_error = execute_install_device_link_transaction(
-                    install_id, device_id, performed_by, ip_address, reason
-                )
-                
-                if success:
-                    # Link device to habitation asset in Thingsboard (non-blocking)
-                    try:
-                        from shared.thingsboard_utils import link_device_to_habitation
+            if linked_ids:
+                # Link devices to habitation asset in Thingsboard (non-blocking) - install read once
+                try:
+                    from shared.thingsboard_utils import link_device_to_habitation
+                    
+                    install_response = table.get_item(Key={"PK": f"INSTALL#{install_id}", "SK": "META"})
+                    if "Item" in install_response:
+                        thingsboard_assets = install_response["Item"].get("thingsboardAssets")
+                        habitation_id = None
                         
-                        # Get installation to find habitation asset ID
-                        install_response = table.get_item(Key={"PK": f"INSTALL#{install_id}", "SK": "META"})
-                        if "Item" in install_response:
-                            installation = install_response["Item"]
-                            thingsboard_assets = installation.get("thingsboardAssets")
-                            habitation_id = None
-                            
-                            if isinstance(thingsboard_assets, dict):
-                                habitation_id = thingsboard_assets.get("habitation", {}).get("id")
-                            
-                            if habitation_id:
+                        if isinstance(thingsboard_assets, dict):
+                            habitation_id = thingsboard_assets.get("habitation", {}).get("id")
+                        
+                        if habitation_id:
+                            for device_id in linked_ids:
                                 logger.info(f"Linking device {device_id} to habitation {habitation_id} in Thingsboard")
-                                link_success = link_device_to_habitation(device_id, habitation_id)
-                                if link_success:
+                                if link_device_to_habitation(device_id, habitation_id):
                                     logger.info(f"Successfully linked device {device_id} to habitation in Thingsboard")
                                 else:
                                     logger.warning(f"Failed to link device {device_id} to habitation in Thingsboard (non-blocking)")
-                            else:
-                                logger.warning(f"Habitation asset not found for installation {install_id} (non-blocking)")
                         else:
-                            logger.warning(f"Installation not found for Thingsboard linking {install_id} (non-blocking)")
-                    except Exception as e:
-                        logger.warning(f"Thingsboard device linking failed (non-blocking): {str(e)}", exc_info=True)
-                    
-                    results.append({"deviceId": device_id, "status": "linked"})
-                else:
-                    errors.append({"deviceId": device_id, "error": transaction_error})
+                            logger.warning(f"Habitation asset not found for installation {install_id} (non-blocking)")
+                    else:
+                        logger.warning(f"Installation not found for Thingsboard linking {install_id} (non-blocking)")
+                except Exception as e:
+                    logger.warning(f"Thingsboard device linking failed (non-blocking): {str(e)}", exc_info=True)
             
             response_data = {
                 "installId": install_id,
@@ -1508,6 +1598,160 @@ def lambda_handler(event, context):
             logger.info(f"Contact unlink operation complete: {len(results)} succeeded, {len(errors)} failed")
             return SuccessResponse.build(response_data, status_code)
 
+        # Check if this is a /devices/{deviceId}/alerts/ack request
+        if path_parameters.get("deviceId") and "/alerts/ack" in path:
+            device_id = path_parameters.get("deviceId")
+            try:
+                body = json.loads(event.get("body") or "{}")
+            except Exception as e:
+                logger.error(f"Failed to parse body: {e}")
+                return ErrorResponse.build(f"Malformed JSON body: {e}", 400)
+            alert_ids = body.get("alertIds") or []
+            if not isinstance(alert_ids, list) or not alert_ids:
+                return ErrorResponse.build("alertIds array is required in request body", 400)
+            
+            performed_by = body.get("performedBy", "system")
+            timestamp = datetime.utcnow().isoformat() + "Z"
+            acknowledged = []
+            errors = []
+            for alert_id in alert_ids:
+                try:
+                    table.update_item(
+                        Key={"PK": f"DEVICE#{device_id}", "SK": f"ALERT#{alert_id}"},
+                        UpdateExpression="SET AlertStatus = :acknowledged, AcknowledgedBy = :by, AcknowledgedAt = :at",
+                        ConditionExpression="attribute_exists(PK)",
+                        ExpressionAttributeValues={":acknowledged": "ACKNOWLEDGED", ":by": performed_by, ":at": timestamp}
+                    )
+                    acknowledged.append(alert_id)
+                except ClientError as e:
+                    if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                        errors.append({"alertId": alert_id, "error": "Alert not found"})
+                    else:
+                        errors.append({"alertId": alert_id, "error": e.response["Error"]["Message"]})
+            
+            response_data = {"deviceId": device_id, "acknowledged": acknowledged, "performedBy": performed_by, "timestamp": timestamp}
+            if errors:
+                response_data["errors"] = errors
+            logger.info(f"Acknowledged {len(acknowledged)} alerts for device {device_id}, {len(errors)} failed")
+            return SuccessResponse.build(response_data, 200 if acknowledged else 400)
+        
+        # Check if this is a POST /configs/apply bulk config push
+        if "/configs/apply" in path:
+            try:
+                body = json.loads(event.get("body") or "{}")
+                body = convert_floats_to_decimal(body)
+            except Exception as e:
+                logger.error(f"Failed to parse body: {e}")
+                return ErrorResponse.build(f"Malformed JSON body: {e}", 400)
+            
+            config_version = body.get("configVersion")
+            config_data = body.get("configData")
+            device_ids = body.get("deviceIds")
+            applied_by = body.get("appliedBy") or body.get("performedBy") or "system"
+            status = body.get("status", "active")
+            if not isinstance(config_version, str) or not config_version or "#" in config_version:
+                return ErrorResponse.build("configVersion is required and must not contain '#'", 400)
+            if not isinstance(config_data, dict):
+                return ErrorResponse.build("configData object is required", 400)
+            if not isinstance(device_ids, list) or not device_ids:
+                return ErrorResponse.build("deviceIds array is required in request body", 400)
+            if len(device_ids) > CONFIG_APPLY_MAX_DEVICES:
+                return ErrorResponse.build(f"Maximum {CONFIG_APPLY_MAX_DEVICES} devices can be configured at once", 400)
+            invalid_ids = [d for d in device_ids if not isinstance(d, str) or not re.match(r"^[A-Za-z0-9_-]{1,64}$", d)]
+            if invalid_ids:
+                return ErrorResponse.build(f"Invalid deviceId format: {', '.join(map(str, invalid_ids[:20]))}", 400)
+            device_ids = list(dict.fromkeys(device_ids))
+            
+            job_id = f"CFGAPPLY-{str(uuid.uuid4())[:8].upper()}"
+            try:
+                if len(device_ids) > CONFIG_APPLY_SYNC_MAX_DEVICES:
+                    # Too many to finish inside the API Gateway timeout - run as an async job
+                    logger.info(f"Queueing config {config_version} for {len(device_ids)} devices (job {job_id})")
+                    result = queue_config_apply(job_id, device_ids, config_version, config_data, applied_by, status)
+                    return SuccessResponse.build(result, 202)
+                logger.info(f"Applying config {config_version} to {len(device_ids)} devices (job {job_id})")
+                result = apply_config_to_devices(job_id, device_ids, config_version, config_data, applied_by, status)
+                return SuccessResponse.build(result, 200 if result["applied"] else 400)
+            except ClientError as e:
+                logger.error(f"Database error applying config: {str(e)}")
+                return ErrorResponse.build(f"Database error: {e.response['Error']['Message']}", 500)
+            except Exception as e:
+                logger.error(f"Unexpected error applying config: {str(e)}")
+                return ErrorResponse.build(f"Error applying config: {str(e)}", 500)
+        
+        # Check if this is a /devices/runtime/batch telemetry ingest request
+        if "/devices/runtime/batch" in path:
+            try:
+                body = json.loads(event.get("body") or "{}")
+            except Exception as e:
+                logger.error(f"Failed to parse body: {e}")
+                return ErrorResponse.build(f"Malformed JSON body: {e}", 400)
+            
+            readings = body.get("readings")
+            if not isinstance(readings, list) or not readings:
+                return ErrorResponse.build("readings array is required in request body", 400)
+            if len(readings) > RUNTIME_MAX_READINGS:
+                return ErrorResponse.build(f"Maximum {RUNTIME_MAX_READINGS} readings can be ingested at once", 400)
+            bucket_size = body.get("bucket")
+            if bucket_size and bucket_size not in RUNTIME_BUCKET_SECONDS:
+                return ErrorResponse.build(f"bucket must be one of: {', '.join(RUNTIME_BUCKET_SECONDS)}", 400)
+            
+            logger.info(f"Ingesting {len(readings)} runtime readings (bucket={bucket_size})")
+            try:
+                summary, errors, stored = ingest_runtime_readings(readings, bucket_size)
+            except Exception as e:
+                logger.error(f"Runtime ingest failed: {str(e)}")
+                return ErrorResponse.build(f"Runtime ingest failed: {str(e)}", 500)
+            
+            logger.info(f"Runtime ingest complete: {summary}")
+            response_data = dict(summary)
+            
+            # Refresh the last-known-state shadows (non-blocking)
+            try:
+                response_data["statesUpdated"] = update_device_states(stored)
+            except Exception as e:
+                logger.error(f"Device state update failed (non-blocking): {str(e)}", exc_info=True)
+                response_data["stateError"] = str(e)
+            
+            # Run the anomaly detector over the stored readings (non-blocking)
+            try:
+                devices_evaluated, alerts_raised = run_anomaly_detection(stored)
+                response_data["alertsRaised"] = alerts_raised
+            except Exception as e:
+                logger.error(f"Anomaly detection failed (non-blocking): {str(e)}", exc_info=True)
+                response_data["detectorError"] = str(e)
+            
+            # Fold the stored readings into hourly/daily rollups (non-blocking)
+            try:
+                response_data["rollupsUpdated"] = update_runtime_rollups(stored)
+            except Exception as e:
+                logger.error(f"Rollup update failed (non-blocking): {str(e)}", exc_info=True)
+                response_data["rollupError"] = str(e)
+            if errors:
+                response_data["errors"] = errors
+            return SuccessResponse.build(response_data, 200 if summary["stored"] else 400)
+        
+        # Check if this is a /devices/bulk import request
+        if "/devices/bulk" in path:
+            logger.info("Processing bulk device import")
+            lines, fmt, source_error = open_bulk_device_source(event)
+            if source_error:
+                return ErrorResponse.build(source_error, 400)
+
+            params = event.get("queryStringParameters") or {}
+            created_by = params.get("createdBy", "system")
+            try:
+                summary, errors = import_devices_bulk(iter_bulk_device_rows(lines, fmt), created_by)
+            except Exception as e:
+                logger.error(f"Bulk device import failed: {str(e)}")
+                return ErrorResponse.build(f"Bulk import failed: {str(e)}", 500)
+
+            logger.info(f"Bulk device import complete: {summary}")
+            response_data = {"format": fmt, **summary}
+            if errors:
+                response_data["errors"] = errors
+            return SuccessResponse.build(response_data, 200 if summary["created"] else 400)
+
         # Default POST handler for creating entities
         logger.info("POST handler: Starting default entity creation")
         try:
@@ -1565,6 +1809,10 @@ def lambda_handler(event, context):
                 logger.error(f"Pydantic validation failed: {str(val_error)}", exc_info=True)
                 return ErrorResponse.build(f"Validation error: {str(val_error)}", 400)
         
+            # Repairs join the sparse RepairDateIndex used by /repairs/analytics
+            if entity_type == "REPAIR":
+                item["RepairDate"] = item["CreatedDate"]
+            
             # Apply encryption to sensitive fields before storage
             try:
                 item = prepare_item_for_storage(item, entity_type)
@@ -1574,10 +1822,17 @@ def lambda_handler(event, context):
                 logger.warning(f"Proceeding with unencrypted data due to encryption failure")
             
             # Insert new item with duplicate prevention
-            table.put_item(
-                Item=item,
-                ConditionExpression="attribute_not_exists(PK) AND attribute_not_exists(SK)"
-            )
+            if entity_type == "CONFIG":
+                # Config, history entry and current pointer are written together
+                _, error_code = write_device_config(item)
+                if error_code == "DUPLICATE":
+                    logger.warning(f"Duplicate {entity_type} detected: PK={pk}, SK={sk}")
+                    return ErrorResponse.build(f"{entity_type} with ID {device_id} already exists", 409)
+            else:
+                table.put_item(
+                    Item=item,
+                    ConditionExpression="attribute_not_exists(PK) AND attribute_not_exists(SK)"
+                )
             logger.info(f"Created new {entity_type} with PK={pk}, SK={sk}")
             
             # Prepare response with decrypted fields for better UX
@@ -1608,26 +1863,295 @@ def lambda_handler(event, context):
         params = event.get("queryStringParameters") or {}
         device_id_param = path_parameters.get("deviceId") or path_parameters.get("id")
         
-        # Check if this is a /devices/{deviceId}/sim request (no EntityType required)
-        if device_id_param and "/sim" in path:
+        # Check if this is a GET /repairs/analytics request
+        if "/repairs/analytics" in path:
+            group_by = params.get("groupBy", "deviceType")
+            if group_by not in REPAIR_GROUP_BY:
+                return ErrorResponse.build(f"groupBy must be one of: {', '.join(REPAIR_GROUP_BY)}", 400)
+            today = datetime.now(timezone.utc).date()
+            to_day = params.get("to") or today.isoformat()
+            from_day = params.get("from") or (today - relativedelta(years=1)).isoformat()
+            try:
+                from_parsed = datetime.strptime(from_day, "%Y-%m-%d").date()
+                to_parsed = datetime.strptime(to_day, "%Y-%m-%d").date()
+            except ValueError:
+                return ErrorResponse.build("from and to must be dates in YYYY-MM-DD format", 400)
+            if from_parsed > to_parsed:
+                return ErrorResponse.build("from must not be later than to", 400)
+            refresh = params.get("refresh", "false").lower() == "true"
+            
+            logger.info(f"Repair analytics by {group_by} from {from_day} to {to_day} (refresh={refresh})")
+            try:
+                result = get_repair_analytics(group_by, from_day, f"{to_day}T23:59:59.999999Z", refresh)
+                result["to"] = to_day
+                return SuccessResponse.build(result, 200)
+            except ClientError as e:
+                logger.error(f"Database error computing repair analytics: {str(e)}")
+                return ErrorResponse.build(f"Database error: {e.response['Error']['Message']}", 500)
+            except Exception as e:
+                logger.error(f"Unexpected error computing repair analytics: {str(e)}")
+                return ErrorResponse.build(f"Error computing repair analytics: {str(e)}", 500)
+        
+        # Check if this is a current-state request:
+        #   GET /devices/{deviceId}/state, GET /installs/{installId}/state,
+        #   GET /devices/state?deviceIds=a,b or ?stateId=..&districtId=.. (region)
+        install_id_param = path_parameters.get("installId")
+        if path.rstrip("/").endswith("/state"):
+            try:
+                if device_id_param and device_id_param != "state":
+                    if not re.match(r"^[A-Za-z0-9_-]{1,64}$", device_id_param):
+                        return ErrorResponse.build("Invalid deviceId format", 400)
+                    item = table.get_item(Key={"PK": f"DEVICE#{device_id_param}", "SK": DEVICE_STATE_SK}).get("Item")
+                    if not item:
+                        return ErrorResponse.build(f"No state recorded for device {device_id_param}", 404)
+                    return SuccessResponse.build(format_device_state(device_id_param, item), 200)
+                
+                scope = {}
+                if install_id_param:
+                    scope["installationId"] = install_id_param
+                    device_ids = list_install_device_ids(install_id_param)
+                elif params.get("deviceIds"):
+                    device_ids = [d.strip() for d in params["deviceIds"].split(",") if d.strip()]
+                    if any(not re.match(r"^[A-Za-z0-9_-]{1,64}$", d) for d in device_ids):
+                        return ErrorResponse.build("Invalid deviceId format", 400)
+                else:
+                    filters = {level: params.get(level) for level in INSTALL_REGION_LEVELS}
+                    filters["customerId"] = params.get("customerId")
+                    if not any(filters.values()):
+                        return ErrorResponse.build("Provide deviceIds, a region filter (stateId, districtId, ...) or customerId", 400)
+                    scope = {k: v for k, v in filters.items() if v}
+                    # Resolve devices one page of installs at a time and stop once the cap is passed
+                    install_count = 0
+                    unique_ids = {}
+                    next_page_token = None
+                    with ThreadPoolExecutor(max_workers=CASCADE_MAX_WORKERS) as executor:
+                        while len(unique_ids) <= DEVICE_STATE_MAX_DEVICES:
+                            items, next_page_token, scope_error = query_installs_page(filters, 100, next_page_token)
+                            if scope_error:
+                                return ErrorResponse.build(scope_error, 400)
+                            install_ids = [item.get("installationId") for item in items if item.get("installationId")]
+                            install_count += len(install_ids)
+                            for ids in executor.map(list_install_device_ids, install_ids):
+                                unique_ids.update(dict.fromkeys(ids))
+                            if not next_page_token:
+                                break
+                    device_ids = list(unique_ids)
+                    scope["installCount"] = install_count
+                
+                device_ids = list(dict.fromkeys(device_ids))
+                if len(device_ids) > DEVICE_STATE_MAX_DEVICES:
+                    return ErrorResponse.build(f"Scope covers more than {DEVICE_STATE_MAX_DEVICES} devices; narrow the filter", 400)
+                states = batch_get_device_states(device_ids)
+                logger.info(f"Fetched state for {len(states)} of {len(device_ids)} devices")
+                return SuccessResponse.build({
+                    **scope,
+                    "deviceCount": len(device_ids),
+                    "devices": [format_device_state(device_id, states.get(device_id)) for device_id in device_ids]
+                }, 200)
+            except ClientError as e:
+                logger.error(f"Database error fetching device state: {str(e)}")
+                return ErrorResponse.build(f"Database error: {e.response['Error']['Message']}", 500)
+            except Exception as e:
+                logger.error(f"Unexpected error fetching device state: {str(e)}")
+                return ErrorResponse.build(f"Error fetching device state: {str(e)}", 500)
+        
+        # Check if this is a GET /devices/{deviceId}/alerts or /installs/{installId}/alerts request
+        if (device_id_param or install_id_param) and "/alerts" in path:
+            end_dt = parse_runtime_timestamp(params["to"]) if params.get("to") else datetime.now(timezone.utc)
+            start_dt = parse_runtime_timestamp(params["from"]) if params.get("from") else end_dt - relativedelta(days=7)
+            if start_dt is None or end_dt is None:
+                return ErrorResponse.build("from and to must be ISO-8601 timestamps", 400)
+            status_filter = params.get("status")
+            if status_filter and status_filter.upper() not in ("OPEN", "ACKNOWLEDGED"):
+                return ErrorResponse.build("status must be open or acknowledged", 400)
+            try:
+                if device_id_param:
+                    if not re.match(r"^[A-Za-z0-9_-]{1,64}$", device_id_param):
+                        return ErrorResponse.build("Invalid deviceId format", 400)
+                    scope = {"deviceId": device_id_param}
+                    alerts = query_device_alerts(device_id_param, start_dt, end_dt, status_filter)
+                else:
+                    scope = {"installationId": install_id_param}
+                    device_ids = list_install_device_ids(install_id_param)
+                    with ThreadPoolExecutor(max_workers=CASCADE_MAX_WORKERS) as executor:
+                        per_device = executor.map(lambda d: query_device_alerts(d, start_dt, end_dt, status_filter), device_ids)
+                        alerts = sorted((a for device_alerts in per_device for a in device_alerts), key=lambda a: a.get("AlertAt", ""), reverse=True)
+                logger.info(f"Found {len(alerts)} alerts for {scope}")
+                return SuccessResponse.build({**scope, "alertCount": len(alerts), "alerts": alerts}, 200)
+            except ClientError as e:
+                logger.error(f"Database error fetching alerts: {str(e)}")
+                return ErrorResponse.build(f"Database error: {e.response['Error']['Message']}", 500)
+            except Exception as e:
+                logger.error(f"Unexpected error fetching alerts: {str(e)}")
+                return ErrorResponse.build(f"Error fetching alerts: {str(e)}", 500)
+        
+        # Check if this is a GET /devices/{deviceId}/rollups or /installs/{installId}/rollups request
+        if (device_id_param or install_id_param) and "/rollups" in path:
+            entity_id = device_id_param or install_id_param
+            if not re.match(r"^[A-Za-z0-9_-]{1,64}$", entity_id):
+                return ErrorResponse.build("Invalid id format", 400)
+            pk = f"DEVICE#{entity_id}" if device_id_param else f"INSTALL#{entity_id}"
+            
+            end_dt = parse_runtime_timestamp(params["to"]) if params.get("to") else datetime.now(timezone.utc)
+            start_dt = parse_runtime_timestamp(params["from"]) if params.get("from") else end_dt - relativedelta(days=7)
+            if start_dt is None or end_dt is None:
+                return ErrorResponse.build("from and to must be ISO-8601 timestamps", 400)
+            if start_dt >= end_dt:
+                return ErrorResponse.build("from must be earlier than to", 400)
+            
+            resolution = params.get("resolution", "auto")
+            if resolution == "auto":
+                resolution = pick_rollup_resolution((end_dt - start_dt).total_seconds())
+            elif resolution not in ROLLUP_RESOLUTIONS:
+                return ErrorResponse.build("resolution must be auto, hour or day", 400)
+            if (end_dt - start_dt).total_seconds() / ROLLUP_RESOLUTIONS[resolution][1] > RUNTIME_MAX_POINTS:
+                return ErrorResponse.build(f"Range too large for {resolution} resolution: at most {RUNTIME_MAX_POINTS} points", 400)
+            metric_names = [m.strip() for m in params.get("metrics", "").split(",") if m.strip()]
+            
+            logger.info(f"Fetching {resolution} rollups for {pk} from {start_dt} to {end_dt}")
+            try:
+                series = query_rollup_series(pk, resolution, start_dt, end_dt, metric_names)
+                return SuccessResponse.build({
+                    "deviceId" if device_id_param else "installationId": entity_id,
+                    "from": format_runtime_timestamp(start_dt),
+                    "to": format_runtime_timestamp(end_dt),
+                    "resolution": resolution,
+                    "series": series
+                }, 200)
+            except ClientError as e:
+                logger.error(f"Database error fetching rollups: {str(e)}")
+                return ErrorResponse.build(f"Database error: {e.response['Error']['Message']}", 500)
+            except Exception as e:
+                logger.error(f"Unexpected error fetching rollups: {str(e)}")
+                return ErrorResponse.build(f"Error fetching rollups: {str(e)}", 500)
+        
+        # Check if this is a GET /devices/{deviceId}/runtime time-range request
+        if device_id_param and "/runtime" in path:
             device_id = device_id_param
-            logger.info(f"Fetching linked SIM for device: {device_id}")
+            if not re.match(r"^[A-Za-z0-9_-]{1,64}$", device_id):
+                return ErrorResponse.build("Invalid deviceId format", 400)
             
-            # Check if caller wants decrypted data (default: decrypted)
-            if "decrypt" in params:
-                should_decrypt = params.get("decrypt", "").lower() == "true"
+            end_dt = parse_runtime_timestamp(params["to"]) if params.get("to") else datetime.now(timezone.utc)
+            start_dt = parse_runtime_timestamp(params["from"]) if params.get("from") else end_dt - relativedelta(days=1)
+            if start_dt is None or end_dt is None:
+                return ErrorResponse.build("from and to must be ISO-8601 timestamps", 400)
+            if start_dt >= end_dt:
+                return ErrorResponse.build("from must be earlier than to", 400)
+            range_seconds = (end_dt - start_dt).total_seconds()
+            if range_seconds > RUNTIME_MAX_RANGE_DAYS * 86400:
+                return ErrorResponse.build(f"Time range cannot exceed {RUNTIME_MAX_RANGE_DAYS} days", 400)
+            
+            if params.get("step"):
+                step, error_msg = parse_runtime_step(params["step"])
+                if error_msg:
+                    return ErrorResponse.build(error_msg, 400)
+                if range_seconds / step > RUNTIME_MAX_POINTS:
+                    return ErrorResponse.build(f"step too small: at most {RUNTIME_MAX_POINTS} points per series", 400)
             else:
-                should_decrypt = True
-            logger.info(f"GET /devices/{device_id}/sim - decrypt={should_decrypt}")
-            
-            # Validate deviceId format
-            if not device_id or not re.match(r"^[A-Za-z0-9_-]{1,64}$", device_id):
-                logger.warning(f"Invalid deviceId format: {device_id}")
-                return ErrorResponse.build("Invalid deviceId format. Must be alphanumeric with optional _ or - (1-64 chars)", 400)
+                step = pick_runtime_step(range_seconds)
+            metric_names = [m.strip() for m in params.get("metrics", "").split(",") if m.strip()]
             
+            logger.info(f"Fetching runtime for {device_id} from {start_dt} to {end_dt} step={step}s metrics={metric_names or 'all'}")
             try:
-                # Check if device exists
-                device_response = table.get_item(
+                samples, items_read, truncated = collect_runtime_samples(device_id, start_dt, end_dt, metric_names)
+                start_ts = start_dt.timestamp()
+                series = {
+                    name: downsample_runtime_series(timestamps, values, start_ts, step)
+                    for name, (timestamps, values) in sorted(samples.items())
+                }
+                result = {
+                    "deviceId": device_id,
+                    "from": format_runtime_timestamp(start_dt),
+                    "to": format_runtime_timestamp(end_dt),
+                    "stepSeconds": step,
+                    "itemsRead": items_read,
+                    "rawReadings": sum(len(timestamps) for timestamps, _ in samples.values()),
+                    "truncated": truncated,
+                    "series": series
+                }
+                logger.info(f"Runtime query for {device_id}: {items_read} items -> {sum(len(points) for points in series.values())} points")
+                return SuccessResponse.build(result, 200)
+            except ClientError as e:
+                logger.error(f"Database error fetching runtime: {str(e)}")
+                return ErrorResponse.build(f"Database error: {e.response['Error']['Message']}", 500)
+            except Exception as e:
+                logger.error(f"Unexpected error fetching runtime: {str(e)}")
+                return ErrorResponse.build(f"Error fetching runtime: {str(e)}", 500)
+        
+        # Check if this is a GET /installs/warranty-expiring request (must precede /installs/{installId})
+        if "/installs/warranty-expiring" in path:
+            days, error_msg = parse_warranty_window(params.get("within"))
+            if error_msg:
+                return ErrorResponse.build(error_msg, 400)
+            try:
+                limit = int(params.get("limit", "50"))
+            except ValueError:
+                return ErrorResponse.build("Limit must be between 1 and 100", 400)
+            if limit < 1 or limit > 100:
+                return ErrorResponse.build("Limit must be between 1 and 100", 400)
+            
+            filters = {level: params.get(level) for level in INSTALL_REGION_LEVELS}
+            filters["customerId"] = params.get("customerId")
+            filters["status"] = params.get("status")
+            logger.info(f"Fetching installs with warranty expiring within {days} days, filters={filters}")
+            
+            try:
+                items, next_page_token, cursor_error = query_warranty_expiring_page(days, filters, limit, params.get("nextToken"))
+                if cursor_error:
+                    return ErrorResponse.build(cursor_error, 400)
+                
+                installs = [simplify(item) for item in items]
+                install_ids = [install.get("installationId") for install in installs]
+                with ThreadPoolExecutor(max_workers=CASCADE_MAX_WORKERS) as executor:
+                    device_counts = list(executor.map(count_install_devices, install_ids))
+                
+                today = datetime.utcnow().date()
+                for install, devices_count in zip(installs, device_counts):
+                    install["devicesCount"] = devices_count
+                    try:
+                        warranty_end = datetime.strptime(install["warrantyDate"][:10], "%Y-%m-%d").date()
+                        install["daysRemaining"] = (warranty_end - today).days
+                    except (KeyError, ValueError):
+                        install["daysRemaining"] = None
+                
+                result = {
+                    "within": days,
+                    "installCount": len(installs),
+                    "installs": installs,
+                    "limit": limit,
+                    "hasMore": bool(next_page_token)
+                }
+                if next_page_token:
+                    result["nextToken"] = next_page_token
+                logger.info(f"Found {len(installs)} install(s) with expiring warranty, hasMore: {result['hasMore']}")
+                return SuccessResponse.build(result, 200)
+            except ClientError as e:
+                logger.error(f"Database error fetching warranty report: {str(e)}")
+                return ErrorResponse.build(f"Database error: {e.response['Error']['Message']}", 500)
+            except Exception as e:
+                logger.error(f"Unexpected error fetching warranty report: {str(e)}")
+                return ErrorResponse.build(f"Error fetching warranty report: {str(e)}", 500)
+        
+        # Check if this is a /devices/{deviceId}/sim request (no EntityType required)
+        if device_id_param and "/sim" in path:
+            device_id = device_id_param
+            logger.info(f"Fetching linked SIM for device: {device_id}")
+            
+            # Check if caller wants decrypted data (default: decrypted)
+            if "decrypt" in params:
+                should_decrypt = params.get("decrypt", "").lower() == "true"
+            else:
+                should_decrypt = True
+            logger.info(f"GET /devices/{device_id}/sim - decrypt={should_decrypt}")
+            
+            # Validate deviceId format
+            if not device_id or not re.match(r"^[A-Za-z0-9_-]{1,64}$", device_id):
+                logger.warning(f"Invalid deviceId format: {device_id}")
+                return ErrorResponse.build("Invalid deviceId format. Must be alphanumeric with optional _ or - (1-64 chars)", 400)
+            
+            try:
+                # Check if device exists
+                device_response = table.get_item(
                     Key={"PK": f"DEVICE#{device_id}", "SK": "META"}
                 )
                 if "Item" not in device_response:
@@ -1680,6 +2204,55 @@ def lambda_handler(event, context):
                 logger.error(f"Unexpected error fetching SIM for {device_id}: {str(e)}")
                 return ErrorResponse.build(f"Error fetching SIM: {str(e)}", 500)
         
+        # Check if this is a GET /configs/apply/{jobId} progress request
+        if "/configs/apply" in path:
+            job_id = path_parameters.get("jobId") or path.rstrip("/").split("/")[-1]
+            if not job_id or job_id == "apply":
+                return ErrorResponse.build("jobId is required", 400)
+            try:
+                response = table.get_item(Key={"PK": f"CONFIG_APPLY#{job_id}", "SK": "META"})
+                if "Item" not in response:
+                    return ErrorResponse.build(f"Config apply job {job_id} not found", 404)
+                if config_apply_lease_expired(response["Item"]):
+                    logger.warning(f"Config apply job {job_id} lost its lease; re-queueing")
+                    requeue_config_apply_job(job_id)
+                return SuccessResponse.build(format_config_apply_job(response["Item"]), 200)
+            except ClientError as e:
+                logger.error(f"Database error fetching config apply job {job_id}: {str(e)}")
+                return ErrorResponse.build(f"Database error: {e.response['Error']['Message']}", 500)
+        
+        # Check if this is a GET /devices/{deviceId}/configs/current or /configs/history request
+        if device_id_param and ("/configs/current" in path or "/configs/history" in path):
+            device_id = device_id_param
+            if not re.match(r"^[A-Za-z0-9_-]{1,64}$", device_id):
+                return ErrorResponse.build("Invalid deviceId format. Must be alphanumeric with optional _ or - (1-64 chars)", 400)
+            try:
+                if "/configs/current" in path:
+                    current = get_current_config(device_id)
+                    if current is None:
+                        return ErrorResponse.build(f"No config found for device {device_id}", 404)
+                    return SuccessResponse.build(format_config_entry(current), 200)
+                
+                try:
+                    limit = int(params.get("limit", "20"))
+                except ValueError:
+                    return ErrorResponse.build("Limit must be between 1 and 100", 400)
+                if limit < 1 or limit > 100:
+                    return ErrorResponse.build("Limit must be between 1 and 100", 400)
+                items, next_token, error_msg = query_config_history_page(device_id, limit, params.get("nextToken"))
+                if error_msg:
+                    return ErrorResponse.build(error_msg, 400)
+                result = {"deviceId": device_id, "items": [format_config_entry(item) for item in items], "count": len(items)}
+                if next_token:
+                    result["nextToken"] = next_token
+                return SuccessResponse.build(result, 200)
+            except ClientError as e:
+                logger.error(f"Database error fetching config history for {device_id}: {str(e)}")
+                return ErrorResponse.build(f"Database error: {e.response['Error']['Message']}", 500)
+            except Exception as e:
+                logger.error(f"Unexpected error fetching config history for {device_id}: {str(e)}")
+                return ErrorResponse.build(f"Error fetching configs: {str(e)}", 500)
+        
         # Check if this is a /devices/{deviceId}/configs request
         if device_id_param and "/configs" in path:
             device_id = device_id_param
@@ -1738,15 +2311,8 @@ def lambda_handler(event, context):
 
                 install_data = simplify(response["Item"])
 
-                # Fetch and add region names (support both PascalCase and camelCase)
-                region_names = fetch_region_names(
-                    state_id=install_data.get("stateId") or install_data.get("StateId"),
-                    district_id=install_data.get("districtId") or install_data.get("DistrictId"),
-                    mandal_id=install_data.get("mandalId") or install_data.get("MandalId"),
-                    village_id=install_data.get("villageId") or install_data.get("VillageId"),
-                    habitation_id=install_data.get("habitationId") or install_data.get("HabitationId")
-                )
-                install_data.update(region_names)
+                # Region names are stored on META (legacy records fall back to a lookup)
+                install_data.update(resolve_install_region_names(install_data))
 
                 # If includeCustomer is requested, fetch customer details
                 if include_customer:
@@ -1956,130 +2522,93 @@ def lambda_handler(event, context):
             if limit < 1 or limit > 100:
                 return ErrorResponse.build("Limit must be between 1 and 100", 400)
             
+            filters = {level: query_params.get(level) for level in INSTALL_REGION_LEVELS}
+            filters["customerId"] = query_params.get("customerId")
+            filters["status"] = query_params.get("status")
+            
             try:
-                # Query all INSTALL records with pagination
-                scan_params = {
-                    "FilterExpression": "begins_with(PK, :pk_prefix)",
-                    "ExpressionAttributeValues": {
-                        ":pk_prefix": "INSTALL#"
-                    }
-                }
-                
-                # Add pagination token if provided
-                if next_token:
-                    try:
-                        import base64
-                        decoded_token = json.loads(base64.b64decode(next_token).decode('utf-8'))
-                        scan_params["ExclusiveStartKey"] = decoded_token
-                    except Exception as e:
-                        logger.error(f"Invalid nextToken: {e}")
-                        return ErrorResponse.build("Invalid nextToken", 400)
+                # Query one page of INSTALL META records through the listing indexes
+                items, next_page_token, cursor_error = query_installs_page(filters, limit, next_token)
+                if cursor_error:
+                    return ErrorResponse.build(cursor_error, 400)
                 
-                # Keep scanning until we have enough installations or no more data
                 installs = []
-                last_evaluated_key = None
-                
-                while len(installs) < limit:
-                    response = table.scan(**scan_params)
+                for item in items:
+                    install_data = simplify(item)
+
+                    # Region names are stored on META (legacy records fall back to a lookup)
+                    install_data.update(resolve_install_region_names(install_data))
                     
-                    for item in response.get("Items", []):
-                        # Only include items with SK = META (main install record)
-                        if item.get("SK") == "META":
-                            install_data = simplify(item)
-                            
-                            # Fetch and add region names (support both PascalCase and camelCase)
-                            region_names = fetch_region_names(
-                                state_id=install_data.get("stateId") or install_data.get("StateId"),
-                                district_id=install_data.get("districtId") or install_data.get("DistrictId"),
-                                mandal_id=install_data.get("mandalId") or install_data.get("MandalId"),
-                                village_id=install_data.get("villageId") or install_data.get("VillageId"),
-                                habitation_id=install_data.get("habitationId") or install_data.get("HabitationId")
+                    # If includeCustomer is requested, fetch customer details
+                    if include_customer:
+                        customer_id = install_data.get("customerId")
+                        if customer_id:
+                            # Query customer from v_customers table
+                            try:
+                                customers_table = dynamodb.Table(os.environ.get("CUSTOMERS_TABLE", "v_customers_dev"))
+                                customer_response = customers_table.get_item(
+                                    Key={"PK": f"CUSTOMER#{customer_id}", "SK": "ENTITY#CUSTOMER"}
+                                )
+                                if "Item" in customer_response:
+                                    customer_item = simplify(customer_response["Item"])
+                                    # Add customerName to base payload
+                                    install_data["customerName"] = customer_item.get("name")
+                                    # Include only relevant customer fields
+                                    install_data["customer"] = {
+                                        "customerId": customer_item.get("customerId") or customer_id,
+                                        "name": customer_item.get("name"),
+                                        "companyName": customer_item.get("companyName"),
+                                        "email": customer_item.get("email"),
+                                        "phone": customer_item.get("phone"),
+                                        "countryCode": customer_item.get("countryCode")
+                                    }
+                            except Exception as e:
+                                logger.warning(f"Failed to fetch customer {customer_id}: {str(e)}")
+                                install_data["customer"] = {"customerId": customer_id, "error": "Customer not found"}
+                    
+                    # Query and count device associations
+                    # Support both PascalCase and camelCase
+                    install_id = install_data.get("installationId") or install_data.get("InstallationId")
+                    if install_id:
+                        try:
+                            device_response = table.query(
+                                KeyConditionExpression="PK = :pk AND begins_with(SK, :sk)",
+                                ExpressionAttributeValues={
+                                    ":pk": f"INSTALL#{install_id}",
+                                    ":sk": "DEVICE_ASSOC#"
+                                }
                             )
-                            install_data.update(region_names)
-                            
-                            # If includeCustomer is requested, fetch customer details
-                            if include_customer:
-                                customer_id = install_data.get("customerId")
-                                if customer_id:
-                                    # Query customer from v_customers table
-                                    try:
-                                        customers_table = dynamodb.Table(os.environ.get("CUSTOMERS_TABLE", "v_customers_dev"))
-                                        customer_response = customers_table.get_item(
-                                            Key={"PK": f"CUSTOMER#{customer_id}", "SK": "ENTITY#CUSTOMER"}
-                                        )
-                                        if "Item" in customer_response:
-                                            customer_item = simplify(customer_response["Item"])
-                                            # Add customerName to base payload
-                                            install_data["customerName"] = customer_item.get("name")
-                                            # Include only relevant customer fields
-                                            install_data["customer"] = {
-                                                "customerId": customer_item.get("customerId") or customer_id,
-                                                "name": customer_item.get("name"),
-                                                "companyName": customer_item.get("companyName"),
-                                                "email": customer_item.get("email"),
-                                                "phone": customer_item.get("phone"),
-                                                "countryCode": customer_item.get("countryCode")
-                                            }
-                                    except Exception as e:
-                                        logger.warning(f"Failed to fetch customer {customer_id}: {str(e)}")
-                                        install_data["customer"] = {"customerId": customer_id, "error": "Customer not found"}
-                            
-                            # Query and count device associations
-                            # Support both PascalCase and camelCase
-                            install_id = install_data.get("installationId") or install_data.get("InstallationId")
-                            if install_id:
-                                try:
-                                    device_response = table.query(
-                                        KeyConditionExpression="PK = :pk AND begins_with(SK, :sk)",
-                                        ExpressionAttributeValues={
-                                            ":pk": f"INSTALL#{install_id}",
-                                            ":sk": "DEVICE_ASSOC#"
-                                        }
-                                    )
-                                    device_items = device_response.get("Items", [])
-                                    install_data["devicesCount"] = len(device_items)
-                                    # Store associations for batch fetch later if needed
-                                    if include_devices:
-                                        install_data["_deviceAssociations"] = device_items
-                                except Exception as e:
-                                    logger.warning(f"Failed to count devices for {install_id}: {str(e)}")
-                                    install_data["devicesCount"] = 0
-                            else:
-                                install_data["devicesCount"] = 0
-                            
-                            # Query and count contact associations
-                            # Support both PascalCase and camelCase
-                            install_id = install_data.get("installationId") or install_data.get("InstallationId")
-                            if install_id:
-                                try:
-                                    contact_response = table.query(
-                                        KeyConditionExpression="PK = :pk AND begins_with(SK, :sk)",
-                                        ExpressionAttributeValues={
-                                            ":pk": f"INSTALL#{install_id}",
-                                            ":sk": "CONTACT_ASSOC#"
-                                        }
-                                    )
-                                    install_data["contactsCount"] = len(contact_response.get("Items", []))
-                                except Exception as e:
-                                    logger.warning(f"Failed to count contacts for {install_id}: {str(e)}")
-                                    install_data["contactsCount"] = 0
-                            else:
-                                install_data["contactsCount"] = 0
-                            
-                            installs.append(install_data)
-                            
-                            # Stop if we have enough installations
-                            if len(installs) >= limit:
-                                break
+                            device_items = device_response.get("Items", [])
+                            install_data["devicesCount"] = len(device_items)
+                            # Store associations for batch fetch later if needed
+                            if include_devices:
+                                install_data["_deviceAssociations"] = device_items
+                        except Exception as e:
+                            logger.warning(f"Failed to count devices for {install_id}: {str(e)}")
+                            install_data["devicesCount"] = 0
+                    else:
+                        install_data["devicesCount"] = 0
                     
-                    # Check if there are more results to scan
-                    if "LastEvaluatedKey" in response:
-                        last_evaluated_key = response["LastEvaluatedKey"]
-                        scan_params["ExclusiveStartKey"] = last_evaluated_key
+                    # Query and count contact associations
+                    # Support both PascalCase and camelCase
+                    install_id = install_data.get("installationId") or install_data.get("InstallationId")
+                    if install_id:
+                        try:
+                            contact_response = table.query(
+                                KeyConditionExpression="PK = :pk AND begins_with(SK, :sk)",
+                                ExpressionAttributeValues={
+                                    ":pk": f"INSTALL#{install_id}",
+                                    ":sk": "CONTACT_ASSOC#"
+                                }
+                            )
+                            install_data["contactsCount"] = len(contact_response.get("Items", []))
+                        except Exception as e:
+                            logger.warning(f"Failed to count contacts for {install_id}: {str(e)}")
+                            install_data["contactsCount"] = 0
                     else:
-                        # No more data to scan
-                        last_evaluated_key = None
-                        break
+                        install_data["contactsCount"] = 0
+                    
+                    installs.append(install_data)
                 
                 # Batch fetch customers if includeCustomer is enabled
                 if include_customer and installs:
@@ -2203,10 +2732,8 @@ def lambda_handler(event, context):
                 }
                 
                 # Add nextToken if there are more results
-                if last_evaluated_key:
-                    import base64
-                    token = base64.b64encode(json.dumps(last_evaluated_key).encode('utf-8')).decode('utf-8')
-                    result["nextToken"] = token
+                if next_page_token:
+                    result["nextToken"] = next_page_token
                     result["hasMore"] = True
                 else:
                     result["hasMore"] = False
@@ -2977,6 +3504,18 @@ def lambda_handler(event, context):
             if "PrimaryDevice" in updated_fields and updated_fields["PrimaryDevice"] not in ["water", "chlorine", "none"]:
                 return ErrorResponse.build("PrimaryDevice must be 'water', 'chlorine', or 'none'", 400)
             
+            # Backfill denormalized region names on legacy records that predate them
+            if not all(existing_install.get(field) for field in REGION_NAME_FIELDS):
+                region_names = resolve_install_region_names(simplify(existing_install))
+                for field, name in region_names.items():
+                    if name and existing_install.get(field) != name:
+                        updated_fields[field] = name
+
+            # Keep the camelCase attributes read by the listing indexes in step with PascalCase updates
+            for db_field, index_field in (("CustomerId", "customerId"), ("Status", "status"), ("WarrantyDate", "warrantyDate")):
+                if db_field in updated_fields:
+                    updated_fields[index_field] = updated_fields[db_field]
+
             # Update the installation
             timestamp = datetime.utcnow().isoformat() + "Z"
             updated_fields["UpdatedDate"] = timestamp
@@ -2988,7 +3527,7 @@ def lambda_handler(event, context):
             expr_attr_names = {}
             
             # Reserved keywords in DynamoDB that need aliases
-            reserved_keywords = {"Status"}
+            reserved_keywords = {"Status", "status"}
             
             for field, value in updated_fields.items():
                 if field in reserved_keywords:
@@ -3030,17 +3569,10 @@ def lambda_handler(event, context):
                 
                 updated_install = simplify(response["Attributes"])
                 logger.info(f"Updated installation {install_id}: {list(changes.keys())}")
-                
-                # Fetch and add region names to response
-                region_names = fetch_region_names(
-                    state_id=updated_install.get("StateId"),
-                    district_id=updated_install.get("DistrictId"),
-                    mandal_id=updated_install.get("MandalId"),
-                    village_id=updated_install.get("VillageId"),
-                    habitation_id=updated_install.get("HabitationId")
-                )
-                updated_install.update(region_names)
-                
+
+                # Region names are on the updated item (backfilled above if missing)
+                updated_install.update(resolve_install_region_names(updated_install))
+
                 return SuccessResponse.build({
                     "message": "Installation updated successfully",
                     "installation": updated_install,
@@ -3156,6 +3688,8 @@ def lambda_handler(event, context):
                 ReturnValues="ALL_NEW"
             )
             updated_item = result.get("Attributes", {})
+            if entity_type == "CONFIG":
+                sync_config_pointer(pk, sk, updated_item)
             return SuccessResponse.build({"updated": simplify(updated_item)})
         except Exception as e:
             logger.error(f"Update error: {str(e)}")
@@ -3250,113 +3784,25 @@ def lambda_handler(event, context):
                 
                 # Handle cascade delete
                 if cascade_delete:
-                    deleted_items = []
-                    
-                    # Delete REGION_LOCK if it exists
-                    region_combo = install_data.get("regionCombo") or install_data.get("RegionCombo")
-                    if region_combo:
-                        try:
-                            region_lock_pk = f"REGION_LOCK#{region_combo}"
-                            table.delete_item(Key={"PK": region_lock_pk, "SK": "LOCK"})
-                            deleted_items.append({
-                                "PK": region_lock_pk,
-                                "SK": "LOCK",
-                                "Type": "region_lock"
-                            })
-                            logger.info(f"Deleted region lock for {region_combo}")
-                        except Exception as e:
-                            logger.warning(f"Failed to delete region lock for {region_combo}: {str(e)}")
-                    
-                    # Query all records for this installation
-                    response = table.query(
-                        KeyConditionExpression=Key("PK").eq(pk)
-                    )
-                    all_items = response.get("Items", [])
-                    
-                    # Continue pagination if needed
-                    while "LastEvaluatedKey" in response:
-                        response = table.query(
-                            KeyConditionExpression=Key("PK").eq(pk),
-                            ExclusiveStartKey=response["LastEvaluatedKey"]
-                        )
-                        all_items.extend(response.get("Items", []))
-                    
-                    # Delete bidirectional associations
-                    # For each DEVICE_ASSOC, also delete the corresponding INSTALL record in DEVICE
-                    for item in all_items:
-                        if item.get("SK", "").startswith("DEVICE_ASSOC#"):
-                            device_id = item.get("DeviceId")
-                            if device_id:
-                                # Delete DEVICE -> INSTALL association
-                                try:
-                                    device_install_sk = f"INSTALL#{install_id}"
-                                    table.delete_item(
-                                        Key={"PK": f"DEVICE#{device_id}", "SK": device_install_sk}
-                                    )
-                                    deleted_items.append({
-                                        "PK": f"DEVICE#{device_id}",
-                                        "SK": device_install_sk,
-                                        "Type": "bidirectional_device_assoc"
-                                    })
-                                    logger.info(f"Deleted bidirectional device association: DEVICE#{device_id} -> {device_install_sk}")
-                                    
-                                    # Remove linkedInstallationId from device META
-                                    table.update_item(
-                                        Key={"PK": f"DEVICE#{device_id}", "SK": "META"},
-                                        UpdateExpression="REMOVE linkedInstallationId"
-                                    )
-                                    logger.info(f"Removed linkedInstallationId from device {device_id}")
-                                except Exception as e:
-                                    logger.warning(f"Failed to delete bidirectional device association for {device_id}: {str(e)}")
-                    
-                    # For each CONTACT_ASSOC, also delete the corresponding INSTALL record in CUSTOMER
-                    for item in all_items:
-                        if item.get("SK", "").startswith("CONTACT_ASSOC#"):
-                            contact_id = item.get("ContactId")
-                            customer_id = item.get("CustomerId")
-                            if contact_id and customer_id:
-                                # Delete CUSTOMER -> INSTALL association
-                                try:
-                                    customers_table_name = os.environ.get("CUSTOMERS_TABLE", "v_customers_dev")
-                                    customers_table = dynamodb.Table(customers_table_name)
-                                    customer_install_sk = f"ENTITY#INSTALL_ASSOC#{install_id}"
-                                    customers_table.delete_item(
-                                        Key={"PK": f"CUSTOMER#{customer_id}", "SK": customer_install_sk}
-                                    )
-                                    deleted_items.append({
-                                        "PK": f"CUSTOMER#{customer_id}",
-                                        "SK": customer_install_sk,
-                                        "Type": "bidirectional_contact_assoc",
-                                        "Table": customers_table_name
-                                    })
-                                    logger.info(f"Deleted bidirectional contact association: CUSTOMER#{customer_id} -> {customer_install_sk}")
-                                except Exception as e:
-                                    logger.warning(f"Failed to delete bidirectional contact association for customer {customer_id}, contact {contact_id}: {str(e)}")
-                    
-                    # Delete all installation records (META, DEVICE_ASSOC, CONTACT_ASSOC, etc.)
-                    for item_to_delete in all_items:
-                        item_pk = item_to_delete.get("PK")
-                        item_sk = item_to_delete.get("SK")
-                        
-                        table.delete_item(
-                            Key={"PK": item_pk, "SK": item_sk}
-                        )
-                        deleted_items.append({
-                            "PK": item_pk,
-                            "SK": item_sk,
-                            "Type": "installation_record"
-                        })
-                        logger.info(f"Cascade deleted: {item_sk} with PK={item_pk}")
-                    
-                    logger.info(f"Successfully cascade deleted installation {install_id} with {len(deleted_items)} total records")
+                    plan = plan_install_cascade_delete(install_id, install_data)
+                    logger.info(f"Cascade plan for installation {install_id}: {plan['summary']}")
+
+                    outcome = run_cascade_plan(plan)
+                    if outcome["incomplete"]:
+                        logger.warning(f"Cascade delete of installation {install_id} incomplete: "
+                                       f"{len(outcome['failedDeletes'])} deletes, {outcome['failedUpdates']} updates failed")
+                    else:
+                        logger.info(f"Successfully cascade deleted installation {install_id} with {outcome['totalRecordsDeleted']} total records")
+
+                    if outcome["incomplete"]:
+                        return cascade_delete_failure_response("installation", "InstallationId", install_id, outcome)
                     return SuccessResponse.build({
                         "deleted": {
                             "InstallationId": install_id,
                             "cascadeDelete": True,
-                            "totalRecordsDeleted": len(deleted_items),
-                            "deletedItems": deleted_items
+                            **outcome
                         }
-                    })
+                    }, 200)
                 
                 # Standard delete (only if no linked resources)
                 # Delete REGION_LOCK if it exists
@@ -3514,47 +3960,25 @@ def lambda_handler(event, context):
                 
                 # Handle cascade delete
                 if cascade_delete:
-                    deleted_items = []
-                    
-                    # Query all records for this device
-                    response = table.query(
-                        KeyConditionExpression=Key("PK").eq(pk)
-                    )
-                    all_items = response.get("Items", [])
-                    
-                    # Continue pagination if needed
-                    while "LastEvaluatedKey" in response:
-                        response = table.query(
-                            KeyConditionExpression=Key("PK").eq(pk),
-                            ExclusiveStartKey=response["LastEvaluatedKey"]
-                        )
-                        all_items.extend(response.get("Items", []))
-                    
-                    # Delete all items (CONFIG, REPAIR, RUNTIME, INSTALL, SIM_ASSOC, DEVICE)
-                    for item_to_delete in all_items:
-                        item_pk = item_to_delete.get("PK")
-                        item_sk = item_to_delete.get("SK")
-                        item_entity_type = item_to_delete.get("EntityType")
-                        
-                        table.delete_item(
-                            Key={"PK": item_pk, "SK": item_sk}
-                        )
-                        deleted_items.append({
-                            "PK": item_pk,
-                            "SK": item_sk,
-                            "EntityType": item_entity_type
-                        })
-                        logger.info(f"Cascade deleted: {item_entity_type} with PK={item_pk}, SK={item_sk}")
-                    
-                    logger.info(f"Successfully cascade deleted device {device_id} with {len(deleted_items)} total records")
+                    plan = plan_device_cascade_delete(device_id)
+                    logger.info(f"Cascade plan for device {device_id}: {plan['summary']}")
+
+                    outcome = run_cascade_plan(plan)
+                    if outcome["incomplete"]:
+                        logger.warning(f"Cascade delete of device {device_id} incomplete: "
+                                       f"{len(outcome['failedDeletes'])} deletes, {outcome['failedUpdates']} updates failed")
+                    else:
+                        logger.info(f"Successfully cascade deleted device {device_id} with {outcome['totalRecordsDeleted']} total records")
+
+                    if outcome["incomplete"]:
+                        return cascade_delete_failure_response("device", "DeviceId", device_id, outcome)
                     return SuccessResponse.build({
                         "deleted": {
                             "DeviceId": device_id,
                             "cascadeDelete": True,
-                            "totalRecordsDeleted": len(deleted_items),
-                            "deletedItems": deleted_items
+                            **outcome
                         }
-                    })
+                    }, 200)
             
             # Standard delete for non-DEVICE entities or DEVICE without associations
             table.delete_item(
@@ -3563,6 +3987,8 @@ def lambda_handler(event, context):
                     "SK": sk
                 }
             )
+            if entity_type == "CONFIG":
+                remove_config_pointer(pk, sk)
             logger.info(f"Successfully deleted {entity_type} with PK={pk}, SK={sk}")
             return SuccessResponse.build({"deleted": {"PK": pk, "SK": sk, "EntityType": entity_type}})
         except Exception as e:
@@ -4125,7 +4551,7 @@ def validate_region_id_exists(region_type, region_id):
     Returns (success, error_message)
     """
     try:
-        regions_table = dynamodb.Table("v_regions_dev")
+        regions_table = dynamodb.Table(REGIONS_TABLE_NAME)
         response = regions_table.get_item(
             Key={"PK": f"{region_type}#{region_id}", "SK": "META"}
         )
@@ -4225,16 +4651,26 @@ def create_install_device_history(install_id, device_id, action, performed_by, i
         return False, f"Error creating history: {str(e)}"
 
 
-def execute_install_device_link_transaction(install_id, device_id, performed_by, ip_address, reason=None):
+def build_install_device_link_items(install_id, device_id, performed_by, ip_address, reason, timestamp):
     """
-    Execute atomic transaction to link a device to an install.
-    Creates bidirectional associations, updates device's META record with LinkedInstallationId,
-    and adds installation history to device record.
+    Build the transaction items that link one device to an install:
+    both association records, the device META update and the install history record.
     """
-    timestamp = datetime.utcnow().isoformat() + "Z"
-    
-    # Prepare transaction items
-    transact_items = [
+    history_item = {
+        "PK": {"S": f"INSTALL#{install_id}"},
+        "SK": {"S": f"DEVICE_HISTORY#{timestamp}#{device_id}"},
+        "EntityType": {"S": "INSTALL_DEVICE_HISTORY"},
+        "InstallId": {"S": install_id},
+        "DeviceId": {"S": device_id},
+        "Action": {"S": "LINKED"},
+        "PerformedBy": {"S": performed_by},
+        "PerformedAt": {"S": timestamp},
+        "IPAddress": {"S": ip_address}
+    }
+    if reason:
+        history_item["Reason"] = {"S": reason}
+
+    return [
         {
             # Create association: INSTALL -> DEVICE
             "Put": {
@@ -4302,16 +4738,32 @@ def execute_install_device_link_transaction(install_id, device_id, performed_by,
                 },
                 "ConditionExpression": "attribute_exists(PK) AND attribute_exists(SK)"
             }
+        },
+        {
+            # Install-side history record, written atomically with the link
+            "Put": {
+                "TableName": TABLE_NAME,
+                "Item": history_item
+            }
         }
     ]
+
+
+INSTALL_DEVICE_LINK_ITEMS = 4  # transaction items per linked device (see build_install_device_link_items)
+
+
+def execute_install_device_link_transaction(install_id, device_id, performed_by, ip_address, reason=None):
+    """
+    Execute atomic transaction to link a device to an install.
+    Creates bidirectional associations, updates device's META record with LinkedInstallationId,
+    adds installation history to device record and writes the install history record.
+    """
+    timestamp = datetime.utcnow().isoformat() + "Z"
+    transact_items = build_install_device_link_items(install_id, device_id, performed_by, ip_address, reason, timestamp)
     
     try:
         dynamodb_client.transact_write_items(TransactItems=transact_items)
         logger.info(f"Successfully linked device {device_id} to install {install_id}")
-        
-        # Create history record (non-transactional, but logged)
-        create_install_device_history(install_id, device_id, "LINKED", performed_by, ip_address, reason)
-        
         return True, None
     
     except ClientError as e:
@@ -4328,58 +4780,355 @@ def execute_install_device_link_transaction(install_id, device_id, performed_by,
         return False, f"Unexpected error: {str(e)}"
 
 
-def execute_install_device_unlink_transaction(install_id, device_id, performed_by, ip_address, reason=None):
+def _link_failure_message(install_id, device_id, reason_item):
+    """Translate a per-item transaction cancellation reason into a per-device error."""
+    if reason_item.get("Code") != "ConditionalCheckFailed":
+        return f"Transaction failed: {reason_item.get('Code')} {reason_item.get('Message', '')}".strip()
+    position = reason_item["_index"] % INSTALL_DEVICE_LINK_ITEMS
+    if position == 2:
+        return f"Device {device_id} not found"
+    return f"Device {device_id} is already linked to install {install_id}"
+
+
+def execute_install_device_link_batch(install_id, device_ids, performed_by, ip_address, reason=None):
     """
-    Execute atomic transaction to unlink a device from an install.
-    Deletes bidirectional associations, removes LinkedInstallationId from device META,
-    and adds unlink history to device record.
+    Link several devices to an install, packing as many devices as fit into each
+    transact_write_items call (CASCADE_TRANSACT_SIZE items, INSTALL_DEVICE_LINK_ITEMS per device).
+
+    A cancelled transaction reports which items failed; those devices are reported as
+    errors and the remaining devices of the chunk are retried in a fresh transaction.
+    Returns (linked_device_ids, errors) where errors is a list of {"deviceId", "error"}.
     """
     timestamp = datetime.utcnow().isoformat() + "Z"
-    
-    # Prepare transaction items
-    transact_items = [
-        {
-            # Delete association: INSTALL -> DEVICE
-            "Delete": {
-                "TableName": TABLE_NAME,
-                "Key": {
-                    "PK": {"S": f"INSTALL#{install_id}"},
-                    "SK": {"S": f"DEVICE_ASSOC#{device_id}"}
-                },
-                "ConditionExpression": "attribute_exists(PK) AND attribute_exists(SK)"
-            }
-        },
-        {
-            # Delete association: DEVICE -> INSTALL
-            "Delete": {
-                "TableName": TABLE_NAME,
-                "Key": {
-                    "PK": {"S": f"DEVICE#{device_id}"},
-                    "SK": {"S": f"INSTALL_ASSOC#{install_id}"}
-                },
-                "ConditionExpression": "attribute_exists(PK) AND attribute_exists(SK)"
-            }
-        },
-        {
-            # Update device META record to remove linkedInstallationId and add unlink history
-            "Update": {
-                "TableName": TABLE_NAME,
-                "Key": {
-                    "PK": {"S": f"DEVICE#{device_id}"},
-                    "SK": {"S": "META"}
-                },
-                "UpdateExpression": "REMOVE linkedInstallationId SET installationHistory = list_append(if_not_exists(installationHistory, :empty_list), :install_history)",
-                "ExpressionAttributeValues": {
-                    ":empty_list": {"L": []},
-                    ":install_history": {
-                        "L": [
-                            {
-                                "M": {
-                                    "timestamp": {"S": timestamp},
-                                    "action": {"S": "unlinked"},
-                                    "installationId": {"S": install_id},
-                                    "performedBy": {"S": performed_by},
-                                    "ipAddress": {"S": ip_address},
+    per_transaction = CASCADE_TRANSACT_SIZE // INSTALL_DEVICE_LINK_ITEMS
+    linked = []
+    errors = []
+
+    for i in range(0, len(device_ids), per_transaction):
+        pending = list(device_ids[i:i + per_transaction])
+        attempt = 0
+        while pending:
+            transact_items = []
+            for device_id in pending:
+                transact_items.extend(
+                    build_install_device_link_items(install_id, device_id, performed_by, ip_address, reason, timestamp)
+                )
+            try:
+                dynamodb_client.transact_write_items(TransactItems=transact_items)
+                logger.info(f"Linked {len(pending)} devices to install {install_id} in one transaction")
+                linked.extend(pending)
+                break
+            except ClientError as e:
+                error_code = e.response['Error']['Code']
+                reasons = e.response.get('CancellationReasons', [])
+                failed_positions = {}
+                for index, reason_item in enumerate(reasons):
+                    if reason_item.get("Code") not in (None, "None"):
+                        failed_positions.setdefault(index // INSTALL_DEVICE_LINK_ITEMS, {**reason_item, "_index": index})
+
+                attempt += 1
+                if error_code != 'TransactionCanceledException' or not failed_positions or attempt > CASCADE_MAX_RETRIES:
+                    logger.error(f"Link transaction failed for install {install_id}: {str(e)}")
+                    message = e.response['Error'].get('Message', str(e))
+                    errors.extend({"deviceId": device_id, "error": f"Database error: {message}"} for device_id in pending)
+                    break
+
+                retryable = all(r.get("Code") in ("TransactionConflict", "ThrottlingError") for r in failed_positions.values())
+                if retryable:
+                    # Conflicts with a concurrent writer - back off and retry the same devices
+                    time.sleep(min(0.05 * (2 ** attempt), 1.0))
+                    continue
+
+                for position, reason_item in failed_positions.items():
+                    device_id = pending[position]
+                    errors.append({"deviceId": device_id, "error": _link_failure_message(install_id, device_id, reason_item)})
+                pending = [device_id for position, device_id in enumerate(pending) if position not in failed_positions]
+                logger.info(f"Retrying link transaction for {len(pending)} remaining devices")
+            except Exception as e:
+                logger.error(f"Unexpected error in link transaction: {str(e)}")
+                errors.extend({"deviceId": device_id, "error": f"Unexpected error: {str(e)}"} for device_id in pending)
+                break
+
+    return linked, errors
+
+
+def prevalidate_install_device_links(install_id, device_ids):
+    """
+    Check a batch of devices before linking them to an install.
+    Device META records are fetched with batch_get_item and existing installation links
+    are looked up in parallel. Returns (eligible_device_ids, errors).
+    """
+    errors = []
+    candidates = []
+    for device_id in device_ids:
+        if not isinstance(device_id, str) or not re.match(r"^[A-Za-z0-9_-]{1,64}$", device_id):
+            errors.append({"deviceId": device_id, "error": "Invalid deviceId format"})
+        elif device_id in candidates:
+            errors.append({"deviceId": device_id, "error": "Duplicate deviceId in request"})
+        else:
+            candidates.append(device_id)
+    if not candidates:
+        return [], errors
+
+    logger.info(f"Batch validating {len(candidates)} devices")
+    try:
+        found_devices = _existing_device_ids(candidates)
+        logger.info(f"Found {len(found_devices)} devices out of {len(candidates)}")
+    except Exception as e:
+        logger.error(f"Batch device lookup failed: {str(e)}")
+        return [], errors + [{"deviceId": device_id, "error": f"Error validating device: {str(e)}"} for device_id in candidates]
+
+    existing = [device_id for device_id in candidates if device_id in found_devices]
+    errors.extend({"deviceId": device_id, "error": f"Device {device_id} not found"} for device_id in candidates if device_id not in found_devices)
+
+    eligible = []
+    with ThreadPoolExecutor(max_workers=CASCADE_MAX_WORKERS) as executor:
+        link_lookups = list(executor.map(get_device_installation_link, existing))
+    for device_id, (is_linked, existing_install_id) in zip(existing, link_lookups):
+        if is_linked and existing_install_id == install_id:
+            errors.append({"deviceId": device_id, "error": f"Device already linked to install {install_id}"})
+        elif is_linked:
+            errors.append({"deviceId": device_id, "error": f"Device already linked to installation {existing_install_id}"})
+        else:
+            eligible.append(device_id)
+    return eligible, errors
+
+
+# Outbox markers share one partition so the scheduled drain is a Query, not a table scan
+THINGSBOARD_OUTBOX_PK = "OUTBOX#THINGSBOARD"
+INSTALL_CREATE_BASE_ITEMS = 3  # region lock, install META and ThingsBoard outbox marker
+
+
+def _serialize_item(item):
+    """Serialize a plain item into DynamoDB attribute values for the low-level client."""
+    serializer = TypeSerializer()
+    return {k: serializer.serialize(v) for k, v in convert_floats_to_decimal(item).items() if v is not None}
+
+
+def thingsboard_outbox_key(installation_id):
+    return {"PK": THINGSBOARD_OUTBOX_PK, "SK": f"INSTALL#{installation_id}"}
+
+
+def build_thingsboard_outbox_item(installation_id, device_ids, timestamp):
+    """Marker recording ThingsBoard work (region sync + habitation links) still owed for an install."""
+    return {
+        **thingsboard_outbox_key(installation_id),
+        "entityType": "THINGSBOARD_OUTBOX",
+        "installationId": installation_id,
+        "status": "PENDING",
+        "deviceIds": list(device_ids),
+        "attempts": 0,
+        "createdDate": timestamp
+    }
+
+
+def execute_install_create_transaction(installation_item, region_lock_item, device_ids, performed_by, ip_address, reason=None):
+    """
+    Create an installation in one transact_write_items call: region lock, META,
+    ThingsBoard outbox marker and as many initial device links (with history) as fit.
+
+    Devices that fail their link conditions are dropped and the transaction retried
+    without them. Devices beyond the per-transaction capacity are returned as overflow
+    for the caller to link afterwards.
+    Returns (success, linked_device_ids, overflow_device_ids, device_errors, error_code)
+    where error_code is "DUPLICATE" when the region lock already exists.
+    """
+    installation_id = installation_item["installationId"]
+    timestamp = installation_item["createdDate"]
+    capacity = (CASCADE_TRANSACT_SIZE - INSTALL_CREATE_BASE_ITEMS) // INSTALL_DEVICE_LINK_ITEMS
+    pending = list(device_ids[:capacity])
+    overflow = list(device_ids[capacity:])
+    device_errors = []
+    attempt = 0
+
+    while True:
+        transact_items = [
+            {"Put": {"TableName": TABLE_NAME, "Item": _serialize_item(region_lock_item), "ConditionExpression": "attribute_not_exists(PK)"}},
+            {"Put": {"TableName": TABLE_NAME, "Item": _serialize_item(installation_item), "ConditionExpression": "attribute_not_exists(PK)"}},
+            {"Put": {"TableName": TABLE_NAME, "Item": _serialize_item(build_thingsboard_outbox_item(installation_id, pending + overflow, timestamp))}}
+        ]
+        for device_id in pending:
+            transact_items.extend(
+                build_install_device_link_items(installation_id, device_id, performed_by, ip_address, reason, timestamp)
+            )
+
+        try:
+            dynamodb_client.transact_write_items(TransactItems=transact_items)
+            logger.info(f"Created installation {installation_id} with {len(pending)} device links in one transaction")
+            return True, pending, overflow, device_errors, None
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            reasons = e.response.get('CancellationReasons', [])
+            failed = {index: r for index, r in enumerate(reasons) if r.get("Code") not in (None, "None")}
+            if failed.get(0, {}).get("Code") == "ConditionalCheckFailed":
+                return False, [], [], device_errors, "DUPLICATE"
+
+            attempt += 1
+            if attempt > CASCADE_MAX_RETRIES or not failed:
+                raise
+            if all(r.get("Code") in ("TransactionConflict", "ThrottlingError") for r in failed.values()):
+                time.sleep(min(0.05 * (2 ** attempt), 1.0))
+                continue
+
+            failed_positions = {}
+            for index, reason_item in failed.items():
+                if index < INSTALL_CREATE_BASE_ITEMS:
+                    raise
+                failed_positions.setdefault((index - INSTALL_CREATE_BASE_ITEMS) // INSTALL_DEVICE_LINK_ITEMS,
+                                            {**reason_item, "_index": index - INSTALL_CREATE_BASE_ITEMS})
+            for position, reason_item in failed_positions.items():
+                device_id = pending[position]
+                device_errors.append({"deviceId": device_id, "error": _link_failure_message(installation_id, device_id, reason_item)})
+            pending = [device_id for position, device_id in enumerate(pending) if position not in failed_positions]
+            logger.info(f"Retrying installation create with {len(pending)} device links")
+
+
+def complete_thingsboard_outbox(installation_data, device_ids):
+    """
+    Perform the ThingsBoard work recorded by an install's outbox marker: sync the region
+    assets, link devices to the habitation asset, then store thingsboardAssets on META and
+    clear the marker in one transaction. On failure the marker is kept for the next drain.
+    Returns (sync_results, thingsboard_status, error).
+    """
+    installation_id = installation_data.get("installationId")
+    pk = f"INSTALL#{installation_id}"
+    try:
+        from shared.thingsboard_utils import sync_installation_regions_to_thingsboard, link_device_to_habitation
+
+        logger.info(f"Syncing installation regions to Thingsboard for installation {installation_id}")
+        sync_results = sync_installation_regions_to_thingsboard(installation_data)
+        logger.info(f"Thingsboard sync results: {sync_results}")
+        thingsboard_status = "partial" if sync_results.get("errors") else "synced"
+
+        habitation_id = (sync_results.get("habitation") or {}).get("id") if isinstance(sync_results, dict) else None
+        if habitation_id:
+            for device_id in device_ids:
+                if link_device_to_habitation(device_id, habitation_id):
+                    logger.info(f"Successfully linked device {device_id} to habitation in Thingsboard")
+                else:
+                    logger.warning(f"Failed to link device {device_id} to habitation in Thingsboard (non-blocking)")
+        elif device_ids:
+            logger.warning(f"Habitation asset not found for installation {installation_id} (non-blocking)")
+
+        dynamodb_client.transact_write_items(TransactItems=[
+            {
+                "Update": {
+                    "TableName": TABLE_NAME,
+                    "Key": _ddb_key(pk, "META"),
+                    "UpdateExpression": "SET thingsboardAssets = :assets, thingsboardStatus = :status",
+                    "ConditionExpression": "attribute_exists(PK)",
+                    "ExpressionAttributeValues": {
+                        ":assets": TypeSerializer().serialize(convert_floats_to_decimal(sync_results)),
+                        ":status": {"S": thingsboard_status}
+                    }
+                }
+            },
+            {"Delete": {"TableName": TABLE_NAME, "Key": _ddb_key(THINGSBOARD_OUTBOX_PK, f"INSTALL#{installation_id}")}}
+        ])
+        logger.info(f"Saved thingsboardAssets and cleared outbox for installation {installation_id}")
+        return sync_results, thingsboard_status, None
+    except Exception as e:
+        logger.error(f"Thingsboard sync failed for installation {installation_id} (outbox retained): {str(e)}", exc_info=True)
+        try:
+            table.update_item(
+                Key=thingsboard_outbox_key(installation_id),
+                UpdateExpression="SET attempts = if_not_exists(attempts, :zero) + :one, lastError = :error, updatedDate = :now",
+                ConditionExpression="attribute_exists(PK)",
+                ExpressionAttributeValues={
+                    ":zero": 0,
+                    ":one": 1,
+                    ":error": str(e)[:500],
+                    ":now": datetime.utcnow().isoformat() + "Z"
+                }
+            )
+        except Exception as marker_error:
+            logger.warning(f"Could not record outbox failure for {installation_id}: {str(marker_error)}")
+        return None, "error", str(e)
+
+
+def drain_thingsboard_outbox():
+    """Retry pending ThingsBoard outbox markers (invoked by the scheduled EventBridge rule)."""
+    query_params = {
+        "KeyConditionExpression": Key("PK").eq(THINGSBOARD_OUTBOX_PK)
+    }
+    markers = []
+    while True:
+        response = table.query(**query_params)
+        markers.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            break
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    logger.info(f"Draining {len(markers)} ThingsBoard outbox markers")
+    processed = 0
+    failed = 0
+    for marker in markers:
+        install_response = table.get_item(Key={"PK": marker["SK"], "SK": "META"})
+        if "Item" not in install_response:
+            # Install was deleted after the marker was written
+            table.delete_item(Key={"PK": marker["PK"], "SK": marker["SK"]})
+            continue
+        _, _, error = complete_thingsboard_outbox(simplify(install_response["Item"]), marker.get("deviceIds", []))
+        if error:
+            failed += 1
+        else:
+            processed += 1
+    return {"markers": len(markers), "processed": processed, "failed": failed}
+
+
+def execute_install_device_unlink_transaction(install_id, device_id, performed_by, ip_address, reason=None):
+    """
+    Execute atomic transaction to unlink a device from an install.
+    Deletes bidirectional associations, removes LinkedInstallationId from device META,
+    and adds unlink history to device record.
+    """
+    timestamp = datetime.utcnow().isoformat() + "Z"
+    
+    # Prepare transaction items
+    transact_items = [
+        {
+            # Delete association: INSTALL -> DEVICE
+            "Delete": {
+                "TableName": TABLE_NAME,
+                "Key": {
+                    "PK": {"S": f"INSTALL#{install_id}"},
+                    "SK": {"S": f"DEVICE_ASSOC#{device_id}"}
+                },
+                "ConditionExpression": "attribute_exists(PK) AND attribute_exists(SK)"
+            }
+        },
+        {
+            # Delete association: DEVICE -> INSTALL
+            "Delete": {
+                "TableName": TABLE_NAME,
+                "Key": {
+                    "PK": {"S": f"DEVICE#{device_id}"},
+                    "SK": {"S": f"INSTALL_ASSOC#{install_id}"}
+                },
+                "ConditionExpression": "attribute_exists(PK) AND attribute_exists(SK)"
+            }
+        },
+        {
+            # Update device META record to remove linkedInstallationId and add unlink history
+            "Update": {
+                "TableName": TABLE_NAME,
+                "Key": {
+                    "PK": {"S": f"DEVICE#{device_id}"},
+                    "SK": {"S": "META"}
+                },
+                "UpdateExpression": "REMOVE linkedInstallationId SET installationHistory = list_append(if_not_exists(installationHistory, :empty_list), :install_history)",
+                "ExpressionAttributeValues": {
+                    ":empty_list": {"L": []},
+                    ":install_history": {
+                        "L": [
+                            {
+                                "M": {
+                                    "timestamp": {"S": timestamp},
+                                    "action": {"S": "unlinked"},
+                                    "installationId": {"S": install_id},
+                                    "performedBy": {"S": performed_by},
+                                    "ipAddress": {"S": ip_address},
                                     "reason": {"S": reason or ""}
                                 }
                             }
@@ -4554,3 +5303,2437 @@ def validate_contacts_belong_to_customer_batch(contact_ids, customer_id):
         logger.error(f"Error validating contacts: {str(e)}")
         # On error, treat all as invalid to be safe
         return [], contact_ids
+
+
+# ============================================================================
+# CASCADE DELETE ENGINE
+# ============================================================================
+#
+# Cascade deletes are planned up front (every key to delete and every mirror
+# record to update, across the devices, customers and simcards tables) and then
+# executed as chunked batch_write_item / transact_write_items calls running in
+# parallel. Parent records (install/device META, REGION_LOCK) are only deleted
+# once all children are gone, so a partially failed cascade can be retried.
+
+CASCADE_BATCH_SIZE = 25  # batch_write_item limit
+CASCADE_TRANSACT_SIZE = 100  # transact_write_items limit
+CASCADE_MAX_WORKERS = 8
+CASCADE_MAX_RETRIES = 5
+
+
+def _ddb_key(pk, sk):
+    """Build a low-level DynamoDB key."""
+    return {"PK": {"S": pk}, "SK": {"S": sk}}
+
+
+def query_partition_items(pk):
+    """Query every item under a partition key, following pagination."""
+    response = table.query(KeyConditionExpression=Key("PK").eq(pk))
+    items = response.get("Items", [])
+    while "LastEvaluatedKey" in response:
+        response = table.query(
+            KeyConditionExpression=Key("PK").eq(pk),
+            ExclusiveStartKey=response["LastEvaluatedKey"]
+        )
+        items.extend(response.get("Items", []))
+    return items
+
+
+def _batch_write_requests(table_name, requests):
+    """
+    Send up to 25 write requests with batch_write_item, retrying UnprocessedItems with backoff.
+    Returns the requests that could not be processed.
+    """
+    request_items = {table_name: requests}
+    attempt = 0
+    while request_items:
+        response = dynamodb_client.batch_write_item(RequestItems=request_items)
+        request_items = response.get("UnprocessedItems") or {}
+        if not request_items:
+            break
+        attempt += 1
+        if attempt > CASCADE_MAX_RETRIES:
+            break
+        time.sleep(min(0.05 * (2 ** attempt), 1.0))
+    return [req for reqs in request_items.values() for req in reqs]
+
+
+def _batch_delete_chunk(table_name, keys):
+    """
+    Delete up to 25 keys with batch_write_item.
+    Returns (deleted_count, failed_keys).
+    """
+    try:
+        unprocessed = _batch_write_requests(table_name, [{"DeleteRequest": {"Key": key}} for key in keys])
+    except Exception as e:
+        logger.error(f"Batch delete failed on {table_name}: {str(e)}")
+        return 0, keys
+
+    failed = [req["DeleteRequest"]["Key"] for req in unprocessed]
+    return len(keys) - len(failed), failed
+
+
+def _transact_update_chunk(updates):
+    """
+    Apply up to 100 conditional updates in one transaction.
+    Updates whose condition fails (record missing or already re-pointed) are skipped
+    and the rest retried once. Returns (updated_count, skipped_count, failed_updates).
+    """
+    pending = list(updates)
+    skipped = 0
+    for _ in range(2):
+        try:
+            dynamodb_client.transact_write_items(TransactItems=pending)
+            return len(pending), skipped, []
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                logger.error(f"Cascade update transaction failed: {str(e)}")
+                return 0, skipped, pending
+            reasons = e.response.get("CancellationReasons", [])
+            failed_idx = {i for i, r in enumerate(reasons) if r.get("Code") == "ConditionalCheckFailed"}
+            if not failed_idx:
+                logger.error(f"Cascade update transaction cancelled: {reasons}")
+                return 0, skipped, pending
+            skipped += len(failed_idx)
+            pending = [u for i, u in enumerate(pending) if i not in failed_idx]
+            if not pending:
+                return 0, skipped, []
+    return 0, skipped, pending
+
+
+def execute_cascade_operations(deletes, updates):
+    """
+    Run planned deletes and updates as parallel chunks.
+
+    Args:
+        deletes: list of (table_name, low-level key) tuples
+        updates: list of transact_write_items "Update" entries
+
+    Returns:
+        Summary dict with deleted/updated/skipped counts and failed keys
+    """
+    # Deduplicate keys per table - batch_write_item rejects duplicates in one request
+    keys_by_table = {}
+    for table_name, key in deletes:
+        seen = keys_by_table.setdefault(table_name, {})
+        seen[(key["PK"]["S"], key["SK"]["S"])] = key
+
+    result = {"deleted": 0, "updated": 0, "skipped": 0, "failedDeletes": [], "failedUpdates": 0}
+    futures = []
+    with ThreadPoolExecutor(max_workers=CASCADE_MAX_WORKERS) as executor:
+        for table_name, keyed in keys_by_table.items():
+            keys = list(keyed.values())
+            for i in range(0, len(keys), CASCADE_BATCH_SIZE):
+                futures.append(("delete", table_name, executor.submit(
+                    _batch_delete_chunk, table_name, keys[i:i + CASCADE_BATCH_SIZE]
+                )))
+        for i in range(0, len(updates), CASCADE_TRANSACT_SIZE):
+            futures.append(("update", None, executor.submit(
+                _transact_update_chunk, updates[i:i + CASCADE_TRANSACT_SIZE]
+            )))
+
+        for kind, table_name, future in futures:
+            if kind == "delete":
+                deleted, failed = future.result()
+                result["deleted"] += deleted
+                result["failedDeletes"].extend(
+                    {"Table": table_name, "PK": k["PK"]["S"], "SK": k["SK"]["S"]} for k in failed
+                )
+            else:
+                updated, skipped, failed = future.result()
+                result["updated"] += updated
+                result["skipped"] += skipped
+                result["failedUpdates"] += len(failed)
+
+    return result
+
+
+def cascade_delete_failure_response(label, id_field, entity_id, outcome):
+    """500 for a cascade that left work undone; the parent record was kept, so the delete can be retried."""
+    return build_response(500, {
+        "error": f"Cascade delete of {label} {entity_id} is incomplete: {len(outcome['failedDeletes'])} deletes and "
+                 f"{outcome['failedUpdates']} updates failed. The {label} was kept; retry the delete to finish.",
+        "partial": {id_field: entity_id, "cascadeDelete": True, **outcome}
+    })
+
+
+def run_cascade_plan(plan):
+    """
+    Execute a cascade plan: children and mirror updates first, then the parent records.
+    Parents are kept if any child operation failed so the cascade can be retried.
+    """
+    children = execute_cascade_operations(plan["deletes"], plan["updates"])
+    incomplete = bool(children["failedDeletes"]) or children["failedUpdates"] > 0
+
+    parents = {"deleted": 0, "failedDeletes": []}
+    if not incomplete:
+        parents = execute_cascade_operations(plan["parentDeletes"], [])
+        incomplete = bool(parents["failedDeletes"])
+
+    return {
+        "totalRecordsDeleted": children["deleted"] + parents["deleted"],
+        "recordsUpdated": children["updated"],
+        "updatesSkipped": children["skipped"],
+        "summary": plan["summary"],
+        "incomplete": incomplete,
+        "failedDeletes": children["failedDeletes"] + parents["failedDeletes"],
+        "failedUpdates": children["failedUpdates"]
+    }
+
+
+def plan_install_cascade_delete(install_id, install_data):
+    """
+    Plan every key delete and mirror update for DELETE /installs/{id}?cascade=true.
+
+    Covers the install partition (META, DEVICE_ASSOC, CONTACT_ASSOC, DEVICE_HISTORY, ...),
+    the DEVICE#<id>/INSTALL_ASSOC mirrors, linkedInstallationId on device META,
+    customer ENTITY#INSTALL_ASSOC records and the REGION_LOCK.
+    """
+    pk = f"INSTALL#{install_id}"
+    customers_table_name = os.environ.get("CUSTOMERS_TABLE", "v_customers_dev")
+
+    deletes = []
+    parent_deletes = []
+    updates = []
+    customer_ids = set()
+    summary = {"installationRecords": 0, "deviceAssociations": 0, "contactAssociations": 0, "customerAssociations": 0, "regionLock": False}
+
+    for item in query_partition_items(pk):
+        sk = item.get("SK")
+        if sk == "META":
+            parent_deletes.append((TABLE_NAME, _ddb_key(pk, sk)))
+            summary["installationRecords"] += 1
+            continue
+
+        deletes.append((TABLE_NAME, _ddb_key(pk, sk)))
+        summary["installationRecords"] += 1
+
+        if sk.startswith("DEVICE_ASSOC#"):
+            # Support both PascalCase and camelCase
+            device_id = item.get("deviceId") or item.get("DeviceId") or sk.split("#", 1)[1]
+            summary["deviceAssociations"] += 1
+            deletes.append((TABLE_NAME, _ddb_key(f"DEVICE#{device_id}", f"INSTALL_ASSOC#{install_id}")))
+            updates.append({
+                "Update": {
+                    "TableName": TABLE_NAME,
+                    "Key": _ddb_key(f"DEVICE#{device_id}", "META"),
+                    "UpdateExpression": "REMOVE linkedInstallationId",
+                    "ConditionExpression": "attribute_exists(PK) AND linkedInstallationId = :installId",
+                    "ExpressionAttributeValues": {":installId": {"S": install_id}}
+                }
+            })
+        elif sk.startswith("CONTACT_ASSOC#"):
+            summary["contactAssociations"] += 1
+            if item.get("CustomerId"):
+                customer_ids.add(item["CustomerId"])
+
+    install_customer_id = install_data.get("customerId") or install_data.get("CustomerId")
+    if install_customer_id:
+        customer_ids.add(install_customer_id)
+    for customer_id in customer_ids:
+        deletes.append((customers_table_name, _ddb_key(f"CUSTOMER#{customer_id}", f"ENTITY#INSTALL_ASSOC#{install_id}")))
+    summary["customerAssociations"] = len(customer_ids)
+
+    region_combo = install_data.get("regionCombo") or install_data.get("RegionCombo")
+    if region_combo:
+        parent_deletes.append((TABLE_NAME, _ddb_key(f"REGION_LOCK#{region_combo}", "LOCK")))
+        summary["regionLock"] = True
+
+    return {"deletes": deletes, "parentDeletes": parent_deletes, "updates": updates, "summary": summary}
+
+
+def plan_device_cascade_delete(device_id):
+    """
+    Plan every key delete and mirror update for a cascading DEVICE delete.
+
+    Covers the device partition (META, CONFIG, REPAIR, RUNTIME, INSTALL_ASSOC, SIM_ASSOC, ...),
+    the INSTALL#<id>/DEVICE_ASSOC mirrors and linkedDeviceId on linked SIM cards.
+    """
+    pk = f"DEVICE#{device_id}"
+
+    deletes = []
+    parent_deletes = []
+    updates = []
+    summary = {}
+
+    for item in query_partition_items(pk):
+        sk = item.get("SK")
+        entity_type = item.get("EntityType") or item.get("entityType") or sk.split("#", 1)[0]
+        summary[entity_type] = summary.get(entity_type, 0) + 1
+
+        if sk == "META":
+            parent_deletes.append((TABLE_NAME, _ddb_key(pk, sk)))
+            continue
+
+        deletes.append((TABLE_NAME, _ddb_key(pk, sk)))
+
+        if sk.startswith("INSTALL_ASSOC#"):
+            install_id = item.get("installId") or item.get("InstallId") or sk.split("#", 1)[1]
+            deletes.append((TABLE_NAME, _ddb_key(f"INSTALL#{install_id}", f"DEVICE_ASSOC#{device_id}")))
+        elif sk.startswith("SIM_ASSOC#"):
+            sim_id = item.get("SIMId") or sk.split("#", 1)[1]
+            updates.append({
+                "Update": {
+                    "TableName": SIMCARDS_TABLE_NAME,
+                    "Key": _ddb_key(f"SIMCARD#{sim_id}", "ENTITY#SIMCARD"),
+                    "UpdateExpression": "REMOVE linkedDeviceId",
+                    "ConditionExpression": "attribute_exists(PK) AND linkedDeviceId = :deviceId",
+                    "ExpressionAttributeValues": {":deviceId": {"S": device_id}}
+                }
+            })
+
+    return {"deletes": deletes, "parentDeletes": parent_deletes, "updates": updates, "summary": summary}
+
+
+# ============================================================================
+# BULK DEVICE IMPORT
+# ============================================================================
+
+BULK_DEVICE_CHUNK_SIZE = 100  # batch_get_item limit - one duplicate check per chunk
+BULK_DEVICE_MAX_ROWS = 20000
+BULK_IMPORT_BUCKET = os.environ.get("BULK_IMPORT_BUCKET", "iot-platform-bulk-imports")
+
+
+def iter_bulk_device_rows(lines, fmt):
+    """
+    Lazily parse NDJSON or CSV lines into device rows.
+    Yields (row_number, row_dict, error) - exactly one of row_dict/error is set.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row_number, row in enumerate(reader, start=1):
+            # Drop empty cells so optional fields fall back to model defaults
+            yield row_number, {k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()}, None
+        return
+
+    row_number = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Malformed JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, "Row must be a JSON object"
+            continue
+        yield row_number, row, None
+
+
+def build_bulk_device_item(row, created_by, timestamp):
+    """Normalize and validate one import row into a DEVICE META item. Returns (item, error)."""
+    item = {k: v for k, v in row.items() if k not in ("PK", "SK")}
+    item["EntityType"] = "DEVICE"
+    if not item.get("DeviceId"):
+        item["DeviceId"] = f"DEV-{str(uuid.uuid4())[:8].upper()}"
+    elif not re.match(r"^[A-Za-z0-9_-]{1,64}$", str(item["DeviceId"])):
+        return None, "Invalid DeviceId format"
+
+    item["PK"], item["SK"] = derive_pk_sk(item)
+    item.setdefault("CreatedDate", timestamp)
+    item.setdefault("UpdatedDate", timestamp)
+    item.setdefault("CreatedBy", created_by)
+    item.setdefault("UpdatedBy", item["CreatedBy"])
+
+    is_valid, validation_errors = validate_device_input(item)
+    if not is_valid:
+        return None, f"Validation errors: {'; '.join(validation_errors)}"
+    try:
+        DeviceMeta(**item)
+    except ValidationError as e:
+        return None, f"Validation error: {e.errors()[0].get('loc')} {e.errors()[0].get('msg')}"
+    return item, None
+
+
+BATCH_GET_MAX_KEYS = 100
+
+
+def _existing_device_ids(device_ids):
+    """
+    Return the subset of device IDs that already have a META record.
+    Keys are fetched with batch_get_item in chunks of 100; UnprocessedKeys are retried with backoff.
+    """
+    existing = set()
+    unique_ids = list(dict.fromkeys(device_ids))
+    for i in range(0, len(unique_ids), BATCH_GET_MAX_KEYS):
+        request_items = {TABLE_NAME: {
+            "Keys": [_ddb_key(f"DEVICE#{device_id}", "META") for device_id in unique_ids[i:i + BATCH_GET_MAX_KEYS]],
+            "ProjectionExpression": "PK"
+        }}
+        attempt = 0
+        while request_items:
+            response = dynamodb_client.batch_get_item(RequestItems=request_items)
+            for item in response.get("Responses", {}).get(TABLE_NAME, []):
+                existing.add(item["PK"]["S"].split("#", 1)[1])
+            request_items = response.get("UnprocessedKeys") or {}
+            if request_items:
+                attempt += 1
+                if attempt > CASCADE_MAX_RETRIES:
+                    raise RuntimeError(f"batch_get_item left {len(request_items[TABLE_NAME]['Keys'])} keys unprocessed")
+                time.sleep(min(0.05 * (2 ** attempt), 1.0))
+    return existing
+
+
+def _write_bulk_device_chunk(chunk, executor):
+    """
+    Duplicate-check, encrypt and write one chunk of (row_number, item) pairs.
+    Returns (created_count, errors).
+    """
+    errors = []
+    existing = _existing_device_ids([item["DeviceId"] for _, item in chunk])
+    pending = []
+    for row_number, item in chunk:
+        if item["DeviceId"] in existing:
+            errors.append({"row": row_number, "deviceId": item["DeviceId"], "error": "Device already exists"})
+        else:
+            pending.append((row_number, item))
+    if not pending:
+        return 0, errors
+
+    # KMS has no batch encrypt - fan the per-item calls out across the pool
+    encrypted = list(executor.map(lambda entry: prepare_item_for_storage(entry[1], "DEVICE"), pending))
+
+    serializer = TypeSerializer()
+    requests = [
+        {"PutRequest": {"Item": {k: serializer.serialize(v) for k, v in item.items() if v is not None}}}
+        for item in encrypted
+    ]
+    row_by_pk = {item["PK"]: (row_number, item["DeviceId"]) for row_number, item in pending}
+
+    # Each future keeps its own slice so a failed batch names exactly the rows it carried
+    futures = [
+        (executor.submit(_batch_write_requests, TABLE_NAME, requests[i:i + CASCADE_BATCH_SIZE]), pending[i:i + CASCADE_BATCH_SIZE])
+        for i in range(0, len(requests), CASCADE_BATCH_SIZE)
+    ]
+    created = 0
+    for future, batch in futures:
+        try:
+            unprocessed = future.result()
+        except Exception as e:
+            logger.error(f"Bulk device write failed: {str(e)}")
+            errors.extend(
+                {"row": row_number, "deviceId": item["DeviceId"], "error": f"Batch write failed: {str(e)}"}
+                for row_number, item in batch
+            )
+            continue
+        for req in unprocessed:
+            row_number, device_id = row_by_pk[req["PutRequest"]["Item"]["PK"]["S"]]
+            errors.append({"row": row_number, "deviceId": device_id, "error": "Write throttled, not stored"})
+        created += len(batch) - len(unprocessed)
+
+    return created, errors
+
+
+def import_devices_bulk(rows, created_by):
+    """
+    Stream-validate and write device rows in chunks.
+
+    Duplicates (within the file or against existing META records) are rejected per row.
+    The existence check is a batch read ahead of the batch write, so two concurrent imports
+    of the same DeviceId can race; single-device POST /devices remains strictly conditional.
+    """
+    timestamp = datetime.utcnow().isoformat() + "Z"
+    summary = {"totalRows": 0, "created": 0, "failed": 0}
+    errors = []
+    seen_ids = set()
+    chunk = []
+
+    with ThreadPoolExecutor(max_workers=CASCADE_MAX_WORKERS) as executor:
+        for row_number, row, parse_error in rows:
+            summary["totalRows"] += 1
+            if summary["totalRows"] > BULK_DEVICE_MAX_ROWS:
+                summary["totalRows"] -= 1
+                errors.append({"row": row_number, "error": f"Import limited to {BULK_DEVICE_MAX_ROWS} rows; remaining rows skipped"})
+                break
+            if parse_error:
+                errors.append({"row": row_number, "error": parse_error})
+                continue
+
+            item, error = build_bulk_device_item(row, created_by, timestamp)
+            if error:
+                errors.append({"row": row_number, "deviceId": row.get("DeviceId"), "error": error})
+                continue
+            if item["DeviceId"] in seen_ids:
+                errors.append({"row": row_number, "deviceId": item["DeviceId"], "error": "Duplicate DeviceId in import"})
+                continue
+            seen_ids.add(item["DeviceId"])
+
+            chunk.append((row_number, item))
+            if len(chunk) >= BULK_DEVICE_CHUNK_SIZE:
+                created, chunk_errors = _write_bulk_device_chunk(chunk, executor)
+                summary["created"] += created
+                errors.extend(chunk_errors)
+                chunk = []
+
+        if chunk:
+            created, chunk_errors = _write_bulk_device_chunk(chunk, executor)
+            summary["created"] += created
+            errors.extend(chunk_errors)
+
+    summary["failed"] = len(errors)
+    return summary, errors
+
+
+def open_bulk_device_source(event):
+    """
+    Resolve the import source for POST /devices/bulk.
+
+    Accepts an inline NDJSON/CSV body (format from ?format= or Content-Type) or a JSON
+    body {"s3Key": ..., "format": ...} pointing at a larger file in BULK_IMPORT_BUCKET.
+    Returns (lines_iterator, format, error).
+    """
+    params = event.get("queryStringParameters") or {}
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    content_type = headers.get("content-type", "")
+    body = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode("utf-8")
+
+    fmt = params.get("format")
+    if not fmt:
+        fmt = "csv" if "csv" in content_type else "ndjson"
+
+    if "application/json" in content_type or body.lstrip().startswith("{\"s3Key\""):
+        try:
+            request = json.loads(body)
+        except ValueError:
+            request = None
+        if isinstance(request, dict) and request.get("s3Key"):
+            fmt = request.get("format") or ("csv" if request["s3Key"].endswith(".csv") else "ndjson")
+            try:
+                s3_object = s3_client.get_object(Bucket=BULK_IMPORT_BUCKET, Key=request["s3Key"])
+            except ClientError as e:
+                return None, fmt, f"Unable to read s3://{BULK_IMPORT_BUCKET}/{request['s3Key']}: {e.response['Error']['Message']}"
+            lines = (line.decode("utf-8") for line in s3_object["Body"].iter_lines())
+            return lines, fmt, None
+
+    if fmt not in ("csv", "ndjson"):
+        return None, fmt, "format must be 'csv' or 'ndjson'"
+    if not body.strip():
+        return None, fmt, "Request body is empty"
+    return iter(body.splitlines()), fmt, None
+
+
+# ============================================================================
+# RUNTIME TELEMETRY INGEST
+# ============================================================================
+#
+# Readings are stored either as one RUNTIME#<EventDate> item per reading, or grouped
+# into time buckets: RUNTIME#<bucketStart> items holding a Readings list. Both share
+# the RUNTIME# prefix so a key-range query over a device partition covers either form.
+
+RUNTIME_MAX_READINGS = 5000
+RUNTIME_TTL_DAYS = int(os.environ.get("RUNTIME_TTL_DAYS", "90"))
+RUNTIME_BUCKET_SECONDS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600}
+RUNTIME_DEVICE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+RUNTIME_METRIC_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+# Bucket items must stay under DynamoDB's 400KB item limit: appended readings are sized
+# (JSON length, an upper bound for the stored form) and tracked on ReadingsBytes
+RUNTIME_BUCKET_MAX_BYTES = 350000
+RUNTIME_BUCKET_WRITE_BYTES = 100000
+
+
+def format_runtime_timestamp(dt):
+    """Fixed-width UTC timestamp so RUNTIME# sort keys order chronologically."""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def parse_runtime_timestamp(value):
+    """Parse an ISO-8601 timestamp (Z or offset; naive values are taken as UTC). Returns datetime or None."""
+    if not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def validate_runtime_reading(reading):
+    """
+    Lightweight schema check for one ingest reading (avoids building a pydantic model per row):
+    {"deviceId": str, "eventDate": ISO-8601, "metrics": {name: number}, "events": [..], "status": str}
+    Returns (normalized_reading, error).
+    """
+    if not isinstance(reading, dict):
+        return None, "Reading must be an object"
+    device_id = reading.get("deviceId") or reading.get("DeviceId")
+    if not isinstance(device_id, str) or not RUNTIME_DEVICE_ID_PATTERN.match(device_id):
+        return None, "Invalid deviceId"
+    event_dt = parse_runtime_timestamp(reading.get("eventDate") or reading.get("EventDate"))
+    if event_dt is None:
+        return None, "eventDate must be an ISO-8601 timestamp"
+
+    metrics = reading.get("metrics", reading.get("Metrics"))
+    if not isinstance(metrics, dict) or not metrics:
+        return None, "metrics must be a non-empty object"
+    for name, value in metrics.items():
+        if not RUNTIME_METRIC_NAME_PATTERN.match(name):
+            return None, f"Invalid metric name: {name}"
+        if isinstance(value, bool) or not isinstance(value, (int, float, Decimal)):
+            return None, f"Metric {name} must be numeric"
+        if not math.isfinite(value):
+            # json.loads accepts NaN/Infinity, DynamoDB numbers do not
+            return None, f"Metric {name} must be a finite number"
+
+    events = reading.get("events", reading.get("Events", []))
+    if not isinstance(events, list):
+        return None, "events must be a list"
+    status = reading.get("status", reading.get("Status", "ok"))
+    if not isinstance(status, str):
+        return None, "status must be a string"
+
+    return {
+        "deviceId": device_id,
+        "eventDt": event_dt,
+        "metrics": convert_floats_to_decimal(metrics),
+        "events": convert_floats_to_decimal(events),
+        "status": status
+    }, None
+
+
+def build_runtime_item(reading, created_date):
+    """Build a single-reading RUNTIME item (same shape as DeviceRuntime)."""
+    event_date = format_runtime_timestamp(reading["eventDt"])
+    return {
+        "PK": f"DEVICE#{reading['deviceId']}",
+        "SK": f"RUNTIME#{event_date}",
+        "EntityType": "RUNTIME",
+        "DeviceId": reading["deviceId"],
+        "Metrics": reading["metrics"],
+        "Events": reading["events"],
+        "Status": reading["status"],
+        "EventDate": event_date,
+        "ttl": int(reading["eventDt"].timestamp()) + RUNTIME_TTL_DAYS * 86400,
+        "CreatedDate": created_date
+    }
+
+
+def _runtime_bucket_entry_bytes(reading):
+    payload = {"t": format_runtime_timestamp(reading["eventDt"]), "m": reading["metrics"], "e": reading["events"]}
+    return len(json.dumps(payload, default=str))
+
+
+def write_runtime_bucket(device_id, bucket_start, bucket_size, readings, created_date):
+    """
+    Append readings to a time-bucketed RUNTIME item, in update_item calls of at most
+    RUNTIME_BUCKET_WRITE_BYTES. Once the item holds RUNTIME_BUCKET_MAX_BYTES of readings
+    further readings are refused rather than growing it past the item size limit.
+    Returns (stored_readings, rejected_readings).
+    """
+    readings = sorted(readings, key=lambda r: r["eventDt"])
+    bucket_end_ts = int(bucket_start.timestamp()) + RUNTIME_BUCKET_SECONDS[bucket_size]
+
+    batches = [[]]
+    batch_bytes = 0
+    for reading in readings:
+        size = _runtime_bucket_entry_bytes(reading)
+        if batches[-1] and batch_bytes + size > RUNTIME_BUCKET_WRITE_BYTES:
+            batches.append([])
+            batch_bytes = 0
+        batches[-1].append((reading, size))
+        batch_bytes += size
+
+    stored = []
+    for position, batch in enumerate(batches):
+        batch_readings = [reading for reading, _ in batch]
+        batch_bytes = sum(size for _, size in batch)
+        last = batch_readings[-1]
+        try:
+            table.update_item(
+                Key={"PK": f"DEVICE#{device_id}", "SK": f"RUNTIME#{format_runtime_timestamp(bucket_start)}"},
+                UpdateExpression=(
+                    "SET Readings = list_append(if_not_exists(Readings, :empty), :readings), "
+                    "Events = list_append(if_not_exists(Events, :empty), :events), "
+                    "#metrics = :metrics, #status = :status, EntityType = :entity_type, DeviceId = :device_id, "
+                    "EventDate = :event_date, BucketSize = :bucket_size, #ttl = :ttl, "
+                    "CreatedDate = if_not_exists(CreatedDate, :now), UpdatedDate = :now "
+                    "ADD ReadingsBytes :bytes"
+                ),
+                ConditionExpression="attribute_not_exists(ReadingsBytes) OR ReadingsBytes <= :max_existing",
+                ExpressionAttributeNames={"#metrics": "Metrics", "#status": "Status", "#ttl": "ttl"},
+                ExpressionAttributeValues={
+                    ":empty": [],
+                    ":readings": [{"t": format_runtime_timestamp(r["eventDt"]), "m": r["metrics"]} for r in batch_readings],
+                    ":events": [event for r in batch_readings for event in r["events"]],
+                    ":metrics": last["metrics"],
+                    ":status": last["status"],
+                    ":entity_type": "RUNTIME",
+                    ":device_id": device_id,
+                    ":event_date": format_runtime_timestamp(bucket_start),
+                    ":bucket_size": bucket_size,
+                    ":ttl": bucket_end_ts + RUNTIME_TTL_DAYS * 86400,
+                    ":now": created_date,
+                    ":bytes": batch_bytes,
+                    ":max_existing": RUNTIME_BUCKET_MAX_BYTES - batch_bytes
+                }
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            logger.warning(f"Runtime bucket {device_id}/{format_runtime_timestamp(bucket_start)} is full")
+            rejected = [reading for later in batches[position:] for reading, _ in later]
+            return stored, rejected
+        stored.extend(batch_readings)
+    return stored, []
+
+
+def ingest_runtime_readings(raw_readings, bucket_size=None):
+    """
+    Validate and store a batch of readings for many devices.
+
+    Unknown devices are rejected per reading (one batch_get_item per 100 devices).
+    Unbucketed readings go through batch_write_item in parallel chunks of 25; bucketed
+    readings are grouped per device and bucket, costing one update_item per bucket.
+    Returns (summary, errors, stored_readings).
+    """
+    created_date = datetime.utcnow().isoformat() + "Z"
+    errors = []
+    readings = []
+    for index, raw in enumerate(raw_readings):
+        reading, error = validate_runtime_reading(raw)
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            reading["index"] = index
+            readings.append(reading)
+
+    device_ids = sorted({r["deviceId"] for r in readings})
+    known_devices = set()
+    for i in range(0, len(device_ids), 100):
+        known_devices |= _existing_device_ids(device_ids[i:i + 100])
+    accepted = []
+    for reading in readings:
+        if reading["deviceId"] in known_devices:
+            accepted.append(reading)
+        else:
+            errors.append({"index": reading["index"], "deviceId": reading["deviceId"], "error": "Device not found"})
+
+    stored = []
+    with ThreadPoolExecutor(max_workers=CASCADE_MAX_WORKERS) as executor:
+        if bucket_size:
+            bucket_seconds = RUNTIME_BUCKET_SECONDS[bucket_size]
+            buckets = {}
+            for reading in accepted:
+                epoch = int(reading["eventDt"].timestamp())
+                bucket_start = datetime.fromtimestamp(epoch - epoch % bucket_seconds, tz=timezone.utc)
+                buckets.setdefault((reading["deviceId"], bucket_start), []).append(reading)
+
+            futures = {
+                executor.submit(write_runtime_bucket, device_id, bucket_start, bucket_size, group, created_date): group
+                for (device_id, bucket_start), group in buckets.items()
+            }
+            for future, group in futures.items():
+                try:
+                    bucket_stored, bucket_rejected = future.result()
+                    stored.extend(bucket_stored)
+                    errors.extend(
+                        {"index": r["index"], "deviceId": r["deviceId"], "error": f"Runtime bucket is full; use a smaller bucket than {bucket_size}"}
+                        for r in bucket_rejected
+                    )
+                except Exception as e:
+                    logger.error(f"Runtime bucket write failed for {group[0]['deviceId']}: {str(e)}")
+                    errors.extend({"index": r["index"], "deviceId": r["deviceId"], "error": f"Write failed: {str(e)}"} for r in group)
+            summary_writes = len(buckets)
+        else:
+            # batch_write_item rejects duplicate keys in one request - last reading wins
+            by_key = {}
+            for reading in accepted:
+                key = (reading["deviceId"], format_runtime_timestamp(reading["eventDt"]))
+                if key in by_key:
+                    previous = by_key[key]
+                    errors.append({"index": previous["index"], "deviceId": previous["deviceId"], "error": "Superseded by a later reading with the same eventDate"})
+                by_key[key] = reading
+            serializer = TypeSerializer()
+            unique = []
+            requests = []
+            for r in by_key.values():
+                try:
+                    request = {"PutRequest": {"Item": {k: serializer.serialize(v) for k, v in build_runtime_item(r, created_date).items()}}}
+                except (TypeError, decimal.InvalidOperation) as e:
+                    errors.append({"index": r["index"], "deviceId": r["deviceId"], "error": f"Unstorable value: {str(e)}"})
+                    continue
+                unique.append(r)
+                requests.append(request)
+            chunks = [(unique[i:i + CASCADE_BATCH_SIZE], requests[i:i + CASCADE_BATCH_SIZE]) for i in range(0, len(requests), CASCADE_BATCH_SIZE)]
+            futures = [(chunk_readings, executor.submit(_batch_write_requests, TABLE_NAME, chunk_requests)) for chunk_readings, chunk_requests in chunks]
+            for chunk_readings, future in futures:
+                try:
+                    unprocessed = {(req["PutRequest"]["Item"]["PK"]["S"], req["PutRequest"]["Item"]["SK"]["S"]) for req in future.result()}
+                except Exception as e:
+                    logger.error(f"Runtime batch write failed: {str(e)}")
+                    errors.extend({"index": r["index"], "deviceId": r["deviceId"], "error": f"Write failed: {str(e)}"} for r in chunk_readings)
+                    continue
+                for r in chunk_readings:
+                    if (f"DEVICE#{r['deviceId']}", f"RUNTIME#{format_runtime_timestamp(r['eventDt'])}") in unprocessed:
+                        errors.append({"index": r["index"], "deviceId": r["deviceId"], "error": "Write throttled, not stored"})
+                    else:
+                        stored.append(r)
+            summary_writes = len(unique)
+
+    # After the writes: a late reading only counts as stored once its archived day is
+    # flagged for re-archiving, otherwise the archive-aware read path would never see it
+    stored, unflagged = flag_late_runtime_readings(stored)
+    errors.extend(
+        {"index": r["index"], "deviceId": r["deviceId"], "error": "Stored but its archived day could not be flagged; resend the reading"}
+        for r in unflagged
+    )
+    register_runtime_devices({r["deviceId"] for r in stored})
+
+    summary = {
+        "received": len(raw_readings),
+        "stored": len(stored),
+        "rejected": len(raw_readings) - len(stored),
+        "devices": len({r["deviceId"] for r in stored}),
+        "itemsWritten": summary_writes,
+        "bucket": bucket_size
+    }
+    return summary, sorted(errors, key=lambda e: e["index"]), stored
+
+
+# ============================================================================
+# RUNTIME TELEMETRY QUERY
+# ============================================================================
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy ships in the Lambda bundle; pure-Python fallback for local runs
+    np = None
+
+RUNTIME_STEP_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+RUNTIME_AUTO_STEPS = (60, 300, 900, 3600, 3 * 3600, 6 * 3600, 86400)
+RUNTIME_TARGET_POINTS = 500
+RUNTIME_MAX_POINTS = 2000
+RUNTIME_MAX_RANGE_DAYS = 400
+RUNTIME_MAX_ITEMS_READ = 200000
+
+
+def parse_runtime_step(value):
+    """Parse a step like "30s", "5m", "1h" or "1d" into seconds. Returns (seconds, error)."""
+    match = re.match(r"^(\d{1,4})([smhd])$", value.strip().lower())
+    if not match or int(match.group(1)) < 1:
+        return None, "step must look like 30s, 5m, 1h or 1d"
+    return int(match.group(1)) * RUNTIME_STEP_UNITS[match.group(2)], None
+
+
+def pick_runtime_step(range_seconds):
+    """Smallest standard step that keeps the series near RUNTIME_TARGET_POINTS buckets."""
+    for step in RUNTIME_AUTO_STEPS:
+        if range_seconds / step <= RUNTIME_TARGET_POINTS:
+            return step
+    return RUNTIME_AUTO_STEPS[-1]
+
+
+def collect_runtime_samples(device_id, start_dt, end_dt, metric_names=None, include_archives=True):
+    """
+    Key-range query over RUNTIME#<EventDate> items, page by page, flattening both
+    single-reading and bucketed items into per-metric (timestamps, values) lists.
+    Days already packed by the archive job are read from their blobs instead.
+    Returns (samples, items_read, truncated).
+    """
+    start_dt = start_dt.astimezone(timezone.utc)
+    end_dt = end_dt.astimezone(timezone.utc)
+    start_ts = start_dt.timestamp()
+    end_ts = end_dt.timestamp()
+    # Bucketed items are keyed by bucket start, so look back one maximal bucket
+    lower = datetime.fromtimestamp(start_ts - max(RUNTIME_BUCKET_SECONDS.values()), tz=timezone.utc)
+    wanted = set(metric_names) if metric_names else None
+    samples = {}
+    items_read = 0
+
+    archived = {}
+    if include_archives:
+        archived = {
+            day: item for day, item in archived_runtime_days(
+                device_id, start_dt.strftime("%Y-%m-%d"), end_dt.strftime("%Y-%m-%d")).items()
+            if item.get("ArchivedDate")
+        }
+    # Days with late readings since they were archived are read from both the blob and
+    # DynamoDB; points already in the blob are not counted twice
+    stale_days = {day for day, item in archived.items() if item.get("LateReadings")}
+    archived_points = set()
+    for day_samples in read_runtime_archives(archived.values(), metric_names):
+        for name, (timestamps, values) in day_samples.items():
+            series = samples.setdefault(name, ([], []))
+            for ts, value in zip(timestamps, values):
+                if start_ts <= ts <= end_ts:
+                    series[0].append(ts)
+                    series[1].append(value)
+                    if stale_days and time.strftime("%Y-%m-%d", time.gmtime(ts)) in stale_days:
+                        archived_points.add((name, ts))
+    # Skip the archived prefix of the range in DynamoDB; buckets never straddle a day boundary
+    first_live = start_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    while first_live.strftime("%Y-%m-%d") in archived and first_live.strftime("%Y-%m-%d") not in stale_days:
+        first_live = datetime.fromtimestamp(first_live.timestamp() + 86400, tz=timezone.utc)
+    if first_live > end_dt:
+        return samples, items_read, False
+    lower = max(lower, first_live)
+
+    query_params = {
+        "KeyConditionExpression": Key("PK").eq(f"DEVICE#{device_id}") & Key("SK").between(
+            f"RUNTIME#{format_runtime_timestamp(lower)}", f"RUNTIME#{format_runtime_timestamp(end_dt)}"
+        ),
+        "ProjectionExpression": "SK, EventDate, #metrics, Readings",
+        "ExpressionAttributeNames": {"#metrics": "Metrics"}
+    }
+
+    def add_sample(timestamp_str, metrics):
+        event_dt = parse_runtime_timestamp(timestamp_str)
+        if event_dt is None or not isinstance(metrics, dict):
+            return
+        ts = event_dt.timestamp()
+        if ts < start_ts or ts > end_ts:
+            return
+        day = time.strftime("%Y-%m-%d", time.gmtime(ts)) if archived else None
+        if day in archived and day not in stale_days:
+            return
+        for name, value in metrics.items():
+            if day in stale_days and (name, ts) in archived_points:
+                continue
+            if (wanted is None or name in wanted) and isinstance(value, (int, float, Decimal)):
+                series = samples.setdefault(name, ([], []))
+                series[0].append(ts)
+                series[1].append(float(value))
+
+    while True:
+        response = table.query(**query_params)
+        for item in response.get("Items", []):
+            items_read += 1
+            if item.get("Readings"):
+                for reading in item["Readings"]:
+                    add_sample(reading.get("t"), reading.get("m"))
+            else:
+                add_sample(item.get("EventDate") or item["SK"].split("#", 1)[1], item.get("Metrics"))
+        if "LastEvaluatedKey" not in response:
+            return samples, items_read, False
+        if items_read >= RUNTIME_MAX_ITEMS_READ:
+            logger.warning(f"Runtime query for {device_id} truncated after {items_read} items")
+            return samples, items_read, True
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def downsample_runtime_series(timestamps, values, start_ts, step):
+    """Reduce one metric to min/max/mean/last/count per step-sized bucket."""
+    if np is not None:
+        ts = np.asarray(timestamps, dtype=np.float64)
+        vals = np.asarray(values, dtype=np.float64)
+        order = np.argsort(ts, kind="stable")
+        ts, vals = ts[order], vals[order]
+        bucket_ids = ((ts - start_ts) // step).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bucket_ids[1:] != bucket_ids[:-1]])
+        bounds = np.r_[starts, len(vals)]
+        counts = np.diff(bounds)
+        mins = np.minimum.reduceat(vals, starts)
+        maxs = np.maximum.reduceat(vals, starts)
+        means = np.add.reduceat(vals, starts) / counts
+        lasts = vals[bounds[1:] - 1]
+        rows = zip(bucket_ids[starts].tolist(), mins.tolist(), maxs.tolist(), means.tolist(), lasts.tolist(), counts.tolist())
+    else:
+        buckets = {}
+        for ts, value in sorted(zip(timestamps, values)):
+            bucket = buckets.setdefault(int((ts - start_ts) // step), [value, value, 0.0, value, 0])
+            bucket[0] = min(bucket[0], value)
+            bucket[1] = max(bucket[1], value)
+            bucket[2] += value
+            bucket[3] = value
+            bucket[4] += 1
+        rows = [(b, v[0], v[1], v[2] / v[4], v[3], v[4]) for b, v in sorted(buckets.items())]
+
+    return [
+        {
+            "t": format_runtime_timestamp(datetime.fromtimestamp(start_ts + bucket * step, tz=timezone.utc)),
+            "min": round(mn, 6),
+            "max": round(mx, 6),
+            "mean": round(mean, 6),
+            "last": round(last, 6),
+            "count": count
+        }
+        for bucket, mn, mx, mean, last, count in rows
+    ]
+
+
+# ============================================================================
+# RUNTIME ARCHIVE
+# ============================================================================
+#
+# Before RUNTIME items expire, a scheduled job packs each device-day into one
+# columnar blob (shared.telemetry_archive) and records DEVICE#<id>/ARCHIVE#<day>.
+# collect_runtime_samples reads archived days from the blobs and only queries
+# DynamoDB for the rest, so the runtime endpoint spans both transparently.
+#
+# Ingest has no time window, so a reading can land on a day that is already archived.
+# Ingest counts such readings on the day's index item (LateReadings); reads then merge
+# that day's live items with the blob, and the next job run re-archives the day.
+# Devices with RUNTIME data are listed on the RUNTIME_DEVICES registry partition,
+# which the job walks instead of scanning the table.
+
+ARCHIVE_SK_PREFIX = "ARCHIVE#"
+ARCHIVE_AFTER_DAYS = int(os.environ.get("RUNTIME_ARCHIVE_AFTER_DAYS", "2"))
+ARCHIVE_MAX_DAYS_PER_RUN = int(os.environ.get("RUNTIME_ARCHIVE_MAX_DAYS_PER_RUN", "500"))
+ARCHIVE_READ_WORKERS = 8
+# Readings within this margin of the cutoff are flagged as late too, so a day archived
+# while they were being written is still revisited
+ARCHIVE_LATE_MARGIN_SECONDS = 3600
+RUNTIME_DEVICE_REGISTRY_PK = "RUNTIME_DEVICES"
+_registered_runtime_devices = set()
+
+
+def _runtime_day_start(day):
+    return datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def runtime_archive_cutoff_day(margin_seconds=0):
+    """Newest day the archive job packs (days older than ARCHIVE_AFTER_DAYS)."""
+    cutoff = time.time() + margin_seconds - ARCHIVE_AFTER_DAYS * 86400
+    return datetime.fromtimestamp(cutoff, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def register_runtime_devices(device_ids):
+    """Add devices to the RUNTIME_DEVICES registry (each container writes a device once)."""
+    serializer = TypeSerializer()
+    new_ids = sorted(set(device_ids) - _registered_runtime_devices)
+    for i in range(0, len(new_ids), CASCADE_BATCH_SIZE):
+        chunk = new_ids[i:i + CASCADE_BATCH_SIZE]
+        requests = [{"PutRequest": {"Item": {k: serializer.serialize(v) for k, v in {
+            "PK": RUNTIME_DEVICE_REGISTRY_PK,
+            "SK": f"DEVICE#{device_id}",
+            "EntityType": "RUNTIME_DEVICE",
+            "DeviceId": device_id
+        }.items()}}} for device_id in chunk]
+        try:
+            unprocessed = {req["PutRequest"]["Item"]["DeviceId"]["S"] for req in _batch_write_requests(TABLE_NAME, requests)}
+        except Exception as e:
+            # Retried by the next ingest in this container
+            logger.error(f"Could not register runtime devices: {str(e)}")
+            continue
+        _registered_runtime_devices.update(device_id for device_id in chunk if device_id not in unprocessed)
+
+
+def list_runtime_devices():
+    """Device IDs on the RUNTIME_DEVICES registry partition."""
+    query_params = {
+        "KeyConditionExpression": Key("PK").eq(RUNTIME_DEVICE_REGISTRY_PK),
+        "ProjectionExpression": "DeviceId"
+    }
+    device_ids = []
+    while True:
+        response = table.query(**query_params)
+        device_ids.extend(item["DeviceId"] for item in response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return device_ids
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def flag_late_runtime_readings(readings):
+    """
+    Count stored readings for days the archive job may already have packed on their
+    ARCHIVE#<day> index item (creating a placeholder when the day is not archived yet).
+    Returns (flagged_or_recent_readings, readings_that_could_not_be_flagged).
+    """
+    cutoff_day = runtime_archive_cutoff_day(ARCHIVE_LATE_MARGIN_SECONDS)
+    late = {}
+    for reading in readings:
+        day = reading["eventDt"].astimezone(timezone.utc).strftime("%Y-%m-%d")
+        if day <= cutoff_day:
+            late.setdefault((reading["deviceId"], day), []).append(reading)
+    if not late:
+        return readings, []
+
+    def flag(device_day):
+        device_id, day = device_day
+        table.update_item(
+            Key={"PK": f"DEVICE#{device_id}", "SK": f"{ARCHIVE_SK_PREFIX}{day}"},
+            UpdateExpression="ADD LateReadings :count SET EntityType = if_not_exists(EntityType, :entity_type), DeviceId = :device_id, #day = :day",
+            ExpressionAttributeNames={"#day": "Day"},
+            ExpressionAttributeValues={
+                ":count": len(late[device_day]),
+                ":entity_type": "RUNTIME_ARCHIVE",
+                ":device_id": device_id,
+                ":day": day
+            }
+        )
+
+    failed = set()
+    with ThreadPoolExecutor(max_workers=min(CASCADE_MAX_WORKERS, len(late))) as executor:
+        futures = {executor.submit(flag, device_day): device_day for device_day in late}
+        for future, device_day in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Could not flag late RUNTIME readings for {device_day[0]} on {device_day[1]}: {str(e)}")
+                failed.update(id(reading) for reading in late[device_day])
+    return ([r for r in readings if id(r) not in failed], [r for r in readings if id(r) in failed])
+
+
+def archived_runtime_days(device_id, start_day=None, end_day=None):
+    """
+    Return {day: archive index item} for a device, optionally within [start_day, end_day].
+    Items without ArchivedDate are late-reading placeholders for days not archived yet.
+    """
+    key_condition = Key("PK").eq(f"DEVICE#{device_id}")
+    if start_day and end_day:
+        key_condition = key_condition & Key("SK").between(f"{ARCHIVE_SK_PREFIX}{start_day}", f"{ARCHIVE_SK_PREFIX}{end_day}")
+    else:
+        key_condition = key_condition & Key("SK").begins_with(ARCHIVE_SK_PREFIX)
+    query_params = {"KeyConditionExpression": key_condition}
+    archives = {}
+    while True:
+        response = table.query(**query_params)
+        for item in response.get("Items", []):
+            archives[item["SK"][len(ARCHIVE_SK_PREFIX):]] = item
+        if "LastEvaluatedKey" not in response:
+            return archives
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def read_runtime_archives(archives, metric_names=None):
+    """Fetch and decode archive blobs in parallel. Returns a list of per-day sample dicts."""
+    from shared.telemetry_archive import get_archive_store, decode_archive
+
+    keys = [item["ArchiveKey"] for item in archives if item.get("ArchiveKey")]
+    if not keys:
+        return []
+    store = get_archive_store()
+
+    def read_one(archive_key):
+        _, samples = decode_archive(store.get(archive_key), metric_names)
+        return samples
+
+    with ThreadPoolExecutor(max_workers=min(ARCHIVE_READ_WORKERS, len(keys))) as executor:
+        return list(executor.map(read_one, keys))
+
+
+def merge_runtime_samples(*sample_sets):
+    """Union of per-metric samples; a later set wins where a metric has the same timestamp."""
+    merged = {}
+    for samples in sample_sets:
+        for name, (timestamps, values) in samples.items():
+            merged.setdefault(name, {}).update(zip(timestamps, values))
+    return {name: (sorted(points), [points[ts] for ts in sorted(points)]) for name, points in merged.items()}
+
+
+def archive_runtime_day(device_id, day, store, existing=None):
+    """
+    Pack one device-day into an archive blob and record its index item. A day that is
+    already archived (re-archived for late readings) merges its blob with the live items.
+    Returns the reading count, or None when more late readings arrived during the pass.
+    """
+    from shared.telemetry_archive import archive_key, decode_archive, encode_archive
+
+    day_start = _runtime_day_start(day)
+    day_end = datetime.fromtimestamp(day_start.timestamp() + 86400 - 0.001, tz=timezone.utc)
+    samples, items_read, truncated = collect_runtime_samples(device_id, day_start, day_end, include_archives=False)
+    if truncated:
+        raise RuntimeError(f"Too many RUNTIME items for {device_id} on {day} to archive in one pass")
+    if existing and existing.get("ArchiveKey"):
+        _, archived_samples = decode_archive(store.get(existing["ArchiveKey"]))
+        samples = merge_runtime_samples(archived_samples, samples)
+
+    index_item = {
+        "PK": f"DEVICE#{device_id}",
+        "SK": f"{ARCHIVE_SK_PREFIX}{day}",
+        "EntityType": "RUNTIME_ARCHIVE",
+        "DeviceId": device_id,
+        "Day": day,
+        "ItemsArchived": items_read,
+        "ReadingCount": max((len(timestamps) for timestamps, _ in samples.values()), default=0),
+        "MetricNames": sorted(samples),
+        "ArchivedDate": datetime.utcnow().isoformat() + "Z"
+    }
+    if samples:
+        key = archive_key(device_id, day)
+        blob = encode_archive(device_id, day, samples)
+        store.put(key, blob)
+        index_item["ArchiveKey"] = key
+        index_item["SizeBytes"] = len(blob)
+    # Index item is written last: a day only counts as archived once its blob exists.
+    # It clears LateReadings only if no late reading was flagged after this pass started.
+    try:
+        table.put_item(
+            Item=index_item,
+            ConditionExpression="attribute_not_exists(LateReadings) OR LateReadings = :seen",
+            ExpressionAttributeValues={":seen": int((existing or {}).get("LateReadings", 0))}
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        logger.info(f"Late RUNTIME readings arrived for {device_id} on {day} while archiving; next run re-archives it")
+        return None
+    return index_item["ReadingCount"]
+
+
+def pending_archive_days(device_id, cutoff_day):
+    """
+    (day, index item or None) for days with RUNTIME data up to cutoff_day that are not
+    archived yet or have late readings since, oldest first.
+    """
+    oldest = table.query(
+        KeyConditionExpression=Key("PK").eq(f"DEVICE#{device_id}") & Key("SK").begins_with("RUNTIME#"),
+        ProjectionExpression="SK",
+        Limit=1
+    ).get("Items", [])
+    if not oldest:
+        return []
+    first_day = oldest[0]["SK"].split("#", 1)[1][:10]
+    if first_day > cutoff_day:
+        return []
+    archived = archived_runtime_days(device_id, first_day, cutoff_day)
+    days = []
+    day_dt = _runtime_day_start(first_day)
+    cutoff_dt = _runtime_day_start(cutoff_day)
+    while day_dt <= cutoff_dt:
+        day = day_dt.strftime("%Y-%m-%d")
+        item = archived.get(day)
+        if not item or not item.get("ArchivedDate") or item.get("LateReadings"):
+            days.append((day, item))
+        day_dt = datetime.fromtimestamp(day_dt.timestamp() + 86400, tz=timezone.utc)
+    return days
+
+
+def run_runtime_archive_job(device_ids=None):
+    """
+    Archive every complete, not-yet-archived RUNTIME day older than ARCHIVE_AFTER_DAYS
+    and re-archive days with late readings (invoked by the scheduled
+    {"job": "archive-runtime"} rule). Bounded per run; the next run picks up where this
+    one stopped.
+    """
+    from shared.telemetry_archive import get_archive_store
+
+    if not device_ids:
+        device_ids = list_runtime_devices()
+
+    cutoff_day = runtime_archive_cutoff_day()
+    store = get_archive_store()
+    summary = {"devices": len(device_ids), "daysArchived": 0, "readingsArchived": 0, "failed": 0, "remaining": False}
+    for device_id in device_ids:
+        for day, existing in pending_archive_days(device_id, cutoff_day):
+            if summary["daysArchived"] >= ARCHIVE_MAX_DAYS_PER_RUN:
+                summary["remaining"] = True
+                logger.info(f"Runtime archive run stopped after {summary['daysArchived']} days")
+                return summary
+            try:
+                reading_count = archive_runtime_day(device_id, day, store, existing)
+            except Exception as e:
+                logger.error(f"Failed to archive RUNTIME for {device_id} on {day}: {str(e)}")
+                summary["failed"] += 1
+                break
+            if reading_count is None:
+                summary["remaining"] = True
+                continue
+            summary["readingsArchived"] += reading_count
+            summary["daysArchived"] += 1
+    logger.info(f"Runtime archive run: {summary}")
+    return summary
+
+
+# ============================================================================
+# RUNTIME ROLLUPS
+# ============================================================================
+#
+# Hourly and daily aggregates per device (DEVICE#<id>) and per installation
+# (INSTALL#<id>), keyed ROLLUP#H#<hourStart> / ROLLUP#D#<dayStart>. Each item holds
+# Metrics: {name: {count, sum, min, max, last, lastAt}} and a Version used for
+# optimistic merges. AppliedBatches keeps digests of the most recent reading sets merged
+# into the item so a retried ingest is not counted twice. Rollups outlive the raw RUNTIME ttl.
+
+ROLLUP_RESOLUTIONS = {"hour": ("H", 3600), "day": ("D", 86400)}
+ROLLUP_TTL_DAYS = {
+    "hour": int(os.environ.get("ROLLUP_HOURLY_TTL_DAYS", "400")),
+    "day": int(os.environ.get("ROLLUP_DAILY_TTL_DAYS", "1825"))
+}
+ROLLUP_MIN_POINTS = 24
+ROLLUP_APPLIED_BATCHES_KEPT = 50
+
+
+def _device_installation_ids(device_ids):
+    """Map device IDs to their linkedInstallationId (None when unlinked), 100 keys per batch_get_item."""
+    mapping = {}
+    device_ids = list(device_ids)
+    for i in range(0, len(device_ids), 100):
+        request_items = {TABLE_NAME: {
+            "Keys": [_ddb_key(f"DEVICE#{device_id}", "META") for device_id in device_ids[i:i + 100]],
+            "ProjectionExpression": "PK, linkedInstallationId"
+        }}
+        while request_items:
+            response = dynamodb_client.batch_get_item(RequestItems=request_items)
+            for item in response.get("Responses", {}).get(TABLE_NAME, []):
+                mapping[item["PK"]["S"].split("#", 1)[1]] = item.get("linkedInstallationId", {}).get("S")
+            request_items = response.get("UnprocessedKeys") or {}
+    return mapping
+
+
+def aggregate_rollup_samples(group_keys, timestamps, values):
+    """
+    Reduce samples to {group_key: (count, sum, min, max, last, last_ts)} in one vectorized pass.
+    group_keys, timestamps and values are parallel lists.
+    """
+    key_index = {}
+    gids = [key_index.setdefault(key, len(key_index)) for key in group_keys]
+    keys = list(key_index)
+
+    if np is not None:
+        gid = np.asarray(gids, dtype=np.int64)
+        ts = np.asarray(timestamps, dtype=np.float64)
+        vals = np.asarray(values, dtype=np.float64)
+        order = np.lexsort((ts, gid))
+        gid, ts, vals = gid[order], ts[order], vals[order]
+        starts = np.flatnonzero(np.r_[True, gid[1:] != gid[:-1]])
+        bounds = np.r_[starts, len(vals)]
+        rows = zip(
+            gid[starts].tolist(),
+            np.diff(bounds).tolist(),
+            np.add.reduceat(vals, starts).tolist(),
+            np.minimum.reduceat(vals, starts).tolist(),
+            np.maximum.reduceat(vals, starts).tolist(),
+            vals[bounds[1:] - 1].tolist(),
+            ts[bounds[1:] - 1].tolist()
+        )
+        return {keys[g]: (count, total, mn, mx, last, last_ts) for g, count, total, mn, mx, last, last_ts in rows}
+
+    result = {}
+    for g, ts, value in sorted(zip(gids, timestamps, values)):
+        count, total, mn, mx, _, _ = result.get(keys[g], (0, 0.0, value, value, value, ts))
+        result[keys[g]] = (count + 1, total + value, min(mn, value), max(mx, value), value, ts)
+    return result
+
+
+def _merge_rollup_stats(existing, delta):
+    """Merge aggregated deltas into a stored Metrics map."""
+    merged = dict(existing or {})
+    for name, (count, total, mn, mx, last, last_ts) in delta.items():
+        last_at = format_runtime_timestamp(datetime.fromtimestamp(last_ts, tz=timezone.utc))
+        current = merged.get(name)
+        if not current:
+            merged[name] = {"count": count, "sum": Decimal(str(round(total, 6))), "min": Decimal(str(mn)),
+                            "max": Decimal(str(mx)), "last": Decimal(str(last)), "lastAt": last_at}
+            continue
+        merged[name] = {
+            "count": int(current["count"]) + count,
+            "sum": Decimal(str(round(float(current["sum"]) + total, 6))),
+            "min": min(current["min"], Decimal(str(mn))),
+            "max": max(current["max"], Decimal(str(mx))),
+            "last": Decimal(str(last)) if last_at >= current.get("lastAt", "") else current["last"],
+            "lastAt": max(last_at, current.get("lastAt", ""))
+        }
+    return merged
+
+
+def rollup_batch_digest(reading_keys):
+    """Order-independent digest of the (deviceId, eventDate) readings behind one rollup delta."""
+    return hashlib.sha256("\n".join(sorted(reading_keys)).encode()).hexdigest()[:32]
+
+
+def apply_rollup_delta(pk, resolution, bucket_start, delta, batch_digest=None):
+    """
+    Read-merge-write one rollup item, retrying on concurrent updates (Version check).
+    A delta whose batch_digest is already in AppliedBatches was merged by an earlier
+    attempt of the same ingest and is skipped.
+    """
+    code, seconds = ROLLUP_RESOLUTIONS[resolution]
+    sk = f"ROLLUP#{code}#{format_runtime_timestamp(bucket_start)}"
+    for attempt in range(CASCADE_MAX_RETRIES + 1):
+        existing = table.get_item(Key={"PK": pk, "SK": sk}, ConsistentRead=True).get("Item")
+        version = int(existing["Version"]) if existing else 0
+        applied = list(existing.get("AppliedBatches", [])) if existing else []
+        if batch_digest:
+            if batch_digest in applied:
+                logger.info(f"Rollup {pk}/{sk} already includes batch {batch_digest}, skipping")
+                return False
+            applied = (applied + [batch_digest])[-ROLLUP_APPLIED_BATCHES_KEPT:]
+        item = {
+            "PK": pk,
+            "SK": sk,
+            "EntityType": "ROLLUP",
+            "Resolution": resolution,
+            "BucketStart": format_runtime_timestamp(bucket_start),
+            "Metrics": _merge_rollup_stats(existing.get("Metrics") if existing else None, delta),
+            "Version": version + 1,
+            "AppliedBatches": applied,
+            "ttl": int(bucket_start.timestamp()) + seconds + ROLLUP_TTL_DAYS[resolution] * 86400,
+            "UpdatedDate": datetime.utcnow().isoformat() + "Z"
+        }
+        try:
+            table.put_item(
+                Item=item,
+                ConditionExpression="attribute_not_exists(PK) OR Version = :version",
+                ExpressionAttributeValues={":version": version}
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            time.sleep(min(0.02 * (2 ** attempt), 0.5))
+    logger.error(f"Gave up merging rollup {pk}/{sk} after {CASCADE_MAX_RETRIES + 1} attempts")
+    return False
+
+
+def update_runtime_rollups(readings):
+    """
+    Fold freshly stored readings into hourly and daily rollups for their devices and
+    linked installations. Aggregation for the whole batch is one vectorized pass; each
+    affected rollup item is then merged once, in parallel. Resending the same readings
+    (a client retry) leaves the rollups unchanged.
+    Returns the number of rollup items updated.
+    """
+    if not readings:
+        return 0
+    installations = _device_installation_ids({r["deviceId"] for r in readings})
+
+    group_keys, timestamps, values = [], [], []
+    reading_keys = {}
+    for reading in readings:
+        ts = reading["eventDt"].timestamp()
+        reading_key = f"{reading['deviceId']}|{format_runtime_timestamp(reading['eventDt'])}"
+        partitions = [f"DEVICE#{reading['deviceId']}"]
+        if installations.get(reading["deviceId"]):
+            partitions.append(f"INSTALL#{installations[reading['deviceId']]}")
+        for resolution, (_, seconds) in ROLLUP_RESOLUTIONS.items():
+            bucket_start = int(ts - ts % seconds)
+            for pk in partitions:
+                reading_keys.setdefault((pk, resolution, bucket_start), set()).add(reading_key)
+                for name, value in reading["metrics"].items():
+                    group_keys.append((pk, resolution, bucket_start, name))
+                    timestamps.append(ts)
+                    values.append(float(value))
+
+    deltas = {}
+    for (pk, resolution, bucket_start, name), stats in aggregate_rollup_samples(group_keys, timestamps, values).items():
+        deltas.setdefault((pk, resolution, bucket_start), {})[name] = stats
+
+    with ThreadPoolExecutor(max_workers=CASCADE_MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(
+                apply_rollup_delta, pk, resolution, datetime.fromtimestamp(bucket_start, tz=timezone.utc), delta,
+                rollup_batch_digest(reading_keys[(pk, resolution, bucket_start)])
+            )
+            for (pk, resolution, bucket_start), delta in deltas.items()
+        ]
+        updated = sum(1 for future in futures if future.result())
+    logger.info(f"Updated {updated} of {len(deltas)} rollup items from {len(readings)} readings")
+    return updated
+
+
+def pick_rollup_resolution(range_seconds):
+    """Coarsest rollup resolution that still yields ROLLUP_MIN_POINTS points for the range."""
+    for resolution in ("day", "hour"):
+        if range_seconds / ROLLUP_RESOLUTIONS[resolution][1] >= ROLLUP_MIN_POINTS:
+            return resolution
+    return "hour"
+
+
+def query_rollup_series(pk, resolution, start_dt, end_dt, metric_names=None):
+    """Key-range query over ROLLUP#<code># items, returned as runtime-style series."""
+    code, seconds = ROLLUP_RESOLUTIONS[resolution]
+    lower = datetime.fromtimestamp(start_dt.timestamp() - start_dt.timestamp() % seconds, tz=timezone.utc)
+    query_params = {
+        "KeyConditionExpression": Key("PK").eq(pk) & Key("SK").between(
+            f"ROLLUP#{code}#{format_runtime_timestamp(lower)}", f"ROLLUP#{code}#{format_runtime_timestamp(end_dt)}"
+        )
+    }
+    wanted = set(metric_names) if metric_names else None
+    series = {}
+    while True:
+        response = table.query(**query_params)
+        for item in response.get("Items", []):
+            for name, stats in (item.get("Metrics") or {}).items():
+                if wanted is not None and name not in wanted:
+                    continue
+                count = int(stats["count"])
+                series.setdefault(name, []).append({
+                    "t": item["BucketStart"],
+                    "min": float(stats["min"]),
+                    "max": float(stats["max"]),
+                    "mean": round(float(stats["sum"]) / count, 6) if count else None,
+                    "last": float(stats["last"]),
+                    "count": count
+                })
+        if "LastEvaluatedKey" not in response:
+            return dict(sorted(series.items()))
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+# ============================================================================
+# DEVICE STATE SHADOW
+# ============================================================================
+#
+# DEVICE#<id>/STATE keeps the latest value per metric ({value, at}) so current status
+# is a single key read. Merges compare per-metric timestamps, so late readings never
+# overwrite newer values, and a Version condition guards against concurrent ingests.
+
+DEVICE_STATE_SK = "STATE"
+DEVICE_STATE_MAX_DEVICES = 500
+
+
+def _latest_metrics_by_device(readings):
+    """Collapse a batch to {device_id: ({metric: (value, at)}, (status, at))} keeping the newest per metric."""
+    latest = {}
+    for reading in readings:
+        at = format_runtime_timestamp(reading["eventDt"])
+        metrics, status = latest.setdefault(reading["deviceId"], ({}, (None, "")))
+        for name, value in reading["metrics"].items():
+            if name not in metrics or at >= metrics[name][1]:
+                metrics[name] = (value, at)
+        if at >= status[1]:
+            latest[reading["deviceId"]] = (metrics, (reading["status"], at))
+    return latest
+
+
+def _merge_device_state(device_id, existing, metrics, status):
+    """Build the new STATE item from the stored one plus the newest batch values."""
+    merged = dict((existing or {}).get("Metrics") or {})
+    for name, (value, at) in metrics.items():
+        if name not in merged or at >= merged[name].get("at", ""):
+            merged[name] = {"value": value, "at": at}
+    item = {
+        "PK": f"DEVICE#{device_id}",
+        "SK": DEVICE_STATE_SK,
+        "EntityType": "DEVICE_STATE",
+        "DeviceId": device_id,
+        "Metrics": merged,
+        "LastEventAt": max(entry["at"] for entry in merged.values()),
+        "Status": (existing or {}).get("Status"),
+        "StatusAt": (existing or {}).get("StatusAt", ""),
+        "Version": int((existing or {}).get("Version", 0)) + 1,
+        "UpdatedDate": datetime.utcnow().isoformat() + "Z"
+    }
+    if status[1] >= item["StatusAt"]:
+        item["Status"], item["StatusAt"] = status
+    return item
+
+
+def _put_device_state(device_id, existing, metrics, status):
+    """Conditionally write one STATE item, re-reading and re-merging on version conflicts."""
+    for attempt in range(CASCADE_MAX_RETRIES + 1):
+        item = _merge_device_state(device_id, existing, metrics, status)
+        try:
+            table.put_item(
+                Item=item,
+                ConditionExpression="attribute_not_exists(PK) OR Version = :version",
+                ExpressionAttributeValues={":version": item["Version"] - 1}
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            time.sleep(min(0.02 * (2 ** attempt), 0.5))
+            existing = table.get_item(Key={"PK": f"DEVICE#{device_id}", "SK": DEVICE_STATE_SK}, ConsistentRead=True).get("Item")
+    logger.error(f"Gave up updating state for device {device_id}")
+    return False
+
+
+def batch_get_device_states(device_ids):
+    """Fetch STATE items for many devices, 100 keys per batch_get_item. Returns {device_id: item}."""
+    states = {}
+    device_ids = list(dict.fromkeys(device_ids))
+    for i in range(0, len(device_ids), 100):
+        request_items = {TABLE_NAME: {
+            "Keys": [_ddb_key(f"DEVICE#{device_id}", DEVICE_STATE_SK) for device_id in device_ids[i:i + 100]],
+            "ConsistentRead": True
+        }}
+        while request_items:
+            response = dynamodb_client.batch_get_item(RequestItems=request_items)
+            for raw in response.get("Responses", {}).get(TABLE_NAME, []):
+                item = {k: deserializer.deserialize(v) for k, v in raw.items()}
+                states[item["DeviceId"]] = item
+            request_items = response.get("UnprocessedKeys") or {}
+    return states
+
+
+def update_device_states(readings):
+    """Fold the newest reading per device and metric into the STATE shadows. Returns items updated."""
+    latest = _latest_metrics_by_device(readings)
+    if not latest:
+        return 0
+    existing = batch_get_device_states(latest.keys())
+    with ThreadPoolExecutor(max_workers=CASCADE_MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(_put_device_state, device_id, existing.get(device_id), metrics, status)
+            for device_id, (metrics, status) in latest.items()
+        ]
+        updated = sum(1 for future in futures if future.result())
+    logger.info(f"Updated state for {updated} of {len(latest)} devices")
+    return updated
+
+
+def list_install_device_ids(install_id):
+    """Device IDs linked to an installation (DEVICE_ASSOC records)."""
+    device_ids = []
+    query_params = {
+        "KeyConditionExpression": Key("PK").eq(f"INSTALL#{install_id}") & Key("SK").begins_with("DEVICE_ASSOC#"),
+        "ProjectionExpression": "SK"
+    }
+    while True:
+        response = table.query(**query_params)
+        device_ids.extend(item["SK"].split("#", 1)[1] for item in response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return device_ids
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def format_device_state(device_id, item):
+    """Response shape for one device's current state."""
+    if not item:
+        return {"deviceId": device_id, "metrics": {}, "lastEventAt": None, "status": None}
+    return {
+        "deviceId": device_id,
+        "metrics": simplify(item.get("Metrics") or {}),
+        "lastEventAt": item.get("LastEventAt"),
+        "status": item.get("Status")
+    }
+
+
+# ============================================================================
+# TELEMETRY ANOMALY DETECTION
+# ============================================================================
+#
+# DEVICE#<id>/DETECTOR keeps an exponentially weighted mean and variance per metric.
+# Every ingest batch updates them in O(1) per reading; a reading whose z-score against
+# the prior statistics exceeds ANOMALY_Z_THRESHOLD writes DEVICE#<id>/ALERT#<at>#<metric>.
+
+DETECTOR_SK = "DETECTOR"
+ANOMALY_ALPHA = float(os.environ.get("ANOMALY_ALPHA", "0.1"))
+ANOMALY_Z_THRESHOLD = float(os.environ.get("ANOMALY_Z_THRESHOLD", "4.0"))
+ANOMALY_WARMUP_READINGS = int(os.environ.get("ANOMALY_WARMUP_READINGS", "30"))
+ANOMALY_COOLDOWN_SECONDS = int(os.environ.get("ANOMALY_COOLDOWN_SECONDS", "900"))
+ALERT_TTL_DAYS = int(os.environ.get("ALERT_TTL_DAYS", "180"))
+EWMA_SCAN_CHUNK = 500
+# Largest exponent allowed for (1 - alpha) ** -k within a chunk: e^600 leaves headroom
+# below the float64 limit (~e^709) for the input magnitudes multiplied into it
+EWMA_SCAN_MAX_EXPONENT = 600.0
+
+
+def ewma_scan(inputs, alpha, initial):
+    """
+    Evaluate y_i = (1 - alpha) * y_(i-1) + alpha * u_i for every i.
+    Vectorized via the closed form y_i = d^i * (y_0 + alpha * sum_j u_j * d^-j), chunked so
+    d^-k stays finite: the chunk shrinks as alpha grows (about 15 readings at alpha=0.99).
+    """
+    if not 0 < alpha < 1:
+        raise ValueError(f"EWMA alpha must be between 0 and 1 (exclusive), got {alpha}")
+    if np is None:
+        outputs, y = [], initial
+        for u in inputs:
+            y = (1 - alpha) * y + alpha * u
+            outputs.append(y)
+        return outputs
+
+    u = np.asarray(inputs, dtype=np.float64)
+    out = np.empty_like(u)
+    decay = 1.0 - alpha
+    chunk_size = max(1, min(EWMA_SCAN_CHUNK, int(EWMA_SCAN_MAX_EXPONENT / -math.log(decay))))
+    y = initial
+    for start in range(0, len(u), chunk_size):
+        chunk = u[start:start + chunk_size]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        out[start:start + len(chunk)] = powers * (y + alpha * np.cumsum(chunk / powers))
+        y = out[start + len(chunk) - 1]
+    return out
+
+
+def detect_metric_anomalies(values, prior):
+    """
+    Run one metric's readings (time ordered) through the EWMA detector.
+    prior is {"mean", "var", "n"} or None. Returns (posterior, [(index, z, expected, std), ...]).
+    """
+    if not values:
+        return prior, []
+    if not prior:
+        prior = {"mean": float(values[0]), "var": 0.0, "n": 0}
+    mean0, var0, n0 = float(prior["mean"]), float(prior["var"]), int(prior["n"])
+    alpha = ANOMALY_ALPHA
+
+    means = list(ewma_scan(values, alpha, mean0))
+    prev_means = [mean0] + means[:-1]
+    deviations = [x - m for x, m in zip(values, prev_means)]
+    # West's EW variance: v_i = (1 - a) * (v_(i-1) + a * d_i^2)
+    variances = list(ewma_scan([(1 - alpha) * d * d for d in deviations], alpha, var0))
+    prev_vars = [var0] + variances[:-1]
+
+    anomalies = []
+    for i, (d, v) in enumerate(zip(deviations, prev_vars)):
+        if n0 + i >= ANOMALY_WARMUP_READINGS and v > 0:
+            z = d / (v ** 0.5)
+            if abs(z) >= ANOMALY_Z_THRESHOLD:
+                anomalies.append((i, z, prev_means[i], v ** 0.5))
+    return {"mean": float(means[-1]), "var": float(variances[-1]), "n": n0 + len(values)}, anomalies
+
+
+def _detect_device_anomalies(device_id, series, existing):
+    """
+    Update one device's DETECTOR item from its batch series {metric: [(at, value), ...]} and
+    return the alert items to write. Retries the compute on Version conflicts.
+    """
+    key = {"PK": f"DEVICE#{device_id}", "SK": DETECTOR_SK}
+    for attempt in range(CASCADE_MAX_RETRIES + 1):
+        stored = (existing or {}).get("Metrics") or {}
+        metrics = dict(stored)
+        alerts = []
+        for name, points in series.items():
+            state = stored.get(name) or {}
+            # Late readings are skipped so the statistics only move forward in time
+            points = sorted(p for p in points if p[0] > state.get("lastAt", ""))
+            if not points:
+                continue
+            posterior, anomalies = detect_metric_anomalies([float(v) for _, v in points], state.get("stats"))
+            last_alert_at = state.get("lastAlertAt", "")
+            for index, z, expected, std in anomalies:
+                at = points[index][0]
+                if last_alert_at and (parse_runtime_timestamp(at) - parse_runtime_timestamp(last_alert_at)).total_seconds() < ANOMALY_COOLDOWN_SECONDS:
+                    continue
+                last_alert_at = at
+                alerts.append({
+                    "PK": key["PK"],
+                    "SK": f"ALERT#{at}#{name}",
+                    "AlertId": f"{at}#{name}",
+                    "EntityType": "ALERT",
+                    "DeviceId": device_id,
+                    "Metric": name,
+                    "AlertAt": at,
+                    "Value": Decimal(str(points[index][1])),
+                    "Expected": Decimal(str(round(expected, 6))),
+                    "StdDev": Decimal(str(round(std, 6))),
+                    "ZScore": Decimal(str(round(z, 3))),
+                    "Direction": "high" if z > 0 else "low",
+                    "AlertStatus": "OPEN",
+                    "ttl": int(parse_runtime_timestamp(at).timestamp()) + ALERT_TTL_DAYS * 86400
+                })
+            metrics[name] = {
+                "stats": {k: Decimal(str(round(v, 9))) for k, v in posterior.items()},
+                "lastAt": points[-1][0],
+                "lastAlertAt": last_alert_at
+            }
+
+        version = int((existing or {}).get("Version", 0))
+        try:
+            table.put_item(
+                Item={**key, "EntityType": "DETECTOR", "DeviceId": device_id, "Metrics": metrics,
+                      "Version": version + 1, "UpdatedDate": datetime.utcnow().isoformat() + "Z"},
+                ConditionExpression="attribute_not_exists(PK) OR Version = :version",
+                ExpressionAttributeValues={":version": version}
+            )
+            return alerts
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            time.sleep(min(0.02 * (2 ** attempt), 0.5))
+            existing = table.get_item(Key=key, ConsistentRead=True).get("Item")
+    logger.error(f"Gave up updating detector state for device {device_id}")
+    return []
+
+
+def run_anomaly_detection(readings):
+    """Detector stage of the RUNTIME ingest path. Returns (devices_evaluated, alerts_written)."""
+    series = {}
+    for reading in readings:
+        at = format_runtime_timestamp(reading["eventDt"])
+        per_device = series.setdefault(reading["deviceId"], {})
+        for name, value in reading["metrics"].items():
+            per_device.setdefault(name, []).append((at, value))
+    if not series:
+        return 0, 0
+
+    existing = {}
+    device_ids = list(series)
+    for i in range(0, len(device_ids), 100):
+        request_items = {TABLE_NAME: {"Keys": [_ddb_key(f"DEVICE#{d}", DETECTOR_SK) for d in device_ids[i:i + 100]], "ConsistentRead": True}}
+        while request_items:
+            response = dynamodb_client.batch_get_item(RequestItems=request_items)
+            for raw in response.get("Responses", {}).get(TABLE_NAME, []):
+                item = {k: deserializer.deserialize(v) for k, v in raw.items()}
+                existing[item["DeviceId"]] = item
+            request_items = response.get("UnprocessedKeys") or {}
+
+    with ThreadPoolExecutor(max_workers=CASCADE_MAX_WORKERS) as executor:
+        futures = [executor.submit(_detect_device_anomalies, d, s, existing.get(d)) for d, s in series.items()]
+        alerts = [alert for future in futures for alert in future.result()]
+
+    serializer = TypeSerializer()
+    requests = [{"PutRequest": {"Item": {k: serializer.serialize(v) for k, v in alert.items()}}} for alert in alerts]
+    unprocessed = []
+    for i in range(0, len(requests), CASCADE_BATCH_SIZE):
+        unprocessed.extend(_batch_write_requests(TABLE_NAME, requests[i:i + CASCADE_BATCH_SIZE]))
+    if unprocessed:
+        logger.error(f"{len(unprocessed)} alerts could not be written")
+    logger.info(f"Anomaly detection evaluated {len(series)} devices, raised {len(alerts)} alerts")
+    return len(series), len(alerts) - len(unprocessed)
+
+
+def query_device_alerts(device_id, start_dt, end_dt, status=None):
+    """Key-range query over a device's ALERT# items, newest first."""
+    query_params = {
+        "KeyConditionExpression": Key("PK").eq(f"DEVICE#{device_id}") & Key("SK").between(
+            f"ALERT#{format_runtime_timestamp(start_dt)}", f"ALERT#{format_runtime_timestamp(end_dt)}~"
+        ),
+        "ScanIndexForward": False
+    }
+    if status:
+        query_params["FilterExpression"] = Attr("AlertStatus").eq(status.upper())
+    alerts = []
+    while True:
+        response = table.query(**query_params)
+        alerts.extend(simplify(item) for item in response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return alerts
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+# ============================================================================
+# DEVICE CONFIG POINTER AND HISTORY
+# ============================================================================
+#
+# Every config write is one transaction of three items under the device partition:
+#   CONFIG#<version>#<created>          the config itself (key layout unchanged)
+#   CONFIG_HISTORY#<created>#<version>  time-ordered history entry, paginated newest first
+#   CONFIG_CURRENT                      pointer to the latest config; only ever moves forward in time
+# Bulk applies record progress on CONFIG_APPLY#<jobId>/META. Applies too large to finish
+# within the API Gateway timeout are queued: the device IDs are staged on
+# CONFIG_APPLY#<jobId>/DEVICES#<n> and the function invokes itself asynchronously.
+# A running job holds a lease that every chunk renews; a job whose lease ran out (the
+# invocation crashed or timed out) is re-queued by GET /configs/apply/{jobId} and resumes
+# idempotently, because its configs are written with the job's CreatedDate.
+
+CONFIG_CURRENT_SK = "CONFIG_CURRENT"
+CONFIG_HISTORY_PREFIX = "CONFIG_HISTORY#"
+CONFIG_WRITE_ITEMS = 3
+CONFIG_POINTER_FIELDS = ("DeviceId", "ConfigVersion", "ConfigData", "AppliedBy", "Status", "CreatedDate", "CreatedBy")
+CONFIG_APPLY_MAX_DEVICES = 10000
+CONFIG_APPLY_WORKERS = 4
+# ~1,000 devices is ~30 transactions across CONFIG_APPLY_WORKERS, well inside 29s
+CONFIG_APPLY_SYNC_MAX_DEVICES = int(os.environ.get("CONFIG_APPLY_SYNC_MAX_DEVICES", "1000"))
+CONFIG_APPLY_STAGE_CHUNK = 1000
+CONFIG_APPLY_LEASE_SECONDS = int(os.environ.get("CONFIG_APPLY_LEASE_SECONDS", "300"))
+
+
+def build_config_write_items(config_item, timestamp):
+    """Transaction items for one config write: the config, its history entry and the current pointer."""
+    summary = {field: config_item[field] for field in CONFIG_POINTER_FIELDS if config_item.get(field) is not None}
+    summary["ConfigSK"] = config_item["SK"]
+    history_item = {
+        **summary,
+        "PK": config_item["PK"],
+        "SK": f"{CONFIG_HISTORY_PREFIX}{config_item['CreatedDate']}#{config_item['ConfigVersion']}",
+        "EntityType": "CONFIG_HISTORY"
+    }
+    pointer_item = {**summary, "PK": config_item["PK"], "SK": CONFIG_CURRENT_SK, "EntityType": "CONFIG_CURRENT", "UpdatedDate": timestamp}
+    return [
+        {"Put": {
+            "TableName": TABLE_NAME,
+            "Item": _serialize_item(config_item),
+            "ConditionExpression": "attribute_not_exists(PK) AND attribute_not_exists(SK)"
+        }},
+        {"Put": {"TableName": TABLE_NAME, "Item": _serialize_item(history_item)}},
+        {"Put": {
+            "TableName": TABLE_NAME,
+            "Item": _serialize_item(pointer_item),
+            "ConditionExpression": "attribute_not_exists(PK) OR CreatedDate <= :created",
+            "ExpressionAttributeValues": {":created": {"S": config_item["CreatedDate"]}}
+        }}
+    ]
+
+
+def write_device_config(config_item):
+    """
+    Write a config together with its history entry and current pointer.
+    A back-dated config (older than the current one) is stored without moving the pointer.
+    Returns (pointer_moved, error_code) where error_code is "DUPLICATE" or None.
+    """
+    transact_items = build_config_write_items(config_item, datetime.utcnow().isoformat() + "Z")
+    try:
+        dynamodb_client.transact_write_items(TransactItems=transact_items)
+        return True, None
+    except ClientError as e:
+        reasons = [reason.get("Code") for reason in e.response.get("CancellationReasons", [])]
+        if e.response["Error"]["Code"] != "TransactionCanceledException" or len(reasons) != CONFIG_WRITE_ITEMS:
+            raise
+        if reasons[0] == "ConditionalCheckFailed":
+            return False, "DUPLICATE"
+        if reasons[2] != "ConditionalCheckFailed":
+            raise
+    logger.info(f"Config {config_item['SK']} is older than the current config of {config_item['DeviceId']}; pointer unchanged")
+    dynamodb_client.transact_write_items(TransactItems=transact_items[:2])
+    return False, None
+
+
+def get_current_config(device_id):
+    """
+    Return the CONFIG_CURRENT pointer for a device (None if it has no configs).
+    Devices configured before the pointer existed are resolved once from their
+    CONFIG# items and the pointer is written for next time.
+    """
+    response = table.get_item(Key={"PK": f"DEVICE#{device_id}", "SK": CONFIG_CURRENT_SK})
+    if "Item" in response:
+        return response["Item"]
+
+    query_params = {"KeyConditionExpression": Key("PK").eq(f"DEVICE#{device_id}") & Key("SK").begins_with("CONFIG#")}
+    latest = None
+    while True:
+        page = table.query(**query_params)
+        for item in page.get("Items", []):
+            if latest is None or item.get("CreatedDate", "") > latest.get("CreatedDate", ""):
+                latest = item
+        if "LastEvaluatedKey" not in page:
+            break
+        query_params["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+    if latest is None:
+        return None
+
+    pointer_item = {field: latest[field] for field in CONFIG_POINTER_FIELDS if latest.get(field) is not None}
+    pointer_item.update({
+        "PK": latest["PK"],
+        "SK": CONFIG_CURRENT_SK,
+        "EntityType": "CONFIG_CURRENT",
+        "ConfigSK": latest["SK"],
+        "UpdatedDate": datetime.utcnow().isoformat() + "Z"
+    })
+    try:
+        table.put_item(Item=pointer_item, ConditionExpression="attribute_not_exists(PK)")
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+    return pointer_item
+
+
+def query_config_history_page(device_id, limit, next_token=None):
+    """Newest-first page of CONFIG_HISTORY entries. Returns (items, next_token, error)."""
+    cursor_scope = f"{CONFIG_HISTORY_PREFIX}{device_id}"
+    query_params = {
+        "KeyConditionExpression": Key("PK").eq(f"DEVICE#{device_id}") & Key("SK").begins_with(CONFIG_HISTORY_PREFIX),
+        "ScanIndexForward": False,
+        "Limit": limit
+    }
+    if next_token:
+        start_key, error = decode_install_cursor(next_token, cursor_scope)
+        if error:
+            return None, None, error
+        query_params["ExclusiveStartKey"] = start_key
+
+    response = table.query(**query_params)
+    last_key = response.get("LastEvaluatedKey")
+    token = encode_install_cursor(cursor_scope, last_key) if last_key else None
+    return response.get("Items", []), token, None
+
+
+def format_config_entry(item):
+    """API shape for CONFIG_CURRENT and CONFIG_HISTORY items."""
+    item = simplify(item)
+    return {
+        "deviceId": item.get("DeviceId"),
+        "configVersion": item.get("ConfigVersion"),
+        "configData": item.get("ConfigData"),
+        "appliedBy": item.get("AppliedBy"),
+        "status": item.get("Status"),
+        "createdDate": item.get("CreatedDate"),
+        "configSK": item.get("ConfigSK")
+    }
+
+
+def sync_config_pointer(pk, sk, updated_item):
+    """After a PUT on a config, refresh its history entry, and the pointer if it points at that config."""
+    summary = {field: updated_item[field] for field in CONFIG_POINTER_FIELDS
+               if field not in ("DeviceId", "CreatedDate") and updated_item.get(field) is not None}
+    if not summary:
+        return
+    _, version, created = sk.split("#", 2)
+    targets = (
+        ({"PK": pk, "SK": f"{CONFIG_HISTORY_PREFIX}{created}#{version}"}, "attribute_exists(PK)"),
+        ({"PK": pk, "SK": CONFIG_CURRENT_SK}, "ConfigSK = :config_sk")
+    )
+    for key, condition in targets:
+        values = {f":{field}": value for field, value in summary.items()}
+        if ":config_sk" in condition:
+            values[":config_sk"] = sk
+        try:
+            table.update_item(
+                Key=key,
+                UpdateExpression="SET " + ", ".join(f"#{field} = :{field}" for field in summary),
+                ConditionExpression=condition,
+                ExpressionAttributeNames={f"#{field}": field for field in summary},
+                ExpressionAttributeValues=values
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+
+def remove_config_pointer(pk, sk):
+    """After a config is deleted, drop its history entry and clear the pointer if it pointed at it."""
+    _, version, created = sk.split("#", 2)
+    table.delete_item(Key={"PK": pk, "SK": f"{CONFIG_HISTORY_PREFIX}{created}#{version}"})
+    try:
+        # The next GET /configs/current re-resolves the pointer from the remaining configs
+        table.delete_item(
+            Key={"PK": pk, "SK": CONFIG_CURRENT_SK},
+            ConditionExpression="ConfigSK = :config_sk",
+            ExpressionAttributeValues={":config_sk": sk}
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def build_device_config_item(device_id, config_version, config_data, applied_by, status, timestamp):
+    """A CONFIG item as POST /devices would create it."""
+    item = {
+        "EntityType": "CONFIG",
+        "DeviceId": device_id,
+        "ConfigVersion": config_version,
+        "ConfigData": config_data,
+        "AppliedBy": applied_by,
+        "Status": status,
+        "CreatedDate": timestamp,
+        "UpdatedDate": timestamp,
+        "CreatedBy": applied_by,
+        "UpdatedBy": applied_by
+    }
+    item["PK"], item["SK"] = derive_pk_sk(item)
+    return item
+
+
+def apply_config_chunk(device_ids, config_version, config_data, applied_by, status, timestamp):
+    """
+    Write one config version to several devices in a single transaction
+    (CONFIG_WRITE_ITEMS per device). Like write_device_config, a device whose current
+    config is newer gets the config and history entry without moving its pointer, and
+    a device that already has this exact config (a resumed job) counts as applied.
+    Devices whose items fail otherwise are reported and the rest of the chunk is retried.
+    Returns (applied, errors).
+    """
+    pending = list(device_ids)
+    applied = []
+    errors = []
+    keep_pointer = set()
+    attempt = 0
+    while pending:
+        transact_items = []
+        owners = []  # (position in pending, position of the item in the device's write)
+        for position, device_id in enumerate(pending):
+            config_item = build_device_config_item(device_id, config_version, config_data, applied_by, status, timestamp)
+            write_items = build_config_write_items(config_item, timestamp)
+            if device_id in keep_pointer:
+                write_items = write_items[:2]
+            transact_items.extend(write_items)
+            owners.extend((position, item_position) for item_position in range(len(write_items)))
+        try:
+            dynamodb_client.transact_write_items(TransactItems=transact_items)
+            applied.extend(pending)
+            break
+        except ClientError as e:
+            failed_positions = {}
+            for index, reason in enumerate(e.response.get("CancellationReasons", [])):
+                if reason.get("Code") not in (None, "None") and index < len(owners):
+                    position, item_position = owners[index]
+                    failed_positions.setdefault(position, (item_position, reason.get("Code")))
+
+            attempt += 1
+            if e.response["Error"]["Code"] != "TransactionCanceledException" or not failed_positions or attempt > CASCADE_MAX_RETRIES:
+                message = e.response["Error"].get("Message", str(e))
+                logger.error(f"Config apply transaction failed: {message}")
+                errors.extend({"deviceId": device_id, "error": f"Database error: {message}"} for device_id in pending)
+                break
+            if all(code in ("TransactionConflict", "ThrottlingError") for _, code in failed_positions.values()):
+                time.sleep(min(0.05 * (2 ** attempt), 1.0))
+                continue
+
+            retry = set()
+            for position, (item_position, code) in failed_positions.items():
+                device_id = pending[position]
+                if code != "ConditionalCheckFailed":
+                    errors.append({"deviceId": device_id, "error": f"Transaction failed: {code}"})
+                elif item_position == 0:
+                    # This config was already written for the device by an earlier run of the job
+                    applied.append(device_id)
+                else:
+                    logger.info(f"{device_id} has a newer config than {config_version}; pointer unchanged")
+                    keep_pointer.add(device_id)
+                    retry.add(position)
+            pending = [device_id for position, device_id in enumerate(pending) if position not in failed_positions or position in retry]
+        except Exception as e:
+            logger.error(f"Unexpected error in config apply transaction: {str(e)}")
+            errors.extend({"deviceId": device_id, "error": f"Unexpected error: {str(e)}"} for device_id in pending)
+            break
+    return applied, errors
+
+
+def record_config_apply_progress(job_id, applied, failed):
+    """Add a chunk's outcome to the running totals on the progress record and renew the job's lease."""
+    table.update_item(
+        Key={"PK": f"CONFIG_APPLY#{job_id}", "SK": "META"},
+        UpdateExpression="ADD Applied :applied, Failed :failed SET UpdatedDate = :now, LeaseExpiresAt = :lease",
+        ExpressionAttributeValues={
+            ":applied": applied,
+            ":failed": failed,
+            ":now": datetime.utcnow().isoformat() + "Z",
+            ":lease": int(time.time()) + CONFIG_APPLY_LEASE_SECONDS
+        }
+    )
+
+
+def apply_config_to_devices(job_id, device_ids, config_version, config_data, applied_by, status, created_date=None):
+    """
+    Push one config version to many devices: existence check in batch_get_item
+    chunks, then transactional chunks written in parallel, with running totals on the
+    CONFIG_APPLY#<jobId> progress record. Queued jobs pass their created_date: their
+    progress record already exists and the configs are written with that timestamp, so
+    a resumed job does not write them twice. Returns the final progress summary.
+    """
+    timestamp = created_date or datetime.utcnow().isoformat() + "Z"
+    if created_date is None:
+        table.put_item(Item={
+            "PK": f"CONFIG_APPLY#{job_id}",
+            "SK": "META",
+            "EntityType": "CONFIG_APPLY",
+            "JobId": job_id,
+            "ConfigVersion": config_version,
+            "AppliedBy": applied_by,
+            "Total": len(device_ids),
+            "Applied": 0,
+            "Failed": 0,
+            "Status": "RUNNING",
+            "CreatedDate": timestamp,
+            "UpdatedDate": timestamp
+        })
+
+    existing = set()
+    for i in range(0, len(device_ids), BULK_DEVICE_CHUNK_SIZE):
+        existing |= _existing_device_ids(device_ids[i:i + BULK_DEVICE_CHUNK_SIZE])
+    errors = [{"deviceId": device_id, "error": f"Device {device_id} not found"}
+              for device_id in device_ids if device_id not in existing]
+    if errors:
+        record_config_apply_progress(job_id, 0, len(errors))
+    eligible = [device_id for device_id in device_ids if device_id in existing]
+
+    per_transaction = CASCADE_TRANSACT_SIZE // CONFIG_WRITE_ITEMS
+    applied_total = 0
+
+    def run_chunk(chunk):
+        applied, chunk_errors = apply_config_chunk(chunk, config_version, config_data, applied_by, status, timestamp)
+        record_config_apply_progress(job_id, len(applied), len(chunk_errors))
+        return applied, chunk_errors
+
+    chunks = [eligible[i:i + per_transaction] for i in range(0, len(eligible), per_transaction)]
+    with ThreadPoolExecutor(max_workers=CONFIG_APPLY_WORKERS) as executor:
+        for applied, chunk_errors in executor.map(run_chunk, chunks):
+            applied_total += len(applied)
+            errors.extend(chunk_errors)
+
+    final_status = "COMPLETED" if not errors else ("FAILED" if not applied_total else "COMPLETED_WITH_ERRORS")
+    result = table.update_item(
+        Key={"PK": f"CONFIG_APPLY#{job_id}", "SK": "META"},
+        UpdateExpression="SET #status = :status, Errors = :errors, CompletedDate = :now, UpdatedDate = :now REMOVE LeaseExpiresAt",
+        ExpressionAttributeNames={"#status": "Status"},
+        ExpressionAttributeValues={
+            ":status": final_status,
+            ":errors": errors[:100],
+            ":now": datetime.utcnow().isoformat() + "Z"
+        },
+        ReturnValues="ALL_NEW"
+    )
+    logger.info(f"Config apply {job_id}: {applied_total} applied, {len(errors)} failed of {len(device_ids)}")
+    return format_config_apply_job(result["Attributes"])
+
+
+def queue_config_apply(job_id, device_ids, config_version, config_data, applied_by, status):
+    """
+    Stage a large config push for the async job: a QUEUED progress record carrying the
+    config, the device IDs in CONFIG_APPLY_STAGE_CHUNK-sized DEVICES#<n> items, then an
+    asynchronous {"job": "config-apply"} invocation of this function.
+    Returns the queued progress summary.
+    """
+    timestamp = datetime.utcnow().isoformat() + "Z"
+    for number, start in enumerate(range(0, len(device_ids), CONFIG_APPLY_STAGE_CHUNK)):
+        table.put_item(Item={
+            "PK": f"CONFIG_APPLY#{job_id}",
+            "SK": f"DEVICES#{number:04d}",
+            "EntityType": "CONFIG_APPLY_DEVICES",
+            "DeviceIds": device_ids[start:start + CONFIG_APPLY_STAGE_CHUNK]
+        })
+    job_item = {
+        "PK": f"CONFIG_APPLY#{job_id}",
+        "SK": "META",
+        "EntityType": "CONFIG_APPLY",
+        "JobId": job_id,
+        "ConfigVersion": config_version,
+        "ConfigData": config_data,
+        "ConfigStatus": status,
+        "AppliedBy": applied_by,
+        "Total": len(device_ids),
+        "Applied": 0,
+        "Failed": 0,
+        "Status": "QUEUED",
+        "CreatedDate": timestamp,
+        "UpdatedDate": timestamp
+    }
+    table.put_item(Item=job_item)
+    lambda_client.invoke(
+        FunctionName=os.environ["AWS_LAMBDA_FUNCTION_NAME"],
+        InvocationType="Event",
+        Payload=json.dumps({"job": "config-apply", "jobId": job_id})
+    )
+    return format_config_apply_job(job_item)
+
+
+def config_apply_lease_expired(item):
+    """True for a RUNNING job whose holder stopped renewing its lease (crashed or timed out)."""
+    return item.get("Status") == "RUNNING" and "LeaseExpiresAt" in item and int(item["LeaseExpiresAt"]) < time.time()
+
+
+def requeue_config_apply_job(job_id):
+    """Invoke the job again; the claim in run_config_apply_job decides whether it may run."""
+    lambda_client.invoke(
+        FunctionName=os.environ["AWS_LAMBDA_FUNCTION_NAME"],
+        InvocationType="Event",
+        Payload=json.dumps({"job": "config-apply", "jobId": job_id})
+    )
+
+
+def run_config_apply_job(job_id):
+    """
+    Run a queued config push. The claim is conditional - the job must be QUEUED, or
+    RUNNING with an expired lease - so a redelivered async event does not apply the
+    config twice while its first run is alive. A reclaimed job restarts its totals and
+    resumes from the staged device IDs.
+    Returns the final progress summary (None if the job could not be claimed).
+    """
+    now = int(time.time())
+    try:
+        job = table.update_item(
+            Key={"PK": f"CONFIG_APPLY#{job_id}", "SK": "META"},
+            UpdateExpression="SET #status = :running, UpdatedDate = :now, LeaseExpiresAt = :lease, "
+                             "Applied = :zero, Failed = :zero ADD Attempts :one",
+            ConditionExpression="#status = :queued OR (#status = :running AND LeaseExpiresAt < :epoch)",
+            ExpressionAttributeNames={"#status": "Status"},
+            ExpressionAttributeValues={
+                ":running": "RUNNING",
+                ":queued": "QUEUED",
+                ":now": datetime.utcnow().isoformat() + "Z",
+                ":epoch": now,
+                ":lease": now + CONFIG_APPLY_LEASE_SECONDS,
+                ":zero": 0,
+                ":one": 1
+            },
+            ReturnValues="ALL_NEW"
+        )["Attributes"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        logger.warning(f"Config apply job {job_id} is not queued or is still running; skipping")
+        return None
+
+    staged = table.query(
+        KeyConditionExpression=Key("PK").eq(f"CONFIG_APPLY#{job_id}") & Key("SK").begins_with("DEVICES#"),
+        ConsistentRead=True
+    ).get("Items", [])
+    device_ids = [device_id for item in staged for device_id in item["DeviceIds"]]
+    result = apply_config_to_devices(
+        job_id, device_ids, job["ConfigVersion"], job["ConfigData"], job["AppliedBy"], job.get("ConfigStatus", "active"),
+        created_date=job["CreatedDate"]
+    )
+    for item in staged:
+        table.delete_item(Key={"PK": item["PK"], "SK": item["SK"]})
+    return result
+
+
+def format_config_apply_job(item):
+    """API shape for a CONFIG_APPLY progress record."""
+    item = simplify(item)
+    return {
+        "jobId": item.get("JobId"),
+        "configVersion": item.get("ConfigVersion"),
+        "appliedBy": item.get("AppliedBy"),
+        "status": item.get("Status"),
+        "total": item.get("Total"),
+        "applied": item.get("Applied"),
+        "failed": item.get("Failed"),
+        "errors": item.get("Errors", []),
+        "createdDate": item.get("CreatedDate"),
+        "completedDate": item.get("CompletedDate")
+    }
+
+
+# ============================================================================
+# REPAIR ANALYTICS
+# ============================================================================
+#
+# REPAIR items carry RepairDate (= CreatedDate), which makes them the only members of
+# the sparse RepairDateIndex (EntityType + RepairDate). Analytics read repairs for a
+# date range from that index, join device type / installation / district with batch
+# gets, aggregate with numpy and cache the result on ANALYTICS#REPAIRS/<groupBy>#<range>.
+
+REPAIR_DATE_INDEX = "RepairDateIndex"
+REPAIR_GROUP_BY = ("deviceType", "installation", "district")
+REPAIR_ANALYTICS_FRESH_SECONDS = int(os.environ.get("REPAIR_ANALYTICS_FRESH_SECONDS", "900"))
+REPAIR_ANALYTICS_MAX_CACHE_BYTES = 350000
+
+
+def query_repairs_in_range(from_date, to_date):
+    """All REPAIR items with RepairDate in [from_date, to_date] from the sparse repair index."""
+    query_params = {
+        "IndexName": REPAIR_DATE_INDEX,
+        "KeyConditionExpression": Key("EntityType").eq("REPAIR") & Key("RepairDate").between(from_date, to_date),
+        "ProjectionExpression": "DeviceId, RepairDate, Cost"
+    }
+    repairs = []
+    while True:
+        response = table.query(**query_params)
+        repairs.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return repairs
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def _batch_get_attributes(keys, projection):
+    """batch_get_item over (pk, sk) keys in chunks of 100; returns {pk: deserialized item}."""
+    deserializer = TypeDeserializer()
+    items = {}
+    keys = list(keys)
+    for i in range(0, len(keys), 100):
+        request_items = {TABLE_NAME: {
+            "Keys": [_ddb_key(pk, sk) for pk, sk in keys[i:i + 100]],
+            "ProjectionExpression": projection
+        }}
+        while request_items:
+            response = dynamodb_client.batch_get_item(RequestItems=request_items)
+            for item in response.get("Responses", {}).get(TABLE_NAME, []):
+                items[item["PK"]["S"]] = {k: deserializer.deserialize(v) for k, v in item.items()}
+            request_items = response.get("UnprocessedKeys") or {}
+    return items
+
+
+def repair_group_labels(device_ids, group_by):
+    """Map each device ID to its group label for group_by ("unknown" when it cannot be resolved)."""
+    devices = _batch_get_attributes(
+        [(f"DEVICE#{device_id}", "META") for device_id in device_ids],
+        "PK, DeviceType, deviceType, linkedInstallationId"
+    )
+    labels = {}
+    for device_id in device_ids:
+        device = devices.get(f"DEVICE#{device_id}", {})
+        if group_by == "deviceType":
+            labels[device_id] = device.get("DeviceType") or device.get("deviceType") or "unknown"
+        else:
+            labels[device_id] = device.get("linkedInstallationId") or "unknown"
+    if group_by != "district":
+        return labels
+
+    install_ids = {label for label in labels.values() if label != "unknown"}
+    installs = _batch_get_attributes(
+        [(f"INSTALL#{install_id}", "META") for install_id in install_ids],
+        "PK, districtId, DistrictId"
+    )
+    districts = {pk.split("#", 1)[1]: item.get("districtId") or item.get("DistrictId") for pk, item in installs.items()}
+    return {device_id: districts.get(label) or "unknown" for device_id, label in labels.items()}
+
+
+def aggregate_repair_stats(group_ids, device_ids, timestamps, costs, group_count):
+    """
+    Per-group totals from parallel per-repair arrays (group index, device index,
+    epoch seconds, cost). MTBF is the mean gap between consecutive repairs of the
+    same device, pooled over the group's devices.
+    Returns a list of (repairs, total_cost, devices, gap_sum, gap_count) per group.
+    """
+    if np is not None:
+        groups = np.asarray(group_ids, dtype=np.int64)
+        devices = np.asarray(device_ids, dtype=np.int64)
+        ts = np.asarray(timestamps, dtype=np.float64)
+        cost = np.asarray(costs, dtype=np.float64)
+        order = np.lexsort((ts, devices))
+        groups, devices, ts, cost = groups[order], devices[order], ts[order], cost[order]
+        same_device = np.r_[False, devices[1:] == devices[:-1]]
+        gaps = np.r_[0.0, np.diff(ts)]
+        repairs = np.bincount(groups, minlength=group_count)
+        total_cost = np.bincount(groups, weights=cost, minlength=group_count)
+        device_count = np.bincount(groups[~same_device], minlength=group_count)
+        gap_sum = np.bincount(groups[same_device], weights=gaps[same_device], minlength=group_count)
+        gap_count = np.bincount(groups[same_device], minlength=group_count)
+        return list(zip(repairs.tolist(), total_cost.tolist(), device_count.tolist(), gap_sum.tolist(), gap_count.tolist()))
+
+    stats = [[0, 0.0, 0, 0.0, 0] for _ in range(group_count)]
+    previous = {}
+    for group, device, ts, cost in sorted(zip(group_ids, device_ids, timestamps, costs), key=lambda r: (r[1], r[2])):
+        row = stats[group]
+        row[0] += 1
+        row[1] += cost
+        if device in previous:
+            row[3] += ts - previous[device]
+            row[4] += 1
+        else:
+            row[2] += 1
+        previous[device] = ts
+    return [tuple(row) for row in stats]
+
+
+def compute_repair_analytics(group_by, from_date, to_date):
+    """Repair cost, repairs per device and MTBF grouped by device type, installation or district."""
+    repairs = query_repairs_in_range(from_date, to_date)
+    device_index = {}
+    rows = []
+    for repair in repairs:
+        repair_dt = parse_runtime_timestamp(repair.get("RepairDate"))
+        if repair_dt is None or not repair.get("DeviceId"):
+            continue
+        device = device_index.setdefault(repair["DeviceId"], len(device_index))
+        rows.append((device, repair_dt.timestamp(), float(repair.get("Cost") or 0)))
+
+    labels = repair_group_labels(list(device_index), group_by)
+    group_names = sorted(set(labels.values()))
+    group_index = {name: i for i, name in enumerate(group_names)}
+    device_groups = {device: group_index[labels[device_id]] for device_id, device in device_index.items()}
+
+    stats = aggregate_repair_stats(
+        [device_groups[device] for device, _, _ in rows],
+        [device for device, _, _ in rows],
+        [ts for _, ts, _ in rows],
+        [cost for _, _, cost in rows],
+        len(group_names)
+    ) if rows else []
+
+    groups = []
+    for name, (repair_count, total_cost, device_count, gap_sum, gap_count) in zip(group_names, stats):
+        groups.append({
+            "group": name,
+            "repairCount": int(repair_count),
+            "devicesRepaired": int(device_count),
+            "totalCost": round(total_cost, 2),
+            "averageCost": round(total_cost / repair_count, 2) if repair_count else None,
+            "repairsPerDevice": round(repair_count / device_count, 3) if device_count else None,
+            "mtbfDays": round(gap_sum / gap_count / 86400, 2) if gap_count else None
+        })
+    groups.sort(key=lambda g: g["totalCost"], reverse=True)
+    return {
+        "groupBy": group_by,
+        "from": from_date,
+        "to": to_date,
+        "repairCount": len(rows),
+        "totalCost": round(sum(cost for _, _, cost in rows), 2),
+        "groups": groups
+    }
+
+
+def get_repair_analytics(group_by, from_date, to_date, refresh=False):
+    """Cached compute_repair_analytics: reuse a result younger than REPAIR_ANALYTICS_FRESH_SECONDS."""
+    cache_key = {"PK": "ANALYTICS#REPAIRS", "SK": f"{group_by}#{from_date}#{to_date}"}
+    now = int(time.time())
+    if not refresh:
+        cached = table.get_item(Key=cache_key).get("Item")
+        if cached and int(cached.get("ComputedAt", 0)) + REPAIR_ANALYTICS_FRESH_SECONDS > now:
+            result = json.loads(zlib.decompress(bytes(cached["Result"])).decode("utf-8"))
+            result.update({"cached": True, "computedAt": int(cached["ComputedAt"])})
+            return result
+
+    result = compute_repair_analytics(group_by, from_date, to_date)
+    blob = zlib.compress(json.dumps(result).encode("utf-8"))
+    if len(blob) <= REPAIR_ANALYTICS_MAX_CACHE_BYTES:
+        table.put_item(Item={
+            **cache_key,
+            "EntityType": "ANALYTICS",
+            "Result": blob,
+            "ComputedAt": now,
+            "ttl": now + 7 * 86400
+        })
+    else:
+        logger.warning(f"Repair analytics for {group_by} {from_date}..{to_date} too large to cache ({len(blob)} bytes)")
+    result.update({"cached": False, "computedAt": now})
+    return result
@@ -3,8 +3,10 @@ import os
 import boto3
 import logging
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 import re
+from boto3.dynamodb.conditions import Attr, Key
 from shared.response_utils import SuccessResponse, ErrorResponse
 from pydantic import BaseModel, ValidationError, Field
 
@@ -12,6 +14,10 @@ from pydantic import BaseModel, ValidationError, Field
 TABLE_NAME = os.environ.get("TABLE_NAME", "regions")
 dynamodb = boto3.resource("dynamodb")
 table = dynamodb.Table(TABLE_NAME)
+lambda_client = boto3.client("lambda")
+# Installations (INSTALL#<id>/META) carry denormalized region names that must follow renames
+DEVICES_TABLE_NAME = os.environ.get("DEVICES_TABLE", "v_devices_dev")
+devices_table = dynamodb.Table(DEVICES_TABLE_NAME)
 
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
@@ -224,6 +230,10 @@ class RegionDetails(BaseModel):
 def lambda_handler(event, context):
     logger.info(f"Received event: {json.dumps(event, default=str)}")
     
+    # Queued region rename propagation (async self-invocation from PUT)
+    if event.get("job") == "propagate-region-name":
+        return {"statusCode": 200, "body": json.dumps(run_region_name_propagation(event))}
+    
     # Try multiple ways to extract the HTTP method
     method = (
         event.get("httpMethod") or 
@@ -745,6 +755,10 @@ def lambda_handler(event, context):
             item["SK"] = sk
 
             try:
+                old_name = table.get_item(
+                    Key={"PK": item["PK"], "SK": item["SK"]},
+                    ProjectionExpression="RegionName"
+                ).get("Item", {}).get("RegionName")
                 response = table.update_item(
                     Key={"PK": item["PK"], "SK": item["SK"]},
                     UpdateExpression="SET " + ", ".join(f"{k} = :{k}" for k in item if k not in ["PK", "SK"]),
@@ -760,8 +774,22 @@ def lambda_handler(event, context):
                         "timestamp": sysdate,
                         "item": item,
                         "new_values": response.get("Attributes", {})
-                    }))
-                return SuccessResponse.build({"message": "updated", "item": transform_items_to_json([item])})
+                    }, default=str))
+
+                result = {"message": "updated", "item": transform_items_to_json([item])}
+
+                # Region renamed - the denormalized name on its installations is rewritten in the background
+                if old_name != region_name:
+                    region_path = [state_code, district_code, mandal_code, village_code][:list(REGION_INSTALL_ATTRIBUTES).index(region_type)]
+                    try:
+                        queue_region_name_propagation(region_type, region_path + [region_code], {"PK": pk, "SK": sk})
+                        result["installationsUpdate"] = "queued"
+                    except Exception as e:
+                        logger.error(f"Could not queue region name propagation for {region_type} {region_code}: {e}")
+                        result["installationsUpdate"] = "failed"
+                        result["propagationError"] = str(e)
+
+                return SuccessResponse.build(result)
             except Exception as e:
                 logger.error(f"DynamoDB update_item failed: {e}")
                 if enable_audit:
@@ -901,6 +929,123 @@ def lambda_handler(event, context):
         return ErrorResponse.build("Internal server error", 500)
 
 
+# Installations are found through the devices table's InstallRegionIndex, created by
+# scripts/create_install_indexes.py; renames cannot be propagated until it is ACTIVE.
+DEVICES_INSTALL_REGION_INDEX = "InstallRegionIndex"  # devices table: stateId (HASH) + regionCombo (RANGE)
+REGION_PROPAGATION_WORKERS = 8
+
+# Region type -> (installation id attribute, installation name attribute), top level first
+REGION_INSTALL_ATTRIBUTES = {
+    "STATE": ("stateId", "stateName"),
+    "DISTRICT": ("districtId", "districtName"),
+    "MANDAL": ("mandalId", "mandalName"),
+    "VILLAGE": ("villageId", "villageName"),
+    "HABITATION": ("habitationId", "habitationName")
+}
+
+# Installations keep region ids as the client sent them: bare ("TS"), dashed ("STATE-TS")
+# or hashed ("STATE#TS"), the same forms fetch_region_names strips in the devices API
+REGION_ID_PREFIXES = {
+    "STATE": ("STATE-", "STATE#"),
+    "DISTRICT": ("DIST-", "DISTRICT#"),
+    "MANDAL": ("MANDAL-", "MANDAL#"),
+    "VILLAGE": ("VILLAGE-", "VILLAGE#"),
+    "HABITATION": ("HAB-", "HABITATION#")
+}
+
+
+def normalize_region_code(region_type, code):
+    for prefix in REGION_ID_PREFIXES[region_type]:
+        code = code.replace(prefix, "")
+    return code
+
+
+def queue_region_name_propagation(region_type, region_path, region_key):
+    """Hand a rename to an async invocation of this Lambda so the PUT does not wait on every installation."""
+    lambda_client.invoke(
+        FunctionName=os.environ["AWS_LAMBDA_FUNCTION_NAME"],
+        InvocationType="Event",
+        Payload=json.dumps({
+            "job": "propagate-region-name",
+            "regionType": region_type,
+            "regionPath": region_path,
+            "regionKey": region_key
+        })
+    )
+
+
+def run_region_name_propagation(job):
+    """
+    Push a region's current name to its installations. The name is re-read from the
+    regions table, so out-of-order or redelivered events still converge on the latest name.
+    """
+    region = table.get_item(Key=job["regionKey"], ConsistentRead=True).get("Item")
+    if not region:
+        logger.warning(f"Region {job['regionKey']} no longer exists; nothing to propagate")
+        return {"installationsUpdated": 0}
+    updated = propagate_region_name_to_installations(job["regionType"], job["regionPath"], region.get("RegionName"))
+    return {"installationsUpdated": updated}
+
+
+def propagate_region_name_to_installations(region_type, region_path, region_name):
+    """
+    Rewrite the denormalized region name on every installation in a renamed region.
+
+    Installations store stateName..habitationName on INSTALL#<id>/META at creation time,
+    so a rename must be pushed to them. Region codes are only unique under their parent,
+    so region_path is the full list of codes from the state down to the renamed region;
+    installations are selected through the devices table's InstallRegionIndex
+    (stateId + regionCombo "<state>#<district>#<mandal>#<village>#<habitation>"), once per
+    region id form in REGION_ID_PREFIXES.
+    Returns the number of installations updated.
+    """
+    _, name_attr = REGION_INSTALL_ATTRIBUTES[region_type]
+    region_types = list(REGION_INSTALL_ATTRIBUTES)
+    codes = [normalize_region_code(level, code) for level, code in zip(region_types, region_path)]
+
+    install_keys = {}
+    for form in (None, 0, 1):
+        ids = [code if form is None else REGION_ID_PREFIXES[level][form] + code for level, code in zip(region_types, codes)]
+        key_condition = Key("stateId").eq(ids[0])
+        if len(ids) == len(REGION_INSTALL_ATTRIBUTES):
+            key_condition = key_condition & Key("regionCombo").eq("#".join(ids))
+        elif len(ids) > 1:
+            key_condition = key_condition & Key("regionCombo").begins_with("#".join(ids) + "#")
+
+        query_params = {
+            "IndexName": DEVICES_INSTALL_REGION_INDEX,
+            "KeyConditionExpression": key_condition,
+            "FilterExpression": Attr("entityType").eq("INSTALL"),
+            "ProjectionExpression": "PK, SK"
+        }
+        while True:
+            response = devices_table.query(**query_params)
+            install_keys.update((item["PK"], item) for item in response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                break
+            query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    install_keys = list(install_keys.values())
+
+    logger.info(f"Propagating {region_type} {'#'.join(codes)} name to {len(install_keys)} installation(s)")
+
+    def update_installation(key):
+        try:
+            devices_table.update_item(
+                Key={"PK": key["PK"], "SK": key["SK"]},
+                UpdateExpression="SET #name = :name",
+                ExpressionAttributeNames={"#name": name_attr},
+                ExpressionAttributeValues={":name": region_name},
+                ConditionExpression="attribute_exists(PK)"
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to update {name_attr} on {key['PK']}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=REGION_PROPAGATION_WORKERS) as executor:
+        return sum(executor.map(update_installation, install_keys))
+
+
 def handle_get_hierarchy():
     """
     Get complete hierarchical location structure for dropdowns.
@@ -1,14 +1,32 @@
 import json
+import base64
+import csv
 import os
+import re
 import boto3
+import hashlib
 import logging
+import threading
+import time
+import urllib.parse
+import urllib.request
 import uuid
+from collections import OrderedDict
+from io import BytesIO
 from datetime import datetime
 from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from typing import Optional, List, Dict, Any
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from boto3.dynamodb.conditions import Key, Attr
 from shared.response_utils import SuccessResponse, ErrorResponse
 from shared.encryption_utils import prepare_item_for_storage, prepare_item_for_response
+from shared.session_tokens import (
+    PERMISSION_BITS_KEY, SESSION_TOKEN_TTL_SECONDS, PermissionBits, get_session_secret,
+    has_permission_bit, is_session_token, issue_session_token, permission_mask, verify_session_token
+)
 from pydantic import BaseModel, ValidationError, EmailStr, Field
 
 # DynamoDB setup
@@ -16,6 +34,7 @@ TABLE_NAME = os.environ.get("TABLE_NAME", "v_users_dev")
 S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME", "iot-platform-profile-pictures")
 DEV_MODE = os.environ.get("DEV_MODE", "true").lower() == "true"  # Set to "false" in production
 dynamodb = boto3.resource("dynamodb")
+dynamodb_client = boto3.client("dynamodb")
 s3_client = boto3.client("s3")
 table = dynamodb.Table(TABLE_NAME)
 
@@ -33,8 +52,67 @@ ENTITY_TYPE_PERMISSION = "PERMISSION"
 ENTITY_TYPE_USER_ROLE = "USER_ROLE"
 ENTITY_TYPE_ROLE_PERMISSION = "ROLE_PERMISSION"
 ENTITY_TYPE_COMPONENT = "COMPONENT"
+ENTITY_TYPE_LOGIN_ACTIVITY = "LOGIN_ACTIVITY"
 DEFAULT_PAGE_LIMIT = 50
 MAX_PAGE_LIMIT = 100
+# Filtered/searched listings stop after this many index reads and return a cursor,
+# so a rare search term cannot walk the whole index in one request
+USER_LIST_MAX_QUERY_PAGES = 10
+
+# RBAC cache: role name -> permission names, held per Lambda container.
+# Entries expire after RBAC_CACHE_TTL_SECONDS. Every role/permission mutation bumps the
+# RBAC#CATALOG/VERSION item; containers re-read it at most every RBAC_VERSION_CHECK_SECONDS
+# and drop their cache when it has moved.
+RBAC_VERSION_KEY = {"PK": "RBAC#CATALOG", "SK": "VERSION"}
+RBAC_CACHE_TTL_SECONDS = int(os.environ.get("RBAC_CACHE_TTL_SECONDS", "300"))
+RBAC_VERSION_CHECK_SECONDS = int(os.environ.get("RBAC_VERSION_CHECK_SECONDS", "10"))
+# ROLENAME#<name>/META maps a role name to its role id. Until scripts/backfill_role_lookup.py
+# has run, roles without one are found by scan.
+ROLE_NAME_PK_PREFIX = "ROLENAME#"
+ROLE_LOOKUP_SCAN_FALLBACK = os.environ.get("ROLE_LOOKUP_SCAN_FALLBACK", "true").lower() == "true"
+PERMISSION_BITS_MAX_RETRIES = 5
+
+# Verified Firebase ID tokens are cached per container (LRU keyed by SHA-256 of the token)
+# until the token's exp. With FIREBASE_PROJECT_ID set, tokens are verified against a key set
+# prefetched at init and refreshed in the background per the certs' Cache-Control max-age.
+FIREBASE_PROJECT_ID = os.environ.get("FIREBASE_PROJECT_ID")
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+FIREBASE_CERTS_DEFAULT_MAX_AGE = 3600
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get("TOKEN_CACHE_MAX_ENTRIES", "1024"))
+
+# Profile pictures: clients upload originals straight to S3 with a presigned POST. The
+# bucket's ObjectCreated notification (filtered to PROFILE_PICTURE_ORIGINALS_PREFIX) invokes
+# this Lambda, which writes resized variants under PROFILE_PICTURE_VARIANTS_PREFIX and
+# records them on the profile.
+PROFILE_PICTURE_ORIGINALS_PREFIX = "profile-pictures/originals/"
+PROFILE_PICTURE_VARIANTS_PREFIX = "profile-pictures/variants/"
+PROFILE_PICTURE_MAX_BYTES = 5 * 1024 * 1024
+# A small compressed file can declare huge dimensions; refuse to decode beyond this many pixels
+PROFILE_PICTURE_MAX_PIXELS = 25_000_000
+PROFILE_PICTURE_SIZES = {"thumbnail": 128, "medium": 512}
+PROFILE_PICTURE_FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+PROFILE_PICTURE_CONTENT_TYPES = ["image/jpeg", "image/jpg", "image/png", "image/webp"]
+
+# User listing indexes (see scripts/create_user_indexes.py)
+USER_ENTITY_INDEX = "UserEntityIndex"    # entityType (HASH) + createdAt (RANGE)
+USER_ROLE_INDEX = "UserRoleIndex"        # role (HASH) + createdAt (RANGE)
+USER_ACTIVE_INDEX = "UserActiveIndex"    # activeStatus (HASH) + createdAt (RANGE)
+USER_REGION_INDEX = "UserRegionIndex"    # stateId (HASH) + regionCombo (RANGE)
+USER_REGION_LEVELS = ("stateId", "districtId", "mandalId", "villageId")
+USER_INDEX_FIELDS = {"activeStatus", "regionCombo"}
+
+# EMAIL#<normalized email>/META maps an email to its user id and enforces uniqueness.
+# Until scripts/backfill_user_email_index.py has run, users without one are found by scan.
+EMAIL_PK_PREFIX = "EMAIL#"
+EMAIL_LOOKUP_SCAN_FALLBACK = os.environ.get("EMAIL_LOOKUP_SCAN_FALLBACK", "true").lower() == "true"
+RBAC_CATALOG_KEY = {"PK": "RBAC#CATALOG", "SK": "SNAPSHOT"}
+RBAC_CATALOG_MAX_RETRIES = 5
+RBAC_CATALOG_SECTIONS = {
+    ENTITY_TYPE_ROLE: ("roles", "roleId"),
+    ENTITY_TYPE_PERMISSION: ("permissions", "permissionId"),
+    ENTITY_TYPE_COMPONENT: ("components", "componentId")
+}
+_rbac_cache = {"version": None, "checkedAt": 0.0, "roles": {}, "catalog": None}
 
 # Restricted fields that must never be user-modifiable (system-managed only)
 RESTRICTED_FIELDS = {
@@ -151,6 +229,8 @@ class UserProfile(BaseModel):
     department: Optional[str] = Field(default=None, max_length=100)
     timezone: Optional[str] = Field(default="UTC", max_length=50)
     profilePictureUrl: Optional[str] = None
+    profilePictureKey: Optional[str] = None  # System-managed: S3 key of the original
+    profilePictureVariants: Optional[Dict[str, Dict[str, Any]]] = None  # System-managed: resized copies
     address: Address = Field(default_factory=Address)
     preferences: Preferences = Field(default_factory=Preferences)
     createdAt: str
@@ -232,6 +312,107 @@ def simplify(item):
         return v
     return {k: simplify_value(v) for k, v in item.items()}
 
+_verified_tokens = OrderedDict()
+_verified_tokens_lock = threading.Lock()
+
+
+def _token_cache_key(id_token: str) -> str:
+    return hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+
+def get_cached_token_claims(id_token: str) -> Optional[Dict[str, Any]]:
+    """Claims of a previously verified, still unexpired token."""
+    key = _token_cache_key(id_token)
+    with _verified_tokens_lock:
+        entry = _verified_tokens.get(key)
+        if not entry:
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            del _verified_tokens[key]
+            return None
+        _verified_tokens.move_to_end(key)
+        return dict(claims)
+
+
+def cache_token_claims(id_token: str, claims: Dict[str, Any], expires_at: float):
+    """Remember verified claims until expires_at, evicting least recently used entries."""
+    key = _token_cache_key(id_token)
+    with _verified_tokens_lock:
+        _verified_tokens[key] = (dict(claims), expires_at)
+        _verified_tokens.move_to_end(key)
+        while len(_verified_tokens) > TOKEN_CACHE_MAX_ENTRIES:
+            _verified_tokens.popitem(last=False)
+
+
+class FirebaseKeySet:
+    """
+    Google's securetoken signing certificates (kid -> PEM), fetched once and refreshed on a
+    background timer shortly before the Cache-Control max-age runs out. Lambda freezes
+    timers between invocations, so get() also refreshes synchronously when the set is stale.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.certs = {}
+        self.expires_at = 0.0
+        self.lock = threading.Lock()
+        self.timer = None
+
+    @staticmethod
+    def _max_age(cache_control: str) -> int:
+        match = re.search(r"max-age=(\d+)", cache_control or "")
+        return int(match.group(1)) if match else FIREBASE_CERTS_DEFAULT_MAX_AGE
+
+    def refresh(self):
+        with urllib.request.urlopen(self.url, timeout=5) as response:
+            certs = json.loads(response.read())
+            max_age = self._max_age(response.headers.get("Cache-Control"))
+        with self.lock:
+            self.certs = certs
+            self.expires_at = time.time() + max_age
+        logger.info(f"Loaded {len(certs)} Firebase signing keys (max-age {max_age}s)")
+        self._schedule(max_age)
+
+    def _schedule(self, max_age: int):
+        if self.timer:
+            self.timer.cancel()
+        self.timer = threading.Timer(max(60, max_age * 0.9), self._background_refresh)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning(f"Background Firebase key refresh failed: {str(e)}")
+
+    def get(self) -> Dict[str, str]:
+        if time.time() >= self.expires_at:
+            self.refresh()
+        return self.certs
+
+
+firebase_keys = FirebaseKeySet(FIREBASE_CERTS_URL)
+if FIREBASE_PROJECT_ID and not DEV_MODE:
+    try:
+        firebase_keys.refresh()
+    except Exception as e:
+        logger.warning(f"Could not prefetch Firebase signing keys: {str(e)}")
+
+
+def verify_with_prefetched_keys(id_token: str) -> Dict[str, Any]:
+    """Verify a Firebase ID token offline against the prefetched key set."""
+    from google.auth import jwt as google_jwt
+    decoded_token = google_jwt.decode(id_token, certs=firebase_keys.get(), audience=FIREBASE_PROJECT_ID)
+    if decoded_token.get("iss") != f"https://securetoken.google.com/{FIREBASE_PROJECT_ID}":
+        raise ValueError("Token has an unexpected issuer")
+    if not decoded_token.get("sub"):
+        raise ValueError("Token has no subject")
+    decoded_token["uid"] = decoded_token["sub"]
+    return decoded_token
+
+
 def verify_firebase_token(id_token: str) -> Optional[Dict[str, Any]]:
     """
     Verify Firebase ID token and extract claims.
@@ -261,19 +442,28 @@ def verify_firebase_token(id_token: str) -> Optional[Dict[str, Any]]:
         return None
     ```
     """
+    cached_claims = get_cached_token_claims(id_token)
+    if cached_claims:
+        return cached_claims
+    
     try:
         # Try to import firebase_admin
         try:
             from firebase_admin import auth
-            # Attempt real verification
-            decoded_token = auth.verify_id_token(id_token)
-            return {
+            # Attempt real verification (offline when the key set is prefetched)
+            if FIREBASE_PROJECT_ID:
+                decoded_token = verify_with_prefetched_keys(id_token)
+            else:
+                decoded_token = auth.verify_id_token(id_token)
+            claims = {
                 'uid': decoded_token['uid'],
                 'email': decoded_token.get('email'),
                 'email_verified': decoded_token.get('email_verified', False),
                 'name': decoded_token.get('name'),
                 'role': decoded_token.get('role', 'viewer')
             }
+            cache_token_claims(id_token, claims, decoded_token['exp'])
+            return claims
         except ImportError:
             # Fallback for development (INSECURE - for testing only)
             logger.warning("firebase-admin not installed. Using INSECURE token decode for development only!")
@@ -333,6 +523,8 @@ def extract_user_from_event(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
             return None
         
         token = auth_header.replace("Bearer ", "")
+        if is_session_token(token):
+            return get_session_user(token)
         return verify_firebase_token(token)
     except Exception as e:
         logger.error(f"Error extracting user from event: {e}")
@@ -347,6 +539,12 @@ def check_permission(user: Optional[Dict[str, Any]], required_permission: str) -
     if not user:
         return False
     
+    # Session tokens carry the effective permissions as a bitmask
+    if "permissionMask" in user:
+        bit = permission_bits.bit_for(required_permission, user.get("catalogVersion", 0))
+        if has_permission_bit(user, bit):
+            return True
+    
     # Check permissions array directly if present
     user_permissions = user.get('permissions', [])
     if user_permissions and required_permission in user_permissions:
@@ -357,9 +555,8 @@ def check_permission(user: Optional[Dict[str, Any]], required_permission: str) -
     if not user_role:
         return False
     
-    # Get permissions from database for this role
-    db_permissions = get_role_permissions_from_database(user_role)
-    return required_permission in db_permissions
+    # Role permissions come from the per-container cache, falling back to the database
+    return required_permission in get_cached_role_permissions(user_role)
 
 def require_permission(permission: str):
     """
@@ -396,9 +593,39 @@ def get_default_admin_permissions() -> List[str]:
     ]
 
 
+def normalize_role_name(role_name: str) -> str:
+    """Role names are stored lower-case with underscores."""
+    return role_name.lower().replace(" ", "_")
+
+
+def role_name_key(role_name: str) -> Dict[str, str]:
+    """Key of the lookup item mapping a roleName to its roleId."""
+    return {"PK": f"{ROLE_NAME_PK_PREFIX}{normalize_role_name(role_name)}", "SK": "META"}
+
+
+def build_role_name_item(role_name: str, role_id: str) -> Dict[str, Any]:
+    return {**role_name_key(role_name), "roleName": normalize_role_name(role_name), "roleId": role_id}
+
+
+def _serialize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Serialize a plain item into DynamoDB attribute values for the low-level client."""
+    serializer = TypeSerializer()
+    return {k: serializer.serialize(v) for k, v in item.items() if v is not None}
+
+
+def _deserialize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Plain item from low-level attribute values (e.g. the Item on a failed condition check)."""
+    deserializer = TypeDeserializer()
+    return {k: deserializer.deserialize(v) for k, v in item.items()}
+
+
 def get_role_from_database(role_name: str) -> Optional[Dict[str, Any]]:
     """
     Get role details from database by roleName.
+
+    Resolves the ROLENAME#<name> lookup item and reads ROLE#<id>/META. Roles created
+    before lookup items existed are found with a one-off scan while ROLE_LOOKUP_SCAN_FALLBACK
+    is on, and their lookup item is written so the next resolution is two reads.
     
     Args:
         role_name: The role name to lookup
@@ -407,21 +634,39 @@ def get_role_from_database(role_name: str) -> Optional[Dict[str, Any]]:
         Role item from database or None if not found
     """
     try:
-        # Normalize role name for comparison
-        normalized_role = role_name.lower().replace(" ", "_")
-        
-        response = table.scan(
-            FilterExpression="entityType = :entity_type AND roleName = :role_name",
-            ExpressionAttributeValues={
+        normalized_role = normalize_role_name(role_name)
+
+        lookup = table.get_item(Key=role_name_key(normalized_role)).get("Item")
+        if lookup:
+            role = table.get_item(Key={"PK": f"ROLE#{lookup['roleId']}", "SK": "META"}).get("Item")
+            if role:
+                return role
+            logger.warning(f"Role lookup for '{normalized_role}' points at missing role {lookup['roleId']}")
+
+        if not ROLE_LOOKUP_SCAN_FALLBACK:
+            return None
+
+        scan_params = {
+            "FilterExpression": "entityType = :entity_type AND roleName = :role_name",
+            "ExpressionAttributeValues": {
                 ":entity_type": ENTITY_TYPE_ROLE,
                 ":role_name": normalized_role
             }
-        )
-        
-        items = response.get("Items", [])
-        if items:
-            return items[0]
-        return None
+        }
+        while True:
+            response = table.scan(**scan_params)
+            items = response.get("Items", [])
+            if items:
+                role = items[0]
+                try:
+                    table.put_item(Item=build_role_name_item(normalized_role, role["roleId"]))
+                    logger.info(f"Backfilled role name lookup for '{normalized_role}'")
+                except Exception as e:
+                    logger.warning(f"Could not write role name lookup for '{normalized_role}': {str(e)}")
+                return role
+            if "LastEvaluatedKey" not in response:
+                return None
+            scan_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
     except Exception as e:
         logger.error(f"Error fetching role from database: {str(e)}")
         return None
@@ -477,6 +722,200 @@ def get_role_permissions_from_database(role_name: str) -> List[str]:
         return []
 
 
+def get_rbac_version() -> int:
+    """Current RBAC catalog version (0 until the first role/permission mutation)."""
+    response = table.get_item(Key=RBAC_VERSION_KEY, ConsistentRead=True)
+    return int(response.get("Item", {}).get("version", 0))
+
+
+def bump_rbac_version():
+    """
+    Record a role/permission change so every container drops its cached role permissions.
+    The local cache is cleared immediately; other containers notice on their next version check.
+    """
+    try:
+        table.update_item(
+            Key=RBAC_VERSION_KEY,
+            UpdateExpression="ADD #version :one SET #updatedAt = :now",
+            ExpressionAttributeNames={"#version": "version", "#updatedAt": "updatedAt"},
+            ExpressionAttributeValues={":one": 1, ":now": datetime.utcnow().isoformat()}
+        )
+    except Exception as e:
+        logger.error(f"Failed to bump RBAC version: {str(e)}")
+    _rbac_cache["roles"].clear()
+    _rbac_cache["checkedAt"] = 0.0
+
+
+def _check_rbac_version():
+    """Re-read the catalog version when the last check is stale and drop the cache if it moved."""
+    now = time.time()
+    if now - _rbac_cache["checkedAt"] < RBAC_VERSION_CHECK_SECONDS:
+        return
+    try:
+        version = get_rbac_version()
+    except Exception as e:
+        # Keep serving TTL-bounded entries rather than failing authorization
+        logger.warning(f"Could not read RBAC version: {str(e)}")
+        return
+    if version != _rbac_cache["version"]:
+        if _rbac_cache["version"] is not None:
+            logger.info(f"RBAC version moved {_rbac_cache['version']} -> {version}, clearing role cache")
+        _rbac_cache["roles"].clear()
+        _rbac_cache["catalog"] = None
+        _rbac_cache["version"] = version
+    _rbac_cache["checkedAt"] = now
+
+
+def get_cached_role_permissions(role_name: str) -> List[str]:
+    """Permissions for a role, served from the container cache while fresh."""
+    normalized_role = normalize_role_name(role_name)
+    _check_rbac_version()
+
+    entry = _rbac_cache["roles"].get(normalized_role)
+    if entry and entry["expiresAt"] > time.time():
+        return entry["permissions"]
+
+    permissions = get_role_permissions_from_database(normalized_role)
+    # An empty result may be a missing role or a failed read; only hold it briefly
+    ttl = RBAC_CACHE_TTL_SECONDS if permissions else RBAC_VERSION_CHECK_SECONDS
+    _rbac_cache["roles"][normalized_role] = {"permissions": permissions, "expiresAt": time.time() + ttl}
+    return permissions
+
+
+def load_permission_bits():
+    """(permission name -> bit, version) from RBAC#CATALOG/PERMISSION_BITS."""
+    item = table.get_item(Key=PERMISSION_BITS_KEY, ConsistentRead=True).get("Item", {})
+    return {name: int(bit) for name, bit in item.get("bits", {}).items()}, int(item.get("version", 0))
+
+
+permission_bits = PermissionBits(load_permission_bits)
+
+
+def ensure_permission_bits(permission_names: List[str]):
+    """
+    Give every named permission a bit, returning (bits, version).
+    Bits are append-only: a name keeps its bit for good and deleted permissions' bits are
+    never reused, so tokens issued against an older version stay correct. Concurrent
+    writers are serialized with a condition on the version.
+    """
+    for attempt in range(PERMISSION_BITS_MAX_RETRIES):
+        item = table.get_item(Key=PERMISSION_BITS_KEY, ConsistentRead=True).get("Item")
+        bits = {name: int(bit) for name, bit in (item or {}).get("bits", {}).items()}
+        version = int((item or {}).get("version", 0))
+        missing = sorted(set(permission_names) - set(bits))
+        if not missing:
+            return bits, version
+
+        next_bit = int((item or {}).get("nextBit", len(bits)))
+        for name in missing:
+            bits[name] = next_bit
+            next_bit += 1
+        new_item = {
+            **PERMISSION_BITS_KEY,
+            "bits": bits,
+            "nextBit": next_bit,
+            "version": version + 1,
+            "updatedAt": datetime.utcnow().isoformat()
+        }
+        try:
+            if item:
+                table.put_item(
+                    Item=new_item,
+                    ConditionExpression="#version = :version",
+                    ExpressionAttributeNames={"#version": "version"},
+                    ExpressionAttributeValues={":version": version}
+                )
+            else:
+                table.put_item(Item=new_item, ConditionExpression="attribute_not_exists(PK)")
+            logger.info(f"Assigned permission bits {dict((name, bits[name]) for name in missing)} (version {version + 1})")
+            return bits, version + 1
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            logger.info(f"Permission bit map changed concurrently, retrying (attempt {attempt + 1})")
+    raise RuntimeError("Could not assign permission bits after concurrent updates")
+
+
+def build_session_token(user: Dict[str, Any]) -> Optional[str]:
+    """Signed session token with the user's effective permission bitmask, or None when signing is not configured."""
+    secret = get_session_secret()
+    if not secret:
+        logger.warning("SESSION_TOKEN_SECRET not set - no session token issued")
+        return None
+    permissions = get_cached_role_permissions(user["role"]) if user.get("role") else []
+    bits, version = ensure_permission_bits(permissions)
+    claims = {"sub": user["id"], "uid": user.get("firebaseUid"), "email": user.get("email"), "role": user.get("role")}
+    return issue_session_token(claims, permission_mask(permissions, bits), version, secret)
+
+
+def get_session_user(token: str) -> Optional[Dict[str, Any]]:
+    """Authenticated user for a session token issued by /users/sync."""
+    secret = get_session_secret()
+    payload = verify_session_token(token, secret) if secret else None
+    if not payload:
+        return None
+    return {
+        "uid": payload.get("uid"),
+        "userId": payload.get("sub"),
+        "email": payload.get("email"),
+        "role": payload.get("role"),
+        "permissionMask": payload["permissionMask"],
+        "catalogVersion": payload.get("cv", 0)
+    }
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def email_key(email: str) -> Dict[str, str]:
+    """Key of the lookup item mapping a normalized email to its user id."""
+    return {"PK": f"{EMAIL_PK_PREFIX}{normalize_email(email)}", "SK": "META"}
+
+
+def build_email_item(email: str, user_id: str) -> Dict[str, Any]:
+    return {**email_key(email), "email": normalize_email(email), "userId": user_id}
+
+
+def find_user_by_email(email: str) -> Optional[Dict[str, Any]]:
+    """
+    Resolve a user by email through the EMAIL# lookup item (two single-key reads).
+    Users created before the lookup existed are found by scan while
+    EMAIL_LOOKUP_SCAN_FALLBACK is on, and their lookup item is written on the way.
+    """
+    lookup = table.get_item(Key=email_key(email)).get("Item")
+    if lookup:
+        user = table.get_item(Key={"PK": f"USER#{lookup['userId']}", "SK": "ENTITY#USER"}).get("Item")
+        if user:
+            return user
+        logger.warning(f"Email lookup for {normalize_email(email)} points at missing user {lookup['userId']}")
+    if not EMAIL_LOOKUP_SCAN_FALLBACK:
+        return None
+
+    scan_params = {
+        "FilterExpression": "entityType = :entityType AND email IN (:email, :normalized)",
+        "ExpressionAttributeValues": {
+            ":entityType": ENTITY_TYPE_USER,
+            ":email": email,
+            ":normalized": normalize_email(email)
+        }
+    }
+    while True:
+        response = table.scan(**scan_params)
+        items = response.get("Items", [])
+        if items:
+            user = items[0]
+            try:
+                table.put_item(Item=build_email_item(email, user["id"]), ConditionExpression="attribute_not_exists(PK)")
+                logger.info(f"Backfilled email lookup for user {user['id']}")
+            except Exception as e:
+                logger.warning(f"Could not write email lookup for user {user['id']}: {str(e)}")
+            return user
+        if "LastEvaluatedKey" not in response:
+            return None
+        scan_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
 def validate_role_exists(role_name: str) -> bool:
     """
     Check if a role exists in the database by roleName.
@@ -532,11 +971,43 @@ def handle_get_profile(user_id: str, authenticated_user: Optional[Dict[str, Any]
         return ErrorResponse.build(f"Error getting profile: {str(e)}", 500)
 
 
+def build_default_profile_item(user_id: str, user: Dict[str, Any], timestamp: str) -> Dict[str, Any]:
+    """Default PROFILE#MAIN item for a user (plaintext; encrypt before storing)."""
+    return {
+        "PK": f"USER#{user_id}",
+        "SK": "PROFILE#MAIN",
+        "userId": user_id,
+        "entityType": ENTITY_TYPE_PROFILE,
+        "firstName": user.get("firstName", ""),
+        "lastName": user.get("lastName", ""),
+        "phoneNumber": user.get("phoneNumber"),
+        "language": "en",
+        "organization": None,
+        "department": None,
+        "timezone": "UTC",
+        "profilePictureUrl": None,
+        "address": {
+            "street": "",
+            "city": "",
+            "state": "",
+            "country": "",
+            "postalCode": ""
+        },
+        "preferences": {
+            "notifications": True,
+            "emailAlerts": True,
+            "smsAlerts": False
+        },
+        "createdAt": timestamp,
+        "updatedAt": timestamp
+    }
+
+
 def handle_create_default_profile(user_id: str, authenticated_user: Optional[Dict[str, Any]]):
     """Create a default profile for a user."""
     try:
         # Get user details first
-        user_response = table.get_item(Key={"id": user_id})
+        user_response = table.get_item(Key={"PK": f"USER#{user_id}", "SK": "ENTITY#USER"})
         if "Item" not in user_response:
             return ErrorResponse.build(f"User {user_id} not found", 404)
         
@@ -544,35 +1015,7 @@ def handle_create_default_profile(user_id: str, authenticated_user: Optional[Dic
         timestamp = datetime.utcnow().isoformat() + "Z"
         
         # Create default profile
-        profile_item = {
-            "PK": f"USER#{user_id}",
-            "SK": "PROFILE#MAIN",
-            "userId": user_id,
-            "entityType": ENTITY_TYPE_PROFILE,
-            "firstName": user.get("firstName", ""),
-            "lastName": user.get("lastName", ""),
-            "phoneNumber": user.get("phoneNumber"),
-            "language": "en",
-            "organization": None,
-            "department": None,
-            "timezone": "UTC",
-            "profilePictureUrl": None,
-            "address": {
-                "street": "",
-                "city": "",
-                "state": "",
-                "country": "",
-                "postalCode": ""
-            },
-            "preferences": {
-                "notifications": True,
-                "emailAlerts": True,
-                "smsAlerts": False
-            },
-            "createdAt": timestamp,
-            "updatedAt": timestamp
-        }
-        
+        profile_item = build_default_profile_item(user_id, user, timestamp)
         profile_item = prepare_item_for_storage(profile_item, ENTITY_TYPE_PROFILE)
         table.put_item(Item=profile_item)
         
@@ -634,6 +1077,11 @@ def handle_update_profile(user_id: str, event: Dict[str, Any], authenticated_use
             "updatedAt": timestamp
         }
         
+        # Resized variants belong to the uploaded picture; keep them while it is unchanged
+        if profile_item["profilePictureUrl"] == existing_profile.get("profilePictureUrl"):
+            profile_item["profilePictureKey"] = existing_profile.get("profilePictureKey")
+            profile_item["profilePictureVariants"] = existing_profile.get("profilePictureVariants")
+        
         # Validate with Pydantic
         try:
             UserProfile(**profile_item)
@@ -763,7 +1211,11 @@ def handle_update_profile_partial(user_id: str, event: Dict[str, Any], authentic
 
 
 def handle_upload_profile_picture(user_id: str, event: Dict[str, Any], authenticated_user: Optional[Dict[str, Any]]):
-    """POST /users/{userId}/profile/picture - Upload profile picture to S3."""
+    """
+    POST /users/{userId}/profile/picture - Upload a base64 profile picture through the Lambda.
+    Kept for older clients; new clients should use GET .../upload-url and upload straight to S3.
+    The original lands under the same prefix, so resized variants are generated either way.
+    """
     # Users can only upload their own profile picture unless they're admin
     if authenticated_user:
         auth_user_id = authenticated_user.get('uid')
@@ -789,9 +1241,8 @@ def handle_upload_profile_picture(user_id: str, event: Dict[str, Any], authentic
             return ErrorResponse.build("imageData is required", 400)
         
         # Validate content type
-        allowed_types = ["image/jpeg", "image/jpg", "image/png", "image/webp"]
-        if content_type not in allowed_types:
-            return ErrorResponse.build(f"Invalid content type. Allowed: {', '.join(allowed_types)}", 400)
+        if content_type not in PROFILE_PICTURE_CONTENT_TYPES:
+            return ErrorResponse.build(f"Invalid content type. Allowed: {', '.join(PROFILE_PICTURE_CONTENT_TYPES)}", 400)
         
         # Decode base64 image
         try:
@@ -804,13 +1255,11 @@ def handle_upload_profile_picture(user_id: str, event: Dict[str, Any], authentic
             return ErrorResponse.build(f"Invalid base64 image data: {str(e)}", 400)
         
         # Validate image size (max 5MB)
-        max_size = 5 * 1024 * 1024  # 5MB
-        if len(image_bytes) > max_size:
+        if len(image_bytes) > PROFILE_PICTURE_MAX_BYTES:
             return ErrorResponse.build("Image size exceeds 5MB limit", 400)
         
         # Generate S3 key
-        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        s3_key = f"profile-pictures/{user_id}/{timestamp}.{file_extension}"
+        s3_key = profile_picture_original_key(user_id, file_extension)
         
         # Upload to S3
         try:
@@ -826,7 +1275,7 @@ def handle_upload_profile_picture(user_id: str, event: Dict[str, Any], authentic
             )
             
             # Generate public URL (adjust based on your S3 configuration)
-            profile_picture_url = f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/{s3_key}"
+            profile_picture_url = s3_object_url(s3_key)
             
             logger.info(f"Uploaded profile picture for user {user_id} to {s3_key}")
         except Exception as s3_error:
@@ -880,8 +1329,22 @@ def handle_upload_profile_picture(user_id: str, event: Dict[str, Any], authentic
         return ErrorResponse.build(f"Error uploading profile picture: {str(e)}", 500)
 
 
+def s3_object_url(s3_key: str) -> str:
+    """Public URL of an object in the profile picture bucket (adjust based on your S3 configuration)."""
+    return f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/{s3_key}"
+
+
+def profile_picture_original_key(user_id: str, file_extension: str) -> str:
+    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    return f"{PROFILE_PICTURE_ORIGINALS_PREFIX}{user_id}/{timestamp}.{file_extension}"
+
+
 def handle_get_profile_picture_upload_url(user_id: str, event: Dict[str, Any], authenticated_user: Optional[Dict[str, Any]]):
-    """GET /users/{userId}/profile/picture/upload-url - Generate presigned S3 URL for direct upload."""
+    """
+    GET /users/{userId}/profile/picture/upload-url - Generate presigned S3 POST for direct upload.
+    This is the primary upload path: the image never passes through the Lambda. Once the
+    object lands, the ObjectCreated handler records it and its resized variants on the profile.
+    """
     # Users can only get their own upload URL unless they're admin
     if authenticated_user:
         auth_user_id = authenticated_user.get('uid')
@@ -896,14 +1359,21 @@ def handle_get_profile_picture_upload_url(user_id: str, event: Dict[str, Any], a
     file_extension = query_parameters.get("fileExtension", "jpg")
     
     # Validate content type
-    allowed_types = ["image/jpeg", "image/jpg", "image/png", "image/webp"]
-    if content_type not in allowed_types:
-        return ErrorResponse.build(f"Invalid content type. Allowed: {', '.join(allowed_types)}", 400)
+    if content_type not in PROFILE_PICTURE_CONTENT_TYPES:
+        return ErrorResponse.build(f"Invalid content type. Allowed: {', '.join(PROFILE_PICTURE_CONTENT_TYPES)}", 400)
+    if not re.match(r"^[a-z0-9]{2,5}$", file_extension):
+        return ErrorResponse.build("Invalid file extension", 400)
     
     try:
+        # The upload handler only updates existing profiles, so make sure there is one
+        profile_response = table.get_item(Key={"PK": f"USER#{user_id}", "SK": "PROFILE#MAIN"})
+        if "Item" not in profile_response:
+            create_response = handle_create_default_profile(user_id, authenticated_user)
+            if create_response.get("statusCode") not in [200, 201]:
+                return create_response
+        
         # Generate S3 key
-        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        s3_key = f"profile-pictures/{user_id}/{timestamp}.{file_extension}"
+        s3_key = profile_picture_original_key(user_id, file_extension)
         
         # Generate presigned POST URL (allows direct upload from client)
         presigned_post = s3_client.generate_presigned_post(
@@ -915,23 +1385,22 @@ def handle_get_profile_picture_upload_url(user_id: str, event: Dict[str, Any], a
             },
             Conditions=[
                 {"Content-Type": content_type},
-                ["content-length-range", 0, 5242880]  # 5MB max
+                ["content-length-range", 0, PROFILE_PICTURE_MAX_BYTES]
             ],
             ExpiresIn=3600  # 1 hour
         )
         
-        # Generate the public URL
-        profile_picture_url = f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/{s3_key}"
-        
         return SuccessResponse.build({
             "uploadUrl": presigned_post["url"],
             "fields": presigned_post["fields"],
-            "profilePictureUrl": profile_picture_url,
+            "profilePictureUrl": s3_object_url(s3_key),
             "s3Key": s3_key,
             "expiresIn": 3600,
+            "variants": {name: {"maxSize": size, "formats": list(PROFILE_PICTURE_FORMATS)} for name, size in PROFILE_PICTURE_SIZES.items()},
             "instructions": {
                 "method": "POST",
-                "description": "Use the uploadUrl and include all fields in the form data along with the file"
+                "description": "Use the uploadUrl and include all fields in the form data along with the file. "
+                               "The profile's profilePictureUrl and profilePictureVariants are updated once the upload is processed."
             }
         })
     
@@ -940,8 +1409,277 @@ def handle_get_profile_picture_upload_url(user_id: str, event: Dict[str, Any], a
         return ErrorResponse.build(f"Error generating upload URL: {str(e)}", 500)
 
 
+def render_profile_picture_variants(image_bytes: bytes) -> Dict[str, Dict[str, Any]]:
+    """
+    Resize an image into every PROFILE_PICTURE_SIZES box and encode each in every
+    PROFILE_PICTURE_FORMATS format. Returns {size name: {"width", "height", format: bytes}}.
+    Raises ValueError for images over PROFILE_PICTURE_MAX_PIXELS, before their pixels are decoded.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(BytesIO(image_bytes)) as source:
+        # open() only reads the header; the dimensions are known before any decoding
+        width, height = source.size
+        if width * height > PROFILE_PICTURE_MAX_PIXELS:
+            raise ValueError(f"{width}x{height} exceeds the {PROFILE_PICTURE_MAX_PIXELS} pixel limit")
+        image = ImageOps.exif_transpose(source).convert("RGB")
+
+    variants = {}
+    for name, size in PROFILE_PICTURE_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)  # keeps aspect ratio, never upscales
+        rendered = {"width": resized.width, "height": resized.height}
+        for extension, (pil_format, _) in PROFILE_PICTURE_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, format=pil_format, quality=82, optimize=True)
+            rendered[extension] = buffer.getvalue()
+        variants[name] = rendered
+    return variants
+
+
+def process_uploaded_profile_picture(s3_key: str):
+    """
+    Generate and store variants for an uploaded original, then record them on the profile.
+    Returns (result, error).
+    """
+    user_id = s3_key[len(PROFILE_PICTURE_ORIGINALS_PREFIX):].split("/", 1)[0]
+    upload_name = s3_key.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+
+    obj = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
+    if obj.get("ContentLength", 0) > PROFILE_PICTURE_MAX_BYTES:
+        return None, f"{s3_key} exceeds {PROFILE_PICTURE_MAX_BYTES} bytes"
+    image_bytes = obj["Body"].read()
+
+    variants = {}
+    try:
+        rendered = render_profile_picture_variants(image_bytes)
+    except ImportError:
+        logger.error("Pillow is not installed - recording the original without variants")
+        rendered = {}
+    except Exception as e:
+        return None, f"Could not decode image {s3_key}: {str(e)}"
+
+    for name, images in rendered.items():
+        variants[name] = {"width": images["width"], "height": images["height"]}
+        for extension, (_, content_type) in PROFILE_PICTURE_FORMATS.items():
+            variant_key = f"{PROFILE_PICTURE_VARIANTS_PREFIX}{user_id}/{upload_name}/{name}.{extension}"
+            s3_client.put_object(
+                Bucket=S3_BUCKET_NAME,
+                Key=variant_key,
+                Body=images[extension],
+                ContentType=content_type,
+                CacheControl="public, max-age=31536000, immutable"
+            )
+            variants[name][extension] = s3_object_url(variant_key)
+
+    # Keys embed the upload timestamp, so an older upload processed late never replaces a newer one
+    try:
+        table.update_item(
+            Key={"PK": f"USER#{user_id}", "SK": "PROFILE#MAIN"},
+            UpdateExpression="SET #url = :url, #key = :key, #variants = :variants, #updatedAt = :updated",
+            ConditionExpression="attribute_exists(PK) AND (attribute_not_exists(#key) OR #key <= :key)",
+            ExpressionAttributeNames={
+                "#url": "profilePictureUrl",
+                "#key": "profilePictureKey",
+                "#variants": "profilePictureVariants",
+                "#updatedAt": "updatedAt"
+            },
+            ExpressionAttributeValues={
+                ":url": s3_object_url(s3_key),
+                ":key": s3_key,
+                ":variants": variants,
+                ":updated": datetime.utcnow().isoformat() + "Z"
+            }
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return None, f"Profile for {user_id} is missing or already has a newer picture"
+
+    logger.info(f"Processed profile picture {s3_key} for user {user_id}: {list(variants)}")
+    return {"userId": user_id, "s3Key": s3_key, "variants": list(variants)}, None
+
+
+def handle_profile_picture_uploaded(event: Dict[str, Any]):
+    """S3 ObjectCreated notification for uploaded originals."""
+    processed, skipped = [], []
+    for record in event.get("Records", []):
+        s3_key = urllib.parse.unquote_plus(record.get("s3", {}).get("object", {}).get("key", ""))
+        if not s3_key.startswith(PROFILE_PICTURE_ORIGINALS_PREFIX):
+            # Variants and anything else in the bucket are not ours to process
+            skipped.append(s3_key)
+            continue
+        try:
+            result, error = process_uploaded_profile_picture(s3_key)
+        except Exception as e:
+            logger.error(f"Failed to process profile picture {s3_key}: {str(e)}")
+            raise
+        if error:
+            logger.warning(error)
+            skipped.append(s3_key)
+        else:
+            processed.append(result)
+    return {"processed": processed, "skipped": skipped}
+
+
 # ====== RBAC HANDLERS ======
 
+# The RBAC catalog (every role, permission and component, without link items) is kept
+# materialized on RBAC#CATALOG/SNAPSHOT as {roles, permissions, components} maps keyed by
+# id. Each catalog mutation writes its entity item and the new snapshot in one transaction,
+# conditioned on the snapshot version, so list endpoints read one item - usually from the
+# container cache. Name uniqueness is checked by apply_change against the consistent
+# snapshot being written, never against the cache.
+
+# DynamoDB items are capped at 400KB; refuse catalog writes well before the snapshot gets there
+RBAC_CATALOG_MAX_BYTES = int(os.environ.get("RBAC_CATALOG_MAX_BYTES", str(350 * 1024)))
+
+
+class CatalogNameTaken(Exception):
+    """Raised from apply_change when a created role/permission/component name already exists."""
+
+
+def reject_duplicate_catalog_name(catalog: Dict[str, Any], section: str, name_field: str, name: str, label: str):
+    if any(entry.get(name_field) == name for entry in catalog[section].values()):
+        raise CatalogNameTaken(f"{label} '{name}' already exists")
+
+
+def _catalog_entry(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in item.items() if k not in ["PK", "SK", "entityType"]}
+
+
+def _serialize_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    serializer = TypeSerializer()
+    return {k: serializer.serialize(v) for k, v in values.items()}
+
+
+def rebuild_rbac_catalog() -> Dict[str, Any]:
+    """Build the snapshot from the table (first use, or after manual edits) and store it."""
+    snapshot = {**RBAC_CATALOG_KEY, "roles": {}, "permissions": {}, "components": {}, "version": 0}
+    scan_params = {
+        "FilterExpression": "entityType IN (:role, :permission, :component) AND SK = :meta",
+        "ExpressionAttributeValues": {
+            ":role": ENTITY_TYPE_ROLE,
+            ":permission": ENTITY_TYPE_PERMISSION,
+            ":component": ENTITY_TYPE_COMPONENT,
+            ":meta": "META"
+        }
+    }
+    while True:
+        response = table.scan(**scan_params)
+        for item in response.get("Items", []):
+            section, id_field = RBAC_CATALOG_SECTIONS[item["entityType"]]
+            snapshot[section][item[id_field]] = _catalog_entry(item)
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    snapshot["updatedAt"] = datetime.utcnow().isoformat()
+    try:
+        table.put_item(Item=snapshot, ConditionExpression="attribute_not_exists(PK)")
+        logger.info(f"Built RBAC catalog snapshot: {len(snapshot['roles'])} roles, "
+                    f"{len(snapshot['permissions'])} permissions, {len(snapshot['components'])} components")
+        return snapshot
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        # Another container built it first
+        return table.get_item(Key=RBAC_CATALOG_KEY, ConsistentRead=True)["Item"]
+
+
+def load_rbac_catalog(consistent: bool = False) -> Dict[str, Any]:
+    """
+    The catalog snapshot as {roles, permissions, components, version}.
+    Served from the container cache unless consistent=True (used by writers).
+    """
+    if not consistent:
+        _check_rbac_version()
+        cached = _rbac_cache["catalog"]
+        if cached and cached["expiresAt"] > time.time():
+            return cached
+
+    item = table.get_item(Key=RBAC_CATALOG_KEY, ConsistentRead=True).get("Item") or rebuild_rbac_catalog()
+    catalog = {
+        "roles": item.get("roles", {}),
+        "permissions": item.get("permissions", {}),
+        "components": item.get("components", {}),
+        "version": int(item.get("version", 0)),
+        "expiresAt": time.time() + RBAC_CACHE_TTL_SECONDS
+    }
+    if not consistent:
+        # Writers mutate their copy before committing, so only reader copies are cached
+        _rbac_cache["catalog"] = catalog
+    return catalog
+
+
+def commit_catalog_change(operations: List[Dict[str, Any]], apply_change) -> Dict[str, Any]:
+    """
+    Write `operations` (low-level TransactItems for the entity items) together with the
+    snapshot after apply_change(catalog) has updated it in place. Retries on a fresh
+    snapshot when another writer moved it; any other cancellation is raised to the caller
+    (operations come first, so their CancellationReasons indexes are unchanged).
+    apply_change may raise CatalogNameTaken, which is passed through before anything is written.
+    """
+    for attempt in range(RBAC_CATALOG_MAX_RETRIES):
+        catalog = load_rbac_catalog(consistent=True)
+        apply_change(catalog)
+        version = catalog["version"]
+        snapshot = {
+            **RBAC_CATALOG_KEY,
+            "roles": catalog["roles"],
+            "permissions": catalog["permissions"],
+            "components": catalog["components"],
+            "version": version + 1,
+            "updatedAt": datetime.utcnow().isoformat()
+        }
+        snapshot_bytes = len(json.dumps(snapshot, default=str).encode("utf-8"))
+        if snapshot_bytes > RBAC_CATALOG_MAX_BYTES:
+            raise RuntimeError(f"RBAC catalog snapshot would be {snapshot_bytes} bytes "
+                               f"(limit {RBAC_CATALOG_MAX_BYTES}); remove unused roles, permissions or components")
+        try:
+            dynamodb_client.transact_write_items(TransactItems=list(operations) + [{
+                "Put": {
+                    "TableName": TABLE_NAME,
+                    "Item": _serialize_item(snapshot),
+                    "ConditionExpression": "#version = :version",
+                    "ExpressionAttributeNames": {"#version": "version"},
+                    "ExpressionAttributeValues": {":version": {"N": str(version)}}
+                }
+            }])
+            catalog["version"] = version + 1
+            _rbac_cache["catalog"] = catalog
+            return catalog
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                raise
+            reasons = [reason.get("Code", "None") for reason in e.response.get("CancellationReasons", [])]
+            if not reasons or reasons[-1] != "ConditionalCheckFailed" or any(code != "None" for code in reasons[:-1]):
+                raise
+            logger.info(f"RBAC catalog moved during write, retrying (attempt {attempt + 1})")
+    raise RuntimeError("RBAC catalog is changing too quickly; try again")
+
+
+def is_transaction_condition_failure(error: ClientError, index: int) -> bool:
+    """True when a cancelled transaction failed on the condition of TransactItems[index]."""
+    reasons = error.response.get("CancellationReasons", [])
+    return (error.response["Error"]["Code"] == "TransactionCanceledException"
+            and index < len(reasons) and reasons[index].get("Code") == "ConditionalCheckFailed")
+
+
+def build_update_operation(key: Dict[str, str], updates: Dict[str, Any]) -> Dict[str, Any]:
+    """Low-level transactional SET of `updates` on an existing item."""
+    return {
+        "Update": {
+            "TableName": TABLE_NAME,
+            "Key": _serialize_item(key),
+            "UpdateExpression": "SET " + ", ".join(f"#{field} = :{field}" for field in updates),
+            "ConditionExpression": "attribute_exists(PK)",
+            "ExpressionAttributeNames": {f"#{field}": field for field in updates},
+            "ExpressionAttributeValues": _serialize_values({f":{field}": value for field, value in updates.items()})
+        }
+    }
+
+
 def handle_create_role(event: dict, authenticated_user: dict):
     """Create a new role"""
     if not check_permission(authenticated_user, "permission:manage"):
@@ -951,18 +1689,7 @@ def handle_create_role(event: dict, authenticated_user: dict):
         body = json.loads(event.get("body", "{}"))
         role_data = RoleCreate(**body)
         
-        role_name = role_data.roleName.lower().replace(" ", "_")
-
-        # Check if role already exists by name
-        response = table.scan(
-            FilterExpression="entityType = :entity_type AND roleName = :role_name",
-            ExpressionAttributeValues={
-                ":entity_type": ENTITY_TYPE_ROLE,
-                ":role_name": role_name
-            }
-        )
-        if response.get("Items"):
-            return ErrorResponse.build(f"Role '{role_name}' already exists", 409)
+        role_name = normalize_role_name(role_data.roleName)
 
         role_id = str(uuid.uuid4())
         pk = f"ROLE#{role_id}"
@@ -985,7 +1712,28 @@ def handle_create_role(event: dict, authenticated_user: dict):
             "createdBy": authenticated_user["uid"]
         }
         
-        table.put_item(Item=item)
+        def apply_change(catalog):
+            reject_duplicate_catalog_name(catalog, "roles", "roleName", role_name, "Role")
+            catalog["roles"][role_id] = _catalog_entry(item)
+
+        # Role and its name lookup are written together; the lookup's condition guards
+        # against a concurrent create of the same name
+        try:
+            commit_catalog_change([
+                {"Put": {"TableName": TABLE_NAME, "Item": _serialize_item(item)}},
+                {"Put": {
+                    "TableName": TABLE_NAME,
+                    "Item": _serialize_item(build_role_name_item(role_name, role_id)),
+                    "ConditionExpression": "attribute_not_exists(PK)"
+                }}
+            ], apply_change)
+        except CatalogNameTaken as e:
+            return ErrorResponse.build(str(e), 409)
+        except ClientError as e:
+            if is_transaction_condition_failure(e, 1):
+                return ErrorResponse.build(f"Role '{role_name}' already exists", 409)
+            raise
+        bump_rbac_version()
         
         clean_item = simplify({k: v for k, v in item.items() if k not in ["PK", "SK", "entityType"]})
         
@@ -1028,13 +1776,8 @@ def handle_list_roles(authenticated_user: dict):
         return ErrorResponse.build("Insufficient permissions", 403)
     
     try:
-        response = table.scan(
-            FilterExpression="entityType = :entity_type",
-            ExpressionAttributeValues={":entity_type": ENTITY_TYPE_ROLE}
-        )
-        
-        items = response.get("Items", [])
-        clean_items = [simplify({k: v for k, v in item.items() if k not in ["PK", "SK", "entityType"]}) for item in items]
+        roles = load_rbac_catalog()["roles"].values()
+        clean_items = sorted((simplify(role) for role in roles), key=lambda x: x.get("roleName") or "")
         
         return SuccessResponse.build({
             "message": "Roles retrieved successfully",
@@ -1070,47 +1813,20 @@ def handle_update_role(role_id: str, event: dict, authenticated_user: dict):
         if existing_item.get("isSystem", False):
             return ErrorResponse.build("Cannot update system roles", 403)
         
-        # Build update expression (use ExpressionAttributeNames for all fields)
-        update_expr_parts = ["#updatedAt = :updated_at"]
-        expr_attr_values = {":updated_at": datetime.utcnow().isoformat()}
-        expr_attr_names = {"#updatedAt": "updatedAt"}
-        
-        if update_data.displayName is not None:
-            update_expr_parts.append("#displayName = :display_name")
-            expr_attr_names["#displayName"] = "displayName"
-            expr_attr_values[":display_name"] = update_data.displayName
+        # Fields to set; written with the catalog snapshot in one transaction
+        updates = {"updatedAt": datetime.utcnow().isoformat()}
+        for field in ("displayName", "description", "level", "isSystem"):
+            value = getattr(update_data, field)
+            if value is not None:
+                updates[field] = value
         
-        if update_data.description is not None:
-            update_expr_parts.append("#description = :description")
-            expr_attr_names["#description"] = "description"
-            expr_attr_values[":description"] = update_data.description
+        def apply_change(catalog):
+            catalog["roles"][role_id] = {**catalog["roles"].get(role_id, _catalog_entry(existing_item)), **updates}
         
-        if update_data.level is not None:
-            update_expr_parts.append("#level = :level")
-            expr_attr_names["#level"] = "level"
-            expr_attr_values[":level"] = update_data.level
+        commit_catalog_change([build_update_operation({"PK": pk, "SK": sk}, updates)], apply_change)
+        bump_rbac_version()
         
-        if update_data.isSystem is not None:
-            update_expr_parts.append("#isSystem = :is_system")
-            expr_attr_names["#isSystem"] = "isSystem"
-            expr_attr_values[":is_system"] = update_data.isSystem
-        
-        update_expression = "SET " + ", ".join(update_expr_parts)
-        
-        kwargs = {
-            "Key": {"PK": pk, "SK": sk},
-            "UpdateExpression": update_expression,
-            "ExpressionAttributeValues": expr_attr_values,
-            "ReturnValues": "ALL_NEW"
-        }
-        
-        if expr_attr_names:
-            kwargs["ExpressionAttributeNames"] = expr_attr_names
-        
-        response = table.update_item(**kwargs)
-        
-        updated_item = response["Attributes"]
-        clean_item = simplify({k: v for k, v in updated_item.items() if k not in ["PK", "SK", "entityType"]})
+        clean_item = simplify(_catalog_entry({**existing_item, **updates}))
         
         return SuccessResponse.build({"message": "Role updated successfully", "data": clean_item}, 200)
         
@@ -1141,8 +1857,13 @@ def handle_delete_role(role_id: str, authenticated_user: dict):
         if existing_item.get("isSystem", False):
             return ErrorResponse.build("Cannot delete system roles", 403)
         
-        # Delete role
-        table.delete_item(Key={"PK": pk, "SK": sk})
+        # Delete role and its name lookup
+        operations = [{"Delete": {"TableName": TABLE_NAME, "Key": _serialize_item({"PK": pk, "SK": sk})}}]
+        role_name = existing_item.get("roleName")
+        if role_name:
+            operations.append({"Delete": {"TableName": TABLE_NAME, "Key": _serialize_item(role_name_key(role_name))}})
+        commit_catalog_change(operations, lambda catalog: catalog["roles"].pop(role_id, None))
+        bump_rbac_version()
         
         return SuccessResponse.build({"message": f"Role '{role_id}' deleted successfully"}, 200)
         
@@ -1152,17 +1873,11 @@ def handle_delete_role(role_id: str, authenticated_user: dict):
 
 
 def get_permission_by_name(permission_name: str) -> Dict[str, Any]:
-    """Return the permission item for a permissionName, or an empty dict."""
-    response = table.scan(
-        FilterExpression="entityType = :entity_type AND permissionName = :permission_name",
-        ExpressionAttributeValues={
-            ":entity_type": ENTITY_TYPE_PERMISSION,
-            ":permission_name": permission_name
-        }
-    )
-
-    items = response.get("Items", [])
-    return items[0] if items else {}
+    """Return the catalog entry for a permissionName, or an empty dict."""
+    for permission in load_rbac_catalog()["permissions"].values():
+        if permission.get("permissionName") == permission_name:
+            return permission
+    return {}
 
 
 def get_permission_by_id(permission_id: str) -> Dict[str, Any]:
@@ -1179,11 +1894,6 @@ def handle_create_permission(event: dict, authenticated_user: dict):
     try:
         body = json.loads(event.get("body", "{}"))
         perm_data = PermissionCreate(**body)
-        
-        # Check if permission already exists by name
-        existing_permission = get_permission_by_name(perm_data.permissionName)
-        if existing_permission:
-            return ErrorResponse.build(f"Permission '{perm_data.permissionName}' already exists", 409)
 
         permission_id = str(uuid.uuid4())
         pk = f"PERMISSION#{permission_id}"
@@ -1208,7 +1918,23 @@ def handle_create_permission(event: dict, authenticated_user: dict):
             "createdBy": authenticated_user["uid"]
         }
         
-        table.put_item(Item=item)
+        def apply_change(catalog):
+            reject_duplicate_catalog_name(catalog, "permissions", "permissionName", perm_data.permissionName, "Permission")
+            catalog["permissions"][permission_id] = _catalog_entry(item)
+
+        try:
+            commit_catalog_change(
+                [{"Put": {"TableName": TABLE_NAME, "Item": _serialize_item(item), "ConditionExpression": "attribute_not_exists(PK)"}}],
+                apply_change
+            )
+        except CatalogNameTaken as e:
+            return ErrorResponse.build(str(e), 409)
+        try:
+            ensure_permission_bits([perm_data.permissionName])
+        except Exception as e:
+            # Assigned lazily on the next /users/sync that needs it
+            logger.warning(f"Could not assign a bit to '{perm_data.permissionName}': {str(e)}")
+        bump_rbac_version()
         
         clean_item = simplify({k: v for k, v in item.items() if k not in ["PK", "SK", "entityType"]})
         
@@ -1251,13 +1977,8 @@ def handle_list_permissions(authenticated_user: dict):
         return ErrorResponse.build("Insufficient permissions", 403)
     
     try:
-        response = table.scan(
-            FilterExpression="entityType = :entity_type",
-            ExpressionAttributeValues={":entity_type": ENTITY_TYPE_PERMISSION}
-        )
-        
-        items = response.get("Items", [])
-        clean_items = [simplify({k: v for k, v in item.items() if k not in ["PK", "SK", "entityType"]}) for item in items]
+        permissions = load_rbac_catalog()["permissions"].values()
+        clean_items = sorted((simplify(permission) for permission in permissions), key=lambda x: x.get("permissionName") or "")
         
         return SuccessResponse.build({
             "message": "Permissions retrieved successfully",
@@ -1283,53 +2004,30 @@ def handle_update_permission(permission_id: str, event: dict, authenticated_user
         response = table.get_item(Key={"PK": pk, "SK": sk})
         if "Item" not in response:
             return ErrorResponse.build(f"Permission '{permission_id}' not found", 404)
+        existing_item = response["Item"]
         
         body = json.loads(event.get("body", "{}"))
         
-        # Build update expression
-        update_expressions = []
-        expression_values = {}
-        expression_names = {}
-        
         # Updatable fields
-        updatable_fields = {
-            "permissionCode": "permissionCode",
-            "displayName": "displayName",
-            "description": "description",
-            "category": "category"
-        }
+        updatable_fields = ["permissionCode", "displayName", "description", "category"]
+        updates = {field: body[field] for field in updatable_fields if field in body}
         
-        for field, attr_name in updatable_fields.items():
-            if field in body:
-                update_expressions.append(f"#{attr_name} = :{attr_name}")
-                expression_values[f":{attr_name}"] = body[field]
-                expression_names[f"#{attr_name}"] = attr_name
-        
-        if not update_expressions:
+        if not updates:
             return ErrorResponse.build("No valid fields to update", 400)
         
         # Add updatedAt and updatedBy
-        timestamp = datetime.utcnow().isoformat()
-        update_expressions.append("#updatedAt = :updatedAt")
-        update_expressions.append("#updatedBy = :updatedBy")
-        expression_values[":updatedAt"] = timestamp
-        expression_values[":updatedBy"] = authenticated_user["uid"]
-        expression_names["#updatedAt"] = "updatedAt"
-        expression_names["#updatedBy"] = "updatedBy"
-        
-        # Execute update
-        update_expression = "SET " + ", ".join(update_expressions)
-        
-        response = table.update_item(
-            Key={"PK": pk, "SK": sk},
-            UpdateExpression=update_expression,
-            ExpressionAttributeNames=expression_names,
-            ExpressionAttributeValues=expression_values,
-            ReturnValues="ALL_NEW"
-        )
+        updates["updatedAt"] = datetime.utcnow().isoformat()
+        updates["updatedBy"] = authenticated_user["uid"]
+        
+        # Write the permission and the catalog snapshot together
+        def apply_change(catalog):
+            current = catalog["permissions"].get(permission_id, _catalog_entry(existing_item))
+            catalog["permissions"][permission_id] = {**current, **updates}
         
-        updated_item = response["Attributes"]
-        clean_item = simplify({k: v for k, v in updated_item.items() if k not in ["PK", "SK", "entityType"]})
+        commit_catalog_change([build_update_operation({"PK": pk, "SK": sk}, updates)], apply_change)
+        bump_rbac_version()
+        
+        clean_item = simplify(_catalog_entry({**existing_item, **updates}))
         
         return SuccessResponse.build({
             "message": "Permission updated successfully",
@@ -1374,8 +2072,12 @@ def handle_delete_permission(permission_id: str, authenticated_user: dict):
                 409
             )
         
-        # Delete the permission
-        table.delete_item(Key={"PK": pk, "SK": sk})
+        # Delete the permission (its bit stays reserved in the permission bit map)
+        commit_catalog_change(
+            [{"Delete": {"TableName": TABLE_NAME, "Key": _serialize_item({"PK": pk, "SK": sk})}}],
+            lambda catalog: catalog["permissions"].pop(permission_id, None)
+        )
+        bump_rbac_version()
         
         return SuccessResponse.build({
             "message": f"Permission '{permission_name}' deleted successfully"
@@ -1433,6 +2135,7 @@ def handle_assign_permission_to_role(role_id: str, event: dict, authenticated_us
         }
         
         table.put_item(Item=item)
+        bump_rbac_version()
         
         clean_item = simplify({k: v for k, v in item.items() if k not in ["PK", "SK", "entityType"]})
         
@@ -1504,6 +2207,7 @@ def handle_remove_permission_from_role(role_id: str, permission_id: str, authent
         
         # Delete assignment
         table.delete_item(Key={"PK": pk, "SK": sk})
+        bump_rbac_version()
         
         return SuccessResponse.build({"message": "Permission removed from role successfully"}, 200)
         
@@ -1611,63 +2315,94 @@ def handle_get_user_roles(user_id: str, authenticated_user: dict):
         return ErrorResponse.build(f"Failed to retrieve roles: {str(e)}", 500)
 
 
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_RETRIES = 5
+ROLE_QUERY_WORKERS = 8
+
+
+def batch_get_items(keys: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Fetch items by key in batch_get_item chunks, retrying unprocessed keys with backoff."""
+    items = []
+    for i in range(0, len(keys), BATCH_GET_MAX_KEYS):
+        request = {TABLE_NAME: {"Keys": keys[i:i + BATCH_GET_MAX_KEYS]}}
+        for attempt in range(BATCH_GET_MAX_RETRIES):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response.get("Responses", {}).get(TABLE_NAME, []))
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            time.sleep(0.05 * (2 ** attempt))
+        if request:
+            logger.warning(f"{len(request[TABLE_NAME]['Keys'])} keys still unprocessed after {BATCH_GET_MAX_RETRIES} attempts")
+    return items
+
+
+def query_partition(pk: str, sk_prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+    """All items under a partition key (optionally an SK prefix), following pagination."""
+    params = {"KeyConditionExpression": "PK = :pk", "ExpressionAttributeValues": {":pk": pk}}
+    if sk_prefix:
+        params["KeyConditionExpression"] += " AND begins_with(SK, :sk_prefix)"
+        params["ExpressionAttributeValues"][":sk_prefix"] = sk_prefix
+    items = []
+    while True:
+        response = table.query(**params)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return items
+        params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def compute_user_permissions(user_id: str) -> List[Dict[str, Any]]:
+    """
+    Effective permissions for a user with grantedBy role names, in a fixed number of round trips:
+    one query for the user's role links, one query per role partition (META plus PERMISSION#
+    links, run in parallel) and batch_get_item for the permission META items.
+    """
+    role_ids = []
+    for role_item in query_partition(f"USER#{user_id}", "ROLE#"):
+        role_id = role_item.get("roleId") or role_item["SK"].split("ROLE#", 1)[1]
+        if role_id not in role_ids:
+            role_ids.append(role_id)
+    if not role_ids:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(ROLE_QUERY_WORKERS, len(role_ids))) as executor:
+        role_partitions = list(executor.map(lambda role_id: query_partition(f"ROLE#{role_id}"), role_ids))
+
+    granted_by = {}  # permissionId -> role names, in role order
+    for role_id, partition in zip(role_ids, role_partitions):
+        meta = next((item for item in partition if item["SK"] == "META"), {})
+        role_name = meta.get("roleName")
+        for link in partition:
+            if not link["SK"].startswith("PERMISSION#"):
+                continue
+            permission_id = link.get("permissionId") or link["SK"].split("PERMISSION#", 1)[1]
+            granted_by.setdefault(permission_id, []).append(role_name)
+
+    permission_items = batch_get_items([
+        {"PK": f"PERMISSION#{permission_id}", "SK": "META"} for permission_id in granted_by
+    ])
+    by_id = {item["PK"].split("PERMISSION#", 1)[1]: item for item in permission_items}
+
+    permissions = []
+    for permission_id, role_names in granted_by.items():
+        item = by_id.get(permission_id)
+        if not item:
+            logger.warning(f"Role permission link points at missing permission {permission_id}")
+            continue
+        clean_perm = {k: v for k, v in item.items() if k not in ["PK", "SK", "entityType"]}
+        clean_perm["grantedBy"] = role_names
+        permissions.append(clean_perm)
+    return permissions
+
+
 def handle_get_user_permissions(user_id: str, authenticated_user: dict):
     """Get all computed permissions for a user (from all assigned roles)"""
     if not check_permission(authenticated_user, "permission:read"):
         return ErrorResponse.build("Insufficient permissions", 403)
     
     try:
-        # Get user roles
-        pk = f"USER#{user_id}"
-        user_roles_response = table.query(
-            KeyConditionExpression="PK = :pk AND begins_with(SK, :sk_prefix)",
-            ExpressionAttributeValues={
-                ":pk": pk,
-                ":sk_prefix": "ROLE#"
-            }
-        )
-        
-        role_items = user_roles_response.get("Items", [])
-        
-        # Collect all permissions from all roles
-        all_permissions = {}
-        
-        for role_item in role_items:
-            role_id = role_item.get("roleId")
-            if not role_id and role_item.get("SK", "").startswith("ROLE#"):
-                role_id = role_item["SK"].split("ROLE#", 1)[1]
-
-            role_response = table.get_item(Key={"PK": f"ROLE#{role_id}", "SK": "META"})
-            role_name = role_response.get("Item", {}).get("roleName")
-            
-            # Get permissions for this role
-            role_pk = f"ROLE#{role_id}"
-            role_perms_response = table.query(
-                KeyConditionExpression="PK = :pk AND begins_with(SK, :sk_prefix)",
-                ExpressionAttributeValues={
-                    ":pk": role_pk,
-                    ":sk_prefix": "PERMISSION#"
-                }
-            )
-            
-            perm_items = role_perms_response.get("Items", [])
-            
-            for perm_item in perm_items:
-                perm_name = perm_item.get("permissionName")
-                
-                # Get full permission details
-                perm_data = get_permission_by_name(perm_name)
-                if perm_data:
-                    clean_perm = {k: v for k, v in perm_data.items() if k not in ["PK", "SK", "entityType"]}
-                    
-                    # Track which role granted this permission
-                    if perm_name not in all_permissions:
-                        clean_perm["grantedBy"] = [role_name]
-                        all_permissions[perm_name] = clean_perm
-                    else:
-                        all_permissions[perm_name]["grantedBy"].append(role_name)
-        
-        permissions_list = list(all_permissions.values())
+        permissions_list = [simplify(permission) for permission in compute_user_permissions(user_id)]
         
         return SuccessResponse.build({
             "message": "User permissions computed successfully",
@@ -1715,17 +2450,6 @@ def handle_create_component(event: dict, authenticated_user: dict):
         
         component_name = comp_data.componentName
 
-        # Check if component already exists by name
-        response = table.scan(
-            FilterExpression="entityType = :entity_type AND componentName = :component_name",
-            ExpressionAttributeValues={
-                ":entity_type": ENTITY_TYPE_COMPONENT,
-                ":component_name": component_name
-            }
-        )
-        if response.get("Items"):
-            return ErrorResponse.build(f"Component '{component_name}' already exists", 409)
-
         component_id = str(uuid.uuid4())
         pk = f"COMPONENT#{component_id}"
         sk = "META"
@@ -1749,7 +2473,18 @@ def handle_create_component(event: dict, authenticated_user: dict):
             "createdBy": authenticated_user["uid"]
         }
         
-        table.put_item(Item=item)
+        def apply_change(catalog):
+            reject_duplicate_catalog_name(catalog, "components", "componentName", component_name, "Component")
+            catalog["components"][component_id] = _catalog_entry(item)
+
+        try:
+            commit_catalog_change(
+                [{"Put": {"TableName": TABLE_NAME, "Item": _serialize_item(item), "ConditionExpression": "attribute_not_exists(PK)"}}],
+                apply_change
+            )
+        except CatalogNameTaken as e:
+            return ErrorResponse.build(str(e), 409)
+        bump_rbac_version()
         
         clean_item = simplify({k: v for k, v in item.items() if k not in ["PK", "SK", "entityType"]})
         
@@ -1768,13 +2503,7 @@ def handle_list_components(authenticated_user: dict):
         return ErrorResponse.build("Insufficient permissions", 403)
     
     try:
-        response = table.scan(
-            FilterExpression="entityType = :entity_type",
-            ExpressionAttributeValues={":entity_type": ENTITY_TYPE_COMPONENT}
-        )
-        
-        items = response.get("Items", [])
-        clean_items = [simplify({k: v for k, v in item.items() if k not in ["PK", "SK", "entityType"]}) for item in items]
+        clean_items = [simplify(component) for component in load_rbac_catalog()["components"].values()]
         
         # Sort by order
         clean_items.sort(key=lambda x: x.get("order", 0))
@@ -1830,55 +2559,30 @@ def handle_update_component(component_id: str, event: dict, authenticated_user:
         response = table.get_item(Key={"PK": pk, "SK": sk})
         if "Item" not in response:
             return ErrorResponse.build(f"Component '{component_id}' not found", 404)
+        existing_item = response["Item"]
         
         body = json.loads(event.get("body", "{}"))
         
-        # Build update expression
-        update_expressions = []
-        expression_values = {}
-        expression_names = {}
-        
         # Updatable fields
-        updatable_fields = {
-            "path": "path",
-            "icon": "icon",
-            "order": "order",
-            "category": "category",
-            "requiredPermissions": "requiredPermissions",
-            "optionalPermissions": "optionalPermissions"
-        }
+        updatable_fields = ["path", "icon", "order", "category", "requiredPermissions", "optionalPermissions"]
+        updates = {field: body[field] for field in updatable_fields if field in body}
         
-        for field, attr_name in updatable_fields.items():
-            if field in body:
-                update_expressions.append(f"#{attr_name} = :{attr_name}")
-                expression_values[f":{attr_name}"] = body[field]
-                expression_names[f"#{attr_name}"] = attr_name
-        
-        if not update_expressions:
+        if not updates:
             return ErrorResponse.build("No valid fields to update", 400)
         
         # Add updatedAt and updatedBy
-        timestamp = datetime.utcnow().isoformat()
-        update_expressions.append("#updatedAt = :updatedAt")
-        update_expressions.append("#updatedBy = :updatedBy")
-        expression_values[":updatedAt"] = timestamp
-        expression_values[":updatedBy"] = authenticated_user["uid"]
-        expression_names["#updatedAt"] = "updatedAt"
-        expression_names["#updatedBy"] = "updatedBy"
-        
-        # Execute update
-        update_expression = "SET " + ", ".join(update_expressions)
-        
-        response = table.update_item(
-            Key={"PK": pk, "SK": sk},
-            UpdateExpression=update_expression,
-            ExpressionAttributeNames=expression_names,
-            ExpressionAttributeValues=expression_values,
-            ReturnValues="ALL_NEW"
-        )
+        updates["updatedAt"] = datetime.utcnow().isoformat()
+        updates["updatedBy"] = authenticated_user["uid"]
         
-        updated_item = response["Attributes"]
-        clean_item = simplify({k: v for k, v in updated_item.items() if k not in ["PK", "SK", "entityType"]})
+        # Write the component and the catalog snapshot together
+        def apply_change(catalog):
+            current = catalog["components"].get(component_id, _catalog_entry(existing_item))
+            catalog["components"][component_id] = {**current, **updates}
+        
+        commit_catalog_change([build_update_operation({"PK": pk, "SK": sk}, updates)], apply_change)
+        bump_rbac_version()
+        
+        clean_item = simplify(_catalog_entry({**existing_item, **updates}))
         
         return SuccessResponse.build({
             "message": "Component updated successfully",
@@ -1905,7 +2609,11 @@ def handle_delete_component(component_id: str, authenticated_user: dict):
             return ErrorResponse.build(f"Component '{component_id}' not found", 404)
         
         # Delete the component
-        table.delete_item(Key={"PK": pk, "SK": sk})
+        commit_catalog_change(
+            [{"Delete": {"TableName": TABLE_NAME, "Key": _serialize_item({"PK": pk, "SK": sk})}}],
+            lambda catalog: catalog["components"].pop(component_id, None)
+        )
+        bump_rbac_version()
         
         return SuccessResponse.build({
             "message": f"Component '{component_id}' deleted successfully"
@@ -1921,6 +2629,12 @@ def handle_delete_component(component_id: str, authenticated_user: dict):
 
 def lambda_handler(event, context):
     logger.info(json.dumps(event))
+    flush_due_login_activity()
+
+    # S3 ObjectCreated notifications for directly uploaded profile pictures
+    records = event.get("Records") or []
+    if records and all(record.get("eventSource") == "aws:s3" for record in records):
+        return handle_profile_picture_uploaded(event)
 
     # Try multiple ways to extract the HTTP method (HTTP API 2.0 compatibility)
     method = (
@@ -2139,6 +2853,10 @@ def lambda_handler(event, context):
             # POST /users/sync - Link Firebase UID to DynamoDB user on first login
             return handle_user_sync(event)
 
+        elif method == "POST" and path.rstrip("/").endswith("/users/bulk"):
+            # POST /users/bulk - Provision many users from CSV or JSON
+            return handle_bulk_create_users(event, authenticated_user)
+
         elif method == "POST" and (path == "/users" or path == "/" or path == ""):
             # POST /users - Create new user
             return handle_create_user(event, authenticated_user)
@@ -2164,12 +2882,169 @@ def lambda_handler(event, context):
 
 # Handler Functions
 
+def user_index_attributes(user: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Derived attributes the listing indexes are keyed on.
+    regionCombo is the contiguous run of assigned levels, each followed by "#", so a
+    district-level user ("S#D#") and a village-level user ("S#D#M#V#") both match a
+    begins_with("S#D#") query.
+    """
+    attributes = {"activeStatus": "ACTIVE" if user.get("isActive", True) else "INACTIVE"}
+    levels = []
+    for level in USER_REGION_LEVELS:
+        if not user.get(level):
+            break
+        levels.append(user[level])
+    attributes["regionCombo"] = "".join(f"{level}#" for level in levels) if levels else None
+    return attributes
+
+
+def encode_user_cursor(index_name: str, last_evaluated_key: Dict[str, Any]) -> str:
+    """Encode a query LastEvaluatedKey (and the index it belongs to) as an opaque nextToken."""
+    payload = {"index": index_name, "key": simplify(last_evaluated_key)}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("utf-8")
+
+
+def decode_user_cursor(token: str, index_name: str):
+    """Decode a nextToken produced by encode_user_cursor. Returns (key, error)."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("utf-8")).decode("utf-8"))
+    except Exception as e:
+        logger.error(f"Invalid nextToken: {e}")
+        return None, "Invalid nextToken"
+    if payload.get("index") != index_name or not isinstance(payload.get("key"), dict):
+        return None, "nextToken does not match the requested filters"
+    return payload["key"], None
+
+
+def build_user_list_query(filters: Dict[str, Any]):
+    """
+    Choose the most selective index for GET /users from the request filters.
+
+    - stateId + districtId (+ deeper levels) -> UserRegionIndex, begins_with(regionCombo, ...)
+    - role                                   -> UserRoleIndex, newest first
+    - stateId                                -> UserRegionIndex
+    - isActive                               -> UserActiveIndex, newest first
+    - otherwise                              -> UserEntityIndex, newest first
+    Filters not covered by the key condition become a FilterExpression.
+    Returns (query_params, index_name).
+    """
+    remaining = {k: v for k, v in filters.items() if v is not None and v != ""}
+
+    def region_query():
+        # Longest contiguous run of hierarchy levels becomes the regionCombo prefix
+        prefix_parts = []
+        for level in USER_REGION_LEVELS:
+            if not remaining.get(level):
+                break
+            prefix_parts.append(remaining.pop(level))
+        key_condition = Key("stateId").eq(prefix_parts[0])
+        if len(prefix_parts) > 1:
+            key_condition = key_condition & Key("regionCombo").begins_with("".join(f"{part}#" for part in prefix_parts))
+        return key_condition
+
+    if remaining.get("stateId") and remaining.get("districtId"):
+        index_name = USER_REGION_INDEX
+        key_condition = region_query()
+    elif remaining.get("role"):
+        index_name = USER_ROLE_INDEX
+        key_condition = Key("role").eq(remaining.pop("role"))
+    elif remaining.get("stateId"):
+        index_name = USER_REGION_INDEX
+        key_condition = region_query()
+    elif "isActive" in remaining:
+        index_name = USER_ACTIVE_INDEX
+        key_condition = Key("activeStatus").eq("ACTIVE" if remaining.pop("isActive") else "INACTIVE")
+    else:
+        index_name = USER_ENTITY_INDEX
+        key_condition = Key("entityType").eq(ENTITY_TYPE_USER)
+
+    filter_expression = Attr("entityType").eq(ENTITY_TYPE_USER) if index_name != USER_ENTITY_INDEX else None
+    for attribute, value in remaining.items():
+        condition = Attr(attribute).eq(value)
+        filter_expression = condition if filter_expression is None else filter_expression & condition
+
+    query_params = {
+        "IndexName": index_name,
+        "KeyConditionExpression": key_condition,
+        "ScanIndexForward": index_name == USER_REGION_INDEX
+    }
+    if filter_expression is not None:
+        query_params["FilterExpression"] = filter_expression
+    return query_params, index_name
+
+
+def query_users_page(filters: Dict[str, Any], limit: int, next_token: Optional[str] = None, search: Optional[str] = None):
+    """
+    Fetch one page of users via the listing indexes. Returns (items, next_token, error).
+
+    Without search, each query call is capped at the number of items still needed, so
+    LastEvaluatedKey is a stable cursor. The search term matches decrypted names, so it
+    is applied after reading; the cursor is then rebuilt from the last returned item so
+    users beyond the page are not skipped. At most USER_LIST_MAX_QUERY_PAGES query calls
+    are made, so a page can come back short with a nextToken to continue from.
+    """
+    if limit < 1:
+        return None, None, f"limit must be between 1 and {MAX_PAGE_LIMIT}"
+
+    query_params, index_name = build_user_list_query(filters)
+    if next_token:
+        start_key, error = decode_user_cursor(next_token, index_name)
+        if error:
+            return None, None, error
+        query_params["ExclusiveStartKey"] = start_key
+
+    items = []
+    last_evaluated_key = None
+    query_pages = 0
+    while len(items) < limit and query_pages < USER_LIST_MAX_QUERY_PAGES:
+        query_pages += 1
+        query_params["Limit"] = limit - len(items) if not search else limit
+        response = table.query(**query_params)
+        batch = response.get("Items", [])
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if search:
+            batch = [item for item in batch if user_matches_search(item, search)]
+            if len(items) + len(batch) > limit:
+                items.extend(batch[:limit - len(items)])
+                last_item = items[-1]
+                key_attributes = ["PK", "SK"] + [part["AttributeName"] for part in index_key_schema(index_name)]
+                last_evaluated_key = {attr: last_item[attr] for attr in key_attributes}
+                break
+        items.extend(batch)
+        if not last_evaluated_key:
+            break
+        query_params["ExclusiveStartKey"] = last_evaluated_key
+
+    logger.info(f"Queried {len(items)} users from {index_name} with filters {filters}")
+    token = encode_user_cursor(index_name, last_evaluated_key) if last_evaluated_key else None
+    return items, token, None
+
+
+def index_key_schema(index_name: str) -> List[Dict[str, str]]:
+    """Key attributes of a listing index (hash, range) in KeySchema form."""
+    hash_key, range_key = {
+        USER_ENTITY_INDEX: ("entityType", "createdAt"),
+        USER_ROLE_INDEX: ("role", "createdAt"),
+        USER_ACTIVE_INDEX: ("activeStatus", "createdAt"),
+        USER_REGION_INDEX: ("stateId", "regionCombo")
+    }[index_name]
+    return [{"AttributeName": hash_key, "KeyType": "HASH"}, {"AttributeName": range_key, "KeyType": "RANGE"}]
+
+
+def user_matches_search(item: Dict[str, Any], search: str) -> bool:
+    """Case-insensitive match on first name, last name or email (names are stored encrypted)."""
+    user = prepare_item_for_response(dict(item), ENTITY_TYPE_USER, decrypt=True)
+    term = search.lower()
+    return any(term in str(user.get(field) or "").lower() for field in ("firstName", "lastName", "email"))
+
+
 def handle_list_users(query_parameters: Dict[str, Any], authenticated_user: Optional[Dict[str, Any]], should_decrypt: bool):
     """
     GET /users - List users with pagination and filters.
     Query parameters:
     - limit: Page size (default 50, max 100)
-    - lastEvaluatedKey: Pagination token
+    - nextToken: Opaque pagination token from the previous page (lastEvaluatedKey is accepted as an alias)
     - role: Filter by role
     - isActive: Filter by active status (true/false)
     - stateId, districtId, mandalId, villageId: Filter by region
@@ -2181,13 +3056,15 @@ def handle_list_users(query_parameters: Dict[str, Any], authenticated_user: Opti
     
     try:
         # Parse pagination
-        requested_limit = min(int(query_parameters.get("limit", DEFAULT_PAGE_LIMIT)), MAX_PAGE_LIMIT)
-        last_key = query_parameters.get("lastEvaluatedKey")
+        try:
+            requested_limit = min(int(query_parameters.get("limit", DEFAULT_PAGE_LIMIT)), MAX_PAGE_LIMIT)
+        except ValueError:
+            return ErrorResponse.build(f"limit must be between 1 and {MAX_PAGE_LIMIT}", 400)
+        if requested_limit < 1:
+            return ErrorResponse.build(f"limit must be between 1 and {MAX_PAGE_LIMIT}", 400)
+        next_token = query_parameters.get("nextToken") or query_parameters.get("lastEvaluatedKey")
         
-        # Build filter expression
-        filter_expressions = ["entityType = :entityType", "SK = :sk"]
-        expression_values = {":entityType": ENTITY_TYPE_USER, ":sk": "ENTITY#USER"}
-        expression_names = {}
+        filters = {}
         
         # Role filter
         if "role" in query_parameters:
@@ -2195,115 +3072,48 @@ def handle_list_users(query_parameters: Dict[str, Any], authenticated_user: Opti
             # Validate role exists
             if not validate_role_exists(role):
                 return ErrorResponse.build(f"Invalid role: '{role}' does not exist in the database", 400)
-            filter_expressions.append("#role = :role")
-            expression_values[":role"] = role
-            expression_names["#role"] = "role"
+            filters["role"] = role
         
         # Active status filter
         if "isActive" in query_parameters:
-            is_active = query_parameters["isActive"].lower() == "true"
-            filter_expressions.append("isActive = :isActive")
-            expression_values[":isActive"] = is_active
+            filters["isActive"] = query_parameters["isActive"].lower() == "true"
         
         # Region filters
-        for region_field in ["stateId", "districtId", "mandalId", "villageId"]:
+        for region_field in USER_REGION_LEVELS:
             if region_field in query_parameters:
-                filter_expressions.append(f"{region_field} = :{region_field}")
-                expression_values[f":{region_field}"] = query_parameters[region_field]
+                filters[region_field] = query_parameters[region_field]
         
-        # Keep scanning until we get enough USER entities or run out of items
-        collected_items = []
-        scan_last_key = None
+        items, token, error = query_users_page(filters, requested_limit, next_token, query_parameters.get("search"))
+        if error:
+            return ErrorResponse.build(error, 400)
         
-        if last_key:
-            try:
-                scan_last_key = json.loads(last_key)
-            except:
-                return ErrorResponse.build("Invalid lastEvaluatedKey", 400)
-        
-        # Scan with larger internal limit to account for filtered items
-        # Multiply requested limit by 20 to increase chances of getting enough users
-        max_scans = 5  # Prevent infinite loops
-        scan_count = 0
-        
-        while len(collected_items) < requested_limit and scan_count < max_scans:
-            # Build scan parameters with larger limit
-            scan_params = {
-                "Limit": requested_limit * 20,  # Scan more items to find enough USER entities
-                "FilterExpression": " AND ".join(filter_expressions),
-                "ExpressionAttributeValues": expression_values
-            }
-            
-            if expression_names:
-                scan_params["ExpressionAttributeNames"] = expression_names
-            
-            if scan_last_key:
-                scan_params["ExclusiveStartKey"] = scan_last_key
-            
-            # Execute scan
-            response = table.scan(**scan_params)
-            items = response.get("Items", [])
-            
-            # Apply search filter (post-scan since DynamoDB doesn't support contains well)
-            if "search" in query_parameters:
-                search_term = query_parameters["search"].lower()
-                items = [
-                    item for item in items
-                    if search_term in item.get("firstName", "").lower() or
-                       search_term in item.get("lastName", "").lower() or
-                       search_term in item.get("email", "").lower()
-                ]
-            
-            # Add items to collection
-            collected_items.extend(items)
-            
-            # Check if there are more items to scan
-            if "LastEvaluatedKey" in response:
-                scan_last_key = response["LastEvaluatedKey"]
-                scan_count += 1
-            else:
-                # No more items in table
-                scan_last_key = None
-                break
-            
-            # If we have enough items, stop scanning
-            if len(collected_items) >= requested_limit:
-                break
-        
-        # Trim to requested limit
-        items = collected_items[:requested_limit]
-        has_more = len(collected_items) > requested_limit or scan_last_key is not None
-        
-        # Trim to requested limit
-        items = collected_items[:requested_limit]
-        has_more = len(collected_items) > requested_limit or scan_last_key is not None
-        
-        # Process items
+        # Process items (login counters live on the activity items - one batch read per page)
+        activity = get_login_activity([item["id"] for item in items if item.get("id")]) if items else {}
+        items = [merge_login_activity(item, activity.get(item.get("id"))) for item in items]
         items = [simplify(prepare_item_for_response(item, ENTITY_TYPE_USER, decrypt=should_decrypt)) for item in items]
         
-        # Remove internal DynamoDB fields
-        cleaned_items = []
-        for item in items:
-            cleaned_item = {k: v for k, v in item.items() if k not in ['PK', 'SK', 'entityType']}
-            cleaned_items.append(cleaned_item)
+        # Remove internal DynamoDB and index fields
+        hidden_fields = {"PK", "SK", "entityType"} | USER_INDEX_FIELDS
+        cleaned_items = [{k: v for k, v in item.items() if k not in hidden_fields} for item in items]
         
         # Build response
         result = {
             "users": cleaned_items,
             "count": len(cleaned_items),
             "pagination": {
-                "limit": requested_limit
+                "limit": requested_limit,
+                "hasMore": token is not None
             }
         }
         
-        if scan_last_key:
-            result["pagination"]["lastEvaluatedKey"] = json.dumps(scan_last_key)
-            result["pagination"]["hasMore"] = True
-        else:
-            result["pagination"]["hasMore"] = False
+        if token:
+            result["pagination"]["nextToken"] = token
+            result["pagination"]["lastEvaluatedKey"] = token
         
         return SuccessResponse.build(result)
     
+    except ValueError as e:
+        return ErrorResponse.build(f"Invalid query parameter: {str(e)}", 400)
     except Exception as e:
         logger.error(f"Error listing users: {str(e)}")
         return ErrorResponse.build(f"Error listing users: {str(e)}", 500)
@@ -2317,16 +3127,17 @@ def handle_get_user(user_id: str, authenticated_user: Optional[Dict[str, Any]],
     
     try:
         logger.info(f"GET user with id={user_id}")
-        # Use PK/SK composite key structure
-        response = table.get_item(Key={
-            "PK": f"USER#{user_id}",
-            "SK": "ENTITY#USER"
-        })
-        item = response.get("Item")
+        # User and login activity in one batch read (PK/SK composite key structure)
+        items = {item["SK"]: item for item in batch_get_items([
+            {"PK": f"USER#{user_id}", "SK": "ENTITY#USER"},
+            login_activity_key(user_id)
+        ])}
+        item = items.get("ENTITY#USER")
         
         if not item:
             return ErrorResponse.build(f"User with id {user_id} not found", 404)
         
+        item = merge_login_activity(item, items.get(LOGIN_ACTIVITY_SK))
         item = prepare_item_for_response(item, ENTITY_TYPE_USER, decrypt=should_decrypt)
         item = simplify(item)
         
@@ -2340,10 +3151,164 @@ def handle_get_user(user_id: str, authenticated_user: Optional[Dict[str, Any]],
         return ErrorResponse.build(f"Error getting user: {str(e)}", 500)
 
 
+# ====== LOGIN ACTIVITY ======
+#
+# Logins are counted on USER#<id>/ACTIVITY#LOGIN instead of the user item, so a user who
+# reloads often no longer rewrites the item every other user write touches. Each container
+# buffers logins and writes the activity item at most once per LOGIN_ACTIVITY_WINDOW_SECONDS
+# per user; the lastFlushAt condition holds that window across containers. Every invocation
+# flushes the buffers whose window has passed, so a user who does not log in again is still
+# counted once the container handles any other request. The buffer is an LRU of
+# LOGIN_ACTIVITY_CACHE_MAX_ENTRIES users and an evicted user's logins are written on eviction.
+# Logins buffered when the container is recycled (at most one window per user) are not
+# counted. The user view adds the activity counters to the loginCount/lastLoginAt left on the
+# user item by earlier versions.
+
+LOGIN_ACTIVITY_SK = "ACTIVITY#LOGIN"
+LOGIN_ACTIVITY_DAY_SK_PREFIX = "ACTIVITY#DAY#"
+LOGIN_ACTIVITY_WINDOW_SECONDS = int(os.environ.get("LOGIN_ACTIVITY_WINDOW_SECONDS", "300"))
+LOGIN_ACTIVITY_DAILY_ROLLUP = os.environ.get("LOGIN_ACTIVITY_DAILY_ROLLUP", "false").lower() == "true"
+LOGIN_ACTIVITY_DAILY_TTL_DAYS = int(os.environ.get("LOGIN_ACTIVITY_DAILY_TTL_DAYS", "400"))
+LOGIN_ACTIVITY_CACHE_MAX_ENTRIES = int(os.environ.get("LOGIN_ACTIVITY_CACHE_MAX_ENTRIES", "1024"))
+
+# user_id -> {"activity": last known activity item, "pending": unflushed logins, "nextFlushAt": epoch}
+_login_activity = OrderedDict()
+
+
+def login_activity_key(user_id: str) -> Dict[str, str]:
+    return {"PK": f"USER#{user_id}", "SK": LOGIN_ACTIVITY_SK}
+
+
+def _empty_pending_logins() -> Dict[str, Any]:
+    return {"count": 0, "lastLoginAt": None, "days": {}}
+
+
+def merge_login_activity(user: Dict[str, Any], activity: Optional[Dict[str, Any]],
+                         pending: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """User view with login counters from the activity item (and unflushed logins) merged in."""
+    sources = [user, activity or {}, pending or {}]
+    merged = dict(user)
+    merged["loginCount"] = sum(int(source.get("loginCount", source.get("count")) or 0) for source in sources)
+    last_logins = [source["lastLoginAt"] for source in sources if source.get("lastLoginAt")]
+    merged["lastLoginAt"] = max(last_logins) if last_logins else None
+    return merged
+
+
+def get_login_activity(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Activity items for many users in batched reads, keyed by user id."""
+    items = batch_get_items([login_activity_key(user_id) for user_id in dict.fromkeys(user_ids)])
+    return {item["userId"]: item for item in items}
+
+
+def flush_login_activity(user_id: str, pending: Dict[str, Any], now: float, force: bool = False):
+    """
+    Add buffered logins to the activity item unless another container flushed within the
+    window (force skips that check, for buffers about to be dropped).
+    Returns (flushed, activity item as stored after or instead of this write).
+    """
+    update_params = {
+        "Key": login_activity_key(user_id),
+        "UpdateExpression": "SET #userId = :user_id, #entityType = :entity_type, "
+                            "#lastLoginAt = :last_login, #lastFlushAt = :now ADD #loginCount :count",
+        "ExpressionAttributeNames": {
+            "#userId": "userId",
+            "#entityType": "entityType",
+            "#lastLoginAt": "lastLoginAt",
+            "#lastFlushAt": "lastFlushAt",
+            "#loginCount": "loginCount"
+        },
+        "ExpressionAttributeValues": {
+            ":user_id": user_id,
+            ":entity_type": ENTITY_TYPE_LOGIN_ACTIVITY,
+            ":last_login": pending["lastLoginAt"],
+            ":now": int(now),
+            ":count": pending["count"]
+        },
+        "ReturnValues": "ALL_NEW",
+        "ReturnValuesOnConditionCheckFailure": "ALL_OLD"
+    }
+    if not force:
+        update_params["ConditionExpression"] = "attribute_not_exists(#lastFlushAt) OR #lastFlushAt <= :window_start"
+        update_params["ExpressionAttributeValues"][":window_start"] = int(now) - LOGIN_ACTIVITY_WINDOW_SECONDS
+    try:
+        response = table.update_item(**update_params)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        old_item = e.response.get("Item")
+        return False, _deserialize_item(old_item) if old_item else None
+
+    if LOGIN_ACTIVITY_DAILY_ROLLUP:
+        for day, count in pending["days"].items():
+            table.update_item(
+                Key={"PK": f"USER#{user_id}", "SK": f"{LOGIN_ACTIVITY_DAY_SK_PREFIX}{day}"},
+                UpdateExpression="SET #userId = :user_id, #entityType = :entity_type, #ttl = :ttl ADD #logins :count",
+                ExpressionAttributeNames={"#userId": "userId", "#entityType": "entityType", "#ttl": "ttl", "#logins": "logins"},
+                ExpressionAttributeValues={
+                    ":user_id": user_id,
+                    ":entity_type": ENTITY_TYPE_LOGIN_ACTIVITY,
+                    ":ttl": int(datetime.strptime(day, "%Y-%m-%d").timestamp()) + LOGIN_ACTIVITY_DAILY_TTL_DAYS * 86400,
+                    ":count": count
+                }
+            )
+    return True, response["Attributes"]
+
+
+def record_login(user_id: str, timestamp: str):
+    """
+    Count a login, writing the activity item only when the user's window has passed.
+    Returns (activity, pending) for merge_login_activity.
+    """
+    now = time.time()
+    state = _login_activity.setdefault(user_id, {"activity": None, "pending": _empty_pending_logins(), "nextFlushAt": 0})
+    _login_activity.move_to_end(user_id)
+    while len(_login_activity) > LOGIN_ACTIVITY_CACHE_MAX_ENTRIES:
+        evicted_id, evicted = _login_activity.popitem(last=False)
+        if evicted["pending"]["count"]:
+            _flush_buffered_logins(evicted_id, evicted, now, force=True)
+    pending = state["pending"]
+    pending["count"] += 1
+    pending["lastLoginAt"] = timestamp
+    pending["days"][timestamp[:10]] = pending["days"].get(timestamp[:10], 0) + 1
+    if now < state["nextFlushAt"]:
+        return state["activity"], pending
+
+    _flush_buffered_logins(user_id, state, now)
+    return state["activity"], state["pending"]
+
+
+def flush_due_login_activity():
+    """Flush every buffered user whose window has passed (run on each invocation)."""
+    now = time.time()
+    for user_id, state in list(_login_activity.items()):
+        if state["pending"]["count"] and now >= state["nextFlushAt"]:
+            _flush_buffered_logins(user_id, state, now)
+
+
+def _flush_buffered_logins(user_id: str, state: Dict[str, Any], now: float, force: bool = False):
+    """Write one user's buffered logins and update its cache entry; failures keep them buffered."""
+    try:
+        flushed, activity = flush_login_activity(user_id, state["pending"], now, force=force)
+    except Exception as e:
+        # Keep the logins buffered for the next attempt; login itself must not fail
+        logger.warning(f"Could not record login activity for user {user_id}: {str(e)}")
+        return
+
+    if flushed:
+        state["pending"] = _empty_pending_logins()
+        state["nextFlushAt"] = now + LOGIN_ACTIVITY_WINDOW_SECONDS
+    else:
+        # Another container flushed recently - wait out its window
+        state["nextFlushAt"] = int((activity or {}).get("lastFlushAt", now)) + LOGIN_ACTIVITY_WINDOW_SECONDS
+    if activity:
+        state["activity"] = activity
+
+
 def handle_user_sync(event: Dict[str, Any]):
     """
     POST /users/sync - Link Firebase UID to DynamoDB user on first login.
-    Updates lastLoginAt and loginCount.
+    The user item is written only when something on it changes; the login itself is
+    counted through record_login.
     """
     body = event.get("body")
     if not body:
@@ -2364,25 +3329,14 @@ def handle_user_sync(event: Dict[str, Any]):
         firebase_uid = token_claims['uid']
         email = token_claims['email']
         
-        # Find user by email - Use Query with GSI in production
-        # For now, using scan (should add GSI on email field)
-        response = table.scan(
-            FilterExpression="email = :email AND entityType = :entityType",
-            ExpressionAttributeValues={
-                ":email": email,
-                ":entityType": ENTITY_TYPE_USER
-            }
-        )
-        
-        items = response.get("Items", [])
-        if not items:
+        # Find user by email through the EMAIL# lookup item
+        user = find_user_by_email(email)
+        if not user:
             return ErrorResponse.build(
                 f"User with email {email} not found in system. Please contact your administrator for account setup.",
                 404
             )
         
-        user = items[0]
-        
         # Check if user is active
         if not user.get("isActive", False):
             return ErrorResponse.build(
@@ -2405,14 +3359,10 @@ def handle_user_sync(event: Dict[str, Any]):
             first_name = name_parts[0]
             last_name = name_parts[1] if len(name_parts) > 1 else ""
         
-        # Update user with Firebase UID and login info
+        # Update user with Firebase UID and profile info
         update_expr_parts = []
-        expr_values = {
-            ":updated": timestamp,
-            ":verified": token_claims.get('email_verified', False),
-            ":lastLogin": timestamp,
-            ":one": 1
-        }
+        expr_values = {}
+        expr_names = {}
         
         if not user.get("firebaseUid"):
             update_expr_parts.append("firebaseUid = :uid")
@@ -2431,35 +3381,32 @@ def handle_user_sync(event: Dict[str, Any]):
             expr_names["#lastName"] = "lastName"
             expr_values[":lastName"] = last_name
         
-        update_expr_parts.extend([
-            "#updatedAt = :updated",
-            "#emailVerified = :verified",
-            "#lastLoginAt = :lastLogin",
-            "#loginCount = if_not_exists(#loginCount, :zero) + :one"
-        ])
-        expr_names.update({
-            "#updatedAt": "updatedAt",
-            "#emailVerified": "emailVerified",
-            "#lastLoginAt": "lastLoginAt",
-            "#loginCount": "loginCount"
-        })
-        expr_values[":zero"] = 0
+        email_verified = token_claims.get('email_verified', False)
+        if user.get("emailVerified") != email_verified:
+            update_expr_parts.append("#emailVerified = :verified")
+            expr_names["#emailVerified"] = "emailVerified"
+            expr_values[":verified"] = email_verified
         
-        update_expression = "SET " + ", ".join(update_expr_parts)
-        
-        # Use PK/SK composite keys for the update with ExpressionAttributeNames
-        response = table.update_item(
-            Key={
-                "PK": f"USER#{user_id}",
-                "SK": "ENTITY#USER"
-            },
-            UpdateExpression=update_expression,
-            ExpressionAttributeNames=expr_names,
-            ExpressionAttributeValues=expr_values,
-            ReturnValues="ALL_NEW"
-        )
+        if update_expr_parts:
+            update_expr_parts.append("#updatedAt = :updated")
+            expr_names["#updatedAt"] = "updatedAt"
+            expr_values[":updated"] = timestamp
+            
+            # Use PK/SK composite keys for the update with ExpressionAttributeNames
+            response = table.update_item(
+                Key={
+                    "PK": f"USER#{user_id}",
+                    "SK": "ENTITY#USER"
+                },
+                UpdateExpression="SET " + ", ".join(update_expr_parts),
+                ExpressionAttributeNames=expr_names,
+                ExpressionAttributeValues=expr_values,
+                ReturnValues="ALL_NEW"
+            )
+            user = response["Attributes"]
         
-        updated_user = simplify(response["Attributes"])
+        activity, pending_logins = record_login(user_id, timestamp)
+        updated_user = simplify(merge_login_activity(user, activity, pending_logins))
         logger.info(f"User {email} synced successfully (login count: {updated_user.get('loginCount', 1)})")
         
         # Remove internal DynamoDB fields before returning
@@ -2552,10 +3499,20 @@ def handle_user_sync(event: Dict[str, Any]):
             # Non-blocking - profile sync failure shouldn't fail login
             logger.warning(f"Profile sync failed for user {user_id}: {str(profile_error)}")
         
-        return SuccessResponse.build({
+        response_body = {
             "message": "User synced successfully",
             "user": user_profile
-        })
+        }
+        try:
+            session_token = build_session_token(updated_user)
+            if session_token:
+                response_body["sessionToken"] = session_token
+                response_body["sessionExpiresIn"] = SESSION_TOKEN_TTL_SECONDS
+        except Exception as token_error:
+            # Clients fall back to the Firebase ID token
+            logger.error(f"Failed to issue session token for user {user_id}: {str(token_error)}")
+        
+        return SuccessResponse.build(response_body)
         
     except json.JSONDecodeError as e:
         logger.error(f"JSON decode error: {e}")
@@ -2585,14 +3542,8 @@ def handle_create_user(event: Dict[str, Any], authenticated_user: Optional[Dict[
         
         # Check if email already exists
         email = data.get("email")
-        if email:
-            existing = table.scan(
-                FilterExpression="email = :email",
-                ExpressionAttributeValues={":email": email},
-                Limit=1
-            )
-            if existing.get("Items"):
-                return ErrorResponse.build(f"User with email {email} already exists", 409)
+        if email and find_user_by_email(email):
+            return ErrorResponse.build(f"User with email {email} already exists", 409)
         
         # Validate input using UserUpdate model (same fields as create requires)
         user_data = UserUpdate(**data)
@@ -2610,6 +3561,7 @@ def handle_create_user(event: Dict[str, Any], authenticated_user: Optional[Dict[
         item["PK"] = pk
         item["SK"] = sk
         item["id"] = user_id
+        item["entityType"] = ENTITY_TYPE_USER  # UserEntityIndex hash key: unfiltered GET /users lists by it
         
         # Set timestamps and audit fields
         timestamp = datetime.utcnow().isoformat() + "Z"
@@ -2625,9 +3577,25 @@ def handle_create_user(event: Dict[str, Any], authenticated_user: Optional[Dict[
         if user_data.role:
             item["permissions"] = get_role_permissions_from_database(user_data.role)
         
+        # Listing index attributes; None values are dropped on write (index keys cannot be NULL)
+        item.update(user_index_attributes(item))
+        
         item = prepare_item_for_storage(item, ENTITY_TYPE_USER)
         logger.info(f"Creating user with id={user_id}, email={user_data.email}, role={user_data.role}")
-        table.put_item(Item=item)
+        # User and email lookup are written together; the lookup's condition settles concurrent creates
+        try:
+            dynamodb_client.transact_write_items(TransactItems=[
+                {"Put": {"TableName": TABLE_NAME, "Item": _serialize_item(item)}},
+                {"Put": {
+                    "TableName": TABLE_NAME,
+                    "Item": _serialize_item(build_email_item(user_data.email, user_id)),
+                    "ConditionExpression": "attribute_not_exists(PK)"
+                }}
+            ])
+        except ClientError as e:
+            if is_transaction_condition_failure(e, 1):
+                return ErrorResponse.build(f"User with email {user_data.email} already exists", 409)
+            raise
         
         item = prepare_item_for_response(item, ENTITY_TYPE_USER, decrypt=True)
         item = simplify(item)
@@ -2645,6 +3613,279 @@ def handle_create_user(event: Dict[str, Any], authenticated_user: Optional[Dict[
         return ErrorResponse.build(f"Error creating user: {str(e)}", 500)
 
 
+# ====== BULK USER PROVISIONING ======
+#
+# Each user is four items written in one transaction slice: the user, its EMAIL# lookup
+# (conditional - the uniqueness guard), PROFILE#MAIN and the USER#/ROLE# link. Up to 25
+# users share a transact_write_items call (100-item limit) and slices run in parallel.
+
+BULK_USER_MAX_ROWS = 1000
+BULK_USER_CHUNK_SIZE = BATCH_GET_MAX_KEYS  # one duplicate-check batch read per chunk
+BULK_USER_ITEMS_PER_USER = 4
+BULK_USER_TRANSACTION_USERS = 100 // BULK_USER_ITEMS_PER_USER
+BULK_USER_EMAIL_ITEM_INDEX = 1  # position of the email lookup within a user's items
+BULK_USER_WRITE_WORKERS = 8
+BULK_USER_MAX_RETRIES = 4
+
+
+def parse_bulk_users(event: Dict[str, Any]):
+    """
+    Parse the POST /users/bulk body into (row_number, row) pairs.
+    CSV (header row, format from ?format= or Content-Type) or JSON - a list of users or
+    {"users": [...]}. Empty CSV cells are dropped so optional fields fall back to defaults.
+    Returns (rows, format, error).
+    """
+    params = event.get("queryStringParameters") or {}
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    body = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode("utf-8")
+    if not body.strip():
+        return None, None, "Request body is empty"
+
+    fmt = params.get("format") or ("csv" if "csv" in headers.get("content-type", "") else "json")
+    if fmt == "csv":
+        reader = csv.DictReader(body.lstrip("\ufeff").splitlines())
+        rows = [
+            (row_number, {k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()})
+            for row_number, row in enumerate(reader, start=1)
+        ]
+        return rows, fmt, None
+    if fmt != "json":
+        return None, fmt, "format must be 'csv' or 'json'"
+
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError as e:
+        return None, fmt, f"Invalid JSON: {str(e)}"
+    users = data.get("users") if isinstance(data, dict) else data
+    if not isinstance(users, list):
+        return None, fmt, "JSON body must be a list of users or {\"users\": [...]}"
+    return list(enumerate(users, start=1)), fmt, None
+
+
+def _existing_emails(emails: List[str]) -> set:
+    """Normalized emails that already have an EMAIL# lookup item (batched reads)."""
+    items = batch_get_items([email_key(email) for email in emails])
+    return {item["email"] for item in items}
+
+
+def build_bulk_user_items(user_data: UserUpdate, role: Dict[str, Any], permissions: List[str],
+                          created_by: str, timestamp: str):
+    """Plaintext user, email lookup, profile and role link items for one bulk row. Returns (user_id, items)."""
+    user_id = str(uuid.uuid4())
+    user = user_data.dict()
+    user.update({
+        "PK": f"USER#{user_id}",
+        "SK": "ENTITY#USER",
+        "id": user_id,
+        "entityType": ENTITY_TYPE_USER,
+        "createdAt": timestamp,
+        "updatedAt": timestamp,
+        "createdBy": created_by,
+        "updatedBy": created_by,
+        "permissions": permissions
+    })
+    user.update(user_index_attributes(user))
+    role_link = {
+        "PK": f"USER#{user_id}",
+        "SK": f"ROLE#{role['roleId']}",
+        "entityType": ENTITY_TYPE_USER_ROLE,
+        "userId": user_id,
+        "roleId": role["roleId"],
+        "roleName": role.get("roleName"),
+        "assignedAt": timestamp,
+        "assignedBy": created_by
+    }
+    items = [user, build_email_item(user_data.email, user_id), build_default_profile_item(user_id, user, timestamp), role_link]
+    return user_id, items
+
+
+def _write_bulk_user_slice(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Write up to BULK_USER_TRANSACTION_USERS users in one transaction. Users whose email
+    lookup condition fails are reported as duplicates and the rest retried; conflicts and
+    throttling are retried with backoff. Returns one result per entry.
+    """
+    results = []
+    pending = list(entries)
+    attempt = 0
+    while pending:
+        transact_items = []
+        for entry in pending:
+            for index, item in enumerate(entry["items"]):
+                put = {"TableName": TABLE_NAME, "Item": _serialize_item(item)}
+                if index == BULK_USER_EMAIL_ITEM_INDEX:
+                    put["ConditionExpression"] = "attribute_not_exists(PK)"
+                transact_items.append({"Put": put})
+        try:
+            dynamodb_client.transact_write_items(TransactItems=transact_items)
+            results.extend({"row": entry["row"], "email": entry["email"], "status": "created", "userId": entry["userId"]}
+                           for entry in pending)
+            return results
+        except ClientError as e:
+            code = e.response["Error"]["Code"]
+            duplicates = set()
+            if code == "TransactionCanceledException":
+                duplicates = {
+                    index // BULK_USER_ITEMS_PER_USER
+                    for index in range(len(transact_items))
+                    if is_transaction_condition_failure(e, index)
+                }
+            if duplicates:
+                for position in sorted(duplicates):
+                    entry = pending[position]
+                    results.append({"row": entry["row"], "email": entry["email"], "status": "failed",
+                                    "error": "User with this email already exists"})
+                pending = [entry for position, entry in enumerate(pending) if position not in duplicates]
+                continue
+
+            retryable = code in ("TransactionCanceledException", "ProvisionedThroughputExceededException", "ThrottlingException")
+            attempt += 1
+            if not retryable or attempt >= BULK_USER_MAX_RETRIES:
+                logger.error(f"Bulk user transaction failed for {len(pending)} users: {str(e)}")
+                results.extend({"row": entry["row"], "email": entry["email"], "status": "failed",
+                                "error": f"Write failed: {code}"} for entry in pending)
+                return results
+            time.sleep(0.1 * (2 ** attempt))
+    return results
+
+
+def _failed_bulk_user_results(entries: List[Dict[str, Any]], error: str) -> List[Dict[str, Any]]:
+    """One failed result per entry, for a chunk or slice that could not be written."""
+    return [{"row": entry["row"], "email": entry["email"], "status": "failed", "error": error} for entry in entries]
+
+
+def _provision_bulk_user_chunk(chunk: List[Dict[str, Any]], executor: ThreadPoolExecutor) -> List[Dict[str, Any]]:
+    """
+    Duplicate-check, encrypt and write one chunk of validated rows. An unexpected error
+    fails only the rows it affects: the whole chunk before the writes start, otherwise
+    the one transaction slice that raised.
+    """
+    try:
+        return _write_bulk_user_chunk(chunk, executor)
+    except Exception as e:
+        logger.error(f"Bulk user chunk of {len(chunk)} rows failed: {str(e)}", exc_info=True)
+        return _failed_bulk_user_results(chunk, f"Unexpected error: {str(e)}")
+
+
+def _write_bulk_user_chunk(chunk: List[Dict[str, Any]], executor: ThreadPoolExecutor) -> List[Dict[str, Any]]:
+    results = []
+    existing = _existing_emails([entry["email"] for entry in chunk])
+    pending = []
+    for entry in chunk:
+        if normalize_email(entry["email"]) in existing:
+            results.append({"row": entry["row"], "email": entry["email"], "status": "failed",
+                            "error": "User with this email already exists"})
+        else:
+            pending.append(entry)
+    if not pending:
+        return results
+
+    # KMS has no batch encrypt - fan the per-item calls out across the pool
+    def encrypt(entry):
+        user, email_item, profile, role_link = entry["items"]
+        entry["items"] = [
+            prepare_item_for_storage(user, ENTITY_TYPE_USER),
+            email_item,
+            prepare_item_for_storage(profile, ENTITY_TYPE_PROFILE),
+            role_link
+        ]
+        return entry
+    pending = list(executor.map(encrypt, pending))
+
+    slices = [pending[i:i + BULK_USER_TRANSACTION_USERS] for i in range(0, len(pending), BULK_USER_TRANSACTION_USERS)]
+    futures = [(entries, executor.submit(_write_bulk_user_slice, entries)) for entries in slices]
+    for entries, future in futures:
+        try:
+            results.extend(future.result())
+        except Exception as e:
+            logger.error(f"Bulk user transaction for {len(entries)} users failed: {str(e)}", exc_info=True)
+            results.extend(_failed_bulk_user_results(entries, f"Unexpected error: {str(e)}"))
+    return results
+
+
+def handle_bulk_create_users(event: Dict[str, Any], authenticated_user: Optional[Dict[str, Any]]):
+    """
+    POST /users/bulk - Create many users from a CSV or JSON body.
+
+    Rows are validated like POST /users; roles are resolved once per distinct name. The
+    duplicate check reads EMAIL# lookup items in batches (run scripts/backfill_user_email_index.py
+    first so older users have one), and the conditional lookup write settles concurrent creates.
+    Every row gets a result: created with its userId, or failed with the reason.
+    """
+    if not check_permission(authenticated_user, "user:create"):
+        return ErrorResponse.build("Insufficient permissions to create users", 403)
+
+    rows, fmt, parse_error = parse_bulk_users(event)
+    if parse_error:
+        return ErrorResponse.build(parse_error, 400)
+    if len(rows) > BULK_USER_MAX_ROWS:
+        return ErrorResponse.build(f"Bulk create is limited to {BULK_USER_MAX_ROWS} rows per request", 400)
+
+    timestamp = datetime.utcnow().isoformat() + "Z"
+    created_by = (authenticated_user or {}).get("email", "system")
+    results = []
+    roles = {}
+    seen_emails = set()
+    chunk = []
+
+    with ThreadPoolExecutor(max_workers=BULK_USER_WRITE_WORKERS) as executor:
+        for row_number, row in rows:
+            if not isinstance(row, dict):
+                results.append({"row": row_number, "status": "failed", "error": "Row must be an object"})
+                continue
+            email = row.get("email")
+            restricted_attempted = set(row.keys()) & RESTRICTED_FIELDS
+            if restricted_attempted:
+                results.append({"row": row_number, "email": email, "status": "failed",
+                                "error": f"Cannot set restricted fields: {', '.join(sorted(restricted_attempted))}"})
+                continue
+            try:
+                user_data = UserUpdate(**row)
+            except ValidationError as e:
+                error = e.errors()[0]
+                results.append({"row": row_number, "email": email, "status": "failed",
+                                "error": f"Invalid user data: {'.'.join(str(loc) for loc in error.get('loc', []))} {error.get('msg')}"})
+                continue
+
+            if normalize_email(user_data.email) in seen_emails:
+                results.append({"row": row_number, "email": user_data.email, "status": "failed",
+                                "error": "Duplicate email in request"})
+                continue
+            seen_emails.add(normalize_email(user_data.email))
+
+            role_name = str(user_data.role).lower().replace(" ", "_")
+            if role_name not in roles:
+                role = get_role_from_database(role_name)
+                roles[role_name] = (role, get_role_permissions_from_database(role_name) if role else [])
+            role, permissions = roles[role_name]
+            if not role:
+                results.append({"row": row_number, "email": user_data.email, "status": "failed",
+                                "error": f"Role '{role_name}' does not exist in the database"})
+                continue
+
+            user_id, items = build_bulk_user_items(user_data, role, permissions, created_by, timestamp)
+            chunk.append({"row": row_number, "email": user_data.email, "userId": user_id, "items": items})
+            if len(chunk) >= BULK_USER_CHUNK_SIZE:
+                results.extend(_provision_bulk_user_chunk(chunk, executor))
+                chunk = []
+
+        if chunk:
+            results.extend(_provision_bulk_user_chunk(chunk, executor))
+
+    results.sort(key=lambda result: result["row"])
+    created = sum(1 for result in results if result["status"] == "created")
+    logger.info(f"Bulk user create: {created}/{len(rows)} created ({fmt})")
+    return SuccessResponse.build({
+        "format": fmt,
+        "totalRows": len(rows),
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    }, 200 if created else 400)
+
+
 def handle_update_user_full(user_id: str, event: Dict[str, Any], authenticated_user: Optional[Dict[str, Any]]):
     """PUT /users/{id} - Full update (replace entire user)."""
     # Check update permission
@@ -2711,9 +3952,41 @@ def handle_update_user_full(user_id: str, event: Dict[str, Any], authenticated_u
         # Preserve entityType (restricted field - must not be modified by user)
         item["entityType"] = existing_user.get("entityType", ENTITY_TYPE_USER)
         
+        # Listing index attributes; index keys cannot be NULL, so unset fields are omitted
+        item.update(user_index_attributes(item))
+        item = {k: v for k, v in item.items() if v is not None}
+        
         item = prepare_item_for_storage(item, ENTITY_TYPE_USER)
         logger.info(f"Updating user {user_id} (full replace)")
-        table.put_item(Item=item)
+        old_email = existing_user.get("email")
+        if old_email and normalize_email(old_email) == normalize_email(update_data.email):
+            table.put_item(Item=item)
+        else:
+            # Email changed: move the lookup item with the user in one transaction
+            # Only the lookup this user owns is released: a duplicate left by the email
+            # backfill must not free another user's email
+            operations = [{"Put": {"TableName": TABLE_NAME, "Item": _serialize_item(item)}}]
+            old_lookup = table.get_item(Key=email_key(old_email)).get("Item") if old_email else None
+            if old_lookup and old_lookup.get("userId") == user_id:
+                operations.append({"Delete": {
+                    "TableName": TABLE_NAME,
+                    "Key": _serialize_item(email_key(old_email)),
+                    "ConditionExpression": "attribute_not_exists(PK) OR userId = :user_id",
+                    "ExpressionAttributeValues": {":user_id": {"S": user_id}}
+                }})
+            elif old_lookup:
+                logger.warning(f"Email lookup for user {user_id}'s old email belongs to another user; leaving it")
+            operations.append({"Put": {
+                "TableName": TABLE_NAME,
+                "Item": _serialize_item(build_email_item(update_data.email, user_id)),
+                "ConditionExpression": "attribute_not_exists(PK)"
+            }})
+            try:
+                dynamodb_client.transact_write_items(TransactItems=operations)
+            except ClientError as e:
+                if is_transaction_condition_failure(e, len(operations) - 1):
+                    return ErrorResponse.build(f"User with email {update_data.email} already exists", 409)
+                raise
         
         item = prepare_item_for_response(item, ENTITY_TYPE_USER, decrypt=True)
         item = simplify(item)
@@ -2748,6 +4021,7 @@ def handle_update_user_partial(user_id: str, event: Dict[str, Any], authenticate
         response = table.get_item(Key={"PK": pk, "SK": sk})
         if "Item" not in response:
             return ErrorResponse.build(f"User with id {user_id} not found", 404)
+        existing_user = response["Item"]
         
         data = json.loads(body)
         
@@ -2765,6 +4039,7 @@ def handle_update_user_partial(user_id: str, event: Dict[str, Any], authenticate
         
         # Build update expression
         update_expr_parts = []
+        remove_parts = []
         expr_values = {}
         expr_names = {}
         
@@ -2776,6 +4051,9 @@ def handle_update_user_partial(user_id: str, event: Dict[str, Any], authenticate
         
         if not update_dict:
             return ErrorResponse.build("No fields to update", 400)
+        if "role" in update_dict and update_dict["role"] is None:
+            # role keys UserRoleIndex and drives permissions - it can be changed, not cleared
+            return ErrorResponse.build("role cannot be null", 400)
         
         for field, value in update_dict.items():
             if field == "role":
@@ -2788,6 +4066,10 @@ def handle_update_user_partial(user_id: str, event: Dict[str, Any], authenticate
                 update_expr_parts.append("#permissions = :permissions")
                 expr_names["#permissions"] = "permissions"
                 expr_values[":permissions"] = get_role_permissions_from_database(role_str)
+            elif value is None:
+                # Cleared fields are removed (index key attributes cannot be NULL)
+                remove_parts.append(f"#{field}")
+                expr_names[f"#{field}"] = field
             else:
                 # Always use ExpressionAttributeNames to handle reserved keywords
                 attr_name = field
@@ -2795,6 +4077,16 @@ def handle_update_user_partial(user_id: str, event: Dict[str, Any], authenticate
                 expr_names[f"#{attr_name}"] = field
                 expr_values[f":{attr_name}"] = value
         
+        # Keep the listing index attributes in step with isActive and the region fields
+        if {"isActive", *USER_REGION_LEVELS} & set(update_dict):
+            for field, value in user_index_attributes({**existing_user, **update_dict}).items():
+                expr_names[f"#{field}"] = field
+                if value is None:
+                    remove_parts.append(f"#{field}")
+                else:
+                    update_expr_parts.append(f"#{field} = :{field}")
+                    expr_values[f":{field}"] = value
+        
         # Always update timestamp and updatedBy (both may be reserved keywords in some contexts)
         timestamp = datetime.utcnow().isoformat() + "Z"
         update_expr_parts.append("#updatedAt = :updatedAt")
@@ -2807,6 +4099,8 @@ def handle_update_user_partial(user_id: str, event: Dict[str, Any], authenticate
             expr_values[":updatedBy"] = authenticated_user.get("email", "system")
         
         update_expression = "SET " + ", ".join(update_expr_parts)
+        if remove_parts:
+            update_expression += " REMOVE " + ", ".join(remove_parts)
         
         update_params = {
             "Key": {"PK": pk, "SK": sk},
@@ -2845,12 +4139,35 @@ def handle_delete_user(user_id: str, authenticated_user: Optional[Dict[str, Any]
     
     try:
         # Check if user exists
-        response = table.get_item(Key={"id": user_id})
+        key = {"PK": f"USER#{user_id}", "SK": "ENTITY#USER"}
+        response = table.get_item(Key=key)
         if "Item" not in response:
             return ErrorResponse.build(f"User with id {user_id} not found", 404)
         
         logger.info(f"Deleting user {user_id}")
-        table.delete_item(Key={"id": user_id})
+        email = response["Item"].get("email")
+        if email:
+            # Release the email with the user, unless the lookup belongs to another user
+            try:
+                dynamodb_client.transact_write_items(TransactItems=[
+                    {"Delete": {"TableName": TABLE_NAME, "Key": _serialize_item(key)}},
+                    {"Delete": {
+                        "TableName": TABLE_NAME,
+                        "Key": _serialize_item(email_key(email)),
+                        "ConditionExpression": "attribute_not_exists(PK) OR userId = :user_id",
+                        "ExpressionAttributeValues": {":user_id": {"S": user_id}}
+                    }}
+                ])
+            except ClientError as e:
+                if not is_transaction_condition_failure(e, 1):
+                    raise
+                # A duplicate left by the email backfill; the other user keeps the lookup
+                logger.warning(f"Email lookup for user {user_id} belongs to another user; deleting the user only")
+                table.delete_item(Key=key)
+        else:
+            table.delete_item(Key=key)
+        table.delete_item(Key=login_activity_key(user_id))
+        _login_activity.pop(user_id, None)
         
         return SuccessResponse.build({
             "message": f"User {user_id} deleted successfully"
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Backfill config history entries and current-config pointers for existing device configs.
+
+Configs written before the pointer existed only have CONFIG#<version>#<created>
+items. This script writes a CONFIG_HISTORY#<created>#<version> entry for each one
+and a CONFIG_CURRENT pointer per device (the config with the latest CreatedDate),
+so GET /devices/{deviceId}/configs/history and /configs/current cover them.
+
+Usage:
+    python scripts/backfill_config_history.py [--dry-run] [--table-name NAME]
+
+Options:
+    --dry-run: Preview what would be written without making changes
+    --table-name: Devices DynamoDB table name (default: v_devices_dev)
+"""
+
+import boto3
+import sys
+import argparse
+import logging
+from datetime import datetime
+from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import Attr
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# DynamoDB setup
+dynamodb = boto3.resource('dynamodb')
+
+POINTER_FIELDS = ('DeviceId', 'ConfigVersion', 'ConfigData', 'AppliedBy', 'Status', 'CreatedDate', 'CreatedBy')
+
+
+def scan_all_configs(table_name):
+    """Scan the devices table and return all CONFIG# items."""
+    table = dynamodb.Table(table_name)
+    configs = []
+
+    logger.info(f"Scanning table: {table_name}")
+
+    scan_params = {'FilterExpression': Attr('PK').begins_with('DEVICE#') & Attr('SK').begins_with('CONFIG#')}
+    response = table.scan(**scan_params)
+    configs.extend(response.get('Items', []))
+
+    while 'LastEvaluatedKey' in response:
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        response = table.scan(**scan_params)
+        configs.extend(response.get('Items', []))
+
+    logger.info(f"Found {len(configs)} config records")
+    return configs
+
+
+def config_summary(config):
+    """Fields copied onto history entries and pointers."""
+    summary = {field: config[field] for field in POINTER_FIELDS if config.get(field) is not None}
+    summary['ConfigSK'] = config['SK']
+    return summary
+
+
+def put_if_allowed(table, item, condition, values=None):
+    """Conditional put; returns False when the condition rejects the write."""
+    params = {'Item': item, 'ConditionExpression': condition}
+    if values:
+        params['ExpressionAttributeValues'] = values
+    try:
+        table.put_item(**params)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+
+def backfill_config_history(table_name='v_devices_dev', dry_run=False):
+    """Main backfill function."""
+    table = dynamodb.Table(table_name)
+
+    logger.info("=" * 60)
+    logger.info("Starting Config History Backfill")
+    logger.info(f"Table: {table_name}")
+    logger.info(f"Dry Run: {dry_run}")
+    logger.info("=" * 60)
+
+    configs = scan_all_configs(table_name)
+    stats = {
+        'total_configs': len(configs),
+        'history_written': 0,
+        'history_existing': 0,
+        'pointers_written': 0,
+        'failed': 0
+    }
+
+    latest_by_device = {}
+    for config in configs:
+        _, version, created = config['SK'].split('#', 2)
+        latest = latest_by_device.get(config['PK'])
+        if latest is None or config.get('CreatedDate', created) > latest.get('CreatedDate', ''):
+            latest_by_device[config['PK']] = config
+
+        history_item = {
+            **config_summary(config),
+            'PK': config['PK'],
+            'SK': f'CONFIG_HISTORY#{config.get("CreatedDate", created)}#{config.get("ConfigVersion", version)}',
+            'EntityType': 'CONFIG_HISTORY'
+        }
+        if dry_run:
+            logger.info(f"[DRY RUN] Would write {history_item['SK']} on {config['PK']}")
+            stats['history_written'] += 1
+            continue
+        try:
+            if put_if_allowed(table, history_item, 'attribute_not_exists(PK)'):
+                stats['history_written'] += 1
+            else:
+                stats['history_existing'] += 1
+        except Exception as e:
+            logger.error(f"Failed to write history for {config['PK']}/{config['SK']}: {str(e)}")
+            stats['failed'] += 1
+
+    timestamp = datetime.utcnow().isoformat() + 'Z'
+    for pk, config in latest_by_device.items():
+        pointer_item = {**config_summary(config), 'PK': pk, 'SK': 'CONFIG_CURRENT',
+                        'EntityType': 'CONFIG_CURRENT', 'UpdatedDate': timestamp}
+        if dry_run:
+            logger.info(f"[DRY RUN] Would point {pk} at {config['SK']}")
+            stats['pointers_written'] += 1
+            continue
+        try:
+            # Never move an existing pointer backwards
+            if put_if_allowed(table, pointer_item, 'attribute_not_exists(PK) OR CreatedDate <= :created',
+                              {':created': pointer_item.get('CreatedDate', '')}):
+                stats['pointers_written'] += 1
+        except Exception as e:
+            logger.error(f"Failed to write pointer for {pk}: {str(e)}")
+            stats['failed'] += 1
+
+    # Print summary
+    logger.info("=" * 60)
+    logger.info("Backfill Summary")
+    logger.info("=" * 60)
+    logger.info(f"Total configs:        {stats['total_configs']}")
+    logger.info(f"History written:      {stats['history_written']}")
+    logger.info(f"History existing:     {stats['history_existing']}")
+    logger.info(f"Pointers written:     {stats['pointers_written']}")
+    logger.info(f"Failed:               {stats['failed']}")
+    logger.info("=" * 60)
+
+    if dry_run:
+        logger.info("This was a DRY RUN - no changes were made")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Backfill config history entries and current-config pointers'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Preview backfill without making changes'
+    )
+    parser.add_argument(
+        '--table-name',
+        default='v_devices_dev',
+        help='Devices DynamoDB table name (default: v_devices_dev)'
+    )
+
+    args = parser.parse_args()
+
+    try:
+        backfill_config_history(table_name=args.table_name, dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        logger.info("\nBackfill interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Backfill failed with error: {str(e)}", exc_info=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Backfill denormalized region names onto existing installation records.
+
+Installations created before region names were denormalized only carry the
+region IDs (stateId..habitationId). This script resolves the names from the
+regions table and writes stateName..habitationName onto each INSTALL#<id>/META
+item so installation reads no longer need region lookups.
+
+Usage:
+    python scripts/backfill_install_region_names.py [--dry-run] [--devices-table NAME] [--regions-table NAME]
+
+Options:
+    --dry-run: Preview what would be updated without making changes
+    --devices-table: Devices DynamoDB table name (default: v_devices_dev)
+    --regions-table: Regions DynamoDB table name (default: regions)
+"""
+
+import boto3
+import sys
+import argparse
+import logging
+from boto3.dynamodb.conditions import Attr
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# DynamoDB setup
+dynamodb = boto3.resource('dynamodb')
+
+REGION_NAME_FIELDS = ('stateName', 'districtName', 'mandalName', 'villageName', 'habitationName')
+
+
+def scan_all_installations(table_name):
+    """Scan the devices table and return all installation META records."""
+    table = dynamodb.Table(table_name)
+    installs = []
+
+    logger.info(f"Scanning table: {table_name}")
+
+    scan_params = {'FilterExpression': Attr('entityType').eq('INSTALL') & Attr('SK').eq('META')}
+    response = table.scan(**scan_params)
+    installs.extend(response.get('Items', []))
+
+    while 'LastEvaluatedKey' in response:
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        response = table.scan(**scan_params)
+        installs.extend(response.get('Items', []))
+
+    logger.info(f"Found {len(installs)} installation records")
+    return installs
+
+
+def lookup_region_name(regions_table, cache, pk, sk):
+    """Fetch a RegionName by key, caching results across installations."""
+    if (pk, sk) not in cache:
+        try:
+            response = regions_table.get_item(Key={'PK': pk, 'SK': sk})
+            cache[(pk, sk)] = response.get('Item', {}).get('RegionName')
+        except Exception as e:
+            logger.error(f"Error fetching region {pk}/{sk}: {str(e)}")
+            cache[(pk, sk)] = None
+    return cache[(pk, sk)]
+
+
+def resolve_region_names(regions_table, cache, install):
+    """Resolve stateName..habitationName for an installation using the hierarchical region keys."""
+    state_id = install.get('stateId') or install.get('StateId')
+    district_id = install.get('districtId') or install.get('DistrictId')
+    mandal_id = install.get('mandalId') or install.get('MandalId')
+    village_id = install.get('villageId') or install.get('VillageId')
+    habitation_id = install.get('habitationId') or install.get('HabitationId')
+
+    lookups = {
+        'stateName': (state_id, f'STATE#{state_id}', f'STATE#{state_id}'),
+        'districtName': (district_id and state_id, f'STATE#{state_id}', f'DISTRICT#{district_id}'),
+        'mandalName': (mandal_id and district_id, f'DISTRICT#{district_id}', f'MANDAL#{mandal_id}'),
+        'villageName': (village_id and mandal_id, f'MANDAL#{mandal_id}', f'VILLAGE#{village_id}'),
+        'habitationName': (habitation_id and village_id, f'VILLAGE#{village_id}', f'HABITATION#{habitation_id}')
+    }
+
+    names = {}
+    for field, (present, pk, sk) in lookups.items():
+        if present:
+            name = lookup_region_name(regions_table, cache, pk, sk)
+            if name:
+                names[field] = name
+    return names
+
+
+def backfill_region_names(devices_table_name='v_devices_dev', regions_table_name='regions', dry_run=False):
+    """Main backfill function."""
+    devices_table = dynamodb.Table(devices_table_name)
+    regions_table = dynamodb.Table(regions_table_name)
+
+    logger.info("=" * 60)
+    logger.info("Starting Installation Region Name Backfill")
+    logger.info(f"Devices table: {devices_table_name}")
+    logger.info(f"Regions table: {regions_table_name}")
+    logger.info(f"Dry Run: {dry_run}")
+    logger.info("=" * 60)
+
+    installs = scan_all_installations(devices_table_name)
+
+    stats = {
+        'total_installs': len(installs),
+        'already_complete': 0,
+        'updated': 0,
+        'failed': 0
+    }
+    cache = {}
+
+    for install in installs:
+        if all(install.get(field) for field in REGION_NAME_FIELDS):
+            stats['already_complete'] += 1
+            continue
+
+        names = resolve_region_names(regions_table, cache, install)
+        names = {k: v for k, v in names.items() if install.get(k) != v}
+        if not names:
+            stats['already_complete'] += 1
+            continue
+
+        if dry_run:
+            logger.info(f"[DRY RUN] Would set {names} on {install['PK']}")
+            stats['updated'] += 1
+            continue
+
+        try:
+            devices_table.update_item(
+                Key={'PK': install['PK'], 'SK': install['SK']},
+                UpdateExpression='SET ' + ', '.join(f'{field} = :{field}' for field in names),
+                ExpressionAttributeValues={f':{field}': value for field, value in names.items()}
+            )
+            logger.info(f"Updated region names on {install['PK']}")
+            stats['updated'] += 1
+        except Exception as e:
+            logger.error(f"Failed to update {install['PK']}: {str(e)}")
+            stats['failed'] += 1
+
+    # Print summary
+    logger.info("=" * 60)
+    logger.info("Backfill Summary")
+    logger.info("=" * 60)
+    logger.info(f"Total installations:  {stats['total_installs']}")
+    logger.info(f"Already complete:     {stats['already_complete']}")
+    logger.info(f"Updated:              {stats['updated']}")
+    logger.info(f"Failed:               {stats['failed']}")
+    logger.info("=" * 60)
+
+    if dry_run:
+        logger.info("This was a DRY RUN - no changes were made")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Backfill denormalized region names onto installation records'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Preview backfill without making changes'
+    )
+    parser.add_argument(
+        '--devices-table',
+        default='v_devices_dev',
+        help='Devices DynamoDB table name (default: v_devices_dev)'
+    )
+    parser.add_argument(
+        '--regions-table',
+        default='regions',
+        help='Regions DynamoDB table name (default: regions)'
+    )
+
+    args = parser.parse_args()
+
+    try:
+        backfill_region_names(
+            devices_table_name=args.devices_table,
+            regions_table_name=args.regions_table,
+            dry_run=args.dry_run
+        )
+    except KeyboardInterrupt:
+        logger.info("\nBackfill interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Backfill failed with error: {str(e)}", exc_info=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Backfill the role name lookup items on the users table.
+
+Permission checks resolve a role through a ROLENAME#<name>/META item (written with the
+role) instead of scanning on roleName. This script writes that item for every existing
+ROLE#<id>/META record that lacks one. Two roles sharing a name are reported and left for
+manual cleanup; the first one scanned keeps the lookup.
+
+Once the backfill reports no failures, set ROLE_LOOKUP_SCAN_FALLBACK=false on the users
+Lambda so unknown role names no longer fall back to a scan.
+
+Usage:
+    python scripts/backfill_role_lookup.py [--dry-run] [--table-name NAME]
+
+Options:
+    --dry-run: Preview what would be written without making changes
+    --table-name: Users DynamoDB table name (default: v_users_dev)
+"""
+
+import boto3
+import sys
+import argparse
+import logging
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# DynamoDB setup
+dynamodb = boto3.resource('dynamodb')
+
+
+def normalize_role_name(role_name):
+    return role_name.lower().replace(' ', '_')
+
+
+def backfill_role_lookup(table_name, dry_run=False):
+    """Write ROLENAME#<name>/META for every role that does not have one yet."""
+    table = dynamodb.Table(table_name)
+    scan_params = {'FilterExpression': Attr('entityType').eq('ROLE') & Attr('SK').eq('META')}
+    stats = {'total_roles': 0, 'already_indexed': 0, 'written': 0, 'duplicates': 0, 'no_name': 0, 'failed': 0}
+    seen = {}
+
+    while True:
+        response = table.scan(**scan_params)
+        for role in response.get('Items', []):
+            stats['total_roles'] += 1
+            role_name = role.get('roleName')
+            if not role_name:
+                stats['no_name'] += 1
+                logger.warning(f"Role {role.get('roleId')} has no roleName")
+                continue
+
+            normalized = normalize_role_name(role_name)
+            if normalized in seen and seen[normalized] != role['roleId']:
+                stats['duplicates'] += 1
+                logger.warning(f"Duplicate role name {normalized}: roles {seen[normalized]} and {role['roleId']}")
+                continue
+            seen[normalized] = role['roleId']
+
+            key = {'PK': f'ROLENAME#{normalized}', 'SK': 'META'}
+            if dry_run:
+                existing = table.get_item(Key=key).get('Item')
+                if existing:
+                    stats['already_indexed'] += 1
+                else:
+                    logger.info(f"[DRY RUN] Would write {key['PK']} -> {role['roleId']}")
+                    stats['written'] += 1
+                continue
+
+            try:
+                table.put_item(
+                    Item={**key, 'roleName': normalized, 'roleId': role['roleId']},
+                    ConditionExpression='attribute_not_exists(PK)'
+                )
+                stats['written'] += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    logger.error(f"Failed to write lookup for {role['roleId']}: {str(e)}")
+                    stats['failed'] += 1
+                    continue
+                owner = table.get_item(Key=key).get('Item', {}).get('roleId')
+                if owner == role['roleId']:
+                    stats['already_indexed'] += 1
+                else:
+                    stats['duplicates'] += 1
+                    logger.warning(f"Role name {normalized} of role {role['roleId']} is already held by role {owner}")
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Backfill ROLENAME# lookup items for existing roles'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Preview backfill without making changes'
+    )
+    parser.add_argument(
+        '--table-name',
+        default='v_users_dev',
+        help='Users DynamoDB table name (default: v_users_dev)'
+    )
+
+    args = parser.parse_args()
+
+    logger.info("=" * 60)
+    logger.info("Role Name Lookup Backfill")
+    logger.info(f"Table: {args.table_name}")
+    logger.info(f"Dry Run: {args.dry_run}")
+    logger.info("=" * 60)
+
+    try:
+        stats = backfill_role_lookup(args.table_name, dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        logger.info("\nBackfill interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Backfill failed with error: {str(e)}", exc_info=True)
+        sys.exit(1)
+
+    logger.info("=" * 60)
+    logger.info("Backfill Summary")
+    logger.info("=" * 60)
+    logger.info(f"Total roles:       {stats['total_roles']}")
+    logger.info(f"Already indexed:   {stats['already_indexed']}")
+    logger.info(f"Written:           {stats['written']}")
+    logger.info(f"Duplicate names:   {stats['duplicates']}")
+    logger.info(f"Without name:      {stats['no_name']}")
+    logger.info(f"Failed:            {stats['failed']}")
+    logger.info("=" * 60)
+
+    if args.dry_run:
+        logger.info("This was a DRY RUN - no changes were made")
+
+
+if __name__ == '__main__':
+    main()
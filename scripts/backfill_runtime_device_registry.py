@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Backfill the RUNTIME_DEVICES registry on the devices table.
+
+The runtime archive job ({"job": "archive-runtime"}) walks the RUNTIME_DEVICES
+partition instead of scanning the table for devices. Runtime ingest registers every
+device it stores readings for; this script registers devices that only have
+readings from before the registry existed.
+
+Usage:
+    python scripts/backfill_runtime_device_registry.py [--dry-run] [--table-name NAME]
+
+Options:
+    --dry-run: Preview what would be registered without making changes
+    --table-name: Devices DynamoDB table name (default: v_devices_dev)
+"""
+
+import boto3
+import sys
+import argparse
+import logging
+from boto3.dynamodb.conditions import Attr, Key
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# DynamoDB setup
+dynamodb = boto3.resource('dynamodb')
+
+REGISTRY_PK = 'RUNTIME_DEVICES'
+
+
+def scan_device_ids(table):
+    """All device IDs with a DEVICE#<id>/META record."""
+    scan_params = {
+        'FilterExpression': Attr('PK').begins_with('DEVICE#') & Attr('SK').eq('META'),
+        'ProjectionExpression': 'PK'
+    }
+    device_ids = []
+    while True:
+        response = table.scan(**scan_params)
+        device_ids.extend(item['PK'].split('#', 1)[1] for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return device_ids
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def has_runtime_data(table, device_id):
+    response = table.query(
+        KeyConditionExpression=Key('PK').eq(f'DEVICE#{device_id}') & Key('SK').begins_with('RUNTIME#'),
+        ProjectionExpression='SK',
+        Limit=1
+    )
+    return bool(response.get('Items'))
+
+
+def backfill_registry(table_name='v_devices_dev', dry_run=False):
+    """Register every device that has RUNTIME items."""
+    table = dynamodb.Table(table_name)
+    stats = {'devices': 0, 'registered': 0, 'no_runtime': 0, 'failed': 0}
+
+    for device_id in scan_device_ids(table):
+        stats['devices'] += 1
+        if not has_runtime_data(table, device_id):
+            stats['no_runtime'] += 1
+            continue
+        if dry_run:
+            logger.info(f"[DRY RUN] Would register {device_id}")
+            stats['registered'] += 1
+            continue
+        try:
+            table.put_item(Item={
+                'PK': REGISTRY_PK,
+                'SK': f'DEVICE#{device_id}',
+                'EntityType': 'RUNTIME_DEVICE',
+                'DeviceId': device_id
+            })
+            stats['registered'] += 1
+        except Exception as e:
+            logger.error(f"Failed to register {device_id}: {str(e)}")
+            stats['failed'] += 1
+
+    logger.info(f"Registry backfill: {stats}")
+    if dry_run:
+        logger.info("This was a DRY RUN - no changes were made")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Register devices with RUNTIME data for the archive job')
+    parser.add_argument('--dry-run', action='store_true', help='Preview without making changes')
+    parser.add_argument('--table-name', default='v_devices_dev', help='Devices DynamoDB table name (default: v_devices_dev)')
+    args = parser.parse_args()
+
+    try:
+        stats = backfill_registry(table_name=args.table_name, dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        logger.info("\nBackfill interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Backfill failed with error: {str(e)}", exc_info=True)
+        sys.exit(1)
+    if stats['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
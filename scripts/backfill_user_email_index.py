@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Backfill the email lookup items on the users table.
+
+POST /users/sync and POST /users resolve users through an EMAIL#<normalized email>/META
+item (written transactionally with the user) instead of scanning on email. This script
+writes that item for every existing USER#<id>/ENTITY#USER record that lacks one.
+Two users sharing an email (case-insensitively) are reported and left for manual cleanup;
+the first one scanned keeps the lookup.
+
+Once the backfill reports no failures, set EMAIL_LOOKUP_SCAN_FALLBACK=false on the users
+Lambda so unknown emails no longer fall back to a scan.
+
+Usage:
+    python scripts/backfill_user_email_index.py [--dry-run] [--table-name NAME]
+
+Options:
+    --dry-run: Preview what would be written without making changes
+    --table-name: Users DynamoDB table name (default: v_users_dev)
+"""
+
+import boto3
+import sys
+import argparse
+import logging
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# DynamoDB setup
+dynamodb = boto3.resource('dynamodb')
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+def backfill_email_index(table_name, dry_run=False):
+    """Write EMAIL#<email>/META for every user that does not have one yet."""
+    table = dynamodb.Table(table_name)
+    scan_params = {'FilterExpression': Attr('entityType').eq('USER') & Attr('SK').eq('ENTITY#USER')}
+    stats = {'total_users': 0, 'already_indexed': 0, 'written': 0, 'duplicates': 0, 'no_email': 0, 'failed': 0}
+    seen = {}
+
+    while True:
+        response = table.scan(**scan_params)
+        for user in response.get('Items', []):
+            stats['total_users'] += 1
+            email = user.get('email')
+            if not email:
+                stats['no_email'] += 1
+                logger.warning(f"User {user.get('id')} has no email")
+                continue
+
+            normalized = normalize_email(email)
+            if normalized in seen and seen[normalized] != user['id']:
+                stats['duplicates'] += 1
+                logger.warning(f"Duplicate email {normalized}: users {seen[normalized]} and {user['id']}")
+                continue
+            seen[normalized] = user['id']
+
+            key = {'PK': f'EMAIL#{normalized}', 'SK': 'META'}
+            if dry_run:
+                existing = table.get_item(Key=key).get('Item')
+                if existing:
+                    stats['already_indexed'] += 1
+                else:
+                    logger.info(f"[DRY RUN] Would write {key['PK']} -> {user['id']}")
+                    stats['written'] += 1
+                continue
+
+            try:
+                table.put_item(
+                    Item={**key, 'email': normalized, 'userId': user['id']},
+                    ConditionExpression='attribute_not_exists(PK)'
+                )
+                stats['written'] += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    logger.error(f"Failed to write lookup for {user['id']}: {str(e)}")
+                    stats['failed'] += 1
+                    continue
+                owner = table.get_item(Key=key).get('Item', {}).get('userId')
+                if owner == user['id']:
+                    stats['already_indexed'] += 1
+                else:
+                    stats['duplicates'] += 1
+                    logger.warning(f"Email {normalized} of user {user['id']} is already held by user {owner}")
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Backfill EMAIL# lookup items for existing users'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Preview backfill without making changes'
+    )
+    parser.add_argument(
+        '--table-name',
+        default='v_users_dev',
+        help='Users DynamoDB table name (default: v_users_dev)'
+    )
+
+    args = parser.parse_args()
+
+    logger.info("=" * 60)
+    logger.info("User Email Lookup Backfill")
+    logger.info(f"Table: {args.table_name}")
+    logger.info(f"Dry Run: {args.dry_run}")
+    logger.info("=" * 60)
+
+    try:
+        stats = backfill_email_index(args.table_name, dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        logger.info("\nBackfill interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Backfill failed with error: {str(e)}", exc_info=True)
+        sys.exit(1)
+
+    logger.info("=" * 60)
+    logger.info("Backfill Summary")
+    logger.info("=" * 60)
+    logger.info(f"Total users:       {stats['total_users']}")
+    logger.info(f"Already indexed:   {stats['already_indexed']}")
+    logger.info(f"Written:           {stats['written']}")
+    logger.info(f"Duplicate emails:  {stats['duplicates']}")
+    logger.info(f"Without email:     {stats['no_email']}")
+    logger.info(f"Failed:            {stats['failed']}")
+    logger.info("=" * 60)
+
+    if args.dry_run:
+        logger.info("This was a DRY RUN - no changes were made")
+
+
+if __name__ == '__main__':
+    main()
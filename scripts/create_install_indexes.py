@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Create the installation listing indexes on the devices table and backfill the
+attributes they are keyed on.
+
+GET /installs and GET /installs/warranty-expiring query these global secondary
+indexes instead of scanning:
+    InstallEntityDateIndex  entityType (HASH) + createdDate (RANGE)
+    InstallRegionIndex      stateId (HASH)    + regionCombo (RANGE)
+    InstallCustomerIndex    customerId (HASH) + createdDate (RANGE)
+    InstallWarrantyIndex    entityType (HASH) + warrantyDate (RANGE)
+
+Installations created through POST /installs already carry these attributes.
+Legacy records written with PascalCase attributes (StateId, CreatedDate, ...) or
+without regionCombo are backfilled so they show up in the indexes.
+
+Usage:
+    python scripts/create_install_indexes.py [--dry-run] [--skip-indexes] [--table-name NAME]
+
+Options:
+    --dry-run: Preview index creation and backfill without making changes
+    --skip-indexes: Only run the attribute backfill
+    --table-name: Devices DynamoDB table name (default: v_devices_dev)
+"""
+
+import boto3
+import sys
+import time
+import argparse
+import logging
+from boto3.dynamodb.conditions import Attr
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# DynamoDB setup
+dynamodb = boto3.resource('dynamodb')
+dynamodb_client = boto3.client('dynamodb')
+
+INSTALL_INDEXES = [
+    ('InstallEntityDateIndex', 'entityType', 'createdDate'),
+    ('InstallRegionIndex', 'stateId', 'regionCombo'),
+    ('InstallCustomerIndex', 'customerId', 'createdDate'),
+    ('InstallWarrantyIndex', 'entityType', 'warrantyDate'),
+]
+REGION_LEVELS = ('stateId', 'districtId', 'mandalId', 'villageId', 'habitationId')
+
+
+def wait_for_table_active(table_name):
+    """Block until the table and all of its indexes are ACTIVE."""
+    while True:
+        description = dynamodb_client.describe_table(TableName=table_name)['Table']
+        statuses = [description['TableStatus']] + [
+            index['IndexStatus'] for index in description.get('GlobalSecondaryIndexes', [])
+        ]
+        if all(status == 'ACTIVE' for status in statuses):
+            return
+        logger.info(f"Waiting for {table_name} to become ACTIVE: {statuses}")
+        time.sleep(15)
+
+
+def create_indexes(table_name, dry_run=False):
+    """Create any missing listing index. DynamoDB allows one index creation per update."""
+    description = dynamodb_client.describe_table(TableName=table_name)['Table']
+    existing = {index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])}
+    on_demand = description.get('BillingModeSummary', {}).get('BillingMode') == 'PAY_PER_REQUEST'
+
+    for index_name, hash_key, range_key in INSTALL_INDEXES:
+        if index_name in existing:
+            logger.info(f"Index {index_name} already exists")
+            continue
+        if dry_run:
+            logger.info(f"[DRY RUN] Would create {index_name} ({hash_key}, {range_key})")
+            continue
+
+        create = {
+            'IndexName': index_name,
+            'KeySchema': [
+                {'AttributeName': hash_key, 'KeyType': 'HASH'},
+                {'AttributeName': range_key, 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }
+        if not on_demand:
+            create['ProvisionedThroughput'] = {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+
+        logger.info(f"Creating index {index_name}")
+        dynamodb_client.update_table(
+            TableName=table_name,
+            AttributeDefinitions=[
+                {'AttributeName': hash_key, 'AttributeType': 'S'},
+                {'AttributeName': range_key, 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexUpdates=[{'Create': create}]
+        )
+        wait_for_table_active(table_name)
+        logger.info(f"Index {index_name} is ACTIVE")
+
+
+def missing_index_attributes(install):
+    """Return the index attributes an installation META record is missing."""
+    updates = {}
+    if install.get('entityType') != 'INSTALL':
+        updates['entityType'] = 'INSTALL'
+    for attribute in ('createdDate', 'customerId', 'warrantyDate') + REGION_LEVELS:
+        legacy = attribute[0].upper() + attribute[1:]
+        if not install.get(attribute) and install.get(legacy):
+            updates[attribute] = install[legacy]
+
+    levels = [updates.get(level) or install.get(level) for level in REGION_LEVELS]
+    if not install.get('regionCombo') and all(levels):
+        updates['regionCombo'] = '#'.join(levels)
+    return updates
+
+
+def backfill_index_attributes(table_name, dry_run=False):
+    """Copy legacy attributes onto the names the listing indexes are keyed on."""
+    table = dynamodb.Table(table_name)
+    scan_params = {'FilterExpression': Attr('PK').begins_with('INSTALL#') & Attr('SK').eq('META')}
+    stats = {'total_installs': 0, 'already_complete': 0, 'updated': 0, 'failed': 0}
+
+    while True:
+        response = table.scan(**scan_params)
+        for install in response.get('Items', []):
+            stats['total_installs'] += 1
+            updates = missing_index_attributes(install)
+            if not updates:
+                stats['already_complete'] += 1
+                continue
+
+            if dry_run:
+                logger.info(f"[DRY RUN] Would set {updates} on {install['PK']}")
+                stats['updated'] += 1
+                continue
+
+            try:
+                table.update_item(
+                    Key={'PK': install['PK'], 'SK': install['SK']},
+                    UpdateExpression='SET ' + ', '.join(f'#{field} = :{field}' for field in updates),
+                    ExpressionAttributeNames={f'#{field}': field for field in updates},
+                    ExpressionAttributeValues={f':{field}': value for field, value in updates.items()}
+                )
+                logger.info(f"Updated index attributes on {install['PK']}")
+                stats['updated'] += 1
+            except Exception as e:
+                logger.error(f"Failed to update {install['PK']}: {str(e)}")
+                stats['failed'] += 1
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Create installation listing indexes and backfill their key attributes'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Preview changes without applying them'
+    )
+    parser.add_argument(
+        '--skip-indexes',
+        action='store_true',
+        help='Only backfill attributes, do not create indexes'
+    )
+    parser.add_argument(
+        '--table-name',
+        default='v_devices_dev',
+        help='Devices DynamoDB table name (default: v_devices_dev)'
+    )
+
+    args = parser.parse_args()
+
+    logger.info("=" * 60)
+    logger.info("Installation Listing Indexes")
+    logger.info(f"Table: {args.table_name}")
+    logger.info(f"Dry Run: {args.dry_run}")
+    logger.info("=" * 60)
+
+    try:
+        stats = backfill_index_attributes(args.table_name, dry_run=args.dry_run)
+        if not args.skip_indexes:
+            create_indexes(args.table_name, dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        logger.info("\nInterrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Failed with error: {str(e)}", exc_info=True)
+        sys.exit(1)
+
+    logger.info("=" * 60)
+    logger.info("Backfill Summary")
+    logger.info("=" * 60)
+    logger.info(f"Total installations:  {stats['total_installs']}")
+    logger.info(f"Already complete:     {stats['already_complete']}")
+    logger.info(f"Updated:              {stats['updated']}")
+    logger.info(f"Failed:               {stats['failed']}")
+    logger.info("=" * 60)
+
+    if args.dry_run:
+        logger.info("This was a DRY RUN - no changes were made")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Create the sparse repair index on the devices table and backfill RepairDate.
+
+GET /repairs/analytics reads repairs for a date range from:
+    RepairDateIndex  EntityType (HASH) + RepairDate (RANGE)
+Only REPAIR items carry RepairDate, so no other entity lands in the index.
+
+Repairs created through POST /devices/{deviceId}/repairs already carry
+RepairDate. Older repair records get it copied from CreatedDate.
+
+Usage:
+    python scripts/create_repair_index.py [--dry-run] [--skip-index] [--table-name NAME]
+
+Options:
+    --dry-run: Preview index creation and backfill without making changes
+    --skip-index: Only run the RepairDate backfill
+    --table-name: Devices DynamoDB table name (default: v_devices_dev)
+"""
+
+import boto3
+import sys
+import time
+import argparse
+import logging
+from boto3.dynamodb.conditions import Attr
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# DynamoDB setup
+dynamodb = boto3.resource('dynamodb')
+dynamodb_client = boto3.client('dynamodb')
+
+INDEX_NAME = 'RepairDateIndex'
+
+
+def wait_for_table_active(table_name):
+    """Block until the table and all of its indexes are ACTIVE."""
+    while True:
+        description = dynamodb_client.describe_table(TableName=table_name)['Table']
+        statuses = [description['TableStatus']] + [
+            index['IndexStatus'] for index in description.get('GlobalSecondaryIndexes', [])
+        ]
+        if all(status == 'ACTIVE' for status in statuses):
+            return
+        logger.info(f"Waiting for {table_name} to become ACTIVE: {statuses}")
+        time.sleep(15)
+
+
+def create_index(table_name, dry_run=False):
+    """Create RepairDateIndex if it does not exist yet."""
+    description = dynamodb_client.describe_table(TableName=table_name)['Table']
+    if any(index['IndexName'] == INDEX_NAME for index in description.get('GlobalSecondaryIndexes', [])):
+        logger.info(f"Index {INDEX_NAME} already exists")
+        return
+    if dry_run:
+        logger.info(f"[DRY RUN] Would create {INDEX_NAME} (EntityType, RepairDate)")
+        return
+
+    create = {
+        'IndexName': INDEX_NAME,
+        'KeySchema': [
+            {'AttributeName': 'EntityType', 'KeyType': 'HASH'},
+            {'AttributeName': 'RepairDate', 'KeyType': 'RANGE'}
+        ],
+        'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['DeviceId', 'Cost']}
+    }
+    if description.get('BillingModeSummary', {}).get('BillingMode') != 'PAY_PER_REQUEST':
+        create['ProvisionedThroughput'] = {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+
+    logger.info(f"Creating index {INDEX_NAME}")
+    dynamodb_client.update_table(
+        TableName=table_name,
+        AttributeDefinitions=[
+            {'AttributeName': 'EntityType', 'AttributeType': 'S'},
+            {'AttributeName': 'RepairDate', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexUpdates=[{'Create': create}]
+    )
+    wait_for_table_active(table_name)
+    logger.info(f"Index {INDEX_NAME} is ACTIVE")
+
+
+def backfill_repair_dates(table_name, dry_run=False):
+    """Copy CreatedDate onto RepairDate for repair records that lack it."""
+    table = dynamodb.Table(table_name)
+    scan_params = {
+        'FilterExpression': Attr('SK').begins_with('REPAIR#') & Attr('RepairDate').not_exists(),
+        'ProjectionExpression': 'PK, SK, CreatedDate'
+    }
+    stats = {'missing': 0, 'updated': 0, 'failed': 0}
+
+    while True:
+        response = table.scan(**scan_params)
+        for repair in response.get('Items', []):
+            stats['missing'] += 1
+            repair_date = repair.get('CreatedDate') or repair['SK'].split('#')[-1]
+            if dry_run:
+                logger.info(f"[DRY RUN] Would set RepairDate={repair_date} on {repair['PK']}/{repair['SK']}")
+                stats['updated'] += 1
+                continue
+            try:
+                table.update_item(
+                    Key={'PK': repair['PK'], 'SK': repair['SK']},
+                    UpdateExpression='SET RepairDate = :repair_date, EntityType = if_not_exists(EntityType, :entity_type)',
+                    ExpressionAttributeValues={':repair_date': repair_date, ':entity_type': 'REPAIR'}
+                )
+                stats['updated'] += 1
+            except Exception as e:
+                logger.error(f"Failed to update {repair['PK']}/{repair['SK']}: {str(e)}")
+                stats['failed'] += 1
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Create the repair date index and backfill RepairDate'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Preview changes without applying them'
+    )
+    parser.add_argument(
+        '--skip-index',
+        action='store_true',
+        help='Only backfill RepairDate, do not create the index'
+    )
+    parser.add_argument(
+        '--table-name',
+        default='v_devices_dev',
+        help='Devices DynamoDB table name (default: v_devices_dev)'
+    )
+
+    args = parser.parse_args()
+
+    logger.info("=" * 60)
+    logger.info("Repair Date Index")
+    logger.info(f"Table: {args.table_name}")
+    logger.info(f"Dry Run: {args.dry_run}")
+    logger.info("=" * 60)
+
+    try:
+        stats = backfill_repair_dates(args.table_name, dry_run=args.dry_run)
+        if not args.skip_index:
+            create_index(args.table_name, dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        logger.info("\nInterrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Failed with error: {str(e)}", exc_info=True)
+        sys.exit(1)
+
+    logger.info("=" * 60)
+    logger.info("Backfill Summary")
+    logger.info("=" * 60)
+    logger.info(f"Missing RepairDate:   {stats['missing']}")
+    logger.info(f"Updated:              {stats['updated']}")
+    logger.info(f"Failed:               {stats['failed']}")
+    logger.info("=" * 60)
+
+    if args.dry_run:
+        logger.info("This was a DRY RUN - no changes were made")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Create the user listing indexes on the users table and backfill the attributes
+they are keyed on.
+
+GET /users queries these global secondary indexes instead of scanning, picking
+the most selective one for the request filters:
+    UserEntityIndex   entityType (HASH)   + createdAt (RANGE)
+    UserRoleIndex     role (HASH)         + createdAt (RANGE)
+    UserActiveIndex   activeStatus (HASH) + createdAt (RANGE)
+    UserRegionIndex   stateId (HASH)      + regionCombo (RANGE)
+
+Users written by the API already carry these attributes. Existing users get
+activeStatus ("ACTIVE"/"INACTIVE") and regionCombo ("<state>#<district>#..."
+over the contiguous assigned levels, each followed by "#"). Key attributes
+stored as NULL are removed, because index keys must be strings.
+
+Usage:
+    python scripts/create_user_indexes.py [--dry-run] [--skip-indexes] [--table-name NAME]
+
+Options:
+    --dry-run: Preview index creation and backfill without making changes
+    --skip-indexes: Only run the attribute backfill
+    --table-name: Users DynamoDB table name (default: v_users_dev)
+"""
+
+import boto3
+import sys
+import time
+import argparse
+import logging
+from boto3.dynamodb.conditions import Attr
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# DynamoDB setup
+dynamodb = boto3.resource('dynamodb')
+dynamodb_client = boto3.client('dynamodb')
+
+USER_INDEXES = [
+    ('UserEntityIndex', 'entityType', 'createdAt'),
+    ('UserRoleIndex', 'role', 'createdAt'),
+    ('UserActiveIndex', 'activeStatus', 'createdAt'),
+    ('UserRegionIndex', 'stateId', 'regionCombo'),
+]
+REGION_LEVELS = ('stateId', 'districtId', 'mandalId', 'villageId')
+INDEX_KEY_ATTRIBUTES = ('role', 'createdAt', 'stateId', 'regionCombo', 'activeStatus')
+
+
+def wait_for_table_active(table_name):
+    """Block until the table and all of its indexes are ACTIVE."""
+    while True:
+        description = dynamodb_client.describe_table(TableName=table_name)['Table']
+        statuses = [description['TableStatus']] + [
+            index['IndexStatus'] for index in description.get('GlobalSecondaryIndexes', [])
+        ]
+        if all(status == 'ACTIVE' for status in statuses):
+            return
+        logger.info(f"Waiting for {table_name} to become ACTIVE: {statuses}")
+        time.sleep(15)
+
+
+def create_indexes(table_name, dry_run=False):
+    """Create any missing listing index. DynamoDB allows one index creation per update."""
+    description = dynamodb_client.describe_table(TableName=table_name)['Table']
+    existing = {index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])}
+    on_demand = description.get('BillingModeSummary', {}).get('BillingMode') == 'PAY_PER_REQUEST'
+
+    for index_name, hash_key, range_key in USER_INDEXES:
+        if index_name in existing:
+            logger.info(f"Index {index_name} already exists")
+            continue
+        if dry_run:
+            logger.info(f"[DRY RUN] Would create {index_name} ({hash_key}, {range_key})")
+            continue
+
+        create = {
+            'IndexName': index_name,
+            'KeySchema': [
+                {'AttributeName': hash_key, 'KeyType': 'HASH'},
+                {'AttributeName': range_key, 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }
+        if not on_demand:
+            create['ProvisionedThroughput'] = {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+
+        logger.info(f"Creating index {index_name}")
+        dynamodb_client.update_table(
+            TableName=table_name,
+            AttributeDefinitions=[
+                {'AttributeName': hash_key, 'AttributeType': 'S'},
+                {'AttributeName': range_key, 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexUpdates=[{'Create': create}]
+        )
+        wait_for_table_active(table_name)
+        logger.info(f"Index {index_name} is ACTIVE")
+
+
+def index_attribute_changes(user):
+    """Return (attributes to set, attributes to remove) for a user record."""
+    updates = {}
+    removes = [attribute for attribute in INDEX_KEY_ATTRIBUTES if attribute in user and user[attribute] is None]
+
+    active_status = 'ACTIVE' if user.get('isActive', True) else 'INACTIVE'
+    if user.get('activeStatus') != active_status:
+        updates['activeStatus'] = active_status
+
+    levels = []
+    for level in REGION_LEVELS:
+        if not user.get(level):
+            break
+        levels.append(user[level])
+    region_combo = ''.join(f'{level}#' for level in levels)
+    if region_combo and user.get('regionCombo') != region_combo:
+        updates['regionCombo'] = region_combo
+        removes = [attribute for attribute in removes if attribute != 'regionCombo']
+    elif not region_combo and user.get('regionCombo') and 'regionCombo' not in removes:
+        removes.append('regionCombo')
+
+    if not user.get('createdAt'):
+        updates['createdAt'] = user.get('updatedAt') or '1970-01-01T00:00:00Z'
+        removes = [attribute for attribute in removes if attribute != 'createdAt']
+    return updates, removes
+
+
+def backfill_index_attributes(table_name, dry_run=False):
+    """Set activeStatus/regionCombo and clear NULL key attributes on every user record."""
+    table = dynamodb.Table(table_name)
+    scan_params = {'FilterExpression': Attr('entityType').eq('USER') & Attr('SK').eq('ENTITY#USER')}
+    stats = {'total_users': 0, 'already_complete': 0, 'updated': 0, 'failed': 0}
+
+    while True:
+        response = table.scan(**scan_params)
+        for user in response.get('Items', []):
+            stats['total_users'] += 1
+            updates, removes = index_attribute_changes(user)
+            if not updates and not removes:
+                stats['already_complete'] += 1
+                continue
+
+            if dry_run:
+                logger.info(f"[DRY RUN] Would set {updates} and remove {removes} on {user['PK']}")
+                stats['updated'] += 1
+                continue
+
+            expression = []
+            if updates:
+                expression.append('SET ' + ', '.join(f'#{field} = :{field}' for field in updates))
+            if removes:
+                expression.append('REMOVE ' + ', '.join(f'#{field}' for field in removes))
+            params = {
+                'Key': {'PK': user['PK'], 'SK': user['SK']},
+                'UpdateExpression': ' '.join(expression),
+                'ExpressionAttributeNames': {f'#{field}': field for field in list(updates) + removes}
+            }
+            if updates:
+                params['ExpressionAttributeValues'] = {f':{field}': value for field, value in updates.items()}
+
+            try:
+                table.update_item(**params)
+                logger.info(f"Updated index attributes on {user['PK']}")
+                stats['updated'] += 1
+            except Exception as e:
+                logger.error(f"Failed to update {user['PK']}: {str(e)}")
+                stats['failed'] += 1
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Create user listing indexes and backfill their key attributes'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Preview changes without applying them'
+    )
+    parser.add_argument(
+        '--skip-indexes',
+        action='store_true',
+        help='Only backfill attributes, do not create indexes'
+    )
+    parser.add_argument(
+        '--table-name',
+        default='v_users_dev',
+        help='Users DynamoDB table name (default: v_users_dev)'
+    )
+
+    args = parser.parse_args()
+
+    logger.info("=" * 60)
+    logger.info("User Listing Indexes")
+    logger.info(f"Table: {args.table_name}")
+    logger.info(f"Dry Run: {args.dry_run}")
+    logger.info("=" * 60)
+
+    try:
+        stats = backfill_index_attributes(args.table_name, dry_run=args.dry_run)
+        if not args.skip_indexes:
+            create_indexes(args.table_name, dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        logger.info("\nInterrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Failed with error: {str(e)}", exc_info=True)
+        sys.exit(1)
+
+    logger.info("=" * 60)
+    logger.info("Backfill Summary")
+    logger.info("=" * 60)
+    logger.info(f"Total users:       {stats['total_users']}")
+    logger.info(f"Already complete:  {stats['already_complete']}")
+    logger.info(f"Updated:           {stats['updated']}")
+    logger.info(f"Failed:            {stats['failed']}")
+    logger.info("=" * 60)
+
+    if args.dry_run:
+        logger.info("This was a DRY RUN - no changes were made")
+
+
+if __name__ == '__main__':
+    main()
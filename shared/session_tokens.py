@@ -0,0 +1,149 @@
+"""
+Signed session tokens carrying a user's effective permissions as a bitmask.
+
+POST /users/sync issues these after verifying the Firebase ID token. Each permission
+name in the RBAC catalog owns a fixed bit (assigned once, never reused), stored on the
+users table item RBAC#CATALOG/PERMISSION_BITS together with a catalog version. A token:
+    base64url(header).base64url(payload).base64url(HMAC-SHA256 signature)
+with payload {sub, uid, email, role, perm: <hex bitmask>, cv: <bit map version>, iat, exp}.
+
+Any Lambda that shares SESSION_TOKEN_SECRET can authorize a request with a signature
+check and a bit test - no Firebase or per-request DynamoDB call. The permission name to
+bit lookup is loaded once per container (PermissionBits) and reloaded only when a token
+was issued against a newer catalog version.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+SESSION_TOKEN_TYPE = "vst"
+SESSION_TOKEN_TTL_SECONDS = int(os.environ.get("SESSION_TOKEN_TTL_SECONDS", "900"))
+PERMISSION_BITS_KEY = {"PK": "RBAC#CATALOG", "SK": "PERMISSION_BITS"}
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def get_session_secret() -> Optional[bytes]:
+    """Signing secret shared by every Lambda that issues or accepts session tokens."""
+    secret = os.environ.get("SESSION_TOKEN_SECRET")
+    return secret.encode("utf-8") if secret else None
+
+
+def permission_mask(permission_names: Iterable[str], bits: Dict[str, int]) -> int:
+    """OR together the bits of the given permissions; names without a bit are ignored."""
+    mask = 0
+    for name in permission_names:
+        bit = bits.get(name)
+        if bit is not None:
+            mask |= 1 << int(bit)
+    return mask
+
+
+def issue_session_token(claims: Dict[str, Any], mask: int, catalog_version: int,
+                        secret: bytes, ttl_seconds: int = SESSION_TOKEN_TTL_SECONDS) -> str:
+    """Sign a short-lived session token for claims (sub, uid, email, role)."""
+    now = int(time.time())
+    payload = {**claims, "perm": format(mask, "x"), "cv": int(catalog_version), "iat": now, "exp": now + ttl_seconds}
+    header = _b64encode(json.dumps({"alg": "HS256", "typ": SESSION_TOKEN_TYPE}, separators=(",", ":")).encode("utf-8"))
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    signature = hmac.new(secret, f"{header}.{body}".encode("ascii"), hashlib.sha256).digest()
+    return f"{header}.{body}.{_b64encode(signature)}"
+
+
+def is_session_token(token: str) -> bool:
+    """True when the token's header marks it as one of ours (not a Firebase ID token)."""
+    try:
+        header = json.loads(_b64decode(token.split(".", 1)[0]))
+        return header.get("typ") == SESSION_TOKEN_TYPE
+    except Exception:
+        return False
+
+
+def verify_session_token(token: str, secret: bytes, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Return the payload of a valid, unexpired token; None otherwise."""
+    try:
+        header, body, signature = token.split(".")
+        expected = hmac.new(secret, f"{header}.{body}".encode("ascii"), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            logger.warning("Session token signature mismatch")
+            return None
+        payload = json.loads(_b64decode(body))
+        if payload.get("exp", 0) <= (now if now is not None else time.time()):
+            return None
+        payload["permissionMask"] = int(payload.get("perm", "0"), 16)
+        return payload
+    except Exception as e:
+        logger.warning(f"Malformed session token: {str(e)}")
+        return None
+
+
+def has_permission_bit(payload: Dict[str, Any], bit: Optional[int]) -> bool:
+    """Bit test against a verified token payload."""
+    if bit is None:
+        return False
+    return bool(payload.get("permissionMask", 0) >> int(bit) & 1)
+
+
+class PermissionBits:
+    """
+    Per-container copy of the permission name -> bit map.
+
+    loader() returns (bits, version); it is called on first use and whenever a token
+    references a newer catalog version than the one held.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.bits: Dict[str, int] = {}
+        self.version = -1
+
+    def bit_for(self, permission_name: str, min_version: int = 0) -> Optional[int]:
+        if self.version < max(min_version, 0):
+            bits, version = self.loader()
+            self.bits = {name: int(bit) for name, bit in bits.items()}
+            self.version = int(version)
+        return self.bits.get(permission_name)
+
+
+def dynamodb_bits_loader(table_name: str):
+    """Loader reading RBAC#CATALOG/PERMISSION_BITS from the users table."""
+    def load():
+        import boto3
+        item = boto3.resource("dynamodb").Table(table_name).get_item(
+            Key=PERMISSION_BITS_KEY, ConsistentRead=True
+        ).get("Item", {})
+        return item.get("bits", {}), item.get("version", 0)
+    return load
+
+
+def authorize_event(event: Dict[str, Any], permission_name: str, permission_bits: PermissionBits) -> Optional[Dict[str, Any]]:
+    """
+    Authorize an API Gateway event carrying `Authorization: Bearer <session token>`.
+    Returns the token payload when the token is valid and grants permission_name.
+    """
+    secret = get_session_secret()
+    headers = event.get("headers") or {}
+    auth_header = headers.get("Authorization") or headers.get("authorization") or ""
+    if not secret or not auth_header.startswith("Bearer "):
+        return None
+
+    payload = verify_session_token(auth_header[len("Bearer "):], secret)
+    if not payload:
+        return None
+    if not has_permission_bit(payload, permission_bits.bit_for(permission_name, payload.get("cv", 0))):
+        return None
+    return payload
@@ -0,0 +1,147 @@
+"""
+Columnar archive format and storage for RUNTIME telemetry.
+
+One blob holds a device's readings for one UTC day:
+    b"VTA1" + zlib( header_len:uint32 | JSON header | timestamps | metric columns )
+Timestamps are int64 milliseconds, delta-encoded (first value absolute). Each metric
+is a float64 column aligned with the timestamps, NaN where the metric was not reported.
+Delta-encoded timestamps are small, repetitive integers, so they compress very well.
+
+Blobs live in S3 (TELEMETRY_ARCHIVE_BUCKET) or, when TELEMETRY_ARCHIVE_DIR is set,
+in a local directory with the same key layout - used for local runs and tests.
+"""
+
+import json
+import logging
+import math
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_MAGIC = b"VTA1"
+ARCHIVE_VERSION = 1
+
+
+def archive_key(device_id: str, day: str) -> str:
+    """S3 key / relative path for a device-day archive (day is YYYY-MM-DD)."""
+    return f"runtime/{device_id}/{day}.vta"
+
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def encode_archive(device_id: str, day: str, samples: Dict[str, Tuple[List[float], List[float]]]) -> bytes:
+    """
+    Pack per-metric samples {metric: (epoch_seconds, values)} into one columnar blob.
+    Readings sharing a timestamp share a row.
+    """
+    timestamps_ms = sorted({int(round(ts * 1000)) for series in samples.values() for ts in series[0]})
+    row_of = {ts: i for i, ts in enumerate(timestamps_ms)}
+    metric_names = sorted(samples)
+
+    deltas = array("q", (ts - prev for ts, prev in zip(timestamps_ms, [0] + timestamps_ms[:-1])))
+    columns = []
+    for name in metric_names:
+        column = array("d", [math.nan]) * len(timestamps_ms)
+        for ts, value in zip(*samples[name]):
+            column[row_of[int(round(ts * 1000))]] = float(value)
+        columns.append(_to_little_endian(column))
+
+    header = json.dumps({
+        "version": ARCHIVE_VERSION,
+        "deviceId": device_id,
+        "day": day,
+        "rows": len(timestamps_ms),
+        "metrics": metric_names
+    }).encode("utf-8")
+    payload = struct.pack("<I", len(header)) + header + _to_little_endian(deltas) + b"".join(columns)
+    return ARCHIVE_MAGIC + zlib.compress(payload, 9)
+
+
+def decode_archive(blob: bytes, metric_names: Optional[List[str]] = None) -> Tuple[dict, Dict[str, Tuple[List[float], List[float]]]]:
+    """Unpack a blob into (header, {metric: (epoch_seconds, values)}), optionally for selected metrics."""
+    if blob[:4] != ARCHIVE_MAGIC:
+        raise ValueError("Not a telemetry archive")
+    payload = zlib.decompress(blob[4:])
+    (header_len,) = struct.unpack_from("<I", payload)
+    header = json.loads(payload[4:4 + header_len].decode("utf-8"))
+    rows = header["rows"]
+
+    offset = 4 + header_len
+    deltas = _from_little_endian("q", payload[offset:offset + rows * 8])
+    offset += rows * 8
+    timestamps = []
+    current = 0
+    for delta in deltas:
+        current += delta
+        timestamps.append(current / 1000.0)
+
+    wanted = set(metric_names) if metric_names else None
+    samples = {}
+    for name in header["metrics"]:
+        column_bytes = payload[offset:offset + rows * 8]
+        offset += rows * 8
+        if wanted is not None and name not in wanted:
+            continue
+        column = _from_little_endian("d", column_bytes)
+        present = [(ts, value) for ts, value in zip(timestamps, column) if not math.isnan(value)]
+        samples[name] = ([ts for ts, _ in present], [value for _, value in present])
+    return header, samples
+
+
+class LocalArchiveStore:
+    """Filesystem stand-in for S3 (keys become paths under root)."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def put(self, key: str, blob: bytes) -> None:
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(blob)
+
+    def get(self, key: str) -> bytes:
+        with open(os.path.join(self.root, key), "rb") as f:
+            return f.read()
+
+
+class S3ArchiveStore:
+    """Archive blobs in an S3 bucket."""
+
+    def __init__(self, bucket: str):
+        import boto3
+        self.bucket = bucket
+        self.s3 = boto3.client("s3")
+
+    def put(self, key: str, blob: bytes) -> None:
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=blob, ContentType="application/octet-stream")
+
+    def get(self, key: str) -> bytes:
+        return self.s3.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+
+def get_archive_store():
+    """Local directory store when TELEMETRY_ARCHIVE_DIR is set, otherwise S3."""
+    local_dir = os.environ.get("TELEMETRY_ARCHIVE_DIR")
+    if local_dir:
+        logger.info(f"Using local telemetry archive at {local_dir}")
+        return LocalArchiveStore(local_dir)
+    return S3ArchiveStore(os.environ.get("TELEMETRY_ARCHIVE_BUCKET", "iot-platform-telemetry-archive"))
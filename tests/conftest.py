@@ -0,0 +1,120 @@
+"""
+Shared fixtures for Lambda handler tests.
+
+AWS is replaced by moto for the whole session (the Lambda modules create their boto3
+clients at import, so the mock must be active first). Each test gets freshly created
+users, devices, regions, customers and SIM card tables with the indexes the handlers query.
+"""
+
+import importlib
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-south-2")
+os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+os.environ.pop("FIREBASE_PROJECT_ID", None)
+os.environ["DEV_MODE"] = "true"
+
+USERS_TABLE = "v_users_dev"
+DEVICES_TABLE = "v_devices_dev"
+REGIONS_TABLE = "regions"
+CUSTOMERS_TABLE = "v_customers_dev"
+SIMCARDS_TABLE = "v_simcards_dev"
+PROFILE_BUCKET = "iot-platform-profile-pictures"
+
+# table name -> [(index name, hash key, range key)]
+TABLE_INDEXES = {
+    USERS_TABLE: [
+        ("UserEntityIndex", "entityType", "createdAt"),
+        ("UserRoleIndex", "role", "createdAt"),
+        ("UserActiveIndex", "activeStatus", "createdAt"),
+        ("UserRegionIndex", "stateId", "regionCombo"),
+    ],
+    DEVICES_TABLE: [
+        ("InstallEntityDateIndex", "entityType", "createdDate"),
+        ("InstallRegionIndex", "stateId", "regionCombo"),
+        ("InstallCustomerIndex", "customerId", "createdDate"),
+        ("InstallWarrantyIndex", "entityType", "warrantyDate"),
+        ("RepairDateIndex", "EntityType", "RepairDate"),
+    ],
+    REGIONS_TABLE: [],
+    CUSTOMERS_TABLE: [],
+    SIMCARDS_TABLE: [],
+}
+
+_aws = mock_aws()
+_aws.start()
+
+
+def create_table(name, indexes):
+    attributes = {"PK", "SK"} | {key for _, hash_key, range_key in indexes for key in (hash_key, range_key)}
+    params = {
+        "TableName": name,
+        "KeySchema": [{"AttributeName": "PK", "KeyType": "HASH"}, {"AttributeName": "SK", "KeyType": "RANGE"}],
+        "AttributeDefinitions": [{"AttributeName": attribute, "AttributeType": "S"} for attribute in sorted(attributes)],
+        "BillingMode": "PAY_PER_REQUEST",
+    }
+    if indexes:
+        params["GlobalSecondaryIndexes"] = [{
+            "IndexName": index_name,
+            "KeySchema": [{"AttributeName": hash_key, "KeyType": "HASH"}, {"AttributeName": range_key, "KeyType": "RANGE"}],
+            "Projection": {"ProjectionType": "ALL"},
+        } for index_name, hash_key, range_key in indexes]
+    boto3.client("dynamodb").create_table(**params)
+
+
+@pytest.fixture(autouse=True)
+def aws_tables():
+    """Empty tables (and the profile picture bucket) for every test."""
+    client = boto3.client("dynamodb")
+    for name in client.list_tables()["TableNames"]:
+        client.delete_table(TableName=name)
+    for name, indexes in TABLE_INDEXES.items():
+        create_table(name, indexes)
+
+    s3 = boto3.resource("s3")
+    bucket = s3.Bucket(PROFILE_BUCKET)
+    if bucket.creation_date:
+        bucket.objects.all().delete()
+    else:
+        s3.create_bucket(Bucket=PROFILE_BUCKET, CreateBucketConfiguration={"LocationConstraint": "ap-south-2"})
+    yield boto3.resource("dynamodb")
+
+
+def load_lambda(name):
+    """Import lambdas/<name>/<name>_api.py once per session."""
+    path = os.path.join(ROOT, "lambdas", name)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(f"{name}_api")
+
+
+@pytest.fixture
+def users_api():
+    module = load_lambda("v_users")
+    # Per-container caches must not leak between tests
+    module._rbac_cache.update({"version": None, "checkedAt": 0, "roles": {}, "catalog": None})
+    module._verified_tokens.clear()
+    module._login_activity.clear()
+    module.permission_bits.version = -1
+    return module
+
+
+@pytest.fixture
+def devices_api():
+    module = load_lambda("v_devices")
+    module._registered_runtime_devices.clear()
+    return module
+
+
+@pytest.fixture
+def regions_api():
+    module = load_lambda("v_regions")
+    return module
@@ -0,0 +1,39 @@
+import math
+import random
+
+import pytest
+
+
+def scalar_ewma(inputs, alpha, initial):
+    outputs, y = [], initial
+    for u in inputs:
+        y = (1 - alpha) * y + alpha * u
+        outputs.append(y)
+    return outputs
+
+
+@pytest.mark.parametrize("alpha", [0.01, 0.1, 0.5, 0.9, 0.99])
+def test_ewma_scan_matches_scalar_loop(devices_api, alpha):
+    rng = random.Random(7)
+    inputs = [rng.uniform(-1e6, 1e6) for _ in range(2000)]
+
+    result = list(devices_api.ewma_scan(inputs, alpha, 5.0))
+
+    assert all(math.isfinite(value) for value in result)
+    for got, expected in zip(result, scalar_ewma(inputs, alpha, 5.0)):
+        assert got == pytest.approx(expected, rel=1e-9, abs=1e-6)
+
+
+@pytest.mark.parametrize("alpha", [0, 1, 1.5, -0.1])
+def test_ewma_scan_rejects_alpha_outside_unit_interval(devices_api, alpha):
+    with pytest.raises(ValueError):
+        devices_api.ewma_scan([1.0, 2.0], alpha, 0.0)
+
+
+def test_detector_flags_spike_after_warmup(devices_api):
+    values = [10.0 + 0.1 * (i % 3) for i in range(40)] + [50.0]
+
+    posterior, anomalies = devices_api.detect_metric_anomalies(values, None)
+
+    assert [index for index, *_ in anomalies] == [40]
+    assert posterior["n"] == 41
@@ -0,0 +1,42 @@
+def device_rows(count, start=1):
+    return [
+        (row_number, {
+            "DeviceId": f"DEV-{row_number:04d}",
+            "DeviceName": f"Pump {row_number}",
+            "DeviceType": "pump",
+            "SerialNumber": f"SN-{row_number}",
+            "deviceNumber": f"N-{row_number}",
+            "Status": "active",
+            "Location": "Field",
+        }, None)
+        for row_number in range(start, start + count)
+    ]
+
+
+def test_bulk_import_writes_rows_and_rejects_duplicates(devices_api, aws_tables):
+    rows = device_rows(30) + [(31, {**device_rows(1)[0][1]}, None), (32, None, "Malformed JSON: x")]
+
+    summary, errors = devices_api.import_devices_bulk(iter(rows), "tester")
+
+    assert summary == {"totalRows": 32, "created": 30, "failed": 2}
+    assert {error["row"] for error in errors} == {31, 32}
+    table = aws_tables.Table("v_devices_dev")
+    assert "Item" in table.get_item(Key={"PK": "DEVICE#DEV-0030", "SK": "META"})
+
+
+def test_failed_batch_reports_each_of_its_rows(devices_api, monkeypatch):
+    real_write = devices_api._batch_write_requests
+
+    def flaky_write(table_name, requests):
+        # The second batch of 25 (rows 26-30) fails outright
+        if requests[0]["PutRequest"]["Item"]["DeviceId"]["S"] == "DEV-0026":
+            raise RuntimeError("boom")
+        return real_write(table_name, requests)
+
+    monkeypatch.setattr(devices_api, "_batch_write_requests", flaky_write)
+
+    summary, errors = devices_api.import_devices_bulk(iter(device_rows(30)), "tester")
+
+    assert summary == {"totalRows": 30, "created": 25, "failed": 5}
+    assert sorted(error["row"] for error in errors) == [26, 27, 28, 29, 30]
+    assert all(error["deviceId"] == f"DEV-{error['row']:04d}" for error in errors)
@@ -0,0 +1,98 @@
+import json
+import threading
+
+import pytest
+
+ADMIN = {"email": "admin@example.com", "role": "admin", "permissions": ["user:create", "user:read"]}
+
+
+@pytest.fixture
+def roles(users_api, aws_tables):
+    table = aws_tables.Table("v_users_dev")
+    table.put_item(Item={"PK": "ROLE#R1", "SK": "META", "entityType": "ROLE", "roleId": "R1", "roleName": "operator"})
+    table.put_item(Item={"PK": "ROLE#R1", "SK": "PERMISSION#P1", "permissionName": "device:read"})
+    table.put_item(Item=users_api.build_role_name_item("operator", "R1"))
+    return table
+
+
+def user_row(number, **overrides):
+    return {"email": f"user{number}@example.com", "firstName": "Ann", "lastName": f"Doe{number}", "role": "operator", **overrides}
+
+
+def bulk(users_api, body, content_type="application/json"):
+    event = {"body": body if isinstance(body, str) else json.dumps(body), "headers": {"Content-Type": content_type}}
+    response = users_api.handle_bulk_create_users(event, ADMIN)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def test_bulk_create_reports_every_row(users_api, roles):
+    roles.put_item(Item=users_api.build_email_item("taken@example.com", "OLD"))
+    rows = [user_row(1), user_row(2, email="taken@example.com"), user_row(3, role="ghost"),
+            user_row(4, email="USER1@example.com"), {"email": "bad"}, user_row(6)]
+
+    status, body = bulk(users_api, {"users": rows})
+
+    assert status == 200
+    assert (body["created"], body["failed"]) == (2, 4)
+    outcome = {result["row"]: result.get("error", result["status"]) for result in body["results"]}
+    assert outcome[1] == outcome[6] == "created"
+    assert outcome[2] == "User with this email already exists"
+    assert outcome[3] == "Role 'ghost' does not exist in the database"
+    assert outcome[4] == "Duplicate email in request"
+    assert outcome[5].startswith("Invalid user data")
+
+
+def test_bulk_users_are_listed_with_role_permissions(users_api, roles):
+    bulk(users_api, "email,firstName,lastName,role\nuser1@example.com,Ann,Doe,operator\n", "text/csv")
+
+    items, _, _ = users_api.query_users_page({}, 10)
+
+    assert [item["email"] for item in items] == ["user1@example.com"]
+    assert items[0]["entityType"] == "USER" and items[0]["permissions"] == ["device:read"]
+
+
+def test_unexpected_error_fails_only_its_chunk(users_api, roles, monkeypatch):
+    monkeypatch.setattr(users_api, "BULK_USER_CHUNK_SIZE", 2)
+    real_existing = users_api._existing_emails
+
+    def flaky_existing(emails):
+        if "user3@example.com" in emails:
+            raise RuntimeError("boom")
+        return real_existing(emails)
+
+    monkeypatch.setattr(users_api, "_existing_emails", flaky_existing)
+
+    status, body = bulk(users_api, [user_row(n) for n in range(1, 6)])
+
+    assert status == 200
+    failed = {result["row"] for result in body["results"] if result["status"] == "failed"}
+    assert failed == {3, 4} and body["created"] == 3
+    assert all(result["error"] == "Unexpected error: boom" for result in body["results"] if result["row"] in failed)
+
+
+def test_unexpected_error_fails_only_its_transaction_slice(users_api, roles, monkeypatch):
+    monkeypatch.setattr(users_api, "BULK_USER_TRANSACTION_USERS", 2)
+    real_slice = users_api._write_bulk_user_slice
+    # moto snapshots the table for every transaction without a lock, so concurrent
+    # slices can break each other's snapshot; DynamoDB has no such limit
+    moto_lock = threading.Lock()
+
+    def flaky_slice(entries):
+        if entries[0]["row"] == 3:
+            raise RuntimeError("boom")
+        with moto_lock:
+            return real_slice(entries)
+
+    monkeypatch.setattr(users_api, "_write_bulk_user_slice", flaky_slice)
+
+    _, body = bulk(users_api, [user_row(n) for n in range(1, 6)])
+
+    assert [result["status"] for result in body["results"]] == ["created", "created", "failed", "failed", "created"]
+
+
+def test_single_create_is_listed(users_api, roles):
+    response = users_api.handle_create_user({"body": json.dumps(user_row(1))}, ADMIN)
+
+    assert response["statusCode"] == 201
+    items, _, _ = users_api.query_users_page({}, 10)
+    assert [item["email"] for item in items] == ["user1@example.com"]
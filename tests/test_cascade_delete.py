@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def tables(aws_tables):
+    return {name: aws_tables.Table(name) for name in ("v_devices_dev", "v_customers_dev", "v_simcards_dev")}
+
+
+def exists(table, pk, sk):
+    return "Item" in table.get_item(Key={"PK": pk, "SK": sk})
+
+
+def linked_install(devices, device_count):
+    devices.put_item(Item={"PK": "INSTALL#I1", "SK": "META", "installationId": "I1", "customerId": "C1",
+                           "regionCombo": "TS#01#M1#V1#H1"})
+    devices.put_item(Item={"PK": "REGION_LOCK#TS#01#M1#V1#H1", "SK": "LOCK"})
+    for number in range(device_count):
+        device_id = f"D{number:02d}"
+        devices.put_item(Item={"PK": "INSTALL#I1", "SK": f"DEVICE_ASSOC#{device_id}", "deviceId": device_id})
+        devices.put_item(Item={"PK": f"DEVICE#{device_id}", "SK": "INSTALL_ASSOC#I1", "installId": "I1"})
+        devices.put_item(Item={"PK": f"DEVICE#{device_id}", "SK": "META", "linkedInstallationId": "I1"})
+
+
+def test_install_cascade_removes_children_mirrors_and_parents(devices_api, tables):
+    devices = tables["v_devices_dev"]
+    linked_install(devices, 30)  # more than one batch_write_item chunk
+    tables["v_customers_dev"].put_item(Item={"PK": "CUSTOMER#C1", "SK": "ENTITY#INSTALL_ASSOC#I1"})
+
+    plan = devices_api.plan_install_cascade_delete("I1", devices.get_item(Key={"PK": "INSTALL#I1", "SK": "META"})["Item"])
+    outcome = devices_api.run_cascade_plan(plan)
+
+    assert not outcome["incomplete"]
+    assert plan["summary"]["deviceAssociations"] == 30 and plan["summary"]["regionLock"]
+    assert outcome["recordsUpdated"] == 30
+    assert not exists(devices, "INSTALL#I1", "META")
+    assert not exists(devices, "REGION_LOCK#TS#01#M1#V1#H1", "LOCK")
+    assert not exists(devices, "DEVICE#D29", "INSTALL_ASSOC#I1")
+    assert "linkedInstallationId" not in devices.get_item(Key={"PK": "DEVICE#D29", "SK": "META"})["Item"]
+    assert not exists(tables["v_customers_dev"], "CUSTOMER#C1", "ENTITY#INSTALL_ASSOC#I1")
+
+
+def test_failed_child_delete_keeps_parent_for_retry(devices_api, tables, monkeypatch):
+    devices = tables["v_devices_dev"]
+    linked_install(devices, 3)
+    real_chunk = devices_api._batch_delete_chunk
+    monkeypatch.setattr(devices_api, "_batch_delete_chunk",
+                        lambda table_name, keys: (0, keys) if table_name == "v_customers_dev" else real_chunk(table_name, keys))
+
+    outcome = devices_api.run_cascade_plan(
+        devices_api.plan_install_cascade_delete("I1", {"customerId": "C1", "regionCombo": "TS#01#M1#V1#H1"}))
+
+    assert outcome["incomplete"]
+    assert outcome["failedDeletes"] == [{"Table": "v_customers_dev", "PK": "CUSTOMER#C1", "SK": "ENTITY#INSTALL_ASSOC#I1"}]
+    assert exists(devices, "INSTALL#I1", "META") and exists(devices, "REGION_LOCK#TS#01#M1#V1#H1", "LOCK")
+
+
+def test_incomplete_cascade_delete_is_reported_as_failure(devices_api, tables, monkeypatch):
+    devices = tables["v_devices_dev"]
+    linked_install(devices, 2)
+    real_chunk = devices_api._batch_delete_chunk
+    monkeypatch.setattr(devices_api, "_batch_delete_chunk",
+                        lambda table_name, keys: (0, keys) if table_name == "v_customers_dev" else real_chunk(table_name, keys))
+
+    response = devices_api.lambda_handler({"httpMethod": "DELETE", "path": "/installs/I1",
+                                           "pathParameters": {"installId": "I1"},
+                                           "queryStringParameters": {"cascade": "true"}}, None)
+
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 500
+    assert "deleted" not in body
+    assert "incomplete" in body["error"] and body["partial"]["InstallationId"] == "I1"
+    assert exists(devices, "INSTALL#I1", "META")
+
+def test_device_cascade_clears_install_mirror_and_sim_link(devices_api, tables):
+    devices, sims = tables["v_devices_dev"], tables["v_simcards_dev"]
+    devices.put_item(Item={"PK": "DEVICE#D1", "SK": "META", "EntityType": "DEVICE"})
+    devices.put_item(Item={"PK": "DEVICE#D1", "SK": "INSTALL_ASSOC#I1", "installId": "I1"})
+    devices.put_item(Item={"PK": "DEVICE#D1", "SK": "SIM_ASSOC#S1", "SIMId": "S1"})
+    devices.put_item(Item={"PK": "INSTALL#I1", "SK": "DEVICE_ASSOC#D1"})
+    sims.put_item(Item={"PK": "SIMCARD#S1", "SK": "ENTITY#SIMCARD", "linkedDeviceId": "D1"})
+    sims.put_item(Item={"PK": "SIMCARD#S2", "SK": "ENTITY#SIMCARD", "linkedDeviceId": "D9"})
+    devices.put_item(Item={"PK": "DEVICE#D1", "SK": "SIM_ASSOC#S2", "SIMId": "S2"})  # stale link, re-pointed since
+
+    outcome = devices_api.run_cascade_plan(devices_api.plan_device_cascade_delete("D1"))
+
+    assert not outcome["incomplete"]
+    assert (outcome["recordsUpdated"], outcome["updatesSkipped"]) == (1, 1)
+    assert not exists(devices, "DEVICE#D1", "META") and not exists(devices, "INSTALL#I1", "DEVICE_ASSOC#D1")
+    assert "linkedDeviceId" not in sims.get_item(Key={"PK": "SIMCARD#S1", "SK": "ENTITY#SIMCARD"})["Item"]
+    assert sims.get_item(Key={"PK": "SIMCARD#S2", "SK": "ENTITY#SIMCARD"})["Item"]["linkedDeviceId"] == "D9"
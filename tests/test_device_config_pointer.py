@@ -0,0 +1,148 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def devices(aws_tables):
+    table = aws_tables.Table("v_devices_dev")
+    for number in range(1, 6):
+        table.put_item(Item={"PK": f"DEVICE#D{number}", "SK": "META", "DeviceId": f"D{number}", "EntityType": "DEVICE"})
+    return table
+
+
+def write_config(devices_api, version, created):
+    item = devices_api.build_device_config_item("D1", version, {"interval": 60}, "admin", "active", created)
+    return item, devices_api.write_device_config(item)
+
+
+def current_sk(devices_api):
+    return devices_api.get_current_config("D1")["ConfigSK"]
+
+
+def test_back_dated_config_leaves_pointer(devices_api, devices):
+    newer, (moved, _) = write_config(devices_api, "V2", "2026-02-01T00:00:00Z")
+    assert moved
+    older, (moved, error) = write_config(devices_api, "V1", "2026-01-01T00:00:00Z")
+    assert (moved, error) == (False, None)
+    assert current_sk(devices_api) == newer["SK"]
+
+    _, (_, error) = write_config(devices_api, "V2", "2026-02-01T00:00:00Z")
+    assert error == "DUPLICATE"
+
+
+def test_update_of_non_current_config_only_touches_history(devices_api, devices):
+    newer, _ = write_config(devices_api, "V2", "2026-02-01T00:00:00Z")
+    older, _ = write_config(devices_api, "V1", "2026-01-01T00:00:00Z")
+
+    devices_api.sync_config_pointer(older["PK"], older["SK"], {**older, "Status": "inactive"})
+
+    history = devices.get_item(Key={"PK": "DEVICE#D1", "SK": "CONFIG_HISTORY#2026-01-01T00:00:00Z#V1"})["Item"]
+    assert history["Status"] == "inactive"
+    assert devices_api.get_current_config("D1")["Status"] == "active"
+
+
+def test_delete_of_non_current_config_keeps_pointer(devices_api, devices):
+    newer, _ = write_config(devices_api, "V2", "2026-02-01T00:00:00Z")
+    older, _ = write_config(devices_api, "V1", "2026-01-01T00:00:00Z")
+
+    devices.delete_item(Key={"PK": older["PK"], "SK": older["SK"]})
+    devices_api.remove_config_pointer(older["PK"], older["SK"])
+
+    assert current_sk(devices_api) == newer["SK"]
+    assert "Item" not in devices.get_item(Key={"PK": "DEVICE#D1", "SK": "CONFIG_HISTORY#2026-01-01T00:00:00Z#V1"})
+
+
+def test_delete_of_current_config_re_resolves_pointer(devices_api, devices):
+    newer, _ = write_config(devices_api, "V2", "2026-02-01T00:00:00Z")
+    older, _ = write_config(devices_api, "V1", "2026-01-01T00:00:00Z")
+
+    devices.delete_item(Key={"PK": newer["PK"], "SK": newer["SK"]})
+    devices_api.remove_config_pointer(newer["PK"], newer["SK"])
+
+    assert current_sk(devices_api) == older["SK"]
+
+
+def apply_request(devices_api, device_ids):
+    body = {"configVersion": "V3", "configData": {"interval": 30}, "deviceIds": device_ids, "appliedBy": "admin"}
+    response = devices_api.lambda_handler({"httpMethod": "POST", "path": "/configs/apply", "body": json.dumps(body)}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def test_apply_rejects_invalid_device_ids_with_list(devices_api, devices):
+    status, body = apply_request(devices_api, ["D1", "bad id!"])
+
+    assert status == 400
+    assert body == {"error": "Invalid deviceId format: bad id!"}
+
+
+def test_large_apply_is_queued_and_run_as_job(devices_api, devices, monkeypatch):
+    invocations = []
+    monkeypatch.setattr(devices_api, "CONFIG_APPLY_SYNC_MAX_DEVICES", 2)
+    monkeypatch.setattr(devices_api, "CONFIG_APPLY_STAGE_CHUNK", 2)
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "v_devices")
+    monkeypatch.setattr(devices_api.lambda_client, "invoke", lambda **kwargs: invocations.append(json.loads(kwargs["Payload"])))
+
+    status, body = apply_request(devices_api, ["D1", "D2", "D3", "D404"])
+
+    assert status == 202 and body["status"] == "QUEUED" and body["total"] == 4
+    assert invocations == [{"job": "config-apply", "jobId": body["jobId"]}]
+
+    result = json.loads(devices_api.lambda_handler(invocations[0], None)["body"])
+    assert (result["status"], result["applied"], result["failed"]) == ("COMPLETED_WITH_ERRORS", 3, 1)
+    assert result["createdDate"] == body["createdDate"]
+    assert current_sk(devices_api).startswith("CONFIG#V3#")
+
+    # A redelivered event does not run the job again
+    assert devices_api.run_config_apply_job(body["jobId"]) is None
+
+
+def test_apply_to_device_with_newer_config_matches_single_write(devices_api, devices):
+    newer, _ = write_config(devices_api, "V9", "2999-01-01T00:00:00Z")
+
+    status, body = apply_request(devices_api, ["D1", "D2"])
+
+    assert status == 200 and (body["status"], body["applied"], body["failed"]) == ("COMPLETED", 2, 0)
+    assert current_sk(devices_api) == newer["SK"]
+    history = devices_api.query_config_history_page("D1", 10)[0]
+    assert [entry["ConfigVersion"] for entry in history] == ["V9", "V3"]
+    assert devices_api.get_current_config("D2")["ConfigVersion"] == "V3"
+
+
+def test_job_with_expired_lease_is_requeued_and_resumes(devices_api, devices, monkeypatch):
+    invocations = []
+    monkeypatch.setattr(devices_api, "CONFIG_APPLY_SYNC_MAX_DEVICES", 1)
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "v_devices")
+    monkeypatch.setattr(devices_api.lambda_client, "invoke", lambda **kwargs: invocations.append(json.loads(kwargs["Payload"])))
+    _, queued = apply_request(devices_api, ["D1", "D2", "D3"])
+    job_key = {"PK": f"CONFIG_APPLY#{queued['jobId']}", "SK": "META"}
+
+    # First run dies after D1's chunk was written
+    real_chunk = devices_api.apply_config_chunk
+    monkeypatch.setattr(devices_api, "CASCADE_TRANSACT_SIZE", devices_api.CONFIG_WRITE_ITEMS)
+
+    def crash_after_first_chunk(device_ids, *args):
+        if device_ids != ["D1"]:
+            raise SystemExit("invocation timed out")
+        return real_chunk(device_ids, *args)
+
+    monkeypatch.setattr(devices_api, "apply_config_chunk", crash_after_first_chunk)
+    with pytest.raises(SystemExit):
+        devices_api.run_config_apply_job(queued["jobId"])
+    monkeypatch.setattr(devices_api, "apply_config_chunk", real_chunk)
+
+    assert devices_api.run_config_apply_job(queued["jobId"]) is None  # lease still held
+    get_job = {"httpMethod": "GET", "path": f"/configs/apply/{queued['jobId']}", "pathParameters": {"jobId": queued["jobId"]}}
+    devices_api.lambda_handler(get_job, None)
+    assert len(invocations) == 1  # nothing re-queued while the lease is live
+
+    devices.update_item(Key=job_key, UpdateExpression="SET LeaseExpiresAt = :past", ExpressionAttributeValues={":past": 0})
+    status = json.loads(devices_api.lambda_handler(get_job, None)["body"])["status"]
+    assert status == "RUNNING" and invocations[-1] == {"job": "config-apply", "jobId": queued["jobId"]}
+
+    result = json.loads(devices_api.lambda_handler(invocations[-1], None)["body"])
+
+    assert (result["status"], result["applied"], result["failed"]) == ("COMPLETED", 3, 0)
+    history = devices_api.query_config_history_page("D1", 10)[0]
+    assert [entry["ConfigVersion"] for entry in history] == ["V3"]  # not written twice
+    assert "LeaseExpiresAt" not in devices.get_item(Key=job_key)["Item"]
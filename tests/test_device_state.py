@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def devices(aws_tables):
+    table = aws_tables.Table("v_devices_dev")
+    for device_id in ("D1", "D2"):
+        table.put_item(Item={"PK": f"DEVICE#{device_id}", "SK": "META", "DeviceId": device_id})
+    return table
+
+
+def reading(devices_api, minute, status="ok", device_id="D1", **metrics):
+    raw = {"deviceId": device_id, "eventDate": f"2026-03-01T10:{minute:02d}:00Z", "metrics": metrics, "status": status}
+    return devices_api.validate_runtime_reading(raw)[0]
+
+
+def state(devices, device_id="D1"):
+    return devices.get_item(Key={"PK": f"DEVICE#{device_id}", "SK": "STATE"})["Item"]
+
+
+def test_newest_value_per_metric_wins(devices_api, devices):
+    devices_api.update_device_states([reading(devices_api, 5, flow=5, temp=20), reading(devices_api, 1, flow=1)])
+    devices_api.update_device_states([reading(devices_api, 3, "fault", flow=3, pressure=2)])  # late arrival
+
+    item = state(devices)
+    assert {name: (int(entry["value"]), entry["at"][11:16]) for name, entry in item["Metrics"].items()} == {
+        "flow": (5, "10:05"), "temp": (20, "10:05"), "pressure": (2, "10:03")}
+    assert item["Status"] == "ok" and item["LastEventAt"].startswith("2026-03-01T10:05")
+
+
+def test_version_conflict_remerges_with_stored_state(devices_api, devices):
+    devices_api.update_device_states([reading(devices_api, 5, flow=5)])
+    stale = None  # a writer that read before the first state existed
+
+    latest = devices_api._latest_metrics_by_device([reading(devices_api, 7, temp=21)])
+    assert devices_api._put_device_state("D1", stale, *latest["D1"])
+
+    item = state(devices)
+    assert set(item["Metrics"]) == {"flow", "temp"} and item["Version"] == 2
+
+
+def test_state_endpoints_read_the_shadow(devices_api, devices):
+    devices_api.update_device_states([reading(devices_api, 5, flow=5)])
+
+    response = devices_api.lambda_handler({"httpMethod": "GET", "path": "/devices/D1/state", "pathParameters": {"deviceId": "D1"}}, None)
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["metrics"]["flow"]["value"] == 5
+
+    response = devices_api.lambda_handler({"httpMethod": "GET", "path": "/devices/state",
+                                           "queryStringParameters": {"deviceIds": "D1,D2"}}, None)
+    body = json.loads(response["body"])
+    assert [(d["deviceId"], d["lastEventAt"] is not None) for d in body["devices"]] == [("D1", True), ("D2", False)]
+
+
+def test_region_scope_stops_once_unique_devices_pass_the_cap(devices_api, devices, monkeypatch):
+    monkeypatch.setattr(devices_api, "DEVICE_STATE_MAX_DEVICES", 3)
+    pages = []
+
+    def installs_page(filters, limit, next_token=None):
+        page = int(next_token or 0)
+        pages.append(page)
+        return [{"installationId": f"I{page}-{n}"} for n in range(2)], str(page + 1), None
+
+    monkeypatch.setattr(devices_api, "query_installs_page", installs_page)
+    monkeypatch.setattr(devices_api, "list_install_device_ids", lambda install_id: [f"D-{install_id}"])
+
+    response = devices_api.lambda_handler({"httpMethod": "GET", "path": "/devices/state",
+                                           "queryStringParameters": {"stateId": "TS"}}, None)
+
+    assert response["statusCode"] == 400
+    assert pages == [0, 1]  # never walks the remaining (endless) pages
+
+
+def test_shared_devices_count_once_toward_the_cap(devices_api, devices, monkeypatch):
+    monkeypatch.setattr(devices_api, "DEVICE_STATE_MAX_DEVICES", 2)
+    monkeypatch.setattr(devices_api, "query_installs_page",
+                        lambda filters, limit, next_token=None: ([{"installationId": f"I{n}"} for n in range(5)], None, None))
+    monkeypatch.setattr(devices_api, "list_install_device_ids", lambda install_id: ["D1", "D2"])
+
+    response = devices_api.lambda_handler({"httpMethod": "GET", "path": "/devices/state",
+                                           "queryStringParameters": {"customerId": "C1"}}, None)
+
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 200
+    assert (body["installCount"], body["deviceCount"]) == (5, 2)
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+ADMIN = {"email": "admin@example.com", "role": "admin", "permissions": ["user:create", "user:update", "user:delete"]}
+
+
+@pytest.fixture
+def table(users_api, aws_tables):
+    table = aws_tables.Table("v_users_dev")
+    table.put_item(Item={"PK": "ROLE#R1", "SK": "META", "entityType": "ROLE", "roleId": "R1", "roleName": "operator"})
+    table.put_item(Item=users_api.build_role_name_item("operator", "R1"))
+    return table
+
+
+def create(users_api, email):
+    body = {"email": email, "firstName": "Ann", "lastName": "Doe", "role": "operator"}
+    response = users_api.handle_create_user({"body": json.dumps(body)}, ADMIN)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def lookup(users_api, table, email):
+    return table.get_item(Key=users_api.email_key(email)).get("Item")
+
+
+def test_create_writes_a_unique_normalized_lookup(users_api, table):
+    status, user = create(users_api, "Ann@Example.com")
+
+    assert status == 201
+    assert lookup(users_api, table, "ann@example.com")["userId"] == user["id"]
+    assert users_api.find_user_by_email(" ANN@example.COM ")["id"] == user["id"]
+    assert create(users_api, "ann@EXAMPLE.com")[0] == 409
+
+
+def test_legacy_user_is_found_by_scan_and_backfilled(users_api, table, monkeypatch):
+    table.put_item(Item={"PK": "USER#OLD", "SK": "ENTITY#USER", "entityType": "USER", "id": "OLD", "email": "old@example.com"})
+
+    monkeypatch.setattr(users_api, "EMAIL_LOOKUP_SCAN_FALLBACK", False)
+    assert users_api.find_user_by_email("old@example.com") is None
+
+    monkeypatch.setattr(users_api, "EMAIL_LOOKUP_SCAN_FALLBACK", True)
+    assert users_api.find_user_by_email("old@example.com")["id"] == "OLD"
+    assert lookup(users_api, table, "old@example.com")["userId"] == "OLD"
+    assert create(users_api, "old@example.com")[0] == 409
+
+
+def test_email_change_moves_the_lookup(users_api, table):
+    _, ann = create(users_api, "ann@example.com")
+    create(users_api, "bob@example.com")
+
+    def replace(email):
+        body = {"email": email, "firstName": "Ann", "lastName": "Doe", "role": "operator"}
+        return users_api.handle_update_user_full(ann["id"], {"body": json.dumps(body)}, ADMIN)["statusCode"]
+
+    assert replace("bob@example.com") == 409
+    assert replace("ann.doe@example.com") == 200
+    assert lookup(users_api, table, "ann@example.com") is None
+    assert lookup(users_api, table, "ann.doe@example.com")["userId"] == ann["id"]
+
+
+def test_delete_releases_only_its_own_lookup(users_api, table):
+    _, ann = create(users_api, "ann@example.com")
+    # A duplicate the email backfill left without a lookup of its own
+    table.put_item(Item={"PK": "USER#DUP", "SK": "ENTITY#USER", "entityType": "USER", "id": "DUP", "email": "ann@example.com"})
+
+    assert users_api.handle_delete_user("DUP", ADMIN)["statusCode"] == 200
+    assert lookup(users_api, table, "ann@example.com")["userId"] == ann["id"]
+
+    assert users_api.handle_delete_user(ann["id"], ADMIN)["statusCode"] == 200
+    assert lookup(users_api, table, "ann@example.com") is None
+    assert create(users_api, "ann@example.com")[0] == 201
+
+
+def test_email_change_keeps_another_users_lookup(users_api, table):
+    _, ann = create(users_api, "ann@example.com")
+    table.put_item(Item={"PK": "USER#DUP", "SK": "ENTITY#USER", "entityType": "USER", "id": "DUP",
+                         "email": "ann@example.com", "createdAt": "2026-01-01T00:00:00Z"})
+    body = {"email": "dup@example.com", "firstName": "Dup", "lastName": "Doe", "role": "operator"}
+
+    response = users_api.handle_update_user_full("DUP", {"body": json.dumps(body)}, ADMIN)
+
+    assert response["statusCode"] == 200
+    assert lookup(users_api, table, "ann@example.com")["userId"] == ann["id"]
+    assert lookup(users_api, table, "dup@example.com")["userId"] == "DUP"
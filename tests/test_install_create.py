@@ -0,0 +1,95 @@
+import pytest
+
+
+@pytest.fixture
+def devices(aws_tables):
+    table = aws_tables.Table("v_devices_dev")
+    for number in range(30):
+        table.put_item(Item={"PK": f"DEVICE#D{number:02d}", "SK": "META", "DeviceId": f"D{number:02d}"})
+    return table
+
+
+def install_items(installation_id="I1", combo="TS#01#M1#V1#H1"):
+    timestamp = "2026-03-01T00:00:00Z"
+    installation = {"PK": f"INSTALL#{installation_id}", "SK": "META", "installationId": installation_id,
+                    "entityType": "INSTALL", "regionCombo": combo, "createdDate": timestamp}
+    lock = {"PK": f"REGION_LOCK#{combo}", "SK": "LOCK", "installationId": installation_id,
+            "entityType": "REGION_LOCK", "createdDate": timestamp}
+    return installation, lock
+
+
+def test_create_writes_install_lock_outbox_and_links_together(devices_api, devices):
+    installation, lock = install_items()
+
+    success, linked, overflow, errors, code = devices_api.execute_install_create_transaction(
+        installation, lock, ["D00", "D404", "D01"], "admin", "127.0.0.1")
+
+    assert (success, linked, overflow, code) == (True, ["D00", "D01"], [], None)
+    assert errors == [{"deviceId": "D404", "error": "Device D404 not found"}]
+    outbox = devices.get_item(Key={"PK": "OUTBOX#THINGSBOARD", "SK": "INSTALL#I1"})["Item"]
+    assert outbox["status"] == "PENDING" and outbox["deviceIds"] == ["D00", "D01"]
+    assert devices.get_item(Key={"PK": "DEVICE#D01", "SK": "META"})["Item"]["linkedInstallationId"] == "I1"
+    assert "Item" in devices.get_item(Key={"PK": "REGION_LOCK#TS#01#M1#V1#H1", "SK": "LOCK"})
+
+
+def test_devices_beyond_one_transaction_are_overflow(devices_api, devices):
+    installation, lock = install_items()
+    device_ids = [f"D{number:02d}" for number in range(30)]
+
+    _, linked, overflow, _, _ = devices_api.execute_install_create_transaction(installation, lock, device_ids, "admin", "127.0.0.1")
+
+    assert linked == device_ids[:24]  # (100 - 3 base items) // 4 items per device
+    assert overflow == device_ids[24:]
+
+
+def test_region_already_taken_is_duplicate_and_writes_nothing(devices_api, devices):
+    installation, lock = install_items()
+    devices_api.execute_install_create_transaction(installation, lock, [], "admin", "127.0.0.1")
+    second, second_lock = install_items("I2")
+
+    success, linked, _, _, code = devices_api.execute_install_create_transaction(second, second_lock, ["D05"], "admin", "127.0.0.1")
+
+    assert (success, linked, code) == (False, [], "DUPLICATE")
+    assert "Item" not in devices.get_item(Key={"PK": "INSTALL#I2", "SK": "META"})
+    assert "linkedInstallationId" not in devices.get_item(Key={"PK": "DEVICE#D05", "SK": "META"})["Item"]
+
+
+def test_prevalidate_checks_more_than_one_batch_get_of_devices(devices_api, devices, monkeypatch):
+    device_ids = [f"D{number:02d}" for number in range(30)] + [f"X{number:03d}" for number in range(120)]
+    real_batch_get = devices_api.dynamodb_client.batch_get_item
+    calls = []
+
+    def batch_get_leaving_one_unprocessed(RequestItems):
+        keys = RequestItems["v_devices_dev"]["Keys"]
+        calls.append(len(keys))
+        assert len(keys) <= 100
+        if len(calls) > 1:
+            return real_batch_get(RequestItems=RequestItems)
+        response = real_batch_get(RequestItems={"v_devices_dev": {**RequestItems["v_devices_dev"], "Keys": keys[1:]}})
+        response["UnprocessedKeys"] = {"v_devices_dev": {**RequestItems["v_devices_dev"], "Keys": keys[:1]}}
+        return response
+
+    monkeypatch.setattr(devices_api.dynamodb_client, "batch_get_item", batch_get_leaving_one_unprocessed)
+    monkeypatch.setattr(devices_api.time, "sleep", lambda seconds: None)
+
+    eligible, errors = devices_api.prevalidate_install_device_links("I1", device_ids)
+
+    assert calls == [100, 1, 50]
+    assert eligible == device_ids[:30]
+    assert len(errors) == 120 and all(error["error"].endswith("not found") for error in errors)
+
+
+def test_drain_queries_the_outbox_partition(devices_api, devices, monkeypatch):
+    installation, lock = install_items()
+    devices_api.execute_install_create_transaction(installation, lock, ["D00"], "admin", "127.0.0.1")
+    devices.put_item(Item=devices_api.build_thingsboard_outbox_item("GONE", [], "2026-03-01T00:00:00Z"))
+    completed = []
+    monkeypatch.setattr(devices_api, "complete_thingsboard_outbox",
+                        lambda installation_data, device_ids: completed.append((installation_data["installationId"], device_ids)) or (None, "synced", None))
+    monkeypatch.setattr(devices_api.table, "scan", lambda **kwargs: pytest.fail("outbox drain scanned the table"))
+
+    summary = devices_api.drain_thingsboard_outbox()
+
+    assert summary == {"markers": 2, "processed": 1, "failed": 0}
+    assert completed == [("I1", ["D00"])]
+    assert "Item" not in devices.get_item(Key=devices_api.thingsboard_outbox_key("GONE"))
@@ -0,0 +1,54 @@
+import pytest
+
+
+@pytest.fixture
+def devices(aws_tables):
+    table = aws_tables.Table("v_devices_dev")
+    for number in range(30):
+        table.put_item(Item={"PK": f"DEVICE#D{number:02d}", "SK": "META", "DeviceId": f"D{number:02d}"})
+    return table
+
+
+def test_link_batch_spans_transactions(devices_api, devices, monkeypatch):
+    calls = []
+    real_transact = devices_api.dynamodb_client.transact_write_items
+    monkeypatch.setattr(devices_api.dynamodb_client, "transact_write_items",
+                        lambda **kwargs: calls.append(len(kwargs["TransactItems"])) or real_transact(**kwargs))
+    device_ids = [f"D{number:02d}" for number in range(30)]
+
+    linked, errors = devices_api.execute_install_device_link_batch("I1", device_ids, "admin", "127.0.0.1")
+
+    assert linked == device_ids and errors == []
+    assert calls == [100, 20]  # 25 devices x 4 items, then the remaining 5
+    meta = devices.get_item(Key={"PK": "DEVICE#D29", "SK": "META"})["Item"]
+    assert meta["linkedInstallationId"] == "I1" and meta["installationHistory"][0]["action"] == "linked"
+    assert "Item" in devices.get_item(Key={"PK": "INSTALL#I1", "SK": "DEVICE_ASSOC#D29"})
+
+
+def test_failed_devices_are_dropped_and_rest_retried(devices_api, devices):
+    devices.put_item(Item={"PK": "INSTALL#I1", "SK": "DEVICE_ASSOC#D01", "deviceId": "D01"})
+
+    linked, errors = devices_api.execute_install_device_link_batch("I1", ["D00", "D01", "D404", "D02"], "admin", "127.0.0.1")
+
+    assert linked == ["D00", "D02"]
+    assert sorted((e["deviceId"], e["error"]) for e in errors) == [
+        ("D01", "Device D01 is already linked to install I1"),
+        ("D404", "Device D404 not found"),
+    ]
+    assert "Item" not in devices.get_item(Key={"PK": "DEVICE#D404", "SK": "INSTALL_ASSOC#I1"})
+
+
+def test_prevalidate_reports_each_problem(devices_api, devices):
+    devices.put_item(Item={"PK": "DEVICE#D01", "SK": "INSTALL_ASSOC#I1"})
+    devices.put_item(Item={"PK": "DEVICE#D02", "SK": "INSTALL_ASSOC#I9"})
+
+    eligible, errors = devices_api.prevalidate_install_device_links("I1", ["D00", "D00", "bad id", "D01", "D02", "D404"])
+
+    assert eligible == ["D00"]
+    assert [e["error"] for e in errors] == [
+        "Duplicate deviceId in request",
+        "Invalid deviceId format",
+        "Device D404 not found",
+        "Device already linked to install I1",
+        "Device already linked to installation I9",
+    ]
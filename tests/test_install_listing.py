@@ -0,0 +1,83 @@
+import pytest
+
+
+@pytest.fixture
+def installs(aws_tables):
+    table = aws_tables.Table("v_devices_dev")
+    combos = [("TS", "01"), ("TS", "01"), ("TS", "02"), ("AP", "01"), ("TS", "01")]
+    for number, (state, district) in enumerate(combos, start=1):
+        table.put_item(Item={
+            "PK": f"INSTALL#I{number}",
+            "SK": "META",
+            "installationId": f"I{number}",
+            "entityType": "INSTALL",
+            "stateId": state,
+            "districtId": district,
+            "mandalId": "M1",
+            "villageId": "V1",
+            "habitationId": f"H{number}",
+            "regionCombo": f"{state}#{district}#M1#V1#H{number}",
+            "customerId": "C1" if number % 2 else "C2",
+            "status": "active" if number != 2 else "inactive",
+            "createdDate": f"2026-01-0{number}T00:00:00Z",
+        })
+    return table
+
+
+def ids(items):
+    return sorted(item["installationId"] for item in items)
+
+
+def test_region_prefix_uses_region_index(devices_api, installs):
+    query_params, index_name = devices_api.build_install_list_query({"stateId": "TS", "districtId": "01"})
+    assert index_name == devices_api.INSTALL_REGION_INDEX
+
+    items, token, error = devices_api.query_installs_page({"stateId": "TS", "districtId": "01"}, 10)
+    assert error is None and token is None
+    assert ids(items) == ["I1", "I2", "I5"]
+
+
+def test_status_filter_and_unfiltered_listing(devices_api, installs):
+    items, _, _ = devices_api.query_installs_page({"stateId": "TS", "districtId": "01", "status": "active"}, 10)
+    assert ids(items) == ["I1", "I5"]
+
+    items, _, _ = devices_api.query_installs_page({}, 10)
+    assert [item["installationId"] for item in items] == ["I5", "I4", "I3", "I2", "I1"]  # newest first
+
+
+def test_cursor_pages_through_without_gaps(devices_api, installs):
+    seen = []
+    token = None
+    while True:
+        items, token, error = devices_api.query_installs_page({"customerId": "C1"}, 2, token)
+        assert error is None
+        seen.extend(items)
+        if not token:
+            break
+    assert ids(seen) == ["I1", "I3", "I5"]
+
+
+def test_cursor_is_bound_to_its_filters(devices_api, installs):
+    _, token, _ = devices_api.query_installs_page({}, 1)
+    _, _, error = devices_api.query_installs_page({"customerId": "C1"}, 1, token)
+    assert error == "nextToken does not match the requested filters"
+
+
+def test_lower_region_level_requires_state(devices_api, installs):
+    items, token, error = devices_api.query_installs_page({"districtId": "01", "status": "active"}, 10)
+    assert items is None
+    assert "stateId is required" in error
+
+    # A customer scope keeps the district as a plain filter
+    items, _, error = devices_api.query_installs_page({"customerId": "C1", "districtId": "01"}, 10)
+    assert error is None and ids(items) == ["I1", "I5"]
+
+
+def test_warranty_listing_district_requires_state(devices_api, installs):
+    response = devices_api.lambda_handler({"httpMethod": "GET", "path": "/installs/warranty-expiring",
+                                           "queryStringParameters": {"districtId": "01"}}, None)
+    assert response["statusCode"] == 400
+    assert "stateId is required when filtering by districtId" in response["body"]
+
+    items, _, error = devices_api.query_warranty_expiring_page(30, {"stateId": "TS", "districtId": "01"}, 10)
+    assert error is None and items == []
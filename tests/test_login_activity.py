@@ -0,0 +1,79 @@
+import pytest
+
+
+def activity_item(table, user_id):
+    return table.get_item(Key={"PK": f"USER#{user_id}", "SK": "ACTIVITY#LOGIN"}).get("Item")
+
+
+@pytest.fixture
+def users_table(aws_tables):
+    return aws_tables.Table("v_users_dev")
+
+
+def test_logins_within_window_are_coalesced(users_api, users_table):
+    users_api.record_login("U1", "2026-03-01T10:00:00Z")
+    activity, pending = users_api.record_login("U1", "2026-03-01T10:01:00Z")
+    activity, pending = users_api.record_login("U1", "2026-03-01T10:02:00Z")
+
+    assert activity_item(users_table, "U1")["loginCount"] == 1  # one write for the first login
+    merged = users_api.merge_login_activity({"loginCount": 5}, activity, pending)
+    assert (merged["loginCount"], merged["lastLoginAt"]) == (8, "2026-03-01T10:02:00Z")
+
+
+def test_buffered_logins_flush_after_window(users_api, users_table, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(users_api.time, "time", lambda: clock[0])
+    for minute in range(3):
+        users_api.record_login("U1", f"2026-03-01T10:0{minute}:00Z")
+
+    clock[0] += users_api.LOGIN_ACTIVITY_WINDOW_SECONDS + 1
+    users_api.record_login("U1", "2026-03-01T10:10:00Z")
+
+    item = activity_item(users_table, "U1")
+    assert (item["loginCount"], item["lastLoginAt"]) == (4, "2026-03-01T10:10:00Z")
+
+
+def test_other_container_window_is_respected(users_api, users_table):
+    users_api.record_login("U1", "2026-03-01T10:00:00Z")
+    users_api._login_activity.clear()  # a fresh container
+
+    activity, pending = users_api.record_login("U1", "2026-03-01T10:01:00Z")
+
+    assert activity_item(users_table, "U1")["loginCount"] == 1
+    assert activity["loginCount"] == 1 and pending["count"] == 1
+
+
+def test_buffer_is_bounded_lru(users_api, users_table, monkeypatch):
+    monkeypatch.setattr(users_api, "LOGIN_ACTIVITY_CACHE_MAX_ENTRIES", 2)
+
+    for user_id in ("U1", "U2", "U1", "U3"):
+        users_api.record_login(user_id, "2026-03-01T10:00:00Z")
+
+    assert list(users_api._login_activity) == ["U1", "U3"]
+
+
+def test_due_buffers_flush_on_any_invocation(users_api, users_table, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(users_api.time, "time", lambda: clock[0])
+    users_api.record_login("U1", "2026-03-01T10:00:00Z")
+    users_api.record_login("U1", "2026-03-01T10:01:00Z")  # buffered; U1 does not log in again
+
+    users_api.flush_due_login_activity()
+    assert activity_item(users_table, "U1")["loginCount"] == 1
+
+    clock[0] += users_api.LOGIN_ACTIVITY_WINDOW_SECONDS + 1
+    users_api.lambda_handler({"httpMethod": "GET", "path": "/users/unknown-route"}, None)
+
+    item = activity_item(users_table, "U1")
+    assert (item["loginCount"], item["lastLoginAt"]) == (2, "2026-03-01T10:01:00Z")
+    assert users_api._login_activity["U1"]["pending"]["count"] == 0
+
+
+def test_evicted_user_logins_are_written(users_api, users_table, monkeypatch):
+    monkeypatch.setattr(users_api, "LOGIN_ACTIVITY_CACHE_MAX_ENTRIES", 1)
+    users_api.record_login("U1", "2026-03-01T10:00:00Z")
+    users_api.record_login("U1", "2026-03-01T10:01:00Z")  # buffered within the window
+
+    users_api.record_login("U2", "2026-03-01T10:02:00Z")
+
+    assert activity_item(users_table, "U1")["loginCount"] == 2
@@ -0,0 +1,90 @@
+from io import BytesIO
+
+import boto3
+import pytest
+from PIL import Image
+
+BUCKET = "iot-platform-profile-pictures"
+
+
+def png(width, height):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def s3_event(*keys):
+    return {"Records": [{"eventSource": "aws:s3", "s3": {"object": {"key": key}}} for key in keys]}
+
+
+@pytest.fixture
+def profile(aws_tables):
+    table = aws_tables.Table("v_users_dev")
+    table.put_item(Item={"PK": "USER#U1", "SK": "PROFILE#MAIN", "userId": "U1"})
+    return table
+
+
+@pytest.fixture
+def s3():
+    return boto3.client("s3")
+
+
+def test_upload_is_resized_into_variants(users_api, profile, s3):
+    key = "profile-pictures/originals/U1/20260301120000.png"
+    s3.put_object(Bucket=BUCKET, Key=key, Body=png(1000, 600))
+
+    result = users_api.lambda_handler(s3_event(key), None)
+
+    assert result["processed"] == [{"userId": "U1", "s3Key": key, "variants": ["thumbnail", "medium"]}]
+    variants = profile.get_item(Key={"PK": "USER#U1", "SK": "PROFILE#MAIN"})["Item"]["profilePictureVariants"]
+    assert (variants["thumbnail"]["width"], variants["thumbnail"]["height"]) == (128, 77)
+    assert (variants["medium"]["width"], variants["medium"]["height"]) == (512, 307)
+
+    stored = s3.get_object(Bucket=BUCKET, Key="profile-pictures/variants/U1/20260301120000/thumbnail.webp")
+    assert stored["ContentType"] == "image/webp"
+    assert Image.open(BytesIO(stored["Body"].read())).size == (128, 77)
+
+
+def test_small_image_is_not_upscaled(users_api, profile, s3):
+    key = "profile-pictures/originals/U1/20260301120000.png"
+    s3.put_object(Bucket=BUCKET, Key=key, Body=png(100, 50))
+
+    users_api.handle_profile_picture_uploaded(s3_event(key))
+
+    variants = profile.get_item(Key={"PK": "USER#U1", "SK": "PROFILE#MAIN"})["Item"]["profilePictureVariants"]
+    assert {name: (v["width"], v["height"]) for name, v in variants.items()} == {"thumbnail": (100, 50), "medium": (100, 50)}
+
+
+def test_late_older_upload_does_not_replace_newer(users_api, profile, s3):
+    newer, older = ("profile-pictures/originals/U1/20260301120000.png", "profile-pictures/originals/U1/20260301110000.png")
+    for key in (newer, older):
+        s3.put_object(Bucket=BUCKET, Key=key, Body=png(300, 300))
+
+    result = users_api.handle_profile_picture_uploaded(s3_event(newer, older))
+
+    assert [item["s3Key"] for item in result["processed"]] == [newer]
+    assert result["skipped"] == [older]
+    assert profile.get_item(Key={"PK": "USER#U1", "SK": "PROFILE#MAIN"})["Item"]["profilePictureKey"] == newer
+
+
+def test_variants_and_undecodable_uploads_are_skipped(users_api, profile, s3):
+    broken = "profile-pictures/originals/U1/20260301120000.jpg"
+    s3.put_object(Bucket=BUCKET, Key=broken, Body=b"not an image")
+
+    result = users_api.handle_profile_picture_uploaded(
+        s3_event("profile-pictures/variants/U1/x/thumbnail.webp", broken))
+
+    assert result == {"processed": [], "skipped": ["profile-pictures/variants/U1/x/thumbnail.webp", broken]}
+    assert "profilePictureKey" not in profile.get_item(Key={"PK": "USER#U1", "SK": "PROFILE#MAIN"})["Item"]
+
+
+def test_oversized_dimensions_are_rejected_before_decoding(users_api, profile, s3, monkeypatch):
+    key = "profile-pictures/originals/U1/20260301120000.png"
+    s3.put_object(Bucket=BUCKET, Key=key, Body=png(200, 100))
+    monkeypatch.setattr(users_api, "PROFILE_PICTURE_MAX_PIXELS", 200 * 100 - 1)
+    monkeypatch.setattr(Image.Image, "load", lambda self: pytest.fail("oversized image was decoded"))
+
+    result = users_api.handle_profile_picture_uploaded(s3_event(key))
+
+    assert result == {"processed": [], "skipped": [key]}
+    assert "profilePictureKey" not in profile.get_item(Key={"PK": "USER#U1", "SK": "PROFILE#MAIN"})["Item"]
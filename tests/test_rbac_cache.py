@@ -0,0 +1,67 @@
+import pytest
+
+ADMIN = {"uid": "admin", "permissions": ["permission:manage", "permission:read"]}
+
+
+@pytest.fixture
+def roles(users_api, aws_tables):
+    table = aws_tables.Table("v_users_dev")
+    table.put_item(Item={"PK": "ROLE#R1", "SK": "META", "entityType": "ROLE", "roleId": "R1", "roleName": "operator"})
+    table.put_item(Item={"PK": "ROLE#R1", "SK": "PERMISSION#P1", "permissionName": "device:read"})
+    table.put_item(Item={"PK": "PERMISSION#P2", "SK": "META", "entityType": "PERMISSION",
+                         "permissionId": "P2", "permissionName": "device:write"})
+    return table
+
+
+@pytest.fixture
+def reads(users_api, monkeypatch):
+    calls = []
+    for name in ("scan", "query"):
+        real = getattr(users_api.table, name)
+        monkeypatch.setattr(users_api.table, name, lambda real=real, name=name, **kwargs: calls.append(name) or real(**kwargs))
+    return calls
+
+
+def test_legacy_role_is_found_once_and_backfilled(users_api, roles, reads):
+    operator = {"role": "Operator"}
+    assert users_api.check_permission(operator, "device:read")
+    assert reads == ["scan", "query"]
+    assert roles.get_item(Key=users_api.role_name_key("operator"))["Item"]["roleId"] == "R1"
+
+    assert users_api.check_permission(operator, "device:read")
+    assert not users_api.check_permission(operator, "device:write")
+    assert reads == ["scan", "query"]  # served from the container cache
+
+
+def test_scan_fallback_can_be_switched_off(users_api, roles, reads, monkeypatch):
+    monkeypatch.setattr(users_api, "ROLE_LOOKUP_SCAN_FALLBACK", False)
+
+    assert users_api.get_role_from_database("operator") is None
+    assert reads == []
+
+    roles.put_item(Item=users_api.build_role_name_item("operator", "R1"))
+    assert users_api.get_role_from_database("operator")["roleId"] == "R1"
+
+
+def test_role_change_invalidates_the_cache(users_api, roles, reads):
+    roles.put_item(Item=users_api.build_role_name_item("operator", "R1"))
+    assert not users_api.check_permission({"role": "operator"}, "device:write")
+
+    response = users_api.handle_assign_permission_to_role("R1", {"body": '{"permissionId": "P2"}'}, ADMIN)
+
+    assert response["statusCode"] == 201
+    assert users_api.check_permission({"role": "operator"}, "device:write")
+    assert "scan" not in reads  # resolved through the ROLENAME# lookup item
+
+
+def test_version_moved_by_another_container(users_api, roles):
+    roles.put_item(Item=users_api.build_role_name_item("operator", "R1"))
+    assert not users_api.check_permission({"role": "operator"}, "device:write")
+
+    # Another container assigns the permission and bumps the version
+    roles.put_item(Item={"PK": "ROLE#R1", "SK": "PERMISSION#P2", "permissionName": "device:write"})
+    roles.put_item(Item={**users_api.RBAC_VERSION_KEY, "version": 1})
+    assert not users_api.check_permission({"role": "operator"}, "device:write")  # until the next version check
+
+    users_api._rbac_cache["checkedAt"] = 0.0
+    assert users_api.check_permission({"role": "operator"}, "device:write")
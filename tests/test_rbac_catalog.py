@@ -0,0 +1,109 @@
+import json
+import time
+
+import pytest
+
+ADMIN = {"uid": "admin", "permissions": ["permission:manage", "permission:read"]}
+
+
+def call(handler, *args, body=None):
+    response = handler(*args, {"body": json.dumps(body)}, ADMIN) if body is not None else handler(*args, ADMIN)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def create_role(users_api, name):
+    return call(users_api.handle_create_role, body={"roleName": name, "displayName": name.title()})
+
+
+@pytest.fixture
+def table(aws_tables):
+    return aws_tables.Table("v_users_dev")
+
+
+def test_snapshot_is_built_from_existing_items(users_api, table):
+    table.put_item(Item={"PK": "ROLE#R1", "SK": "META", "entityType": "ROLE", "roleId": "R1", "roleName": "legacy"})
+    table.put_item(Item={"PK": "USER#U1", "SK": "ENTITY#USER", "entityType": "USER", "id": "U1"})
+
+    status, body = call(users_api.handle_list_roles)
+
+    assert status == 200 and [role["roleName"] for role in body["data"]] == ["legacy"]
+    snapshot = table.get_item(Key=users_api.RBAC_CATALOG_KEY)["Item"]
+    assert set(snapshot["roles"]) == {"R1"} and snapshot["version"] == 0
+
+
+def test_catalog_changes_are_listed_without_scanning(users_api, table, monkeypatch):
+    create_role(users_api, "operator")
+    call(users_api.handle_create_component, body={"componentName": "Dashboard", "path": "/dash"})
+    monkeypatch.setattr(users_api.table, "scan", lambda **kwargs: pytest.fail("listing scanned the table"))
+
+    assert create_role(users_api, "Operator")[0] == 409
+    assert call(users_api.handle_create_component, body={"componentName": "Dashboard", "path": "/x"})[0] == 409
+    assert [c["componentName"] for c in call(users_api.handle_list_components)[1]["data"]] == ["Dashboard"]
+
+    role_id = next(iter(users_api.load_rbac_catalog()["roles"]))
+    assert call(users_api.handle_delete_role, role_id)[0] == 200
+    assert call(users_api.handle_list_roles)[1]["data"] == []
+    assert table.get_item(Key=users_api.RBAC_CATALOG_KEY)["Item"]["version"] == 3
+
+
+def test_stale_container_cache_cannot_duplicate_a_role(users_api, table):
+    create_role(users_api, "operator")
+    # This container still holds a catalog from before the role existed
+    users_api._rbac_cache["catalog"] = {"roles": {}, "permissions": {}, "components": {}, "version": 0,
+                                        "expiresAt": time.time() + 60}
+    users_api._rbac_cache["checkedAt"] = time.time()
+
+    status, body = create_role(users_api, "operator")
+
+    assert status == 409 and body["error"] == "Role 'operator' already exists"
+    assert len(users_api.load_rbac_catalog(consistent=True)["roles"]) == 1
+
+
+def test_concurrent_catalog_writer_is_retried(users_api, table, monkeypatch):
+    create_role(users_api, "operator")
+    real_transact = users_api.dynamodb_client.transact_write_items
+    attempts = []
+
+    def racing_transact(TransactItems):
+        if not attempts:
+            # Another container commits a catalog change first
+            table.update_item(Key=users_api.RBAC_CATALOG_KEY, UpdateExpression="ADD #v :one",
+                              ExpressionAttributeNames={"#v": "version"}, ExpressionAttributeValues={":one": 1})
+        attempts.append(len(TransactItems))
+        return real_transact(TransactItems=TransactItems)
+
+    monkeypatch.setattr(users_api.dynamodb_client, "transact_write_items", racing_transact)
+
+    assert create_role(users_api, "auditor")[0] == 201
+    assert len(attempts) == 2
+    catalog = users_api.load_rbac_catalog(consistent=True)
+    assert sorted(role["roleName"] for role in catalog["roles"].values()) == ["auditor", "operator"]
+    assert catalog["version"] == 3
+
+
+@pytest.mark.parametrize("handler, body", [
+    ("handle_create_permission", {"permissionName": "device:read", "permissionCode": "DR", "displayName": "Read",
+                                  "resource": "device", "action": "read", "category": "devices"}),
+    ("handle_create_component", {"componentName": "Dashboard", "path": "/dash"}),
+])
+def test_stale_cache_cannot_duplicate_a_permission_or_component(users_api, table, handler, body):
+    assert call(getattr(users_api, handler), body=body)[0] == 201
+    users_api._rbac_cache["catalog"] = {"roles": {}, "permissions": {}, "components": {}, "version": 0,
+                                        "expiresAt": time.time() + 60}
+    users_api._rbac_cache["checkedAt"] = time.time()
+
+    status, body = call(getattr(users_api, handler), body=body)
+
+    assert status == 409 and body["error"].endswith("already exists")
+    catalog = users_api.load_rbac_catalog(consistent=True)
+    assert len(catalog["permissions"]) + len(catalog["components"]) == 1
+
+
+def test_catalog_write_that_would_outgrow_the_item_is_refused(users_api, table, monkeypatch):
+    create_role(users_api, "operator")
+    monkeypatch.setattr(users_api, "RBAC_CATALOG_MAX_BYTES", 600)
+
+    status, body = call(users_api.handle_create_component, body={"componentName": "Dashboard", "path": "/dash"})
+
+    assert status == 500 and "limit 600" in body["error"]
+    assert users_api.load_rbac_catalog(consistent=True)["components"] == {}
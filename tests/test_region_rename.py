@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+
+def put_install(devices_table, install_id, state, district, mandal="M1", village="V1", habitation="H1"):
+    devices_table.put_item(Item={
+        "PK": f"INSTALL#{install_id}",
+        "SK": "META",
+        "entityType": "INSTALL",
+        "stateId": state,
+        "districtId": district,
+        "mandalId": mandal,
+        "villageId": village,
+        "habitationId": habitation,
+        "regionCombo": f"{state}#{district}#{mandal}#{village}#{habitation}",
+        "districtName": "Old",
+        "habitationName": "Old",
+        "createdDate": "2026-01-01T00:00:00Z",
+    })
+
+
+@pytest.fixture
+def devices_table(aws_tables):
+    return aws_tables.Table("v_devices_dev")
+
+
+def test_district_rename_is_scoped_to_its_state(regions_api, devices_table):
+    put_install(devices_table, "a", "TS", "01")
+    put_install(devices_table, "b", "TS", "01", mandal="M2")
+    put_install(devices_table, "c", "AP", "01")
+    put_install(devices_table, "d", "TS", "02")
+
+    updated = regions_api.propagate_region_name_to_installations("DISTRICT", ["TS", "01"], "Hyderabad")
+
+    assert updated == 2
+    names = {key: devices_table.get_item(Key={"PK": f"INSTALL#{key}", "SK": "META"})["Item"]["districtName"]
+             for key in "abcd"}
+    assert names == {"a": "Hyderabad", "b": "Hyderabad", "c": "Old", "d": "Old"}
+
+
+def test_habitation_rename_matches_full_path_only(regions_api, devices_table):
+    put_install(devices_table, "a", "TS", "01", habitation="H1")
+    put_install(devices_table, "b", "TS", "01", habitation="H10")
+
+    updated = regions_api.propagate_region_name_to_installations("HABITATION", ["TS", "01", "M1", "V1", "H1"], "New")
+
+    assert updated == 1
+    assert devices_table.get_item(Key={"PK": "INSTALL#b", "SK": "META"})["Item"]["habitationName"] == "Old"
+
+
+def test_prefixed_region_ids_are_matched(regions_api, devices_table):
+    put_install(devices_table, "a", "STATE-TS", "DIST-01", "MANDAL-M1", "VILLAGE-V1", "HAB-H1")
+    put_install(devices_table, "b", "TS", "01")
+    put_install(devices_table, "c", "STATE-TS", "DIST-02", "MANDAL-M1", "VILLAGE-V1", "HAB-H1")
+
+    updated = regions_api.propagate_region_name_to_installations("DISTRICT", ["TS", "01"], "Hyderabad")
+
+    assert updated == 2
+    assert devices_table.get_item(Key={"PK": "INSTALL#c", "SK": "META"})["Item"]["districtName"] == "Old"
+
+
+def test_put_rename_is_propagated_in_the_background(regions_api, devices_table, aws_tables, monkeypatch):
+    regions = aws_tables.Table("regions")
+    regions.put_item(Item={"PK": "STATE#TS", "SK": "DISTRICT#01", "RegionType": "DISTRICT", "RegionCode": "01",
+                           "RegionName": "Old", "StateCode": "TS", "isActive": True})
+    put_install(devices_table, "a", "TS", "01")
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "v_regions")
+    queued = []
+    monkeypatch.setattr(regions_api.lambda_client, "invoke", lambda **kwargs: queued.append(json.loads(kwargs["Payload"])))
+
+    response = regions_api.lambda_handler({"httpMethod": "PUT", "body": json.dumps({
+        "RegionType": "DISTRICT", "RegionCode": "01", "RegionName": "Hyderabad", "StateCode": "TS", "isActive": True})}, None)
+
+    assert response["statusCode"] == 200 and json.loads(response["body"])["installationsUpdate"] == "queued"
+    assert devices_table.get_item(Key={"PK": "INSTALL#a", "SK": "META"})["Item"]["districtName"] == "Old"
+    assert queued == [{"job": "propagate-region-name", "regionType": "DISTRICT", "regionPath": ["TS", "01"],
+                       "regionKey": {"PK": "STATE#TS", "SK": "DISTRICT#01"}}]
+
+    result = regions_api.lambda_handler(queued[0], None)
+
+    assert json.loads(result["body"]) == {"installationsUpdated": 1}
+    assert devices_table.get_item(Key={"PK": "INSTALL#a", "SK": "META"})["Item"]["districtName"] == "Hyderabad"
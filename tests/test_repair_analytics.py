@@ -0,0 +1,65 @@
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def repairs(aws_tables):
+    table = aws_tables.Table("v_devices_dev")
+    table.put_item(Item={"PK": "INSTALL#I1", "SK": "META", "districtId": "D01"})
+    for device_id, device_type, install_id in (("P1", "pump", "I1"), ("P2", "pump", None), ("M1", "meter", "I1")):
+        item = {"PK": f"DEVICE#{device_id}", "SK": "META", "DeviceId": device_id, "DeviceType": device_type}
+        if install_id:
+            item["linkedInstallationId"] = install_id
+        table.put_item(Item=item)
+    for number, (device_id, day, cost) in enumerate(
+            [("P1", "01", 100), ("P1", "11", 50), ("P1", "31", 30), ("P2", "05", 20), ("M1", "02", 10)]):
+        table.put_item(Item={
+            "PK": f"DEVICE#{device_id}",
+            "SK": f"REPAIR#R{number}#2026-01-{day}",
+            "EntityType": "REPAIR",
+            "DeviceId": device_id,
+            "Cost": Decimal(cost),
+            "RepairDate": f"2026-01-{day}T08:00:00Z",
+        })
+    return table
+
+
+def by_group(result):
+    return {group["group"]: group for group in result["groups"]}
+
+
+def test_groups_by_device_type_with_mtbf(devices_api, repairs):
+    result = devices_api.compute_repair_analytics("deviceType", "2026-01-01", "2026-01-31T23:59:59Z")
+
+    assert result["repairCount"] == 5 and result["totalCost"] == 210
+    pump = by_group(result)["pump"]
+    assert (pump["repairCount"], pump["devicesRepaired"], pump["totalCost"]) == (4, 2, 200)
+    assert pump["repairsPerDevice"] == 2.0 and pump["mtbfDays"] == 15.0  # P1 gaps of 10 and 20 days
+    assert by_group(result)["meter"]["mtbfDays"] is None
+
+
+def test_district_grouping_and_date_range(devices_api, repairs):
+    result = devices_api.compute_repair_analytics("district", "2026-01-01", "2026-01-15T23:59:59Z")
+
+    groups = by_group(result)
+    assert groups["D01"]["repairCount"] == 3  # P1 twice and M1
+    assert groups["unknown"]["repairCount"] == 1  # P2 is not linked to an installation
+
+
+def test_numpy_and_python_aggregation_agree(devices_api, monkeypatch):
+    args = ([0, 0, 1, 0, 1], [0, 0, 1, 2, 1], [10.0, 40.0, 5.0, 7.0, 6.0], [1.0, 2.0, 3.0, 4.0, 5.0], 2)
+    vectorized = devices_api.aggregate_repair_stats(*args)
+    monkeypatch.setattr(devices_api, "np", None)
+    assert devices_api.aggregate_repair_stats(*args) == vectorized
+
+
+def test_result_is_cached_until_refresh(devices_api, repairs):
+    first = devices_api.get_repair_analytics("deviceType", "2026-01-01", "2026-01-31T23:59:59Z")
+    repairs.delete_item(Key={"PK": "DEVICE#M1", "SK": "REPAIR#R4#2026-01-02"})
+
+    cached = devices_api.get_repair_analytics("deviceType", "2026-01-01", "2026-01-31T23:59:59Z")
+    assert cached["cached"] and cached["repairCount"] == first["repairCount"] == 5
+
+    fresh = devices_api.get_repair_analytics("deviceType", "2026-01-01", "2026-01-31T23:59:59Z", refresh=True)
+    assert not fresh["cached"] and fresh["repairCount"] == 4
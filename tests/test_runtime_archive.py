@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+DAY = (datetime.now(timezone.utc) - timedelta(days=5)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def device(devices_api, aws_tables, tmp_path, monkeypatch):
+    monkeypatch.setenv("TELEMETRY_ARCHIVE_DIR", str(tmp_path))
+    table = aws_tables.Table("v_devices_dev")
+    table.put_item(Item={"PK": "DEVICE#D1", "SK": "META", "DeviceId": "D1"})
+    return table
+
+
+def at(minute):
+    return (DAY + timedelta(minutes=minute)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def ingest(devices_api, minutes, bucket=None):
+    summary, errors, _ = devices_api.ingest_runtime_readings(
+        [{"deviceId": "D1", "eventDate": at(m), "metrics": {"flow": m}} for m in minutes], bucket)
+    assert errors == []
+    return summary
+
+
+def flow(devices_api):
+    samples, _, _ = devices_api.collect_runtime_samples("D1", DAY, DAY + timedelta(days=1) - timedelta(seconds=1))
+    timestamps, values = samples.get("flow", ([], []))
+    return sorted(zip([int(ts - DAY.timestamp()) // 60 for ts in timestamps], values))
+
+
+def expire_live_items(table):
+    """Stand-in for the RUNTIME TTL removing the DynamoDB copies."""
+    for item in table.query(KeyConditionExpression="PK = :pk AND begins_with(SK, :sk)",
+                            ExpressionAttributeValues={":pk": "DEVICE#D1", ":sk": "RUNTIME#"})["Items"]:
+        table.delete_item(Key={"PK": item["PK"], "SK": item["SK"]})
+
+
+def index_item(table):
+    return table.get_item(Key={"PK": "DEVICE#D1", "SK": f"ARCHIVE#{DAY:%Y-%m-%d}"}).get("Item")
+
+
+def test_archive_round_trip_from_the_device_registry(devices_api, device):
+    ingest(devices_api, [0, 10])
+    ingest(devices_api, [20, 25], "15m")
+
+    summary = devices_api.run_runtime_archive_job()
+
+    assert summary["devices"] == 1 and summary["failed"] == 0
+    assert index_item(device)["ReadingCount"] == 4
+    expire_live_items(device)
+    assert flow(devices_api) == [(0, 0.0), (10, 10.0), (20, 20.0), (25, 25.0)]
+
+
+def test_late_reading_is_read_and_re_archived(devices_api, device):
+    ingest(devices_api, [0, 10])
+    devices_api.run_runtime_archive_job()
+
+    ingest(devices_api, [5, 10])  # arrives after its day was archived; 10 is a resend
+
+    assert index_item(device)["LateReadings"] == 2
+    assert flow(devices_api) == [(0, 0.0), (5, 5.0), (10, 10.0)]  # blob + live, no duplicates
+
+    devices_api.run_runtime_archive_job()
+    assert "LateReadings" not in index_item(device)
+    expire_live_items(device)
+    assert flow(devices_api) == [(0, 0.0), (5, 5.0), (10, 10.0)]
+
+
+def test_late_reading_during_a_run_keeps_the_day_pending(devices_api, device, monkeypatch):
+    ingest(devices_api, [0])
+    real_collect = devices_api.collect_runtime_samples
+
+    def collect_then_late_reading(*args, **kwargs):
+        result = real_collect(*args, **kwargs)
+        ingest(devices_api, [30])
+        return result
+
+    monkeypatch.setattr(devices_api, "collect_runtime_samples", collect_then_late_reading)
+    assert devices_api.run_runtime_archive_job()["remaining"] is True
+    monkeypatch.setattr(devices_api, "collect_runtime_samples", real_collect)
+
+    devices_api.run_runtime_archive_job()
+    expire_live_items(device)
+    assert flow(devices_api) == [(0, 0.0), (30, 30.0)]
+
+
+def test_re_running_the_job_is_idempotent(devices_api, device, tmp_path):
+    ingest(devices_api, [0, 10])
+    first = devices_api.run_runtime_archive_job()
+    blob = (tmp_path / "runtime" / "D1" / f"{DAY:%Y-%m-%d}.vta").read_bytes()
+
+    second = devices_api.run_runtime_archive_job()
+
+    assert first["daysArchived"] >= 1 and second["daysArchived"] == 0
+    assert (tmp_path / "runtime" / "D1" / f"{DAY:%Y-%m-%d}.vta").read_bytes() == blob
+    assert flow(devices_api) == [(0, 0.0), (10, 10.0)]
+
+
+def test_job_does_not_scan_the_table(devices_api, device, monkeypatch):
+    ingest(devices_api, [0])
+    monkeypatch.setattr(devices_api.table, "scan", lambda **kwargs: pytest.fail("archive job scanned the table"))
+
+    assert devices_api.run_runtime_archive_job()["devices"] == 1
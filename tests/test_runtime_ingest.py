@@ -0,0 +1,54 @@
+import pytest
+
+
+@pytest.fixture
+def devices(aws_tables):
+    table = aws_tables.Table("v_devices_dev")
+    for device_id in ("D1", "D2"):
+        table.put_item(Item={"PK": f"DEVICE#{device_id}", "SK": "META", "DeviceId": device_id})
+    return table
+
+
+def reading(device_id, minute, **metrics):
+    return {"deviceId": device_id, "eventDate": f"2026-03-01T10:{minute:02d}:00Z", "metrics": metrics or {"temp": 20.5}}
+
+
+def test_non_finite_metrics_are_rejected_per_reading(devices_api, devices):
+    raw = [reading("D1", 0), reading("D1", 1, temp=float("nan")), reading("D1", 2, temp=float("inf")), reading("D9", 3)]
+
+    summary, errors, stored = devices_api.ingest_runtime_readings(raw)
+
+    assert summary["stored"] == 1 and summary["rejected"] == 3
+    assert [(error["index"], error["error"]) for error in errors] == [
+        (1, "Metric temp must be a finite number"),
+        (2, "Metric temp must be a finite number"),
+        (3, "Device not found"),
+    ]
+    assert "Item" in devices.get_item(Key={"PK": "DEVICE#D1", "SK": "RUNTIME#2026-03-01T10:00:00.000Z"})
+
+
+def test_unstorable_event_fails_only_its_reading(devices_api, devices):
+    bad = {**reading("D2", 1), "events": [{"level": float("nan")}]}
+
+    summary, errors, _ = devices_api.ingest_runtime_readings([reading("D1", 0), bad])
+
+    assert summary["stored"] == 1
+    assert [error["index"] for error in errors] == [1]
+
+
+def test_bucket_stops_accepting_readings_at_size_cap(devices_api, devices, monkeypatch):
+    entry_bytes = devices_api._runtime_bucket_entry_bytes(devices_api.validate_runtime_reading(reading("D1", 0))[0])
+    monkeypatch.setattr(devices_api, "RUNTIME_BUCKET_MAX_BYTES", entry_bytes * 5)
+    monkeypatch.setattr(devices_api, "RUNTIME_BUCKET_WRITE_BYTES", entry_bytes * 2)
+
+    summary, errors, _ = devices_api.ingest_runtime_readings([reading("D1", m) for m in range(8)], "1h")
+
+    assert summary["stored"] == 4  # batches of two, the third would pass the cap
+    assert [error["index"] for error in errors] == [4, 5, 6, 7]
+    assert "bucket is full" in errors[0]["error"]
+    item = devices.get_item(Key={"PK": "DEVICE#D1", "SK": "RUNTIME#2026-03-01T10:00:00.000Z"})["Item"]
+    assert len(item["Readings"]) == 4 and item["ReadingsBytes"] == entry_bytes * 4
+
+    # A later request cannot grow the full bucket either
+    summary, errors, _ = devices_api.ingest_runtime_readings([reading("D1", 30), reading("D1", 31)], "1h")
+    assert summary["stored"] == 0 and len(errors) == 2
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+
+import pytest
+
+
+@pytest.fixture
+def readings(devices_api, aws_tables):
+    aws_tables.Table("v_devices_dev").put_item(Item={"PK": "DEVICE#D1", "SK": "META", "DeviceId": "D1"})
+    single = [{"deviceId": "D1", "eventDate": f"2026-03-01T10:{m:02d}:00Z", "metrics": {"flow": m, "temp": 20}} for m in range(0, 30)]
+    bucketed = [{"deviceId": "D1", "eventDate": f"2026-03-01T10:{m:02d}:00Z", "metrics": {"flow": m}} for m in range(30, 60)]
+    devices_api.ingest_runtime_readings(single)
+    devices_api.ingest_runtime_readings(bucketed, "15m")
+
+
+def utc(text):
+    return datetime.fromisoformat(text).replace(tzinfo=timezone.utc)
+
+
+def test_samples_span_single_and_bucketed_items(devices_api, readings):
+    samples, items_read, truncated = devices_api.collect_runtime_samples(
+        "D1", utc("2026-03-01T10:10:00"), utc("2026-03-01T10:44:00"), ["flow"])
+
+    timestamps, values = samples["flow"]
+    assert sorted(values) == [float(m) for m in range(10, 45)]
+    assert set(samples) == {"flow"} and not truncated
+    assert items_read == 30 + 1  # single readings since 10:00 plus the 10:30 bucket (10:45 starts after the range)
+
+
+def test_downsampling_buckets_by_step(devices_api, readings):
+    samples, _, _ = devices_api.collect_runtime_samples("D1", utc("2026-03-01T10:00:00"), utc("2026-03-01T10:59:59"))
+    start = utc("2026-03-01T10:00:00").timestamp()
+
+    points = devices_api.downsample_runtime_series(*samples["flow"], start, 900)
+
+    assert [point["t"] for point in points] == [f"2026-03-01T10:{m:02d}:00.000Z" for m in (0, 15, 30, 45)]
+    assert points[1] == {"t": "2026-03-01T10:15:00.000Z", "min": 15.0, "max": 29.0, "mean": 22.0, "last": 29.0, "count": 15}
+
+
+def test_scalar_downsampling_matches_vectorized(devices_api, monkeypatch):
+    timestamps = [5.0, 1.0, 61.0, 59.0, 200.0]
+    values = [2.0, 4.0, -1.0, 3.0, 7.0]
+    vectorized = devices_api.downsample_runtime_series(timestamps, values, 0.0, 60)
+    monkeypatch.setattr(devices_api, "np", None)
+
+    scalar = devices_api.downsample_runtime_series(timestamps, values, 0.0, 60)
+
+    assert [point["count"] for point in scalar] == [3, 1, 1]
+    assert scalar[0]["last"] == 3.0  # latest sample of the bucket, not the latest received
+    assert vectorized == scalar
+
+
+@pytest.mark.parametrize("value, expected", [("30s", (30, None)), ("5m", (300, None)), ("1D", (86400, None))])
+def test_parse_step(devices_api, value, expected):
+    assert devices_api.parse_runtime_step(value) == expected
+
+
+@pytest.mark.parametrize("value", ["0s", "0m", "5 minutes"])
+def test_invalid_step_is_rejected(devices_api, value):
+    assert devices_api.parse_runtime_step(value) == (None, "step must look like 30s, 5m, 1h or 1d")
+
+
+def test_zero_step_is_a_bad_request(devices_api):
+    response = devices_api.lambda_handler({
+        "httpMethod": "GET",
+        "path": "/devices/D1/runtime",
+        "pathParameters": {"deviceId": "D1"},
+        "queryStringParameters": {"step": "0s"},
+    }, None)
+
+    assert response["statusCode"] == 400
+
+
+def test_auto_step_targets_point_budget(devices_api):
+    assert devices_api.pick_runtime_step(3600) == 60
+    assert devices_api.pick_runtime_step(7 * 86400) == 3600
+    assert devices_api.pick_runtime_step(30 * 86400) == 3 * 3600
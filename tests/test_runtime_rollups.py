@@ -0,0 +1,52 @@
+import pytest
+
+
+@pytest.fixture
+def linked_device(aws_tables):
+    table = aws_tables.Table("v_devices_dev")
+    table.put_item(Item={"PK": "DEVICE#D1", "SK": "META", "DeviceId": "D1", "linkedInstallationId": "I1"})
+    return table
+
+
+def readings(devices_api, values, minute=0):
+    raw = [{"deviceId": "D1", "eventDate": f"2026-03-01T10:{minute + i:02d}:00Z", "metrics": {"flow": v}}
+           for i, v in enumerate(values)]
+    return [devices_api.validate_runtime_reading(r)[0] for r in raw]
+
+
+def hourly(table, pk):
+    return table.get_item(Key={"PK": pk, "SK": "ROLLUP#H#2026-03-01T10:00:00.000Z"})["Item"]["Metrics"]["flow"]
+
+
+def test_rollups_cover_device_and_installation(devices_api, linked_device):
+    updated = devices_api.update_runtime_rollups(readings(devices_api, [1.0, 4.0, 2.5]))
+
+    assert updated == 4  # hour and day, for the device and its installation
+    for pk in ("DEVICE#D1", "INSTALL#I1"):
+        stats = hourly(linked_device, pk)
+        assert (stats["count"], float(stats["sum"]), float(stats["min"]), float(stats["max"]), float(stats["last"])) == (3, 7.5, 1.0, 4.0, 2.5)
+
+
+def test_retried_batch_is_not_counted_twice(devices_api, linked_device):
+    devices_api.update_runtime_rollups(readings(devices_api, [1.0, 4.0]))
+
+    assert devices_api.update_runtime_rollups(readings(devices_api, [1.0, 4.0])) == 0
+    assert hourly(linked_device, "DEVICE#D1")["count"] == 2
+
+    # New readings in the same hour still merge
+    devices_api.update_runtime_rollups(readings(devices_api, [6.0], minute=30))
+    stats = hourly(linked_device, "DEVICE#D1")
+    assert stats["count"] == 3 and float(stats["max"]) == 6.0
+
+
+def test_scalar_aggregation_matches_vectorized(devices_api, monkeypatch):
+    keys = ["a", "b", "a", "a", "b"]
+    timestamps = [3.0, 1.0, 1.0, 2.0, 5.0]
+    values = [3.0, -1.0, 1.0, 2.0, 5.0]
+    vectorized = devices_api.aggregate_rollup_samples(keys, timestamps, values)
+    monkeypatch.setattr(devices_api, "np", None)
+    scalar = devices_api.aggregate_rollup_samples(keys, timestamps, values)
+
+    assert scalar["a"] == (3, 6.0, 1.0, 3.0, 3.0, 3.0)
+    assert scalar["b"] == (2, 4.0, -1.0, 5.0, 5.0, 5.0)
+    assert vectorized == scalar
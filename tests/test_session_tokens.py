@@ -0,0 +1,42 @@
+from shared.session_tokens import (
+    PermissionBits, has_permission_bit, is_session_token, issue_session_token,
+    permission_mask, verify_session_token
+)
+
+SECRET = b"test-secret"
+BITS = {"user:read": 0, "user:create": 1, "device:read": 70}
+
+def test_session_token_round_trip():
+    mask = permission_mask(["user:read", "device:read", "unknown:perm"], BITS)
+    token = issue_session_token({"sub": "u-1", "role": "viewer"}, mask, 3, SECRET)
+    assert is_session_token(token)
+    payload = verify_session_token(token, SECRET)
+    assert payload["sub"] == "u-1"
+    assert payload["cv"] == 3
+    assert has_permission_bit(payload, BITS["user:read"])
+    assert has_permission_bit(payload, BITS["device:read"])
+    assert not has_permission_bit(payload, BITS["user:create"])
+    assert not has_permission_bit(payload, None)
+
+def test_session_token_rejects_tampering_and_expiry():
+    token = issue_session_token({"sub": "u-1"}, 1, 1, SECRET, ttl_seconds=60)
+    assert verify_session_token(token, b"other-secret") is None
+    header, body, signature = token.split(".")
+    assert verify_session_token(f"{header}.{body}x.{signature}", SECRET) is None
+    payload = verify_session_token(token, SECRET)
+    assert verify_session_token(token, SECRET, now=payload["exp"]) is None
+
+def test_firebase_style_token_is_not_a_session_token():
+    assert not is_session_token("eyJhbGciOiJSUzI1NiJ9.e30.sig")
+
+def test_permission_bits_reload_on_newer_version():
+    calls = []
+    def loader():
+        calls.append(1)
+        return ({"user:read": 0}, 1) if len(calls) == 1 else ({"user:read": 0, "user:create": 1}, 2)
+    permission_bits = PermissionBits(loader)
+    assert permission_bits.bit_for("user:create") is None
+    assert permission_bits.bit_for("user:read", 1) == 0
+    assert len(calls) == 1
+    assert permission_bits.bit_for("user:create", 2) == 1
+    assert len(calls) == 2
@@ -0,0 +1,33 @@
+import math
+import pytest
+from shared.telemetry_archive import LocalArchiveStore, archive_key, decode_archive, encode_archive
+
+def test_archive_round_trip():
+    # Metrics reported at different instants share one timestamp column
+    samples = {
+        "voltage": ([1700000000.0, 1700000060.0, 1700000120.5], [230.1, 229.8, 231.0]),
+        "current": ([1700000060.0], [4.25])
+    }
+    blob = encode_archive("dev-1", "2023-11-14", samples)
+    header, decoded = decode_archive(blob)
+    assert header["deviceId"] == "dev-1"
+    assert header["rows"] == 3
+    assert decoded["voltage"] == samples["voltage"]
+    assert decoded["current"] == samples["current"]
+
+def test_archive_metric_selection():
+    blob = encode_archive("dev-1", "2023-11-14", {"a": ([1.0], [1.0]), "b": ([2.0], [math.pi])})
+    _, decoded = decode_archive(blob, ["b"])
+    assert list(decoded) == ["b"]
+    assert decoded["b"] == ([2.0], [math.pi])
+
+def test_archive_rejects_foreign_blob():
+    with pytest.raises(ValueError):
+        decode_archive(b"not an archive")
+
+def test_local_store(tmp_path):
+    store = LocalArchiveStore(str(tmp_path))
+    key = archive_key("dev-1", "2023-11-14")
+    store.put(key, b"blob")
+    assert store.get(key) == b"blob"
+    assert (tmp_path / "runtime" / "dev-1" / "2023-11-14.vta").exists()
@@ -0,0 +1,85 @@
+import hashlib
+import io
+import json
+import time
+
+CLAIMS = {"uid": "u-1", "email": "ann@example.com"}
+
+
+def test_cached_claims_live_until_exp(users_api):
+    users_api.cache_token_claims("token-a", CLAIMS, time.time() + 60)
+    users_api.cache_token_claims("token-b", CLAIMS, time.time() - 1)
+
+    claims = users_api.get_cached_token_claims("token-a")
+    claims["email"] = "changed"
+    assert users_api.get_cached_token_claims("token-a") == CLAIMS  # callers get a copy
+    assert users_api.get_cached_token_claims("token-b") is None
+    assert list(users_api._verified_tokens) == [hashlib.sha256(b"token-a").hexdigest()]  # expired entry dropped
+
+
+def test_least_recently_used_token_is_evicted(users_api, monkeypatch):
+    monkeypatch.setattr(users_api, "TOKEN_CACHE_MAX_ENTRIES", 2)
+    for token in ("a", "b"):
+        users_api.cache_token_claims(token, {**CLAIMS, "uid": token}, time.time() + 60)
+    users_api.get_cached_token_claims("a")
+    users_api.cache_token_claims("c", CLAIMS, time.time() + 60)
+
+    assert users_api.get_cached_token_claims("b") is None
+    assert users_api.get_cached_token_claims("a")["uid"] == "a"
+
+
+def test_repeat_request_skips_verification(users_api):
+    users_api.cache_token_claims("opaque-token", CLAIMS, time.time() + 60)
+    # Not a decodable JWT, so only the cache can answer
+    assert users_api.verify_firebase_token("opaque-token") == CLAIMS
+    assert users_api.verify_firebase_token("other-token") is None
+
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, body, cache_control):
+        super().__init__(json.dumps(body).encode("utf-8"))
+        self.headers = {"Cache-Control": cache_control}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class FakeTimer:
+    scheduled = []
+
+    def __init__(self, interval, function):
+        self.interval, self.function, self.cancelled = interval, function, False
+        FakeTimer.scheduled.append(self)
+
+    def start(self):
+        pass
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def test_key_set_refreshes_per_cache_control(users_api, monkeypatch):
+    fetches = []
+
+    def fake_urlopen(url, timeout):
+        fetches.append(url)
+        return FakeResponse({"kid-1": "PEM"}, "public, max-age=20000, must-revalidate")
+
+    monkeypatch.setattr(users_api.urllib.request, "urlopen", fake_urlopen)
+    monkeypatch.setattr(users_api.threading, "Timer", FakeTimer)
+    FakeTimer.scheduled = []
+    keys = users_api.FirebaseKeySet("https://certs.example")
+
+    assert keys.get() == {"kid-1": "PEM"} and keys.get() == {"kid-1": "PEM"}
+    assert len(fetches) == 1
+    assert FakeTimer.scheduled[0].interval == 18000  # refreshed before max-age runs out
+
+    FakeTimer.scheduled[0].function()  # background refresh
+    assert len(fetches) == 2 and FakeTimer.scheduled[0].cancelled
+
+    keys.expires_at = 0.0  # timer frozen between invocations
+    keys.get()
+    assert len(fetches) == 3
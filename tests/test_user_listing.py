@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+ADMIN = {"email": "admin@example.com", "role": "admin", "permissions": ["user:read", "user:update"]}
+
+
+def put_user(users_api, table, number, first_name, role="operator", state="TS", district="HYD"):
+    user = {
+        "PK": f"USER#U{number:03d}",
+        "SK": "ENTITY#USER",
+        "id": f"U{number:03d}",
+        "entityType": "USER",
+        "email": f"user{number}@example.com",
+        "firstName": first_name,
+        "lastName": "Doe",
+        "role": role,
+        "isActive": True,
+        "stateId": state,
+        "districtId": district,
+        "createdAt": f"2026-01-01T00:00:{number:02d}Z",
+    }
+    user.update(users_api.user_index_attributes(user))
+    table.put_item(Item=users_api.prepare_item_for_storage(user, "USER"))
+
+
+@pytest.fixture
+def users(users_api, aws_tables):
+    table = aws_tables.Table("v_users_dev")
+    for number in range(1, 31):
+        put_user(users_api, table, number, "Zed" if number in (3, 14) else "Ann", role="admin" if number % 3 == 0 else "operator")
+    return table
+
+
+def page_all(users_api, filters, limit, search=None):
+    seen, token, pages = [], None, 0
+    while True:
+        items, token, error = users_api.query_users_page(filters, limit, token, search)
+        assert error is None
+        seen.extend(item["id"] for item in items)
+        pages += 1
+        if not token:
+            return seen, pages
+
+
+def test_role_filter_pages_without_gaps(users_api, users):
+    seen, _ = page_all(users_api, {"role": "admin"}, 4)
+
+    assert seen == [f"U{n:03d}" for n in range(30, 0, -1) if n % 3 == 0]  # newest first
+
+
+def test_region_prefix_matches_deeper_users(users_api, users):
+    put_user(users_api, users, 40, "Deep", state="AP", district="VZG")
+    users.update_item(Key={"PK": "USER#U040", "SK": "ENTITY#USER"},
+                      UpdateExpression="SET regionCombo = :combo", ExpressionAttributeValues={":combo": "AP#VZG#M1#"})
+
+    items, token, _ = users_api.query_users_page({"stateId": "AP", "districtId": "VZG"}, 10)
+
+    assert [item["id"] for item in items] == ["U040"] and token is None
+
+
+def test_search_bounds_query_pages_and_returns_cursor(users_api, users, monkeypatch):
+    monkeypatch.setattr(users_api, "USER_LIST_MAX_QUERY_PAGES", 2)
+
+    items, token, _ = users_api.query_users_page({}, 5, None, "zed")
+    assert items == [] and token  # two pages of five, no match yet
+
+    seen, _ = page_all(users_api, {}, 5, "zed")
+    assert seen == ["U014", "U003"]
+
+
+def test_cursor_rejected_for_other_filters(users_api, users):
+    _, token, _ = users_api.query_users_page({"role": "admin"}, 2)
+
+    assert users_api.query_users_page({}, 2, token)[2] == "nextToken does not match the requested filters"
+
+
+def patch(users_api, body):
+    return users_api.handle_update_user_partial("U001", {"body": json.dumps(body)}, ADMIN)
+
+
+def test_patch_rejects_null_role(users_api, users):
+    response = patch(users_api, {"role": None})
+
+    assert response["statusCode"] == 400
+    assert json.loads(response["body"])["error"] == "role cannot be null"
+    assert users.get_item(Key={"PK": "USER#U001", "SK": "ENTITY#USER"})["Item"]["role"] == "operator"
+
+
+def test_patch_clearing_region_updates_index_attributes(users_api, users):
+    response = patch(users_api, {"districtId": None, "isActive": False})
+
+    assert response["statusCode"] == 200
+    item = users.get_item(Key={"PK": "USER#U001", "SK": "ENTITY#USER"})["Item"]
+    assert "districtId" not in item
+    assert (item["regionCombo"], item["activeStatus"]) == ("TS#", "INACTIVE")
+
+
+@pytest.mark.parametrize("limit", ["0", "-5", "ten"])
+def test_bad_limit_is_a_bad_request(users_api, users, limit):
+    response = users_api.handle_list_users({"limit": limit}, ADMIN, False)
+
+    assert response["statusCode"] == 400
+    assert json.loads(response["body"])["error"] == "limit must be between 1 and 100"
+
+
+def test_created_user_is_in_the_unfiltered_listing(users_api, aws_tables):
+    table = aws_tables.Table("v_users_dev")
+    table.put_item(Item={"PK": "ROLE#R1", "SK": "META", "entityType": "ROLE", "roleId": "R1", "roleName": "operator"})
+    table.put_item(Item=users_api.build_role_name_item("operator", "R1"))
+    creator = {**ADMIN, "permissions": ["user:create"]}
+    body = {"email": "new@example.com", "firstName": "New", "lastName": "User", "role": "operator"}
+    created = json.loads(users_api.handle_create_user({"body": json.dumps(body)}, creator)["body"])
+
+    items, _, error = users_api.query_users_page({}, 10)
+
+    assert error is None and [item["id"] for item in items] == [created["id"]]
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+ADMIN = {"uid": "admin", "permissions": ["permission:read"]}
+
+
+@pytest.fixture
+def assignments(aws_tables):
+    table = aws_tables.Table("v_users_dev")
+    for role_id, role_name, permission_ids in (("R1", "operator", range(0, 120)), ("R2", "auditor", range(100, 130))):
+        table.put_item(Item={"PK": "USER#U1", "SK": f"ROLE#{role_id}", "roleId": role_id})
+        table.put_item(Item={"PK": f"ROLE#{role_id}", "SK": "META", "roleId": role_id, "roleName": role_name})
+        for number in permission_ids:
+            table.put_item(Item={"PK": f"ROLE#{role_id}", "SK": f"PERMISSION#P{number:03d}", "permissionId": f"P{number:03d}"})
+    for number in range(0, 129):  # P129 is linked but missing
+        table.put_item(Item={"PK": f"PERMISSION#P{number:03d}", "SK": "META", "entityType": "PERMISSION",
+                             "permissionId": f"P{number:03d}", "permissionName": f"perm:{number}"})
+    return table
+
+
+@pytest.fixture
+def calls(users_api, monkeypatch):
+    made = []
+    for target, name in ((users_api.table, "query"), (users_api.table, "scan"), (users_api.dynamodb, "batch_get_item")):
+        real = getattr(target, name)
+        monkeypatch.setattr(target, name, lambda real=real, name=name, **kwargs: made.append(name) or real(**kwargs))
+    return made
+
+
+def test_permissions_merge_granted_by_in_fixed_round_trips(users_api, assignments, calls):
+    response = users_api.handle_get_user_permissions("U1", ADMIN)
+
+    assert response["statusCode"] == 200
+    permissions = {p["permissionId"]: p["grantedBy"] for p in json.loads(response["body"])["data"]}
+    assert len(permissions) == 129
+    assert permissions["P000"] == ["operator"]
+    assert permissions["P110"] == ["operator", "auditor"]
+    assert permissions["P125"] == ["auditor"]
+    assert sorted(calls) == ["batch_get_item", "batch_get_item", "query", "query", "query"]
+
+
+def test_unprocessed_keys_are_retried(users_api, assignments, monkeypatch):
+    real = users_api.dynamodb.batch_get_item
+    throttled = []
+
+    def throttling_batch_get(RequestItems):
+        keys = RequestItems[users_api.TABLE_NAME]["Keys"]
+        if not throttled:
+            throttled.append(keys[0])
+            response = real(RequestItems={users_api.TABLE_NAME: {"Keys": keys[1:]}})
+            response["UnprocessedKeys"] = {users_api.TABLE_NAME: {"Keys": keys[:1]}}
+            return response
+        return real(RequestItems=RequestItems)
+
+    monkeypatch.setattr(users_api.dynamodb, "batch_get_item", throttling_batch_get)
+    monkeypatch.setattr(users_api.time, "sleep", lambda seconds: None)
+
+    assert len(users_api.compute_user_permissions("U1")) == 129
+
+
+def test_user_without_roles_has_no_permissions(users_api, assignments):
+    assert users_api.compute_user_permissions("nobody") == []